@@ -0,0 +1,390 @@
+"""
+Detectores de anomalia de temperatura
+
+Antes havia uma única regra no coletor: |taxa| > 0,4 °C/s entre duas
+amostras seguidas. Ela não vê deriva lenta e dispara com ruído de uma
+amostra só. Aqui ficam vários detectores, combinados por AnomalyEngine
+(uma amostra é anomalia se qualquer detector habilitado disparar):
+
+    rate   - |Δtemperatura / Δt| acima do limite (a regra antiga)
+    zscore - z-score contra média/desvio das últimas `window` amostras
+    ewma   - carta de controle EWMA contra a linha de base das últimas `window` amostras
+    cusum  - CUSUM bilateral sobre os desvios padronizados (deriva lenta)
+    mad    - mediana/MAD das últimas `window` amostras (robusto a picos)
+
+Cada detector roda de dois jeitos com o mesmo estado:
+    update(ts, valor)   - incremental, uma amostra por vez (coletor)
+    detect(ts, valores) - em lote, continuando do estado atual (histórico)
+detect(bloco) equivale a chamar update em cada amostra do bloco, então um
+histórico pode ser processado em pedaços sem emendas. Com NumPy instalado
+o lote é vetorizado (janelas por somas acumuladas, sliding_window_view e
+EWMA em blocos); sem NumPy cai no laço de update. CUSUM e o reinício após
+disparo são recursivos: só a padronização é vetorizada.
+
+Configuração: {nome: {parâmetro: valor}}, ex.:
+    {'mad': {'window': 61, 'threshold': 7.0}, 'cusum': {'h': 10.0}}
+Timestamps em epoch-ms; janelas contadas em amostras.
+"""
+import bisect
+import math
+from collections import deque
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+
+# Linhas por bloco nos caminhos NumPy (limita a memória das janelas deslizantes)
+BATCH_BLOCK = 65536
+
+DEFAULT_DETECTORS = {
+    'mad': {},
+    'ewma': {},
+    'cusum': {},
+}
+
+
+class Detector:
+    """Base: detect() em lote é o laço de update() quando não há versão vetorizada"""
+
+    name = None
+    # Amostras de histórico necessárias para o detector estar aquecido
+    warmup = 1
+
+    def update(self, ts, value):
+        raise NotImplementedError
+
+    def detect(self, ts, values):
+        update = self.update
+        return [update(t, v) for t, v in zip(ts, values)]
+
+
+class RateOfChange(Detector):
+    """|Δtemperatura / Δt| > threshold (°C/s) entre amostras seguidas"""
+
+    name = 'rate'
+    warmup = 1
+
+    def __init__(self, threshold=0.4):
+        self.threshold = threshold
+        self._last = None  # (ts, valor)
+
+    def update(self, ts, value):
+        last, self._last = self._last, (ts, value)
+        if last is None or ts <= last[0]:
+            return False
+        return abs(value - last[1]) * 1000 / (ts - last[0]) > self.threshold
+
+    if NUMPY_AVAILABLE:
+        def detect(self, ts, values):
+            if not len(values):
+                return []
+            ts = np.asarray(ts, dtype=np.float64)
+            values = np.asarray(values, dtype=np.float64)
+            prev_ts = np.empty_like(ts)
+            prev_values = np.empty_like(values)
+            prev_ts[1:], prev_values[1:] = ts[:-1], values[:-1]
+            if self._last is None:
+                prev_ts[0], prev_values[0] = ts[0], values[0]
+            else:
+                prev_ts[0], prev_values[0] = self._last
+            dt = ts - prev_ts
+            flags = np.zeros(len(values), dtype=bool)
+            valid = dt > 0
+            flags[valid] = np.abs(values[valid] - prev_values[valid]) * 1000 / dt[valid] > self.threshold
+            self._last = (float(ts[-1]), float(values[-1]))
+            return flags.tolist()
+
+
+class _Window:
+    """Últimas `size` amostras com soma e soma dos quadrados (média e desvio em O(1))"""
+
+    def __init__(self, size):
+        self.size = size
+        self.values = deque(maxlen=size)
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    @property
+    def full(self):
+        return len(self.values) == self.size
+
+    def mean_std(self):
+        n = len(self.values)
+        mean = self.total / n
+        variance = (self.total_sq - self.total * mean) / (n - 1) if n > 1 else 0.0
+        return mean, math.sqrt(max(variance, 0.0))
+
+    def push(self, value):
+        if self.full:
+            oldest = self.values[0]
+            self.total -= oldest
+            self.total_sq -= oldest * oldest
+        self.values.append(value)
+        self.total += value
+        self.total_sq += value * value
+
+    def extend(self, values):
+        for value in values[-self.size:]:
+            self.push(value)
+
+
+def _rolling_baseline(history, values, window):
+    """
+    Média e desvio (amostral) das `window` amostras anteriores a cada valor do bloco.
+    history: amostras anteriores ao bloco (as últimas `window`, se houver).
+    Retorna (mean, std, full) com full=False onde ainda não há janela completa.
+    """
+    ext = np.concatenate([np.asarray(history, dtype=np.float64), values])
+    offset = len(ext) - len(values)
+    # Deslocar pela primeira amostra não muda o desvio e evita cancelamento nas somas
+    shifted = ext - (ext[0] if len(ext) else 0.0)
+    csum = np.concatenate([[0.0], np.cumsum(shifted)])
+    csum_sq = np.concatenate([[0.0], np.cumsum(shifted * shifted)])
+    end = np.arange(offset, len(ext))       # Janela = ext[end - window:end]
+    start = np.maximum(end - window, 0)
+    count = end - start
+    full = count == window
+    n = np.maximum(count, 1)
+    total = csum[end] - csum[start]
+    mean_shifted = total / n
+    variance = (csum_sq[end] - csum_sq[start] - total * mean_shifted) / np.maximum(n - 1, 1)
+    return mean_shifted + (ext[0] if len(ext) else 0.0), np.sqrt(np.maximum(variance, 0.0)), full
+
+
+class RollingZScore(Detector):
+    """|x - média| / desvio das `window` amostras anteriores > threshold"""
+
+    name = 'zscore'
+
+    def __init__(self, window=60, threshold=4.0, min_std=0.05):
+        """min_std: piso do desvio, para um sinal estável não disparar com variações de 0,01 °C"""
+        self.window = _Window(window)
+        self.threshold = threshold
+        self.min_std = min_std
+        self.warmup = window
+
+    def update(self, ts, value):
+        flag = False
+        if self.window.full:
+            mean, std = self.window.mean_std()
+            flag = abs(value - mean) > self.threshold * max(std, self.min_std)
+        self.window.push(value)
+        return flag
+
+    if NUMPY_AVAILABLE:
+        def detect(self, ts, values):
+            values = np.asarray(values, dtype=np.float64)
+            mean, std, full = _rolling_baseline(self.window.values, values, self.window.size)
+            flags = full & (np.abs(values - mean) > self.threshold * np.maximum(std, self.min_std))
+            self.window.extend(values.tolist())
+            return flags.tolist()
+
+
+def _ewma(values, lam, start):
+    """EWMA z[i] = lam * x[i] + (1 - lam) * z[i-1] a partir de z[-1] = start, vetorizado em blocos"""
+    decay = 1.0 - lam
+    # Bloco em que decay**-bloco ainda cabe com folga na precisão do float
+    block = max(1, min(BATCH_BLOCK, int(30 / -math.log(decay)))) if decay > 0 else 1
+    out = np.empty_like(values)
+    previous = start
+    for first in range(0, len(values), block):
+        chunk = values[first:first + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)      # decay^(i+1)
+        weighted = np.cumsum(lam * chunk / powers * decay)  # Σ lam * x[k] * decay^-k
+        out[first:first + len(chunk)] = powers * previous + weighted * powers / decay
+        previous = out[first + len(chunk) - 1]
+    return out
+
+
+class EWMAChart(Detector):
+    """
+    Carta EWMA: z = lam * x + (1 - lam) * z_anterior, com limites de controle
+    média ± L * desvio dos `window` valores anteriores de z. Os limites saem do
+    próprio z (e não de σ * sqrt(lam / (2 - lam))) porque temperatura é
+    autocorrelacionada: a fórmula clássica supõe ruído independente e dispararia
+    o tempo todo. Sensível a desvios pequenos e persistentes que um limite por
+    amostra não vê.
+    """
+
+    name = 'ewma'
+
+    def __init__(self, lam=0.2, L=4.0, window=120, min_std=0.02):
+        self.lam = lam
+        self.L = L
+        self.window = _Window(window)
+        self.min_std = min_std
+        self.warmup = window
+        self._z = None
+
+    def update(self, ts, value):
+        self._z = value if self._z is None else self.lam * value + (1 - self.lam) * self._z
+        flag = False
+        if self.window.full:
+            mean, std = self.window.mean_std()
+            flag = abs(self._z - mean) > self.L * max(std, self.min_std)
+        self.window.push(self._z)
+        return flag
+
+    if NUMPY_AVAILABLE:
+        def detect(self, ts, values):
+            values = np.asarray(values, dtype=np.float64)
+            if not len(values):
+                return []
+            if self._z is None:
+                z = np.empty_like(values)
+                z[0] = values[0]
+                z[1:] = _ewma(values[1:], self.lam, values[0])
+            else:
+                z = _ewma(values, self.lam, self._z)
+            mean, std, full = _rolling_baseline(self.window.values, z, self.window.size)
+            flags = full & (np.abs(z - mean) > self.L * np.maximum(std, self.min_std))
+            self._z = float(z[-1])
+            self.window.extend(z.tolist())
+            return flags.tolist()
+
+
+class CUSUM(Detector):
+    """
+    CUSUM bilateral sobre u = (x - média) / desvio das `window` amostras anteriores:
+    s+ = max(0, s+ + u - k), s- = max(0, s- - u - k); dispara quando s+ ou s- > h
+    e recomeça do zero. Acumula desvios pequenos: pega deriva lenta.
+    """
+
+    name = 'cusum'
+
+    def __init__(self, k=1.0, h=15.0, window=120, min_std=0.05):
+        self.k = k
+        self.h = h
+        self.window = _Window(window)
+        self.min_std = min_std
+        self.warmup = window
+        self._high = 0.0
+        self._low = 0.0
+
+    def _step(self, u):
+        high = max(0.0, self._high + u - self.k)
+        low = max(0.0, self._low - u - self.k)
+        if high > self.h or low > self.h:
+            self._high = self._low = 0.0
+            return True
+        self._high, self._low = high, low
+        return False
+
+    def update(self, ts, value):
+        flag = False
+        if self.window.full:
+            mean, std = self.window.mean_std()
+            flag = self._step((value - mean) / max(std, self.min_std))
+        self.window.push(value)
+        return flag
+
+    if NUMPY_AVAILABLE:
+        def detect(self, ts, values):
+            values = np.asarray(values, dtype=np.float64)
+            mean, std, full = _rolling_baseline(self.window.values, values, self.window.size)
+            standardized = ((values - mean) / np.maximum(std, self.min_std)).tolist()
+            step = self._step
+            # A soma acumulada com reinício é recursiva: só a padronização é vetorizada
+            flags = [step(u) if ready else False for u, ready in zip(standardized, full.tolist())]
+            self.window.extend(values.tolist())
+            return flags
+
+
+class MedianMAD(Detector):
+    """
+    0,6745 * |x - mediana| / MAD das `window` amostras anteriores > threshold.
+    Mediana e MAD não se deixam puxar pelos próprios picos, ao contrário de média e desvio.
+    """
+
+    name = 'mad'
+
+    def __init__(self, window=31, threshold=6.0, min_mad=0.02):
+        self.size = window
+        self.threshold = threshold
+        self.min_mad = min_mad
+        self.warmup = window
+        self.values = deque(maxlen=window)
+        self._sorted = []
+
+    def update(self, ts, value):
+        flag = False
+        ordered = self._sorted
+        if len(ordered) == self.size:
+            median = _median(ordered)
+            # Desvios de cada lado da mediana já são sequências ordenadas: o sort só as intercala
+            mid = bisect.bisect_left(ordered, median)
+            deviations = sorted([median - v for v in ordered[:mid]] + [v - median for v in ordered[mid:]])
+            mad = _median(deviations)
+            flag = 0.6745 * abs(value - median) > self.threshold * max(mad, self.min_mad)
+            del ordered[bisect.bisect_left(ordered, self.values[0])]
+        self.values.append(value)
+        bisect.insort(ordered, value)
+        return flag
+
+    if NUMPY_AVAILABLE:
+        def detect(self, ts, values):
+            values = np.asarray(values, dtype=np.float64)
+            flags = np.zeros(len(values), dtype=bool)
+            ext = np.concatenate([np.asarray(self.values, dtype=np.float64), values])
+            offset = len(ext) - len(values)
+            # Amostra i do bloco (ext[offset + i]) usa a janela ext[offset + i - size:offset + i]
+            first = max(0, self.size - offset)
+            for block in range(first, len(values), BATCH_BLOCK):
+                stop = min(block + BATCH_BLOCK, len(values))
+                windows = sliding_window_view(ext[offset + block - self.size:offset + stop - 1], self.size)
+                median = np.median(windows, axis=1)
+                mad = np.median(np.abs(windows - median[:, None]), axis=1)
+                current = values[block:stop]
+                flags[block:stop] = 0.6745 * np.abs(current - median) > self.threshold * np.maximum(mad, self.min_mad)
+            for value in values[-self.size:].tolist():
+                if len(self._sorted) == self.size:
+                    del self._sorted[bisect.bisect_left(self._sorted, self.values[0])]
+                self.values.append(value)
+                bisect.insort(self._sorted, value)
+            return flags.tolist()
+
+
+def _median(ordered):
+    n = len(ordered)
+    mid = n // 2
+    return ordered[mid] if n % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+DETECTORS = {cls.name: cls for cls in (RateOfChange, RollingZScore, EWMAChart, CUSUM, MedianMAD)}
+
+
+class AnomalyEngine:
+    """Conjunto de detectores configurados; uma amostra é anomalia se qualquer um disparar"""
+
+    def __init__(self, config=None):
+        """
+        Args:
+            config: {nome: {parâmetro: valor}} (None = DEFAULT_DETECTORS)
+        """
+        self.config = DEFAULT_DETECTORS if config is None else config
+        unknown = set(self.config) - set(DETECTORS)
+        if unknown:
+            raise ValueError(f"Detectores desconhecidos: {', '.join(sorted(unknown))} "
+                             f"(disponíveis: {', '.join(DETECTORS)})")
+        self.detectors = [DETECTORS[name](**(params or {})) for name, params in self.config.items()]
+        self.warmup = max((detector.warmup for detector in self.detectors), default=0)
+
+    def update(self, ts, value):
+        """Amostra nova; retorna os nomes dos detectores que dispararam (vazio = normal)"""
+        return [detector.name for detector in self.detectors if detector.update(ts, value)]
+
+    def detect(self, ts, values):
+        """Lote em ordem cronológica, continuando do estado atual; retorna uma flag por amostra"""
+        flags = [False] * len(values)
+        for detector in self.detectors:
+            flags = [a or b for a, b in zip(flags, detector.detect(ts, values))]
+        return flags
+
+    def warm(self, rows):
+        """Aquece o estado com amostras (id, ts, temperature, ...) já gravadas, sem emitir flags"""
+        if rows:
+            self.detect([row[1] for row in rows], [row[2] for row in rows])
@@ -0,0 +1,78 @@
+"""
+Fábrica do app web: as duas interfaces em um processo, sobre um único backend
+
+    /, /monitoring  páginas de controle e monitoramento (rotas de web_app.py)
+    /console        interface de variáveis com template (rotas de web_server.py)
+    /api/...        APIs das duas; /api/stream é único e atende as duas páginas
+
+Os dois conjuntos de rotas compartilham o mesmo PLCServices (pool, fila de
+comandos, tabela de valores, stream SSE e coletor de temperatura).
+
+Uso:
+    app = create_app({'PLC_IP': 'localhost', 'PLC_PORT': 5020})
+    start_services(app)      # varredura, status e coleta; nada inicia sozinho
+    app.run(...)
+"""
+from flask import Flask
+from flask_cors import CORS
+from plc_services import PLCServices
+
+DEFAULT_CONFIG = {
+    'PLC_IP': '192.168.0.200',
+    'PLC_PORT': 502,
+    # Prazo para uma leitura interativa começar; depois disso é descartada (503)
+    'INTERACTIVE_DEADLINE': 2.0,
+    'SCAN_INTERVAL': 1.0,
+    # Máximo de operações aceitas em um único POST /api/batch
+    'MAX_BATCH_OPERATIONS': 500,
+    # Máximo de tags avulsas 'tipo:endereço' na varredura (pedidas por streams ou lidas pela API)
+    'MAX_WATCHED_TAGS': 50,
+    'TEMPERATURE_HR': 40001,
+    # Segundos entre amostras (frações para 10-100 Hz, ex.: 0.01)
+    'TEMPERATURE_INTERVAL': 5,
+    # Após um ciclo atrasado: False pula os ticks perdidos, True lê em seguida (ver sample_scheduler)
+    'TEMPERATURE_CATCH_UP': False,
+    # Detectores de anomalia {nome: {parâmetro: valor}} (None = anomaly_detection.DEFAULT_DETECTORS).
+    # Ao mudar, recalcule o histórico com backfill_anomalies.py
+    'ANOMALY_DETECTORS': None,
+    'COLLECT_TEMPERATURE': True,
+    'TEMPERATURE_DB': 'temperature_data.db',
+    # Amostras mais recentes mantidas em memória para /history, /current e análises
+    'TEMPERATURE_BUFFER': 4096,
+    # Máximo de buckets por consulta em /api/series (limita o tamanho da resposta)
+    'SERIES_MAX_BUCKETS': 10000,
+    # PRAGMA synchronous da gravação das amostras (NORMAL ou FULL, ver sample_writer)
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    # Variáveis da interface /console (None = web_server.VARIABLES)
+    'VARIABLES': None,
+}
+
+
+def create_app(config=None):
+    """
+    Cria o app Flask com as rotas de controle, monitoramento e console.
+
+    Args:
+        config: Dicionário sobrescrevendo chaves de DEFAULT_CONFIG
+    """
+    import web_app
+    import web_server
+
+    app = Flask(__name__, static_folder='static', template_folder='templates')
+    app.config.update(DEFAULT_CONFIG)
+    app.config.update(config or {})
+    if app.config['VARIABLES'] is None:
+        app.config['VARIABLES'] = web_server.VARIABLES
+    CORS(app)
+
+    app.extensions['plc_services'] = PLCServices(app.config)
+    app.register_blueprint(web_app.bp)
+    app.register_blueprint(web_server.bp)
+    return app
+
+
+def start_services(app):
+    """Inicia as tarefas em background do backend do app"""
+    services = app.extensions['plc_services']
+    services.start()
+    return services
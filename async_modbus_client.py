@@ -0,0 +1,153 @@
+"""
+Cliente Modbus assíncrono (asyncio) com transações em pipeline
+
+Mesma API tipada do ModbusCLP (read_bool, write_int, read_real...), mas cada
+método é uma coroutine. Várias transações podem ficar em voo no mesmo socket:
+o AsyncModbusTcpClient associa cada resposta à sua requisição pelo
+Transaction ID do cabeçalho MBAP. O número de transações simultâneas é
+limitado por `max_in_flight` (muitos CLPs aceitam poucas; use 1 para o
+comportamento estritamente sequencial).
+
+Uso:
+    clp = AsyncModbusCLP('192.168.0.200', max_in_flight=8)
+    await clp.connect()
+    temps = await asyncio.gather(*(clp.read_real(a) for a in range(1, 41, 2)))
+    clp.close()
+"""
+import asyncio
+from pymodbus.client import AsyncModbusTcpClient
+import modbus_codec
+from modbus_client import ModbusCLP, MAX_REGISTERS_PER_READ, check_result
+
+
+class AsyncModbusCLP:
+    def __init__(self, ip='192.168.0.200', port=502, unit_id=0, timeout=3, max_in_flight=8):
+        """
+        Args:
+            ip: IP do CLP
+            port: Porta Modbus TCP
+            unit_id: Unit ID (slave) Modbus
+            timeout: Timeout por transação em segundos
+            max_in_flight: Máximo de transações pendentes no mesmo socket
+        """
+        self.ip = ip
+        self.port = port
+        self.unit_id = unit_id
+        self.max_in_flight = max_in_flight
+        self.client = AsyncModbusTcpClient(ip, port=port, timeout=timeout)
+        self._window = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+
+    async def connect(self):
+        """Conecta ao CLP. Retorna True se sucesso."""
+        return await self.client.connect()
+
+    def close(self):
+        """Fecha a conexão."""
+        self.client.close()
+
+    @property
+    def connected(self):
+        return self.client.connected
+
+    async def _execute(self, method, *args):
+        """Envia uma requisição respeitando a janela de transações em voo"""
+        async with self._window:
+            self.in_flight += 1
+            try:
+                result = await method(*args, slave=self.unit_id)
+            finally:
+                self.in_flight -= 1
+        check_result(result)
+        return result
+
+    async def write_bool(self, address, value):
+        """Escreve um valor Booleano em uma Coil (address 0-based)."""
+        try:
+            await self._execute(self.client.write_coil, address, value)
+            return True
+        except Exception as e:
+            print(f"Erro ao escrever BOOL em {address}: {e}")
+            raise
+
+    async def read_bool(self, address):
+        """Lê um valor Booleano de uma Coil (address 0-based)."""
+        try:
+            result = await self._execute(self.client.read_coils, address, 1)
+            return result.bits[0]
+        except Exception as e:
+            print(f"Erro ao ler BOOL de {address}: {e}")
+            raise
+
+    async def write_int(self, address, value):
+        """Escreve um valor INT (16-bit) em um Holding Register."""
+        try:
+            await self._execute(self.client.write_registers, address, ModbusCLP.encode_int(value))
+            return True
+        except Exception as e:
+            print(f"Erro ao escrever INT em {address}: {e}")
+            raise
+
+    async def read_int(self, address):
+        """Lê um valor INT (16-bit) de um Holding Register."""
+        try:
+            result = await self._execute(self.client.read_holding_registers, address, 1)
+            return ModbusCLP.decode_int(result.registers)
+        except Exception as e:
+            print(f"Erro ao ler INT de {address}: {e}")
+            raise
+
+    async def write_real(self, address, value):
+        """Escreve um valor REAL (32-bit float) em 2 Holding Registers."""
+        try:
+            await self._execute(self.client.write_registers, address, ModbusCLP.encode_real(value))
+            return True
+        except Exception as e:
+            print(f"Erro ao escrever REAL em {address}: {e}")
+            raise
+
+    async def read_real(self, address):
+        """Lê um valor REAL (32-bit float) de 2 Holding Registers."""
+        try:
+            result = await self._execute(self.client.read_holding_registers, address, 2)
+            return ModbusCLP.decode_real(result.registers)
+        except Exception as e:
+            print(f"Erro ao ler REAL de {address}: {e}")
+            raise
+
+    async def read_coil_block(self, address, count):
+        """Lê um bloco contíguo de Coils (FC01). Retorna exatamente `count` bools."""
+        result = await self._execute(self.client.read_coils, address, count)
+        return result.bits[:count]
+
+    async def read_register_block(self, address, count):
+        """Lê um bloco contíguo de Holding Registers (FC03)."""
+        result = await self._execute(self.client.read_holding_registers, address, count)
+        return result.registers
+
+    async def read_array(self, address, count, data_type, word_order=modbus_codec.WORD_BIG, as_numpy=False):
+        """
+        Lê `count` valores consecutivos de um tipo do modbus_codec.
+        As requisições (máx. 125 registradores cada) são enviadas em pipeline.
+        """
+        try:
+            size = modbus_codec.register_count(data_type)
+            per_request = (MAX_REGISTERS_PER_READ // size) * size
+            total = count * size
+            chunks = await asyncio.gather(*(
+                self.read_register_block(address + offset, min(per_request, total - offset))
+                for offset in range(0, total, per_request)
+            ))
+            registers = [word for chunk in chunks for word in chunk]
+            return modbus_codec.decode_array(registers, data_type, word_order, as_numpy=as_numpy)
+        except Exception as e:
+            print(f"Erro ao ler {count}x {data_type} de {address}: {e}")
+            raise
+
+    async def read_real_array(self, address, count, word_order=modbus_codec.WORD_BIG, as_numpy=False):
+        """Lê `count` REALs (32-bit float) consecutivos a partir de `address`."""
+        return await self.read_array(address, count, modbus_codec.FLOAT32, word_order, as_numpy)
+
+    async def read_int_array(self, address, count, as_numpy=False):
+        """Lê `count` INTs (16-bit signed) consecutivos a partir de `address`."""
+        return await self.read_array(address, count, modbus_codec.INT16, as_numpy=as_numpy)
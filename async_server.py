@@ -0,0 +1,375 @@
+"""
+Modo de servidor assíncrono para muitos painéis conectados
+
+O servidor de desenvolvimento do Flask (threaded=True) usa uma thread do
+sistema por conexão. Cada navegador com /api/stream aberto prende uma thread
+para sempre, e uma parede da sala de controle com dezenas de tablets esgota
+o processo.
+
+Aqui um único event loop asyncio atende todas as conexões HTTP/1.1:
+  - /api/stream (SSE) é servido direto no loop: uma conexão ociosa custa
+    só um socket e uma coroutine, então milhares cabem em uma thread;
+  - todas as outras rotas e os arquivos estáticos são os mesmos do app
+    Flask, executados via WSGI em um ThreadPoolExecutor limitado (é lá que
+    ficam as chamadas bloqueantes ao CLP e ao SQLite). Respostas pequenas
+    com Content-Length saem de uma vez; as demais (ex.: /api/temperature/export)
+    são repassadas pedaço a pedaço, em chunked transfer-encoding quando não
+    têm Content-Length, sem juntar o corpo inteiro na memória.
+
+Sem dependências além da biblioteca padrão e do próprio Flask.
+
+Uso:
+    python web_app.py --async
+    python web_server.py --async
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, parse_qs
+from event_stream import LoopFanout
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 10 * 1024 * 1024
+MAX_BUFFERED_BYTES = 256 * 1024  # Respostas WSGI maiores (ou sem Content-Length) saem em streaming
+KEEPALIVE_TIMEOUT = 75
+
+REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 408: 'Request Timeout',
+    411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+
+class _Request:
+    def __init__(self, method, target, version, headers, body):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+        self.body = body
+        self.path, _, self.query = target.partition('?')
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+
+class AsyncWSGIServer:
+    """Servidor HTTP/1.1 em asyncio: SSE nativo no loop e demais rotas via WSGI em threads"""
+
+    def __init__(self, app, broker=None, host='0.0.0.0', port=5000, max_workers=16,
+                 stream_path='/api/stream', on_subscribe=None, on_unsubscribe=None):
+        """
+        Args:
+            app: Aplicação WSGI (o app Flask)
+            broker: EventBroker cujos eventos são servidos em stream_path (None = sem SSE nativo)
+            max_workers: Threads para as rotas WSGI (limita chamadas simultâneas ao CLP/SQLite)
+            stream_path: Rota SSE servida direto no loop
+            on_subscribe: Callback opcional on_subscribe(events, tags) ao abrir um stream
+                          (ex.: incluir as tags pedidas na varredura); roda no executor.
+                          ValueError recusa o stream com 400
+            on_unsubscribe: Callback opcional on_unsubscribe(retorno de on_subscribe) quando
+                            o stream termina; roda no executor
+        """
+        self.app = app
+        self.broker = broker
+        self.host = host
+        self.port = port
+        self.max_workers = max_workers
+        self.stream_path = stream_path
+        self.on_subscribe = on_subscribe
+        self.on_unsubscribe = on_unsubscribe
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wsgi')
+        self.fanout = None
+        self.connections = 0
+        self.requests = 0
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        if self.broker is not None:
+            self.fanout = LoopFanout(self.broker, loop)
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                            limit=MAX_HEADER_BYTES, backlog=1024)
+        print(f"[ASYNC] Servindo em http://{self.host}:{self.port} "
+              f"({self.max_workers} workers WSGI, SSE em {self.stream_path})")
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("\n[ASYNC] Servidor encerrado")
+        finally:
+            self.executor.shutdown(wait=False)
+
+    # ---------------------------------------------------------------- HTTP
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEPALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except _HTTPError as e:
+                    await self._send_simple(writer, e.status, e.message)
+                    break
+                if request is None:
+                    break
+
+                self.requests += 1
+                if self.fanout is not None and request.path == self.stream_path and request.method == 'GET':
+                    await self._serve_stream(request, reader, writer)
+                    break
+                if not await self._serve_wsgi(request, writer):
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None
+            raise
+        except asyncio.LimitOverrunError:
+            raise _HTTPError(400, 'Cabeçalho muito grande')
+
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ', 2)
+        except ValueError:
+            raise _HTTPError(400, 'Linha de requisição inválida')
+
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise _HTTPError(411, 'Envie o corpo com Content-Length')
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise _HTTPError(400, 'Content-Length inválido')
+        if length > MAX_BODY_BYTES:
+            raise _HTTPError(413, 'Corpo muito grande')
+        body = await reader.readexactly(length) if length else b''
+        return _Request(method, target, version, headers, body)
+
+    async def _send_simple(self, writer, status, message):
+        body = message.encode('utf-8')
+        writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                     f"Content-Type: text/plain; charset=utf-8\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode('latin-1') + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    # ---------------------------------------------------------------- WSGI
+
+    async def _serve_wsgi(self, request, writer):
+        """Executa a rota Flask em uma thread do executor; retorna se a conexão continua aberta"""
+        loop = asyncio.get_running_loop()
+        try:
+            keep_alive = await loop.run_in_executor(self.executor, self._respond_wsgi, request, writer, loop)
+            await writer.drain()
+        except ConnectionError:
+            return False
+        return keep_alive
+
+    def _respond_wsgi(self, request, writer, loop):
+        """
+        Roda na thread do executor: chama o app e itera o corpo na mesma thread (o
+        stream_with_context do Flask exige), entregando cada pedaço ao loop e esperando
+        o drain antes do próximo - um cliente lento segura o gerador, não a memória.
+        """
+        def send(data):
+            asyncio.run_coroutine_threadsafe(self._write(writer, data), loop).result()
+
+        status, headers, body = self._call_app(request)
+        keep_alive = request.keep_alive
+        length = None
+        head = [f"HTTP/1.1 {status}"]
+        for name, value in headers:
+            if name.lower() == 'content-length':
+                length = int(value)
+            elif name.lower() not in ('connection', 'transfer-encoding'):
+                head.append(f"{name}: {value}")
+        buffered = isinstance(body, bytes)
+        code = int(status.split()[0])
+        if request.method == 'HEAD' or code < 200 or code in (204, 304):
+            # Sem corpo por definição: nem bytes nem moldura chunked, senão o cliente lê o
+            # resto como o começo da próxima resposta na conexão keep-alive
+            if code >= 200 and code != 204 and (length is not None or buffered):
+                head.append(f"Content-Length: {len(body) if length is None else length}")
+            head.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+            loop.call_soon_threadsafe(writer.write, ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+            if hasattr(body, 'close'):
+                body.close()
+            return keep_alive
+        # Corpo de tamanho desconhecido: chunked no HTTP/1.1; no 1.0 termina fechando a conexão
+        chunked = not buffered and length is None and request.version == 'HTTP/1.1'
+        if buffered:
+            head.append(f"Content-Length: {len(body)}")
+        elif length is not None:
+            head.append(f"Content-Length: {length}")
+        elif chunked:
+            head.append("Transfer-Encoding: chunked")
+        else:
+            keep_alive = False
+        head.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        head = ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1')
+
+        if buffered:
+            # Sem esperar o drain aqui: um cliente lento não prende a thread (ver _serve_wsgi)
+            loop.call_soon_threadsafe(writer.write, head + body)
+            return keep_alive
+        try:
+            send(head)
+            try:
+                for chunk in body:
+                    if chunk:
+                        send(b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk)
+            except ConnectionError:
+                raise
+            except Exception as e:
+                # Cabeçalho já enviado: só resta interromper a resposta
+                print(f"[ASYNC] Erro no corpo de {request.path}: {e}")
+                return False
+            if chunked:
+                send(b'0\r\n\r\n')
+            return keep_alive
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+    @staticmethod
+    async def _write(writer, data):
+        writer.write(data)
+        await writer.drain()
+
+    def _call_app(self, request):
+        """
+        Chama o app WSGI. Corpos com Content-Length até MAX_BUFFERED_BYTES voltam já
+        juntos (bytes); os demais voltam como o iterável WSGI, repassado por _respond_wsgi.
+        """
+        host, _, port = request.headers.get('host', f'{self.host}:{self.port}').partition(':')
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote(request.path, encoding='latin-1'),
+            'QUERY_STRING': request.query,
+            'SERVER_NAME': host,
+            'SERVER_PORT': port or str(self.port),
+            'SERVER_PROTOCOL': request.version,
+            'CONTENT_TYPE': request.headers.get('content-type', ''),
+            'CONTENT_LENGTH': str(len(request.body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(request.body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in request.headers.items():
+            if name not in ('content-type', 'content-length'):
+                environ['HTTP_' + name.upper().replace('-', '_')] = value
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = headers
+
+        try:
+            result = self.app(environ, start_response)
+            length = next((value for name, value in response['headers'] if name.lower() == 'content-length'), None)
+            if length is None or int(length) > MAX_BUFFERED_BYTES:
+                return response['status'], response['headers'], result
+            try:
+                body = b''.join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        except Exception as e:
+            print(f"[ASYNC] Erro na rota {request.path}: {e}")
+            return '500 Internal Server Error', [('Content-Type', 'text/plain')], b'Erro interno'
+        return response['status'], response['headers'], body
+
+    # ---------------------------------------------------------------- SSE
+
+    async def _serve_stream(self, request, reader, writer):
+        query = parse_qs(request.query)
+        events = [e for value in query.get('events', []) for e in value.split(',') if e]
+        tags = [t for value in query.get('tags', []) for t in value.split(',') if t]
+        loop = asyncio.get_running_loop()
+        token = None
+        if self.on_subscribe:
+            try:
+                token = await loop.run_in_executor(self.executor, self.on_subscribe, events, tags)
+            except ValueError as e:
+                await self._send_simple(writer, 400, str(e))
+                return
+
+        # Sem Content-Length: o corpo do stream termina quando a conexão fecha
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\n"
+                     b"Access-Control-Allow-Origin: *\r\n\r\n")
+
+        subscription = self.fanout.subscribe(events or None, tags or None)
+        pump = asyncio.ensure_future(self._pump_stream(subscription, writer))
+        # O navegador não envia nada depois da requisição: EOF = cliente foi embora
+        closed = asyncio.ensure_future(reader.read())
+        try:
+            await asyncio.wait({pump, closed}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (pump, closed):
+                task.cancel()
+            await asyncio.gather(pump, closed, return_exceptions=True)
+            if self.on_unsubscribe:
+                await loop.run_in_executor(self.executor, self.on_unsubscribe, token)
+
+    async def _pump_stream(self, subscription, writer):
+        stream = self.fanout.stream(subscription)
+        try:
+            async for chunk in stream:
+                writer.write(chunk.encode('utf-8'))
+                await writer.drain()
+        finally:
+            await stream.aclose()
+
+    def stats(self):
+        return {
+            'connections': self.connections,
+            'requests': self.requests,
+            'stream_clients': self.fanout.clients if self.fanout else 0,
+            'wsgi_workers': self.max_workers,
+        }
+
+
+class _HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def run_async(app, broker=None, host='0.0.0.0', port=5000, max_workers=16, on_subscribe=None, on_unsubscribe=None):
+    """Atende `app` no modo assíncrono (bloqueia até Ctrl+C)"""
+    AsyncWSGIServer(app, broker, host, port, max_workers, on_subscribe=on_subscribe,
+                    on_unsubscribe=on_unsubscribe).run()
@@ -0,0 +1,126 @@
+"""
+Recalcula a coluna anomaly do histórico com os detectores configurados
+
+Depois de mudar ANOMALY_DETECTORS (ou os parâmetros de um detector), as
+amostras antigas continuam marcadas pela configuração anterior. Este script
+passa os detectores em lote (anomaly_detection, vetorizado com NumPy) sobre
+o período pedido, em ordem cronológica e em pedaços de CHUNK_SIZE amostras:
+o estado dos detectores continua de um pedaço para o outro, e antes do
+início do período eles são aquecidos com as amostras imediatamente
+anteriores.
+
+Só as amostras cuja marcação mudou são regravadas, cada pedaço em uma
+transação curta que também corrige a contagem de anomalias dos rollups.
+
+Rode com o coletor parado (como bulk_ingest.py): ele guarda as amostras
+recentes em memória (sample_ring) e os ETags das respostas só mudam com uma
+leitura nova ou quando o banco é reaberto (data_version), então marcações
+corrigidas com ele rodando não apareceriam na API até reiniciá-lo. Se a
+última amostra do banco tem menos de ACTIVE_SECONDS, o script entende que o
+coletor está gravando e recusa rodar (--force ignora a verificação).
+
+Uso:
+    python backfill_anomalies.py [temperature_data.db] [--since 2025-01-01] [--until 2025-02-01]
+                                 [--detectors '{"mad": {"threshold": 7}}'] [--force]
+"""
+import argparse
+import json
+import time
+from anomaly_detection import AnomalyEngine
+from history_encoding import epoch_ms
+from rollups import adjust_anomalies
+from sample_writer import open_database
+
+CHUNK_SIZE = 100000
+ACTIVE_SECONDS = 120  # Amostra mais nova que isso: coletor provavelmente rodando
+
+
+def check_collector_stopped(conn, active_seconds=ACTIVE_SECONDS):
+    """RuntimeError se a amostra mais recente do banco indica um coletor gravando"""
+    latest_ms = conn.execute('SELECT MAX(ts) FROM temperature_samples').fetchone()[0]
+    if latest_ms is None:
+        return
+    age = time.time() - latest_ms / 1000
+    if age < active_seconds:
+        raise RuntimeError(f"Última amostra gravada há {max(age, 0):.0f}s: o coletor parece estar rodando. "
+                           f"Pare o coletor antes de alterar o histórico (ou use --force)")
+
+
+def backfill(db_path, detectors=None, start_ms=None, end_ms=None, chunk_size=CHUNK_SIZE, force=False):
+    """
+    Recalcula anomaly para start_ms <= ts < end_ms (None = sem limite).
+    Com o coletor gravando levanta RuntimeError, a não ser com force=True.
+    Retorna {'scanned', 'set', 'cleared', 'seconds'}.
+    """
+    engine = AnomalyEngine(detectors)
+    conn = open_database(db_path)
+    conn.isolation_level = None  # Transações controladas aqui (BEGIN IMMEDIATE por pedaço)
+    started = time.monotonic()
+    result = {'scanned': 0, 'set': 0, 'cleared': 0}
+    try:
+        if not force:
+            check_collector_stopped(conn)
+        start_ms = -2 ** 63 if start_ms is None else start_ms
+        end_ms = 2 ** 63 - 1 if end_ms is None else end_ms
+
+        # Aquecimento: as amostras logo antes do período, sem regravar nada
+        warmup = conn.execute('''
+            SELECT id, ts, temperature FROM temperature_samples
+            WHERE ts < ? ORDER BY ts DESC, id DESC LIMIT ?
+        ''', (start_ms, engine.warmup)).fetchall()
+        warmup.reverse()
+        engine.warm(warmup)
+
+        # Paginação por (ts, id): cada pedaço continua exatamente de onde o anterior parou
+        cursor = (start_ms, -1)
+        while True:
+            rows = conn.execute('''
+                SELECT id, ts, temperature, anomaly FROM temperature_samples
+                WHERE (ts, id) > (?, ?) AND ts < ?
+                ORDER BY ts, id
+                LIMIT ?
+            ''', (*cursor, end_ms, chunk_size)).fetchall()
+            if not rows:
+                break
+            flags = engine.detect([row[1] for row in rows], [row[2] for row in rows])
+            changed = [(int(flag), row[0], row[1]) for row, flag in zip(rows, flags) if bool(row[3]) != flag]
+            if changed:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    conn.executemany('UPDATE temperature_samples SET anomaly = ? WHERE id = ?',
+                                     [(flag, row_id) for flag, row_id, _ in changed])
+                    adjust_anomalies(conn, [(ts, 1 if flag else -1) for flag, _, ts in changed])
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+            result['scanned'] += len(rows)
+            result['set'] += sum(1 for flag, _, _ in changed if flag)
+            result['cleared'] += sum(1 for flag, _, _ in changed if not flag)
+            cursor = (rows[-1][1], rows[-1][0])
+            print(f"[BACKFILL] {result['scanned']} amostras, {result['set']} marcadas, "
+                  f"{result['cleared']} desmarcadas")
+    finally:
+        conn.close()
+    result['seconds'] = round(time.monotonic() - started, 2)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalcula as anomalias do histórico de temperatura")
+    parser.add_argument('db_path', nargs='?', default='temperature_data.db')
+    parser.add_argument('--since', help="Início do período (horário local, ex.: '2025-01-01 00:00:00')")
+    parser.add_argument('--until', help='Fim do período (exclusivo)')
+    parser.add_argument('--detectors', help='JSON {nome: {parâmetro: valor}} (padrão: DEFAULT_DETECTORS)')
+    parser.add_argument('--chunk', type=int, default=CHUNK_SIZE, help='Amostras por pedaço')
+    parser.add_argument('--force', action='store_true',
+                        help='Roda mesmo se o banco recebeu amostras nos últimos segundos')
+    args = parser.parse_args()
+    result = backfill(args.db_path,
+                      detectors=json.loads(args.detectors) if args.detectors else None,
+                      start_ms=epoch_ms(args.since) if args.since else None,
+                      end_ms=epoch_ms(args.until) if args.until else None,
+                      chunk_size=args.chunk,
+                      force=args.force)
+    print(f"[BACKFILL] Concluído em {result['seconds']}s: {result['scanned']} amostras, "
+          f"{result['set']} marcadas, {result['cleared']} desmarcadas")
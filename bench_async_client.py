@@ -0,0 +1,99 @@
+"""
+Benchmark do cliente assíncrono com pipeline (AsyncModbusCLP)
+
+Uso:
+    python mock_server.py          (em outro terminal)
+    python bench_async_client.py [latencia_ms] [leituras]
+
+Sobe um proxy local que atrasa cada pacote em `latencia_ms` (simula VPN até
+uma planta remota) na frente do mock server e compara leituras REAL por
+segundo do ModbusCLP síncrono com o AsyncModbusCLP em várias janelas.
+"""
+import asyncio
+import sys
+import time
+from modbus_client import ModbusCLP
+from async_modbus_client import AsyncModbusCLP
+
+MOCK_IP = 'localhost'
+MOCK_PORT = 5020
+PROXY_PORT = 5021
+WINDOWS = (1, 4, 8, 16)
+
+
+async def _pipe(reader, writer, delay):
+    try:
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                break
+            # Atraso sem bloquear pacotes seguintes (latência, não banda)
+            asyncio.get_running_loop().call_later(delay, writer.write, data)
+    finally:
+        await asyncio.sleep(delay)
+        writer.close()
+
+
+async def _handle_proxy(client_reader, client_writer, delay):
+    server_reader, server_writer = await asyncio.open_connection(MOCK_IP, MOCK_PORT)
+    try:
+        await asyncio.gather(
+            _pipe(client_reader, server_writer, delay),
+            _pipe(server_reader, client_writer, delay),
+        )
+    except (asyncio.CancelledError, ConnectionError):
+        # Encerramento do benchmark com conexões ainda abertas
+        client_writer.close()
+        server_writer.close()
+
+
+def bench_sync(reads):
+    clp = ModbusCLP(ip=MOCK_IP, port=PROXY_PORT)
+    if not clp.connect():
+        raise Exception("Falha ao conectar ao proxy")
+    try:
+        start = time.perf_counter()
+        for i in range(reads):
+            clp.read_real(1 + (i % 40) * 2)
+        return reads / (time.perf_counter() - start)
+    finally:
+        clp.close()
+
+
+async def bench_async(reads, window):
+    clp = AsyncModbusCLP(ip=MOCK_IP, port=PROXY_PORT, max_in_flight=window)
+    if not await clp.connect():
+        raise Exception("Falha ao conectar ao proxy")
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(clp.read_real(1 + (i % 40) * 2) for i in range(reads)))
+        return reads / (time.perf_counter() - start)
+    finally:
+        clp.close()
+
+
+async def main():
+    latency_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    reads = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    delay = latency_ms / 2000  # metade do RTT em cada sentido
+
+    proxy = await asyncio.start_server(
+        lambda r, w: _handle_proxy(r, w, delay), 'localhost', PROXY_PORT)
+
+    print(f"RTT simulado: {latency_ms:.0f} ms | Leituras: {reads}")
+    print("-" * 60)
+    try:
+        sync_rate = await asyncio.to_thread(bench_sync, reads)
+        print(f"ModbusCLP (síncrono)          : {sync_rate:8.1f} leituras/s")
+        for window in WINDOWS:
+            rate = await bench_async(reads, window)
+            print(f"AsyncModbusCLP janela={window:<3}     : {rate:8.1f} leituras/s ({rate / sync_rate:.1f}x)")
+    except Exception as e:
+        print(f"FALHA: {e}")
+        print("Verifique se o mock_server.py está rodando.")
+    finally:
+        proxy.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""
+Microbenchmark do modbus_codec contra o BinaryPayloadBuilder/Decoder do pymodbus
+
+Uso:
+    python bench_codec.py
+
+Não precisa de CLP nem de mock server: mede apenas a conversão
+registradores <-> valores, que era feita a cada read_int/read_real/write_*.
+"""
+import timeit
+import modbus_codec
+
+try:
+    from pymodbus.payload import BinaryPayloadBuilder, BinaryPayloadDecoder
+    from pymodbus.constants import Endian
+    PAYLOAD_AVAILABLE = True
+except ImportError:
+    PAYLOAD_AVAILABLE = False
+
+REPEAT = 20000
+BLOCK_VALUES = 1000
+
+
+def payload_decode_real(registers):
+    decoder = BinaryPayloadDecoder.fromRegisters(registers, byteorder=Endian.BIG, wordorder=Endian.BIG)
+    return decoder.decode_32bit_float()
+
+
+def payload_encode_real(value):
+    builder = BinaryPayloadBuilder(byteorder=Endian.BIG, wordorder=Endian.BIG)
+    builder.add_32bit_float(value)
+    return builder.to_registers()
+
+
+def payload_decode_block(registers):
+    decoder = BinaryPayloadDecoder.fromRegisters(registers, byteorder=Endian.BIG, wordorder=Endian.BIG)
+    return [decoder.decode_32bit_float() for _ in range(len(registers) // 2)]
+
+
+def report(name, seconds, calls, unit='op'):
+    print(f"  {name:<38} {seconds / calls * 1e6:9.2f} µs/{unit}")
+
+
+def main():
+    registers = modbus_codec.encode(75.5, modbus_codec.FLOAT32)
+    block = modbus_codec.encode_array([i * 0.25 for i in range(BLOCK_VALUES)], modbus_codec.FLOAT32)
+    block_calls = REPEAT // 100
+
+    print(f"Decodificação de 1 REAL ({REPEAT} repetições)")
+    if PAYLOAD_AVAILABLE:
+        report("BinaryPayloadDecoder", timeit.timeit(lambda: payload_decode_real(registers), number=REPEAT), REPEAT)
+    report("modbus_codec.decode", timeit.timeit(
+        lambda: modbus_codec.decode(registers, modbus_codec.FLOAT32), number=REPEAT), REPEAT)
+
+    print(f"\nCodificação de 1 REAL ({REPEAT} repetições)")
+    if PAYLOAD_AVAILABLE:
+        report("BinaryPayloadBuilder", timeit.timeit(lambda: payload_encode_real(75.5), number=REPEAT), REPEAT)
+    report("modbus_codec.encode", timeit.timeit(
+        lambda: modbus_codec.encode(75.5, modbus_codec.FLOAT32), number=REPEAT), REPEAT)
+
+    print(f"\nDecodificação de bloco com {BLOCK_VALUES} REALs ({block_calls} repetições)")
+    if PAYLOAD_AVAILABLE:
+        report("BinaryPayloadDecoder (loop)", timeit.timeit(
+            lambda: payload_decode_block(block), number=block_calls), block_calls, 'bloco')
+    report("modbus_codec.decode_array", timeit.timeit(
+        lambda: modbus_codec.decode_array(block, modbus_codec.FLOAT32), number=block_calls), block_calls, 'bloco')
+    report("modbus_codec.decode_array (swapped)", timeit.timeit(
+        lambda: modbus_codec.decode_array(block, modbus_codec.FLOAT32, modbus_codec.WORD_SWAPPED),
+        number=block_calls), block_calls, 'bloco')
+    if modbus_codec.NUMPY_AVAILABLE:
+        report("modbus_codec.decode_array (numpy)", timeit.timeit(
+            lambda: modbus_codec.decode_array(block, modbus_codec.FLOAT32, as_numpy=True),
+            number=block_calls), block_calls, 'bloco')
+
+    if not PAYLOAD_AVAILABLE:
+        print("\n(pymodbus.payload não disponível nesta versão - comparação omitida)")
+
+
+if __name__ == "__main__":
+    main()
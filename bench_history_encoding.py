@@ -0,0 +1,84 @@
+"""
+Benchmark das codificações do histórico de temperatura
+
+Para N leituras sintéticas mede, em cada formato de history_encoding.py:
+  - tempo de serialização (mediana de várias repetições);
+  - tamanho do corpo sem compressão, com gzip e com brotli (se instalado);
+  - pico de memória alocada durante a serialização (tracemalloc).
+
+A linha 'dicts' é o caminho antigo: montar um dict por leitura e passar
+a lista inteira para o json.
+
+Uso:
+    python bench_history_encoding.py [pontos separados por vírgula]
+    python bench_history_encoding.py 100,1000,10000
+"""
+import gzip
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from history_encoding import FORMAT_ROWS, FORMAT_COLUMNS, FORMAT_BINARY, encode_history, local_timestamp
+from response_cache import BROTLI_AVAILABLE, compress
+
+LEVELS = (100, 1000, 10000)
+REPEAT = 20
+
+
+def make_rows(count):
+    start = int(datetime(2025, 1, 1, 8, 0, 0).timestamp() * 1000)
+    temperature = 25.0
+    rows = []
+    for i in range(count):
+        previous = temperature
+        temperature += random.gauss(0, 0.3)
+        rows.append((i + 1, start + 5000 * i, round(temperature, 1), random.random() < 0.01,
+                     round((temperature - previous) / 5 * 60, 2)))
+    return rows
+
+
+def encode_dicts(rows):
+    data = [{'id': r[0], 'timestamp': local_timestamp(r[1]), 'temperature': r[2], 'anomaly': bool(r[3]),
+             'rate_of_change': r[4]} for r in rows]
+    return json.dumps({'data': data, 'count': len(data), 'cursor': rows[-1][0]}).encode('utf-8')
+
+
+def measure(encode):
+    times = []
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        body = encode()
+        times.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    encode()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return body, statistics.median(times) * 1000, peak / 1024
+
+
+def main():
+    levels = [int(n) for n in sys.argv[1].split(',')] if len(sys.argv) > 1 else LEVELS
+    encoders = {
+        'dicts': encode_dicts,
+        FORMAT_ROWS: lambda rows: encode_history(rows, FORMAT_ROWS, rows[-1][0]),
+        FORMAT_COLUMNS: lambda rows: encode_history(rows, FORMAT_COLUMNS, rows[-1][0]),
+        FORMAT_BINARY: lambda rows: encode_history(rows, FORMAT_BINARY, rows[-1][0]),
+    }
+
+    print(f"{'pontos':>7} {'formato':<9}{'serializar':>11}{'pico mem':>10}{'bytes':>9}{'gzip':>8}"
+          f"{'brotli':>8}")
+    for count in levels:
+        rows = make_rows(count)
+        for name, encoder in encoders.items():
+            body, ms, peak_kb = measure(lambda: encoder(rows))
+            gzipped = len(gzip.compress(body, compresslevel=6))
+            brotli_size = f"{len(compress(body, 'br')):>8}" if BROTLI_AVAILABLE else f"{'-':>8}"
+            print(f"{count:>7} {name:<9}{ms:>9.2f}ms{peak_kb:>8.0f}KB{len(body):>9}{gzipped:>8}{brotli_size}")
+
+
+if __name__ == "__main__":
+    main()
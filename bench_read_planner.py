@@ -0,0 +1,101 @@
+"""
+Benchmark do planejador de leituras em bloco contra o mock_server.py
+
+Uso:
+    python mock_server.py          (em outro terminal)
+    python bench_read_planner.py [quantidade_de_tags]
+
+Compara a leitura tag a tag (como era o /api/read_all) com o ReadPlanner,
+contando round trips Modbus e tempo por varredura.
+"""
+import sys
+import time
+from modbus_client import ModbusCLP
+from modbus_planner import ReadPlanner
+
+TARGET_IP = 'localhost'
+TARGET_PORT = 5020
+SCANS = 20
+
+
+def build_tags(count):
+    """Gera tags espalhadas pelos 100 coils / 100 HR do mock server"""
+    tags = []
+    hr_address = 0
+    for i in range(count):
+        kind = ('bool', 'int', 'real')[i % 3]
+        if kind == 'bool':
+            tags.append({'name': f'B{i}', 'type': 'bool', 'address': i % 100})
+        else:
+            size = 2 if kind == 'real' else 1
+            if hr_address + size > 100:
+                hr_address = 0
+            tags.append({'name': f'{kind[0].upper()}{i}', 'type': kind, 'address': hr_address})
+            # Deixa um registrador livre a cada 4 tags, como num mapa real
+            hr_address += size + (1 if i % 4 == 0 else 0)
+    return tags
+
+
+class RoundTripCounter:
+    """Conta as requisições enviadas pelo ModbusTcpClient"""
+
+    def __init__(self, client):
+        self.count = 0
+        self._execute = client.execute
+        client.execute = self._counted
+
+    def _counted(self, request=None):
+        self.count += 1
+        return self._execute(request)
+
+
+def read_one_by_one(clp, tags):
+    readers = {'bool': clp.read_bool, 'int': clp.read_int, 'real': clp.read_real}
+    return {tag['name']: readers[tag['type']](tag['address']) for tag in tags}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    tags = build_tags(count)
+
+    clp = ModbusCLP(ip=TARGET_IP, port=TARGET_PORT)
+    if not clp.connect():
+        print("FALHA: Não foi possível conectar ao Mock Server.")
+        print("Verifique se o mock_server.py está rodando.")
+        return
+
+    counter = RoundTripCounter(clp.client)
+    planner = ReadPlanner(clp)
+
+    print(f"Tags: {count} | Varreduras: {SCANS}")
+    print("-" * 60)
+
+    try:
+        counter.count = 0
+        start = time.perf_counter()
+        for _ in range(SCANS):
+            expected = read_one_by_one(clp, tags)
+        naive_time = (time.perf_counter() - start) / SCANS
+        naive_trips = counter.count / SCANS
+
+        counter.count = 0
+        start = time.perf_counter()
+        for _ in range(SCANS):
+            values, errors = planner.read(tags)
+        planned_time = (time.perf_counter() - start) / SCANS
+        planned_trips = counter.count / SCANS
+
+        if errors or values != expected:
+            print(f"⚠️ Divergência entre os métodos! Erros: {errors}")
+
+        print(f"Tag a tag : {naive_trips:6.1f} round trips/varredura | {naive_time * 1000:8.2f} ms")
+        print(f"Planejado : {planned_trips:6.1f} round trips/varredura | {planned_time * 1000:8.2f} ms")
+        print(f"Blocos    : {planner.plan(tags)}")
+        print("-" * 60)
+        print(f"Redução de round trips: {naive_trips / max(planned_trips, 1):.1f}x")
+    finally:
+        clp.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark de gravação de amostras no SQLite
+
+Compara, para 1, 10 e 100 tags por ciclo de varredura:
+  - por amostra: o caminho antigo (conectar, INSERT, commit, fechar a cada amostra);
+  - writer NORMAL / FULL: TemperatureCollector com o SampleWriter (WAL,
+    commits em grupo) e PRAGMA synchronous NORMAL ou FULL.
+
+Cada cenário grava o mesmo número de linhas o mais rápido possível; o tempo
+inclui o stop() do coletor, ou seja, até a última amostra estar no disco.
+O banco fica em um diretório temporário ao lado do script (mesmo disco do
+banco real, não um tmpfs).
+
+Uso:
+    python bench_sample_writer.py [linhas por cenário]
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from temperature_monitor import TemperatureCollector
+
+TAGS = (1, 10, 100)
+ROWS = 20000
+LEGACY_MAX_SECONDS = 5
+
+
+def legacy_save(db_path, temperature):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO temperature_readings (timestamp, temperature, anomaly, rate_of_change)
+        VALUES (?, ?, ?, ?)
+    ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), temperature, False, 0.0))
+    conn.commit()
+    conn.close()
+
+
+def run_legacy(db_path, tags, rows):
+    # Tabela v1 e journal padrão: o caminho antigo nunca ligava o WAL
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE temperature_readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            temperature REAL NOT NULL,
+            anomaly BOOLEAN DEFAULT 0,
+            rate_of_change REAL
+        )
+    ''')
+    conn.close()
+
+    written = 0
+    start = time.perf_counter()
+    # Limitado no tempo: a 1 commit por amostra, ROWS linhas demorariam demais
+    while written < rows and time.perf_counter() - start < LEGACY_MAX_SECONDS:
+        for i in range(tags):
+            legacy_save(db_path, 20.0 + i)
+        written += tags
+    return written, time.perf_counter() - start
+
+
+def run_writer(db_path, tags, rows, synchronous):
+    collector = TemperatureCollector(db_path=db_path, synchronous=synchronous)
+    collector.open()
+    start = time.perf_counter()
+    written = 0
+    while written < rows:
+        for i in range(tags):
+            collector._save_reading(20.0 + i, False, 0.0)
+        written += tags
+    collector.stop()  # Espera o último commit
+    elapsed = time.perf_counter() - start
+    stats = collector._writer.stats()
+    assert stats['written'] == written and stats['dropped'] == 0, stats
+    return written, elapsed, stats['rows_per_commit']
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    workdir = tempfile.mkdtemp(prefix='bench_writer_', dir=os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    try:
+        for tags in TAGS:
+            db = os.path.join(workdir, f'legacy_{tags}.db')
+            written, elapsed = run_legacy(db, tags, rows)
+            results.append((tags, 'por amostra', written / elapsed, written / elapsed / tags, 1.0))
+            for synchronous in ('NORMAL', 'FULL'):
+                db = os.path.join(workdir, f'writer_{tags}_{synchronous}.db')
+                written, elapsed, per_commit = run_writer(db, tags, rows, synchronous)
+                results.append((tags, f'writer {synchronous}', written / elapsed, written / elapsed / tags,
+                                per_commit))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    print(f"{'tags':>5} {'modo':<14}{'inserts/s':>12}{'ciclos/s':>11}{'linhas/commit':>15}")
+    for tags, mode, rate, cycles, per_commit in results:
+        print(f"{tags:>5} {mode:<14}{rate:>12.0f}{cycles:>11.1f}{per_commit:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
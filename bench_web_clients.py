@@ -0,0 +1,208 @@
+"""
+Teste de carga: painéis simultâneos com /api/stream aberto
+
+Compara o servidor threaded do Flask com o modo assíncrono (async_server.py)
+segurando N conexões SSE ociosas, como uma sala de controle com dezenas de
+tablets. Para cada N mede:
+  - quantos streams foram estabelecidos (snapshot recebido) em até 20 s;
+  - latência de entrega de um evento publicado até todos os clientes;
+  - latência de uma rota comum (GET /api/variables) com os streams abertos;
+  - threads e memória (RSS) do processo servidor.
+
+Não precisa de CLP: o servidor é o app de create_app sem os serviços em
+background, com uma thread publicando um evento de tag a cada 0,5 s.
+
+Uso:
+    python bench_web_clients.py [clientes separados por vírgula]
+    python bench_web_clients.py 100,1000,3000
+"""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+PORT = 5055
+LEVELS = (100, 500, 1000, 2000)
+MODES = ('threaded', 'async')
+CONNECT_TIMEOUT = 20
+CONNECT_CONCURRENCY = 200
+EVENTS_TO_MEASURE = 4
+
+
+# ==================== Servidor (subprocesso) ====================
+
+def serve(mode, port):
+    from app_factory import create_app
+    app = create_app({'COLLECT_TEMPERATURE': False})
+    broker = app.extensions['plc_services'].event_broker
+
+    def publish():
+        value = 0
+        while True:
+            time.sleep(0.5)
+            value += 1
+            broker.publish('tags', {
+                'PC_Temp': {'value': value, 'timestamp': time.time(), 'quality': 'good', 'error': None, 'age_ms': 0.0}
+            })
+
+    threading.Thread(target=publish, daemon=True).start()
+    if mode == 'async':
+        from async_server import AsyncWSGIServer
+        AsyncWSGIServer(app, broker, host='127.0.0.1', port=port).run()
+    else:
+        import logging
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        app.run(host='127.0.0.1', port=port, threaded=True)
+
+
+# ==================== Clientes ====================
+
+class StreamClient:
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.latencies = []
+
+    async def connect(self, port):
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', port)
+        self.writer.write(f"GET /api/stream?tags=PC_Temp HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+                          f"Accept: text/event-stream\r\n\r\n".encode())
+        await self.writer.drain()
+        while True:
+            event, _ = await self._next_event()
+            if event == 'snapshot':
+                return
+
+    async def _next_event(self):
+        event = None
+        data = None
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise ConnectionError("Stream fechado")
+            line = line.decode().rstrip('\r\n')
+            if line.startswith('event:'):
+                event = line[6:].strip()
+            elif line.startswith('data:'):
+                data = line[5:].strip()
+            elif line == '' and event:
+                return event, data
+
+    async def measure(self, count):
+        while len(self.latencies) < count:
+            event, data = await self._next_event()
+            if event == 'tags':
+                sent = json.loads(data)['PC_Temp']['timestamp']
+                self.latencies.append(time.time() - sent)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+async def http_get(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    await reader.read()
+    writer.close()
+
+
+def process_stats(pid):
+    stats = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('Threads', 'VmRSS'):
+                stats[key] = int(value.split()[0])
+    return stats.get('Threads', 0), stats.get('VmRSS', 0) / 1024
+
+
+async def run_level(port, clients_count, server_pid):
+    clients = [StreamClient() for _ in range(clients_count)]
+    gate = asyncio.Semaphore(CONNECT_CONCURRENCY)
+
+    async def connect(client):
+        async with gate:
+            await client.connect(port)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(asyncio.wait_for(connect(c), CONNECT_TIMEOUT) for c in clients), return_exceptions=True)
+    connect_time = time.perf_counter() - start
+    connected = [c for c, r in zip(clients, results) if not isinstance(r, BaseException)]
+
+    delivered = await asyncio.gather(
+        *(asyncio.wait_for(c.measure(EVENTS_TO_MEASURE), 10) for c in connected), return_exceptions=True)
+    latencies = sorted(l for c in connected for l in c.latencies)
+    complete = sum(1 for r in delivered if not isinstance(r, BaseException))
+
+    request_times = []
+    for _ in range(20):
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(http_get(port, '/api/variables'), 10)
+            request_times.append(time.perf_counter() - t0)
+        except (asyncio.TimeoutError, OSError):
+            pass
+
+    threads, rss = process_stats(server_pid)
+    for client in clients:
+        client.close()
+
+    def pct(values, q):
+        return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else float('nan')
+
+    return {
+        'connected': len(connected),
+        'connect_s': connect_time,
+        'complete': complete,
+        'event_p50': pct(latencies, 0.5),
+        'event_p99': pct(latencies, 0.99),
+        'get_p50': statistics.median(request_times) * 1000 if request_times else float('nan'),
+        'threads': threads,
+        'rss': rss,
+    }
+
+
+def start_server(mode):
+    process = subprocess.Popen([sys.executable, __file__, '--serve', mode, str(PORT)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            asyncio.run(http_get(PORT, '/api/variables'))
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"Servidor {mode} não subiu")
+
+
+def main():
+    levels = [int(n) for n in sys.argv[1].split(',')] if len(sys.argv) > 1 else LEVELS
+
+    print(f"{'modo':<9}{'clientes':>9}{'conectados':>11}{'conexão':>9}{'eventos ok':>11}"
+          f"{'evt p50':>9}{'evt p99':>9}{'GET p50':>9}{'threads':>8}{'RSS MB':>8}")
+    for mode in MODES:
+        for count in levels:
+            process = start_server(mode)
+            try:
+                r = asyncio.run(run_level(PORT, count, process.pid))
+            finally:
+                process.kill()
+                process.wait()
+            print(f"{mode:<9}{count:>9}{r['connected']:>11}{r['connect_s']:>8.1f}s{r['complete']:>11}"
+                  f"{r['event_p50']:>7.1f}ms{r['event_p99']:>7.1f}ms{r['get_p50']:>7.1f}ms"
+                  f"{r['threads']:>8}{r['rss']:>8.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        serve(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
@@ -0,0 +1,246 @@
+"""
+Carga em massa de CSVs de loggers antigos no banco de temperatura
+
+Gravar anos de histórico amostra por amostra (um commit por linha) levaria
+dias. Aqui os arquivos são lidos em streaming, em lotes de CHUNK_SIZE
+linhas, e gravados com executemany em transações grandes (COMMIT_ROWS
+linhas), com synchronous=OFF. O índice idx_samples_ts é removido durante a
+carga e recriado no fim (criar o índice de uma vez sobre os dados é bem
+mais rápido que mantê-lo linha a linha), e os rollups são recalculados
+também no fim. Se a carga falhar no meio, o que já foi gravado fica, e
+índice e rollups são refeitos do mesmo jeito.
+
+Rode com o coletor parado: os ids das linhas carregadas continuam depois
+do maior id do banco, os mesmos que um coletor rodando atribuiria às
+próximas leituras (ele guarda o próximo id desde que abriu o banco). Como no
+backfill_anomalies.py, a carga recusa rodar se a última amostra do banco tem
+menos de backfill_anomalies.ACTIVE_SECONDS (--force ignora a verificação).
+
+Formato dos arquivos (detectado pela primeira linha):
+    - separador ',' ';' ou tab; com ';' ou tab, vírgula decimal é aceita;
+    - cabeçalho com uma coluna de horário (ts, timestamp, datetime, data_hora,
+      data, time, hora) e uma de temperatura (temperature, temperatura, temp,
+      valor, value); anomaly e rate_of_change são opcionais. Sem cabeçalho:
+      horário na 1ª coluna e temperatura na 2ª;
+    - horário em epoch (s ou ms), ISO 'YYYY-MM-DD HH:MM:SS[.fff]' ou
+      'DD/MM/YYYY HH:MM[:SS]', no horário local.
+Os CSVs de history_export.py são aceitos como estão.
+
+Sem coluna anomaly, as amostras passam pelos detectores de anomaly_detection
+em lote; sem rate_of_change, a taxa é calculada entre linhas seguidas.
+
+Uso:
+    python bulk_ingest.py logger_2019.csv logger_2020.csv [--db temperature_data.db] [--no-detect] [--force]
+
+Os mesmos arquivos (ou um banco .db) podem ser tocados nos registradores do
+mock para testar coletor e detectores com dados reais, acelerados:
+    python mock_server.py --replay logger_2019.csv --speed 60 [--hr 40001] [--loop]
+"""
+import argparse
+import csv
+import itertools
+import time
+from datetime import datetime
+from anomaly_detection import AnomalyEngine
+from backfill_anomalies import check_collector_stopped
+from rollups import rebuild_rollups
+from sample_writer import open_database
+from temperature_monitor import create_schema, legacy_table_exists
+
+CHUNK_SIZE = 50000
+COMMIT_ROWS = 1000000
+
+TS_COLUMNS = ('ts', 'timestamp', 'datetime', 'data_hora', 'datahora', 'data', 'time', 'hora')
+TEMP_COLUMNS = ('temperature', 'temperatura', 'temp', 'valor', 'value')
+DATE_FORMATS = ('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S.%f', '%d/%m/%Y %H:%M', '%Y/%m/%d %H:%M:%S')
+
+
+class TimestampParser:
+    """Texto -> epoch-ms; descobre o formato na primeira linha e o reaproveita"""
+
+    def __init__(self):
+        self._parse = None
+
+    def __call__(self, text):
+        text = text.strip()
+        if self._parse is not None:
+            try:
+                return self._parse(text)
+            except ValueError:
+                pass  # Arquivo com formatos misturados: tenta todos de novo
+        for parse in (self._epoch, self._iso, *(self._strptime(fmt) for fmt in DATE_FORMATS)):
+            try:
+                value = parse(text)
+            except ValueError:
+                continue
+            self._parse = parse
+            return value
+        raise ValueError(f"Horário não reconhecido: {text!r}")
+
+    @staticmethod
+    def _epoch(text):
+        value = float(text)
+        # 13 dígitos: já em ms; 10 dígitos: segundos
+        return int(value) if value > 1e11 else int(round(value * 1000))
+
+    @staticmethod
+    def _iso(text):
+        return int(round(datetime.fromisoformat(text).timestamp() * 1000))
+
+    @staticmethod
+    def _strptime(fmt):
+        return lambda text: int(round(datetime.strptime(text, fmt).timestamp() * 1000))
+
+
+def _column(header, names):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+
+def read_series(path, chunk_size=CHUNK_SIZE, stats=None):
+    """
+    Lê um CSV em lotes de até chunk_size tuplas (ts epoch-ms, temperature, anomaly, rate_of_change),
+    anomaly/rate_of_change None quando o arquivo não traz a coluna. Linhas inválidas são
+    puladas e contadas em stats['skipped'].
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault('skipped', 0)
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            delimiter = csv.Sniffer().sniff(sample, delimiters=',;\t').delimiter
+        except csv.Error:
+            delimiter = ','
+        decimal_comma = delimiter != ','
+        reader = csv.reader(f, delimiter=delimiter)
+
+        first = next(reader, None)
+        if first is None:
+            return
+        header = [name.strip().lower() for name in first]
+        ts_col, temp_col = _column(header, TS_COLUMNS), _column(header, TEMP_COLUMNS)
+        if ts_col is None or temp_col is None:
+            # Sem cabeçalho: horário, temperatura
+            ts_col, temp_col, anomaly_col, rate_col = 0, 1, None, None
+            pending = [first]
+        else:
+            anomaly_col, rate_col = _column(header, ('anomaly', 'anomalia')), _column(header, ('rate_of_change',))
+            pending = []
+
+        parse_ts = TimestampParser()
+
+        def number(text):
+            return float(text.replace(',', '.') if decimal_comma else text)
+
+        def parse(row):
+            rate = row[rate_col].strip() if rate_col is not None else ''
+            anomaly = row[anomaly_col].strip().lower() if anomaly_col is not None else ''
+            return (parse_ts(row[ts_col]), number(row[temp_col]),
+                    anomaly in ('1', 'true', 'sim') if anomaly else None,
+                    number(rate) if rate else None)
+
+        chunk = []
+        for row in itertools.chain(pending, reader):
+            if not row or not any(field.strip() for field in row):
+                continue
+            try:
+                chunk.append(parse(row))
+            except (ValueError, IndexError):
+                stats['skipped'] += 1
+                continue
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def ingest(db_path, paths, detectors=None, detect=True, chunk_size=CHUNK_SIZE, commit_rows=COMMIT_ROWS,
+           force=False):
+    """
+    Carrega os arquivos no banco. Retorna {'rows', 'skipped', 'seconds'}.
+
+    Args:
+        detectors: Configuração dos detectores (None = padrão), usada sem coluna anomaly
+        detect: False grava anomaly = 0 quando o arquivo não traz a coluna
+        force: Carrega mesmo se o banco parece ter um coletor gravando (RuntimeError sem isso)
+    """
+    conn = open_database(db_path, 'OFF')
+    conn.isolation_level = None  # Transações controladas aqui
+    conn.execute('PRAGMA cache_size = -262144')  # 256 MB de cache durante a carga
+    started = time.monotonic()
+    result = {'rows': 0, 'skipped': 0}
+    try:
+        create_schema(conn)
+        if legacy_table_exists(conn):
+            raise ValueError("Banco v1 ainda não migrado: rode migrate_db.py antes da carga")
+        if not force:
+            check_collector_stopped(conn)
+        next_id = conn.execute('SELECT MAX(id) FROM temperature_samples').fetchone()[0] or 0
+
+        # Índice recriado no fim (finally), de uma vez
+        conn.execute('DROP INDEX IF EXISTS idx_samples_ts')
+        pending = 0
+        for path in paths:
+            engine = AnomalyEngine(detectors) if detect else None
+            last = None  # (ts, temperatura) da linha anterior, para a taxa
+            for chunk in read_series(path, chunk_size, result):
+                ts = [row[0] for row in chunk]
+                temps = [row[1] for row in chunk]
+                flags = (engine.detect(ts, temps) if engine and chunk[0][2] is None
+                         else [bool(row[2]) for row in chunk])
+
+                rows = []
+                for (sample_ts, temperature, _, rate), flag in zip(chunk, flags):
+                    if rate is None:
+                        rate = 0.0
+                        if last is not None and sample_ts > last[0]:
+                            rate = (temperature - last[1]) * 1000 / (sample_ts - last[0])
+                    last = (sample_ts, temperature)
+                    next_id += 1
+                    rows.append((next_id, sample_ts, temperature, int(flag), rate))
+
+                if not conn.in_transaction:
+                    conn.execute('BEGIN')
+                conn.executemany('''
+                    INSERT INTO temperature_samples (id, ts, temperature, anomaly, rate_of_change)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', rows)
+                pending += len(rows)
+                result['rows'] += len(rows)
+                if pending >= commit_rows:
+                    conn.execute('COMMIT')
+                    pending = 0
+                    print(f"[INGEST] {result['rows']} linhas ({path})")
+        if conn.in_transaction:
+            conn.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        print("[INGEST] Recriando índice e agregados...")
+        create_schema(conn)
+        conn.execute('BEGIN')
+        rebuild_rollups(conn)
+        conn.close()
+    result['seconds'] = round(time.monotonic() - started, 2)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carrega CSVs de loggers no banco de temperatura")
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--db', default='temperature_data.db')
+    parser.add_argument('--no-detect', action='store_true',
+                        help='Não rodar os detectores de anomalia (anomaly = 0 sem a coluna no arquivo)')
+    parser.add_argument('--force', action='store_true',
+                        help='Carrega mesmo se o banco recebeu amostras nos últimos segundos')
+    args = parser.parse_args()
+    result = ingest(args.db, args.files, detect=not args.no_detect, force=args.force)
+    rate = result['rows'] / result['seconds'] if result['seconds'] else 0
+    print(f"[INGEST] Concluído: {result['rows']} linhas em {result['seconds']}s ({rate:,.0f} linhas/s), "
+          f"{result['skipped']} linhas inválidas puladas")
@@ -0,0 +1,171 @@
+"""
+Circuit breaker e timeouts adaptativos por CLP
+
+Quando um CLP sai da rede, cada chamada ficaria presa no timeout Modbus
+(segurando threads e locks do servidor web). O CircuitBreaker conta as
+falhas recentes e, ao passar do limite, "abre": as chamadas seguintes
+falham na hora, sem tocar na rede. Depois de `reset_timeout` segundos
+uma única chamada de teste é liberada (half-open); se der certo o
+circuito fecha, se falhar volta a abrir.
+
+O RttTracker guarda os tempos de resposta recentes e deriva o timeout de
+um percentil alto (ex.: p99 x 3), em vez dos 3 s fixos do pymodbus: um
+CLP que responde em 5 ms não precisa de 3 s para ser declarado perdido.
+Como o timeout só aprende com chamadas bem-sucedidas, uma falha descarta
+as amostras: as chamadas seguintes (e a de teste do half-open) voltam a
+usar o teto até o novo tempo de resposta ser medido. Sem isso, um CLP que
+ficou mais lento (rede, carga) estouraria sempre o timeout aprendido e
+nunca mais seria medido.
+"""
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Máquina de estados closed -> open -> half_open -> closed"""
+
+    def __init__(self, failure_threshold=3, reset_timeout=10.0, clock=time.monotonic):
+        """
+        Args:
+            failure_threshold: Falhas consecutivas que abrem o circuito
+            reset_timeout: Segundos em aberto antes de liberar uma chamada de teste
+            clock: Fonte de tempo (substituível em testes)
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_progress = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_in_progress = False
+        return self._state
+
+    def allow_request(self):
+        """True se a chamada pode ir para a rede; False para falhar rápido"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_after(self):
+        """Segundos até a próxima chamada de teste (0 se o circuito não está aberto)"""
+        with self._lock:
+            if self._current_state() != OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != OPEN:
+                    self.times_opened += 1
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self._trial_in_progress = False
+
+    def release_trial(self):
+        """Libera a chamada de teste sem resultado conclusivo (ex.: erro do próprio chamador)"""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._failures,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+            }
+
+
+class RttTracker:
+    """Timeout derivado dos tempos de resposta recentes"""
+
+    def __init__(self, window=200, percentile=0.99, multiplier=3.0,
+                 min_timeout=0.2, max_timeout=3.0, min_samples=20):
+        """
+        Args:
+            window: Quantidade de amostras mantidas
+            percentile: Percentil usado como base (0-1)
+            multiplier: Folga aplicada sobre o percentil
+            min_timeout: Piso do timeout (s)
+            max_timeout: Teto do timeout (s), também usado até haver amostras suficientes
+            min_samples: Amostras necessárias antes de adaptar
+        """
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, rtt):
+        with self._lock:
+            self._samples.append(rtt)
+
+    def record_failure(self):
+        """Falha de comunicação: esquece os tempos medidos e volta ao teto até reaprender"""
+        with self._lock:
+            self._samples.clear()
+
+    def quantile(self, q):
+        """Percentil q (0-1) das amostras, ou None sem amostras"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(q * (len(samples) - 1))))
+        return samples[index]
+
+    def timeout(self):
+        """Timeout recomendado para a próxima transação"""
+        with self._lock:
+            enough = len(self._samples) >= self.min_samples
+        if not enough:
+            return self.max_timeout
+        value = self.quantile(self.percentile) * self.multiplier
+        return min(self.max_timeout, max(self.min_timeout, value))
+
+    def stats(self):
+        with self._lock:
+            count = len(self._samples)
+        p50 = self.quantile(0.5)
+        p99 = self.quantile(0.99)
+        return {
+            'samples': count,
+            'p50_ms': round(p50 * 1000, 2) if p50 is not None else None,
+            'p99_ms': round(p99 * 1000, 2) if p99 is not None else None,
+            'timeout_ms': round(self.timeout() * 1000, 1),
+        }
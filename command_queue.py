@@ -0,0 +1,222 @@
+"""
+Fila de comandos por CLP com prioridades
+
+Todas as operações de um CLP passam por uma fila com uma única thread de
+I/O dedicada, em vez de disputar um lock global. A thread sempre executa a
+operação pendente de maior prioridade:
+
+    PRIORITY_COMMAND      - comandos e escritas de segurança (ex.: Stop)
+    PRIORITY_INTERACTIVE  - leituras pedidas por um operador
+    PRIORITY_BACKGROUND   - varreduras periódicas, coleta, verificação de status
+
+Um Stop nunca espera atrás de uma rajada de leituras: no máximo espera a
+operação que já está em andamento. Operações com prazo (deadline) que não
+começaram a tempo são descartadas com DeadlineExceededError em vez de
+rodar atrasadas - uma leitura velha não serve para ninguém.
+
+Uso:
+    queue = get_command_queue('192.168.0.200')
+    value = queue.call(lambda clp: clp.read_real(1), PRIORITY_INTERACTIVE, deadline=2.0)
+"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from connection_pool import get_pool, PLCUnavailableError, is_communication_failure
+
+PRIORITY_COMMAND = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BACKGROUND = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_COMMAND: 'command',
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_BACKGROUND: 'background',
+}
+
+
+class DeadlineExceededError(PLCUnavailableError):
+    """A operação não começou dentro do prazo e foi descartada"""
+
+
+class _Job:
+    __slots__ = ('operation', 'priority', 'deadline', 'timeout', 'submitted', 'future')
+
+    def __init__(self, operation, priority, deadline, timeout):
+        self.operation = operation
+        self.priority = priority
+        self.deadline = deadline
+        self.timeout = timeout
+        self.submitted = time.monotonic()
+        self.future = Future()
+
+
+class _PriorityStats:
+    """Contadores de uma classe de prioridade"""
+
+    def __init__(self):
+        self.submitted = 0
+        self.executed = 0
+        self.failed = 0
+        self.expired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def as_dict(self, depth):
+        started = self.executed + self.failed
+        return {
+            'queued': depth,
+            'submitted': self.submitted,
+            'executed': self.executed,
+            'failed': self.failed,
+            'expired': self.expired,
+            'avg_wait_ms': round(self.total_wait / started * 1000, 2) if started else 0,
+            'max_wait_ms': round(self.max_wait * 1000, 2),
+        }
+
+
+class DeviceCommandQueue:
+    """Fila de prioridades com uma thread de I/O dedicada a um CLP"""
+
+    def __init__(self, ip, port=502, unit_id=0, pool=None, retries=1):
+        """
+        Args:
+            ip, port, unit_id: Endereço Modbus TCP do CLP
+            pool: ModbusConnectionPool (padrão: pool compartilhado do processo)
+            retries: Novas tentativas, com conexão nova, após falha de comunicação
+        """
+        self.ip = ip
+        self.port = port
+        self.unit_id = unit_id
+        self.pool = pool or get_pool()
+        self.retries = retries
+        self._heap = []
+        self._sequence = itertools.count()  # FIFO dentro da mesma prioridade
+        self._condition = threading.Condition()
+        self._stats = {priority: _PriorityStats() for priority in PRIORITY_NAMES}
+        self._busy_since = None
+        self.running = True
+        self.thread = threading.Thread(target=self._worker, daemon=True,
+                                       name=f'plc-io-{ip}:{port}/{unit_id}')
+        self.thread.start()
+
+    def submit(self, operation, priority=PRIORITY_INTERACTIVE, deadline=None, timeout=None):
+        """
+        Enfileira operation(clp) e retorna um concurrent.futures.Future.
+
+        Args:
+            priority: PRIORITY_COMMAND, PRIORITY_INTERACTIVE ou PRIORITY_BACKGROUND
+            deadline: Segundos para a operação começar; depois disso é descartada
+            timeout: Timeout Modbus máximo (s) para esta operação (padrão do pool)
+
+        Levanta CircuitOpenError na hora se o circuito do CLP está aberto.
+        """
+        if priority not in PRIORITY_NAMES:
+            raise ValueError(f"Prioridade inválida: {priority}")
+        self.pool.ensure_available(self.ip, self.port, self.unit_id)
+
+        job = _Job(operation, priority,
+                   time.monotonic() + deadline if deadline is not None else None, timeout)
+        with self._condition:
+            if not self.running:
+                raise PLCUnavailableError(f"Fila do CLP {self.ip}:{self.port} encerrada")
+            heapq.heappush(self._heap, (priority, next(self._sequence), job))
+            self._stats[priority].submitted += 1
+            self._condition.notify()
+        return job.future
+
+    def call(self, operation, priority=PRIORITY_INTERACTIVE, deadline=None, timeout=None):
+        """Como submit, mas espera e retorna o resultado (ou levanta a exceção)"""
+        return self.submit(operation, priority, deadline, timeout).result()
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while self.running and not self._heap:
+                    self._condition.wait()
+                if not self.running and not self._heap:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+                stats = self._stats[job.priority]
+
+                now = time.monotonic()
+                if job.deadline is not None and now > job.deadline:
+                    stats.expired += 1
+                    expired = True
+                else:
+                    wait = now - job.submitted
+                    stats.total_wait += wait
+                    stats.max_wait = max(stats.max_wait, wait)
+                    self._busy_since = now
+                    expired = False
+
+            if expired:
+                late = (now - job.deadline) * 1000
+                job.future.set_exception(DeadlineExceededError(
+                    f"Operação descartada: prazo excedido em {late:.0f} ms (CLP {self.ip}:{self.port} ocupado)"))
+                continue
+
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = self._execute(job)
+            except BaseException as e:
+                with self._condition:
+                    stats.failed += 1
+                    self._busy_since = None
+                job.future.set_exception(e)
+            else:
+                with self._condition:
+                    stats.executed += 1
+                    self._busy_since = None
+                job.future.set_result(result)
+
+    def _execute(self, job):
+        attempt = 0
+        while True:
+            try:
+                with self.pool.connection(self.ip, self.port, self.unit_id, timeout=job.timeout) as clp:
+                    return job.operation(clp)
+            except PLCUnavailableError:
+                raise
+            except Exception as e:
+                # O socket com falha já foi descartado pelo pool; tenta com outro
+                if attempt >= self.retries or not is_communication_failure(e):
+                    raise
+                attempt += 1
+
+    def close(self):
+        """Para a thread após esvaziar a fila"""
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
+        self.thread.join(timeout=10)
+
+    def stats(self):
+        """Profundidade da fila, espera e descartes por classe de prioridade"""
+        with self._condition:
+            depth = {priority: 0 for priority in PRIORITY_NAMES}
+            for priority, _, _ in self._heap:
+                depth[priority] += 1
+            busy_for = time.monotonic() - self._busy_since if self._busy_since is not None else 0.0
+            return {
+                'depth': len(self._heap),
+                'busy_ms': round(busy_for * 1000, 1),
+                'priorities': {name: self._stats[priority].as_dict(depth[priority])
+                               for priority, name in PRIORITY_NAMES.items()},
+            }
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_command_queue(ip, port=502, unit_id=0):
+    """Retorna a fila de comandos do CLP (criada na primeira chamada)"""
+    key = (ip, int(port), int(unit_id))
+    with _queues_lock:
+        if key not in _queues:
+            _queues[key] = DeviceCommandQueue(ip, port, unit_id)
+        return _queues[key]
@@ -0,0 +1,339 @@
+"""
+Pool de conexões Modbus compartilhado pelo processo
+
+Mantém sockets TCP abertos entre as operações (o handshake com o CLP é lento),
+verifica se continuam vivos antes de reutilizá-los, reconecta com backoff
+exponencial e limita o número de sockets simultâneos por CLP.
+
+Cada CLP tem um circuit breaker (falhas seguidas fazem as próximas chamadas
+falharem na hora com CircuitOpenError) e um timeout adaptativo derivado dos
+tempos de resposta medidos (ver circuit_breaker.py).
+
+Uso:
+    from connection_pool import get_pool
+
+    with get_pool().connection('192.168.0.200', 502) as clp:
+        valor = clp.read_real(1)
+"""
+import select
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+from circuit_breaker import HALF_OPEN, CircuitBreaker, RttTracker
+from modbus_client import ModbusCLP, ModbusCommunicationError
+
+
+class PLCUnavailableError(Exception):
+    """Não foi possível obter uma conexão com o CLP (offline, em backoff ou pool esgotado)"""
+
+
+class CircuitOpenError(PLCUnavailableError):
+    """Circuito aberto: o CLP falhou repetidamente e as chamadas são recusadas sem acessar a rede"""
+
+    def __init__(self, message, retry_after=0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_communication_failure(error):
+    """True para falhas de rede/timeout (o CLP não respondeu), False para erros de aplicação"""
+    return isinstance(error, (PLCUnavailableError, ModbusCommunicationError, ConnectionException,
+                              ModbusIOException, OSError))
+
+
+class _DevicePool:
+    """Conexões de um único CLP (ip, porta, unit id)"""
+
+    def __init__(self, key, max_connections, timeout, failure_threshold, reset_timeout):
+        self.key = key
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+        self.rtt = RttTracker(max_timeout=timeout)
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.lock = threading.Lock()
+        self.idle = []  # [(clp, último uso)]
+        self.in_use = 0
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.last_error = None
+
+
+class ModbusConnectionPool:
+    """Pool de conexões ModbusCLP indexado por (ip, porta, unit id)"""
+
+    def __init__(self, max_connections=2, idle_timeout=300, probe_after=5,
+                 backoff_initial=0.5, backoff_max=30, acquire_timeout=5, timeout=3,
+                 retries=1, failure_threshold=3, reset_timeout=10):
+        """
+        Args:
+            max_connections: Sockets simultâneos por CLP (muitos CLPs aceitam poucos)
+            idle_timeout: Segundos sem uso após os quais o socket é fechado
+            probe_after: Segundos ociosos após os quais o socket é verificado antes do uso
+            backoff_initial: Espera inicial (s) após uma falha de conexão
+            backoff_max: Espera máxima (s) entre tentativas de conexão
+            acquire_timeout: Tempo máximo (s) aguardando um slot livre
+            timeout: Timeout Modbus (s) máximo das conexões; o efetivo se adapta ao RTT medido
+            retries: Retransmissões do pymodbus por transação
+            failure_threshold: Falhas consecutivas que abrem o circuito do CLP
+            reset_timeout: Segundos com o circuito aberto antes de uma chamada de teste
+        """
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.probe_after = probe_after
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.acquire_timeout = acquire_timeout
+        self.timeout = timeout
+        self.retries = retries
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._devices = {}
+        self._lock = threading.Lock()
+
+    def _device(self, ip, port, unit_id, timeout=None):
+        key = (ip, int(port), int(unit_id))
+        with self._lock:
+            if key not in self._devices:
+                self._devices[key] = _DevicePool(key, self.max_connections, self.timeout,
+                                                 self.failure_threshold, self.reset_timeout)
+            device = self._devices[key]
+        if timeout is not None:
+            device.timeout = timeout
+            device.rtt.max_timeout = timeout
+        return device
+
+    @contextmanager
+    def connection(self, ip, port=502, unit_id=0, timeout=None, track=True):
+        """
+        Empresta uma conexão ativa com o CLP.
+
+        Falhas de comunicação dentro do bloco descartam o socket (pode ter ficado
+        com uma resposta pendente) e contam para o circuit breaker; erros de
+        aplicação (ex.: exception code do CLP) devolvem o socket ao pool.
+        timeout: Timeout Modbus máximo (s) deste CLP (padrão do pool se None)
+        track: False para não afetar o circuit breaker (verificações de status)
+        """
+        device = self._device(ip, port, unit_id, timeout)
+        if track and not device.breaker.allow_request():
+            self._raise_circuit_open(device)
+        # Chamada de teste do half-open com o timeout máximo: o aprendido pode ser curto demais
+        trial = track and device.breaker.state == HALF_OPEN
+
+        if not device.slots.acquire(timeout=self.acquire_timeout):
+            if track:
+                device.breaker.release_trial()
+            raise PLCUnavailableError(f"Limite de {self.max_connections} conexões atingido para {ip}:{port}")
+
+        try:
+            clp = self._checkout(device)
+        except Exception as e:
+            device.slots.release()
+            if track:
+                if is_communication_failure(e):
+                    device.breaker.record_failure()
+                else:
+                    device.breaker.release_trial()
+            raise
+
+        clp.set_timeout(device.rtt.max_timeout if trial else device.rtt.timeout())
+        clp.set_rtt_observer(device.rtt.record)
+
+        try:
+            yield clp
+        except Exception as e:
+            if is_communication_failure(e):
+                self._discard(clp)
+                clp = None
+                device.rtt.record_failure()
+                if track:
+                    device.breaker.record_failure()
+            elif track:
+                # O CLP respondeu; o erro é da requisição ou do chamador
+                device.breaker.record_success()
+            raise
+        else:
+            if track:
+                device.breaker.record_success()
+        finally:
+            with device.lock:
+                device.in_use -= 1
+                if clp is not None:
+                    clp.set_rtt_observer(None)
+                    device.idle.append((clp, time.monotonic()))
+            device.slots.release()
+
+    def ensure_available(self, ip, port=502, unit_id=0):
+        """Levanta CircuitOpenError se o circuito do CLP está aberto (não consome a chamada de teste)"""
+        device = self._device(ip, port, unit_id)
+        if device.breaker.state == 'open':
+            self._raise_circuit_open(device)
+
+    @staticmethod
+    def _raise_circuit_open(device):
+        ip, port, _ = device.key
+        retry_after = device.breaker.retry_after()
+        raise CircuitOpenError(f"CLP {ip}:{port} indisponível (circuito aberto, nova tentativa em {retry_after:.1f}s)",
+                               retry_after=retry_after)
+
+    def _checkout(self, device):
+        """Retorna uma conexão ociosa saudável ou abre uma nova"""
+        now = time.monotonic()
+
+        while True:
+            with device.lock:
+                if not device.idle:
+                    break
+                clp, last_used = device.idle.pop()
+
+            idle_for = now - last_used
+            if idle_for > self.idle_timeout:
+                self._discard(clp)
+                continue
+            if idle_for > self.probe_after and not self._is_alive(clp):
+                self._discard(clp)
+                continue
+
+            with device.lock:
+                device.in_use += 1
+            return clp
+
+        clp = self._open(device)
+        with device.lock:
+            device.in_use += 1
+        return clp
+
+    def _open(self, device):
+        """Abre um novo socket respeitando o backoff do dispositivo"""
+        ip, port, unit_id = device.key
+        now = time.monotonic()
+
+        with device.lock:
+            if now < device.next_attempt:
+                wait = device.next_attempt - now
+                raise PLCUnavailableError(f"CLP {ip}:{port} indisponível (nova tentativa em {wait:.1f}s): {device.last_error}")
+
+        clp = ModbusCLP(ip=ip, port=port, unit_id=unit_id, timeout=device.timeout, retries=self.retries)
+        try:
+            connected = clp.connect()
+        except Exception as e:
+            connected = False
+            device.last_error = str(e)
+
+        if not connected:
+            clp.close()
+            with device.lock:
+                device.failures += 1
+                delay = min(self.backoff_initial * (2 ** (device.failures - 1)), self.backoff_max)
+                device.next_attempt = time.monotonic() + delay
+                device.last_error = device.last_error or "Falha ao conectar"
+            raise PLCUnavailableError(f"Falha ao conectar ao CLP {ip}:{port}")
+
+        self._enable_keepalive(clp)
+        with device.lock:
+            device.failures = 0
+            device.next_attempt = 0.0
+            device.last_error = None
+        return clp
+
+    @staticmethod
+    def _enable_keepalive(clp):
+        """Ativa TCP keepalive para que firewalls/switches não derrubem o socket ocioso"""
+        sock = clp.client.socket
+        if sock is None:
+            return
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _is_alive(clp):
+        """
+        Verificação barata (sem tráfego Modbus): um socket fechado pelo CLP fica
+        "legível" e retorna 0 bytes; um socket saudável e ocioso não tem nada para ler.
+        """
+        sock = clp.client.socket
+        if sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            # Legível = conexão encerrada (0 bytes) ou resposta atrasada de uma
+            # transação antiga; em ambos os casos o socket não deve ser reutilizado
+            return not readable
+        except (OSError, ValueError):
+            return False
+
+    @staticmethod
+    def _discard(clp):
+        try:
+            clp.close()
+        except Exception:
+            pass
+
+    def check(self, ip, port=502, unit_id=0):
+        """
+        Retorna True se há (ou foi possível abrir) uma conexão saudável com o CLP
+        e o circuito não está aberto. Não conta como chamada para o breaker.
+        """
+        device = self._device(ip, port, unit_id)
+        if device.breaker.state == 'open':
+            return False
+        try:
+            with self.connection(ip, port, unit_id, track=False):
+                return True
+        except PLCUnavailableError:
+            return False
+
+    def circuit_state(self, ip, port=502, unit_id=0):
+        """Estado do circuit breaker e do timeout adaptativo de um CLP"""
+        device = self._device(ip, port, unit_id)
+        return {**device.breaker.stats(), 'rtt': device.rtt.stats()}
+
+    def is_connected(self, ip, port=502, unit_id=0):
+        """True se existe ao menos um socket aberto com o CLP (sem tentar conectar)"""
+        device = self._device(ip, port, unit_id)
+        with device.lock:
+            return device.in_use > 0 or any(clp.client.is_socket_open() for clp, _ in device.idle)
+
+    def close(self, ip, port=502, unit_id=0):
+        """Fecha as conexões ociosas de um CLP (ex.: após mudar a configuração)"""
+        device = self._device(ip, port, unit_id)
+        with device.lock:
+            idle, device.idle = device.idle, []
+        for clp, _ in idle:
+            self._discard(clp)
+
+    def close_all(self):
+        """Fecha todas as conexões ociosas do pool"""
+        with self._lock:
+            keys = list(self._devices)
+        for key in keys:
+            self.close(*key)
+
+    def stats(self):
+        """Estado do pool por CLP"""
+        result = {}
+        with self._lock:
+            devices = list(self._devices.values())
+        for device in devices:
+            ip, port, unit_id = device.key
+            with device.lock:
+                result[f"{ip}:{port}/{unit_id}"] = {
+                    'idle': len(device.idle),
+                    'in_use': device.in_use,
+                    'failures': device.failures,
+                    'last_error': device.last_error,
+                    'circuit': device.breaker.stats(),
+                    'rtt': device.rtt.stats(),
+                }
+        return result
+
+
+_shared_pool = ModbusConnectionPool()
+
+
+def get_pool():
+    """Pool compartilhado por todos os componentes do processo"""
+    return _shared_pool
@@ -0,0 +1,235 @@
+"""
+Distribuição de eventos para os navegadores via Server-Sent Events (SSE)
+
+Em vez de cada página consultar a API a cada 5 s, o servidor empurra as
+mudanças assim que acontecem: o poller publica as tags que mudaram e o
+coletor de temperatura publica cada nova amostra. Cada cliente escolhe o
+que quer receber (tipos de evento e nomes de tags) e recebe heartbeats
+periódicos para detectar conexões mortas dos dois lados.
+
+Formato no fio (text/event-stream):
+    event: tags
+    data: {"real:1": {"value": 75.5, "timestamp": ..., "quality": "good"}}
+
+Eventos:
+    snapshot    - estado atual das tags filtradas (ao conectar e após resync)
+    tags        - tags que mudaram de valor ou qualidade
+    temperature - nova amostra do coletor de temperatura
+    heartbeat   - {"time": ...} quando não há outro evento no intervalo
+"""
+import asyncio
+import json
+import queue
+import threading
+import time
+
+RESYNC = 'resync'
+
+
+def format_sse(event, data):
+    """Serializa um evento no formato text/event-stream"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    """Fila de eventos de um cliente, com filtro por tipo de evento e por tag"""
+
+    clients = 1
+
+    def __init__(self, events=None, tags=None, max_queue=256):
+        """
+        Args:
+            events: Tipos de evento desejados (None = todos)
+            tags: Nomes de tags desejados nos eventos tags/snapshot (None = todas)
+            max_queue: Eventos pendentes antes de o cliente ser considerado lento
+        """
+        self.events = set(events) if events else None
+        self.tags = set(tags) if tags else None
+        # Assinaturas com o mesmo filtro recebem exatamente o mesmo texto SSE
+        self.filter_key = (frozenset(self.events) if self.events else None,
+                           frozenset(self.tags) if self.tags else None)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.resyncs = 0
+
+    def filter(self, event, data):
+        """Parte de `data` que interessa a este cliente, ou None"""
+        if event in ('tags', 'snapshot'):
+            if self.events is not None and 'tags' not in self.events:
+                return None
+            if self.tags is not None:
+                data = {name: entry for name, entry in data.items() if name in self.tags}
+            return data if data or event == 'snapshot' else None
+        if self.events is not None and event not in self.events:
+            return None
+        return data
+
+    def put(self, event, data):
+        try:
+            self.queue.put_nowait((event, data))
+        except queue.Full:
+            # Cliente lento: descarta o atrasado e manda o estado completo de novo
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.resyncs += 1
+            try:
+                self.queue.put_nowait((RESYNC, None))
+            except queue.Full:
+                pass
+
+
+class EventBroker:
+    """Publica eventos para todas as assinaturas ativas"""
+
+    def __init__(self, heartbeat=15.0, snapshot=None):
+        """
+        Args:
+            heartbeat: Segundos sem eventos até enviar um heartbeat
+            snapshot: Função sem argumentos que retorna {nome: entrada} das tags atuais
+        """
+        self.heartbeat = heartbeat
+        self.snapshot = snapshot
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, events=None, tags=None):
+        return self.attach(Subscription(events, tags))
+
+    def attach(self, subscriber):
+        """Registra qualquer objeto com filter(event, data) e put(event, data)"""
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event, data):
+        """Entrega o evento a cada assinatura interessada (não bloqueia)"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        self.published += 1
+        for subscription in subscribers:
+            filtered = subscription.filter(event, data)
+            if filtered is not None:
+                subscription.put(event, filtered)
+
+    def stream(self, subscription):
+        """Gerador de texto SSE para uma assinatura; cancela a assinatura ao terminar"""
+        try:
+            yield "retry: 3000\n\n"
+            yield self._snapshot_event(subscription)
+            while True:
+                try:
+                    event, data = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield format_sse('heartbeat', {'time': time.time()})
+                    continue
+                if event == RESYNC:
+                    yield self._snapshot_event(subscription)
+                else:
+                    yield format_sse(event, data)
+        finally:
+            self.unsubscribe(subscription)
+
+    def _snapshot_event(self, subscription):
+        tags = self.snapshot() if self.snapshot else {}
+        return format_sse('snapshot', subscription.filter('snapshot', tags) or {})
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        return {
+            'clients': sum(subscriber.clients for subscriber in subscribers),
+            'published': self.published,
+            'resyncs': sum(subscriber.resyncs for subscriber in subscribers),
+        }
+
+
+class AsyncSubscription(Subscription):
+    """Assinatura consumida por uma coroutine; só deve ser usada dentro do event loop"""
+
+    def __init__(self, events=None, tags=None, max_queue=256):
+        super().__init__(events, tags, max_queue)
+        self.queue = asyncio.Queue(maxsize=max_queue)
+
+    def put(self, event, data):
+        try:
+            self.queue.put_nowait((event, data))
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.resyncs += 1
+            self.queue.put_nowait((RESYNC, None))
+
+
+class LoopFanout:
+    """
+    Entrega os eventos de um EventBroker às assinaturas de um event loop.
+
+    O broker vê a fan-out como um único assinante: cada evento atravessa a
+    fronteira entre threads uma vez só (call_soon_threadsafe) e é distribuído
+    aos milhares de clientes já dentro do loop.
+    """
+
+    def __init__(self, broker, loop):
+        self.broker = broker
+        self.loop = loop
+        self.subscriptions = set()
+        broker.attach(self)
+
+    @property
+    def clients(self):
+        return len(self.subscriptions)
+
+    @property
+    def resyncs(self):
+        return sum(subscription.resyncs for subscription in self.subscriptions)
+
+    def filter(self, event, data):
+        return data
+
+    def put(self, event, data):
+        # Chamado pela thread que publicou o evento
+        self.loop.call_soon_threadsafe(self._dispatch, event, data)
+
+    def _dispatch(self, event, data):
+        # Filtra e serializa uma vez por filtro distinto, não uma vez por cliente
+        chunks = {}
+        for subscription in list(self.subscriptions):
+            key = subscription.filter_key
+            if key not in chunks:
+                filtered = subscription.filter(event, data)
+                chunks[key] = format_sse(event, filtered) if filtered is not None else None
+            if chunks[key] is not None:
+                subscription.put(event, chunks[key])
+
+    def subscribe(self, events=None, tags=None):
+        subscription = AsyncSubscription(events, tags)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+
+    async def stream(self, subscription):
+        """Versão assíncrona de EventBroker.stream"""
+        try:
+            yield "retry: 3000\n\n"
+            yield self.broker._snapshot_event(subscription)
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(subscription.queue.get(), self.broker.heartbeat)
+                except asyncio.TimeoutError:
+                    yield format_sse('heartbeat', {'time': time.time()})
+                    continue
+                if event == RESYNC:
+                    yield self.broker._snapshot_event(subscription)
+                else:
+                    yield data  # Já serializado em _dispatch
+        finally:
+            self.unsubscribe(subscription)
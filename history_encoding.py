@@ -0,0 +1,134 @@
+"""
+Codificações compactas para o histórico de temperatura
+
+A resposta padrão de /api/temperature/history é uma lista de objetos que
+repete as chaves em cada linha: com 1000 pontos, a maior parte do payload
+são nomes de campos. O cliente escolhe a representação pelo cabeçalho Accept:
+
+  application/json (padrão)
+      {"data": [{"id", "timestamp", "temperature", "anomaly", "rate_of_change"}, ...]}
+
+  application/vnd.temperature.columns+json
+      {"columns": {"id": [...], "t": [...], "temperature": [...],
+                   "anomaly": [...], "rate_of_change": [...]}}
+      vetores paralelos; "t" em epoch-ms (inteiro) e "anomaly" em 0/1
+
+  application/vnd.temperature.binary
+      buffers little-endian, lidos direto com DataView/TypedArray no navegador:
+        cabeçalho (24 bytes): magic b'TMH1', uint32 count, int64 cursor,
+                              uint8 has_more, 7 bytes de preenchimento
+        int64[count]   id
+        int64[count]   t (epoch-ms)
+        float32[count] temperature
+        float32[count] rate_of_change (NaN quando nulo)
+        uint8[count]   anomaly
+
+Nas três, "count", "cursor" e "has_more" têm o mesmo significado.
+"""
+import json
+import struct
+from datetime import datetime
+
+FORMAT_ROWS = 'rows'
+FORMAT_COLUMNS = 'columns'
+FORMAT_BINARY = 'binary'
+
+MIMETYPES = {
+    FORMAT_ROWS: 'application/json',
+    FORMAT_COLUMNS: 'application/vnd.temperature.columns+json',
+    FORMAT_BINARY: 'application/vnd.temperature.binary',
+}
+
+BINARY_MAGIC = b'TMH1'
+BINARY_HEADER = struct.Struct('<4sIq?7x')
+
+
+def negotiate_format(accept):
+    """
+    Formato pedido pelo cabeçalho Accept (werkzeug MIMEAccept).
+    JSON em linhas vem primeiro: '*/*' e clientes antigos continuam recebendo ele.
+    """
+    best = accept.best_match([MIMETYPES[FORMAT_ROWS], MIMETYPES[FORMAT_COLUMNS], MIMETYPES[FORMAT_BINARY]],
+                             default=MIMETYPES[FORMAT_ROWS])
+    return next(fmt for fmt, mimetype in MIMETYPES.items() if mimetype == best)
+
+
+def epoch_ms(timestamp):
+    """'YYYY-MM-DD HH:MM:SS[.fff]' (horário local) -> milissegundos desde a época"""
+    return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+
+
+def local_timestamp(ms):
+    """Milissegundos desde a época -> 'YYYY-MM-DDTHH:MM:SS.fff' no horário local"""
+    return datetime.fromtimestamp(ms / 1000).isoformat(timespec='milliseconds')
+
+
+def encode_history(rows, fmt, cursor, has_more=None):
+    """
+    Serializa as leituras no formato pedido.
+
+    Args:
+        rows: Tuplas (id, ts epoch-ms, temperature, anomaly, rate_of_change) em ordem cronológica
+        fmt: FORMAT_ROWS, FORMAT_COLUMNS ou FORMAT_BINARY
+        cursor: Valor de `since` para a próxima consulta
+        has_more: Só nas consultas incrementais (None = omitido)
+
+    Returns:
+        bytes do corpo
+    """
+    if fmt == FORMAT_BINARY:
+        return _encode_binary(rows, cursor, has_more)
+
+    payload = {'count': len(rows), 'cursor': cursor}
+    if has_more is not None:
+        payload['has_more'] = has_more
+
+    if fmt == FORMAT_COLUMNS:
+        ids, timestamps, temperatures, anomalies, rates = zip(*rows) if rows else ((),) * 5
+        payload['columns'] = {
+            'id': ids,
+            't': timestamps,
+            'temperature': temperatures,
+            'anomaly': [1 if a else 0 for a in anomalies],
+            'rate_of_change': rates,
+        }
+    else:
+        payload['data'] = [
+            {'id': row[0], 'timestamp': local_timestamp(row[1]), 'temperature': row[2],
+             'anomaly': bool(row[3]), 'rate_of_change': row[4]}
+            for row in rows
+        ]
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def _encode_binary(rows, cursor, has_more):
+    count = len(rows)
+    ids, timestamps, temperatures, anomalies, rates = zip(*rows) if rows else ((),) * 5
+    nan = float('nan')
+    return b''.join((
+        BINARY_HEADER.pack(BINARY_MAGIC, count, cursor, bool(has_more)),
+        struct.pack(f'<{count}q', *ids),
+        struct.pack(f'<{count}q', *timestamps),
+        struct.pack(f'<{count}f', *temperatures),
+        struct.pack(f'<{count}f', *(nan if r is None else r for r in rates)),
+        bytes(1 if a else 0 for a in anomalies),
+    ))
+
+
+def decode_binary(body):
+    """Lê o formato binário de volta: (tuplas, cursor, has_more); usado nos testes (test_history_api.py)"""
+    magic, count, cursor, has_more = BINARY_HEADER.unpack_from(body)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Corpo não é um histórico binário")
+    offset = BINARY_HEADER.size
+    ids = struct.unpack_from(f'<{count}q', body, offset)
+    offset += 8 * count
+    timestamps = struct.unpack_from(f'<{count}q', body, offset)
+    offset += 8 * count
+    temperatures = struct.unpack_from(f'<{count}f', body, offset)
+    offset += 4 * count
+    rates = struct.unpack_from(f'<{count}f', body, offset)
+    offset += 4 * count
+    anomalies = body[offset:offset + count]
+    rows = list(zip(ids, timestamps, temperatures, (bool(a) for a in anomalies), rates))
+    return rows, cursor, has_more
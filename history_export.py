@@ -0,0 +1,244 @@
+"""
+Exportação em massa do histórico de temperatura (streaming)
+
+/api/temperature/history devolve no máximo 1000 pontos montados em
+memória; auditorias precisam de meses. Aqui uma consulta por período anda
+por um cursor do SQLite com fetchmany e cada lote é serializado e entregue
+antes do próximo ser lido: a memória fica constante qualquer que seja o
+período (50M linhas passam em lotes de FETCH_SIZE).
+
+Formatos:
+    csv     - id,timestamp,ts,temperature,anomaly,rate_of_change
+    ndjson  - um objeto JSON por linha, mesmos campos
+    parquet - um row group por lote (requer pyarrow)
+compress='gzip' comprime na hora (CSV/NDJSON: fluxo gzip; Parquet: codec
+gzip das colunas, que já são comprimidas por padrão com snappy).
+
+timestamp é o horário local com milissegundos (como em /history), ts é o
+epoch-ms UTC gravado no banco.
+
+Uso (CLI):
+    python history_export.py [temperature_data.db] -o janeiro.csv.gz --since 2025-01-01 --until 2025-02-01
+    python history_export.py --format ndjson -o - | jq ...
+"""
+import argparse
+import sqlite3
+import sys
+import zlib
+from datetime import datetime
+from history_encoding import epoch_ms
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+    pa = pq = None
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+FORMAT_PARQUET = 'parquet'
+
+MIMETYPES = {
+    FORMAT_CSV: 'text/csv',
+    FORMAT_NDJSON: 'application/x-ndjson',
+    FORMAT_PARQUET: 'application/vnd.apache.parquet',
+}
+
+# Linhas por fetchmany (e por row group no Parquet)
+FETCH_SIZE = 10000
+
+CSV_HEADER = 'id,timestamp,ts,temperature,anomaly,rate_of_change\n'
+
+
+def query_rows(db_path, start_ms=None, end_ms=None, fetch_size=FETCH_SIZE):
+    """
+    Gerador de lotes de até fetch_size tuplas (id, ts, temperature, anomaly, rate_of_change)
+    com start_ms <= ts < end_ms, em ordem cronológica. Conexão própria, fechada no fim
+    (ou quando o gerador é descartado, ex.: cliente desconectou).
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute('''
+            SELECT id, ts, temperature, anomaly, rate_of_change
+            FROM temperature_samples
+            WHERE ts >= ? AND ts < ?
+            ORDER BY ts, id
+        ''', (-2 ** 63 if start_ms is None else start_ms, 2 ** 63 - 1 if end_ms is None else end_ms))
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def _number(value):
+    return '' if value is None else repr(value)
+
+
+def _local_timestamps():
+    """
+    Formatador epoch-ms -> horário local igual a history_encoding.local_timestamp, que
+    converte cada segundo uma vez só: amostras seguidas quase sempre caem no mesmo segundo.
+    """
+    last = [None, None]
+
+    def format_ms(ms):
+        second, millis = divmod(ms, 1000)
+        if second != last[0]:
+            last[0], last[1] = second, datetime.fromtimestamp(second).isoformat()
+        return f'{last[1]}.{millis:03d}'
+    return format_ms
+
+
+def encode_csv(batches):
+    local_timestamp = _local_timestamps()
+    yield CSV_HEADER.encode('utf-8')
+    for rows in batches:
+        yield ''.join(
+            f'{row_id},{local_timestamp(ts)},{ts},{temperature!r},{1 if anomaly else 0},{_number(rate)}\n'
+            for row_id, ts, temperature, anomaly, rate in rows
+        ).encode('utf-8')
+
+
+def encode_ndjson(batches):
+    local_timestamp = _local_timestamps()
+    for rows in batches:
+        yield ''.join(
+            f'{{"id":{row_id},"timestamp":"{local_timestamp(ts)}","ts":{ts},"temperature":{temperature!r},'
+            f'"anomaly":{"true" if anomaly else "false"},"rate_of_change":{_number(rate) or "null"}}}\n'
+            for row_id, ts, temperature, anomaly, rate in rows
+        ).encode('utf-8')
+
+
+class _ChunkSink:
+    """Arquivo só de escrita para o ParquetWriter; os bytes são retirados a cada row group"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def encode_parquet(batches, compression='snappy'):
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('ts', pa.timestamp('ms', tz='UTC')),
+        ('temperature', pa.float64()),
+        ('anomaly', pa.bool_()),
+        ('rate_of_change', pa.float64()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression)
+    try:
+        for rows in batches:
+            ids, ts, temperatures, anomalies, rates = zip(*rows)
+            writer.write_table(pa.Table.from_arrays([
+                pa.array(ids, pa.int64()),
+                pa.array(ts, pa.int64()).cast(pa.timestamp('ms', tz='UTC')),
+                pa.array(temperatures, pa.float64()),
+                pa.array([bool(anomaly) for anomaly in anomalies], pa.bool_()),
+                pa.array(rates, pa.float64()),
+            ], schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()  # Rodapé com os metadados
+    yield sink.drain()
+
+
+def gzip_stream(blocks, level=6):
+    """Comprime um fluxo de bytes em gzip sem juntar tudo em memória"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = cabeçalho gzip
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(db_path, fmt, start_ms=None, end_ms=None, compress=None, fetch_size=FETCH_SIZE):
+    """
+    Valida os parâmetros e retorna um iterador de blocos de bytes do arquivo exportado.
+    Levanta ValueError para formato/compressão inválidos ou Parquet sem pyarrow.
+    """
+    if fmt not in MIMETYPES:
+        raise ValueError(f"Formato inválido: {fmt} (use {', '.join(MIMETYPES)})")
+    if compress not in (None, 'gzip'):
+        raise ValueError(f"Compressão inválida: {compress} (use gzip)")
+    if fmt == FORMAT_PARQUET and not PARQUET_AVAILABLE:
+        raise ValueError("Exportar Parquet requer pyarrow (pip install pyarrow)")
+
+    batches = query_rows(db_path, start_ms, end_ms, fetch_size)
+    if fmt == FORMAT_PARQUET:
+        return encode_parquet(batches, compression='gzip' if compress else 'snappy')
+    blocks = encode_csv(batches) if fmt == FORMAT_CSV else encode_ndjson(batches)
+    return gzip_stream(blocks) if compress else blocks
+
+
+def export_filename(fmt, compress=None):
+    return f"temperatura.{fmt}" + ('.gz' if compress and fmt != FORMAT_PARQUET else '')
+
+
+def parse_time(value):
+    """Limite de período: epoch-ms (só dígitos) ou horário local 'YYYY-MM-DD[ HH:MM:SS[.fff]]'"""
+    if value is None:
+        return None
+    return int(value) if value.isdigit() else epoch_ms(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta o histórico de temperatura (CSV, NDJSON ou Parquet)")
+    parser.add_argument('db_path', nargs='?', default='temperature_data.db')
+    parser.add_argument('-o', '--output', default='-', help="Arquivo de saída ('-' = stdout)")
+    parser.add_argument('--format', choices=list(MIMETYPES),
+                        help='Formato (padrão: pela extensão da saída, senão csv)')
+    parser.add_argument('--gzip', action='store_true', help='Comprimir (implícito em saída .gz)')
+    parser.add_argument('--since', help="Início (epoch-ms ou horário local, ex.: '2025-01-01 00:00:00')")
+    parser.add_argument('--until', help='Fim, exclusivo')
+    args = parser.parse_args()
+
+    name = args.output.lower()
+    compress = 'gzip' if args.gzip or name.endswith('.gz') else None
+    fmt = args.format or next((f for f in MIMETYPES if name.removesuffix('.gz').endswith('.' + f)), FORMAT_CSV)
+
+    try:
+        blocks = export(args.db_path, fmt, parse_time(args.since), parse_time(args.until), compress)
+    except ValueError as e:
+        parser.error(str(e))
+
+    out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    written = 0
+    try:
+        for block in blocks:
+            out.write(block)
+            written += len(block)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(f"[EXPORT] {fmt}{' gzip' if compress else ''}: {written} bytes", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Migração online do banco de temperatura v1 -> v2
+
+v1 (temperature_readings): timestamp TEXT no horário local, resolução de 1 s,
+estatísticas comparando com datetime('now') em UTC.
+v2 (temperature_samples):  ts INTEGER em epoch-ms, índice de cobertura
+(ts, temperature, anomaly) para consultas por período.
+
+A conversão anda em lotes pequenos por id, cada um em uma transação curta
+que copia o lote para a v2 e o apaga da v1: o coletor continua gravando
+entre um lote e outro, e uma migração interrompida recomeça de onde parou.
+No fim a tabela v1 é removida e o banco fica com user_version = 2.
+
+O coletor inicia a migração sozinho ao subir com um banco v1; este script
+faz o mesmo manualmente (com o app rodando ou não).
+
+Uso:
+    python migrate_db.py [temperature_data.db] [--chunk 5000]
+"""
+import argparse
+import sqlite3
+import time
+from history_encoding import epoch_ms
+from sample_writer import open_database
+from rollups import update_rollups
+from temperature_monitor import SCHEMA_VERSION, create_schema, legacy_table_exists
+
+CHUNK_SIZE = 5000
+# Pausa entre lotes: deixa a thread gravadora do coletor pegar o lock de escrita
+CHUNK_PAUSE = 0.05
+
+
+def migrate_chunk(conn, chunk_size=CHUNK_SIZE):
+    """Converte o próximo lote da v1; retorna quantas linhas foram migradas"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rows = conn.execute('''
+            SELECT id, timestamp, temperature, anomaly, rate_of_change
+            FROM temperature_readings
+            ORDER BY id
+            LIMIT ?
+        ''', (chunk_size,)).fetchall()
+        converted = [(row_id, epoch_ms(timestamp), temperature, int(bool(anomaly)), rate)
+                     for row_id, timestamp, temperature, anomaly, rate in rows]
+        # Ids da v1 nunca colidem com os da v2 (o coletor continua depois deles):
+        # cada linha entra uma única vez nas amostras e nos agregados
+        conn.executemany('''
+            INSERT INTO temperature_samples (id, ts, temperature, anomaly, rate_of_change)
+            VALUES (?, ?, ?, ?, ?)
+        ''', converted)
+        update_rollups(conn, converted)
+        if rows:
+            conn.execute('DELETE FROM temperature_readings WHERE id <= ?', (rows[-1][0],))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return len(rows)
+
+
+def migrate(db_path, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE):
+    """Migra o banco inteiro; seguro para rodar com o coletor gravando. Retorna as linhas migradas."""
+    conn = open_database(db_path)
+    conn.isolation_level = None  # Transações controladas aqui (BEGIN IMMEDIATE por lote)
+    try:
+        create_schema(conn)
+        if not legacy_table_exists(conn):
+            return 0
+
+        total = conn.execute('SELECT COUNT(*) FROM temperature_readings').fetchone()[0]
+        print(f"[MIGRAÇÃO] {db_path}: {total} leituras v1 para converter")
+        migrated = 0
+        start = time.monotonic()
+        while True:
+            count = migrate_chunk(conn, chunk_size)
+            if not count:
+                break
+            migrated += count
+            print(f"[MIGRAÇÃO] {migrated}/{total}")
+            time.sleep(pause)
+
+        conn.execute('DROP TABLE temperature_readings')
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        print(f"[MIGRAÇÃO] Concluída: {migrated} leituras em {time.monotonic() - start:.1f}s")
+        return migrated
+    except sqlite3.Error as e:
+        print(f"[MIGRAÇÃO] Erro: {e} (rode de novo para continuar)")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converte temperature_data.db para o esquema v2 (epoch-ms)")
+    parser.add_argument('db_path', nargs='?', default='temperature_data.db')
+    parser.add_argument('--chunk', type=int, default=CHUNK_SIZE, help='Linhas por transação')
+    args = parser.parse_args()
+    migrate(args.db_path, args.chunk)
@@ -1,16 +1,79 @@
+import argparse
 import logging
 import asyncio
 from pymodbus.server import StartAsyncTcpServer
 from pymodbus.datastore import ModbusSequentialDataBlock, ModbusSlaveContext, ModbusServerContext
 from pymodbus.device import ModbusDeviceIdentification
 from pymodbus.datastore import ModbusSparseDataBlock
+from pymodbus.framer.socket_framer import ModbusSocketFramer
 
 # Configuração de Logs
 logging.basicConfig()
 log = logging.getLogger()
 log.setLevel(logging.INFO)
 
-async def run_server():
+class PipelinedSocketFramer(ModbusSocketFramer):
+    """Framer que aceita várias requisições no mesmo segmento TCP.
+
+    O framer do pymodbus 3.6 entrega ao decoder um byte a mais (o primeiro
+    byte da próxima requisição) quando os frames chegam juntos, e o servidor
+    derruba a conexão. Clientes com transações em pipeline (AsyncModbusCLP)
+    precisam disso para testar contra o mock.
+    """
+
+    def getFrame(self):
+        # "len" do MBAP conta o unit id, que já faz parte do cabeçalho (_hsize)
+        return self._buffer[self._hsize:self._hsize + self._header["len"] - 1]
+
+async def replay_series(store_hr, source, address=0, speed=1.0, loop=False):
+    """Reproduz uma série gravada no REAL dos registradores address/address+1.
+
+    source: CSV (formatos de bulk_ingest, inclusive os exportados por history_export)
+            ou banco .db do coletor.
+    speed: fator de aceleração (60 = uma hora de dados por minuto). Os instantes
+           seguem o horário das amostras em relação à primeira, em prazos absolutos:
+           atrasos não se acumulam; se o servidor ficar para trás, as amostras
+           vencidas são escritas em seguida.
+    loop: recomeça do início ao terminar.
+    """
+    import modbus_codec
+    from bulk_ingest import read_series
+    from history_export import query_rows
+
+    def chunks():
+        if source.endswith('.db'):
+            return ([(ts, temperature) for _, ts, temperature, _, _ in rows] for rows in query_rows(source))
+        return ([(ts, temperature) for ts, temperature, _, _ in rows] for rows in read_series(source, 1000))
+
+    event_loop = asyncio.get_running_loop()
+    start = event_loop.time()
+    offset = 0.0  # Segundos de replay já decorridos nas voltas anteriores
+    while True:
+        first_ts = last_ts = None
+        count = 0
+        iterator = chunks()
+        # Leitura do arquivo fora do loop de eventos: o servidor continua respondendo
+        while (chunk := await asyncio.to_thread(next, iterator, None)) is not None:
+            for ts, temperature in chunk:
+                if first_ts is None:
+                    first_ts = ts
+                delay = start + offset + (ts - first_ts) / 1000 / speed - event_loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                store_hr.setValues(address, modbus_codec.encode(temperature, modbus_codec.FLOAT32))
+                last_ts = ts
+                count += 1
+        print(f"[REPLAY] {count} amostras de {source} reproduzidas (x{speed:g})")
+        if not loop or count == 0:
+            return
+        offset += (last_ts - first_ts) / 1000 / speed
+
+def _replay_done(task):
+    """Erro no replay (arquivo ausente, formato inválido...) vai para o log em vez de sumir com a task"""
+    if not task.cancelled() and task.exception() is not None:
+        log.error("Replay interrompido: %s", task.exception(), exc_info=task.exception())
+
+async def run_server(port=5020, replay=None):
     # Mapeamento de Memória (Endianness Big Endian é padrão no pymodbus)
     # Coil 00001 (Address 0): OPC_Start
     # HR 40001 (Address 0): OPC_Estado (INT)
@@ -50,23 +113,74 @@ async def run_server():
     identity.MajorMinorRevision = '1.0'
 
     print("=== MOCK MODBUS SERVER INICIADO ===")
-    print("Escutando em localhost:5020 (Porta alterada para não exigir admin)")
+    print(f"Escutando em localhost:{port} (Porta alterada para não exigir admin)")
     print("Mapeamento:")
     print("  Coil 0: OPC_Start")
     print("  HR 0: OPC_Estado")
     print("  HR 1-2: OPC_Temp")
     print("  HR 3: Watchdog")
     
+    replay_task = None
+    if replay:
+        # Série gravada tocando nos holding registers (replay_series)
+        print(f"  Replay: {replay['source']} em HR {replay.get('address', 0)}-{replay.get('address', 0) + 1}"
+              f" (x{replay.get('speed', 1.0):g})")
+        replay_task = asyncio.create_task(replay_series(store_hr, **replay))
+        replay_task.add_done_callback(_replay_done)
+    
     # Inicia o servidor
     # Usando porta 5020 para evitar permissão de admin (502 requer)
-    await StartAsyncTcpServer(context=context, identity=identity, address=("localhost", 5020))
+    try:
+        await StartAsyncTcpServer(context=context, identity=identity, address=("localhost", port),
+                                  framer=PipelinedSocketFramer)
+    finally:
+        if replay_task is not None:
+            replay_task.cancel()
+
+async def run_faulty_server(mode, port=5021):
+    """CLP defeituoso para testar timeouts e o circuit breaker.
+
+    mode='stall': aceita a conexão e nunca responde (CLP travado / cabo meio solto)
+    mode='drop': aceita a conexão e a fecha ao receber a primeira requisição
+    """
+    async def handle(reader, writer):
+        try:
+            while await reader.read(260):
+                if mode == 'drop':
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "localhost", port)
+    print(f"=== MOCK DEFEITUOSO ({mode}) em localhost:{port} ===")
+    async with server:
+        await server.serve_forever()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mock Modbus Server")
+    parser.add_argument('--port', type=int, default=None, help="Porta TCP (padrão 5020, ou 5021 nos modos de falha)")
+    fault = parser.add_mutually_exclusive_group()
+    fault.add_argument('--stall', action='store_true', help="Aceita conexões mas nunca responde")
+    fault.add_argument('--drop', action='store_true', help="Fecha a conexão a cada requisição")
+    parser.add_argument('--replay', help="Série gravada (CSV ou .db) para tocar no HR de temperatura")
+    parser.add_argument('--speed', type=float, default=1.0, help="Fator de aceleração do replay (ex.: 60)")
+    parser.add_argument('--hr', type=int, default=40001,
+                        help="Holding register da temperatura no replay (como TEMPERATURE_HR; 40001 = endereço 0)")
+    parser.add_argument('--loop', action='store_true', help="Repete a série ao terminar")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
+    fault_mode = 'stall' if args.stall else 'drop' if args.drop else None
+    if fault_mode:
+        server = run_faulty_server(fault_mode, args.port or 5021)
+    else:
+        replay = args.replay and {'source': args.replay, 'address': args.hr - 40001, 'speed': args.speed,
+                                  'loop': args.loop}
+        server = run_server(args.port or 5020, replay)
     try:
-        if hasattr(asyncio, "run"):
-            asyncio.run(run_server())
-        else:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(run_server())
+        asyncio.run(server)
     except KeyboardInterrupt:
         print("Servidor encerrado.")
@@ -1,13 +1,46 @@
 from pymodbus.client import ModbusTcpClient
-from pymodbus.payload import BinaryPayloadBuilder, BinaryPayloadDecoder
-from pymodbus.constants import Endian
+from pymodbus.exceptions import ModbusIOException
+from pymodbus.pdu import ExceptionResponse
+import modbus_codec
 import logging
+import time
+
+# Limites do protocolo por requisição
+MAX_REGISTERS_PER_READ = 125   # FC03
+MAX_COILS_PER_WRITE = 1968     # FC15
+MAX_REGISTERS_PER_WRITE = 123  # FC16
+
+class ModbusCommunicationError(Exception):
+    """Falha de comunicação com o CLP (timeout, conexão recusada ou perdida)"""
+
+class ModbusResponseError(Exception):
+    """O CLP respondeu com um exception code Modbus (ex.: endereço inválido)"""
+
+def check_result(result):
+    """Levanta a exceção adequada se a resposta Modbus indicar erro"""
+    if isinstance(result, ExceptionResponse):
+        raise ModbusResponseError(f"Erro Modbus: {result}")
+    if result.isError():
+        raise ModbusCommunicationError(f"Erro Modbus: {result}")
+
+class _TimedModbusTcpClient(ModbusTcpClient):
+    """ModbusTcpClient que informa o tempo de cada transação respondida"""
+
+    rtt_observer = None
+
+    def execute(self, request=None):
+        start = time.perf_counter()
+        result = super().execute(request)
+        if self.rtt_observer and not isinstance(result, ModbusIOException):
+            self.rtt_observer(time.perf_counter() - start)
+        return result
 
 class ModbusCLP:
-    def __init__(self, ip='192.168.0.200', port=502):
+    def __init__(self, ip='192.168.0.200', port=502, unit_id=0, timeout=3, retries=3):
         self.ip = ip
         self.port = port
-        self.client = ModbusTcpClient(ip, port=port)
+        self.unit_id = unit_id
+        self.client = _TimedModbusTcpClient(ip, port=port, timeout=timeout, retries=retries)
 
     def connect(self):
         """Conecta ao CLP. Retorna True se sucesso."""
@@ -17,6 +50,20 @@ class ModbusCLP:
         """Fecha a conexão."""
         self.client.close()
 
+    @property
+    def timeout(self):
+        return self.client.comm_params.timeout_connect
+
+    def set_timeout(self, timeout):
+        """Ajusta o timeout (s) das próximas transações sem reconectar."""
+        self.client.comm_params.timeout_connect = timeout
+        if self.client.socket is not None:
+            self.client.socket.settimeout(timeout)
+
+    def set_rtt_observer(self, observer):
+        """Registra observer(segundos), chamado após cada transação respondida."""
+        self.client.rtt_observer = observer
+
     def write_bool(self, address, value):
         """
         Escreve um valor Booleano em uma Coil.
@@ -25,9 +72,8 @@ class ModbusCLP:
         """
         try:
             # write_coil espera endereço 0-based
-            result = self.client.write_coil(address, value)
-            if result.isError():
-                raise Exception(f"Erro Modbus: {result}")
+            result = self.client.write_coil(address, value, slave=self.unit_id)
+            check_result(result)
             return True
         except Exception as e:
             print(f"Erro ao escrever BOOL em {address}: {e}")
@@ -40,9 +86,8 @@ class ModbusCLP:
         Retorna: True ou False
         """
         try:
-            result = self.client.read_coils(address, 1)
-            if result.isError():
-                raise Exception(f"Erro Modbus: {result}")
+            result = self.client.read_coils(address, 1, slave=self.unit_id)
+            check_result(result)
             return result.bits[0]
         except Exception as e:
             print(f"Erro ao ler BOOL de {address}: {e}")
@@ -55,13 +100,10 @@ class ModbusCLP:
         value: Inteiro (Signed 16-bit)
         """
         try:
-            builder = BinaryPayloadBuilder(byteorder=Endian.BIG, wordorder=Endian.BIG)
-            builder.add_16bit_int(value)
-            payload = builder.build()
+            registers = self.encode_int(value)
             
-            result = self.client.write_registers(address, payload, skip_encode=True)
-            if result.isError():
-                raise Exception(f"Erro Modbus: {result}")
+            result = self.client.write_registers(address, registers, slave=self.unit_id)
+            check_result(result)
             return True
         except Exception as e:
             print(f"Erro ao escrever INT em {address}: {e}")
@@ -73,12 +115,10 @@ class ModbusCLP:
         address: Endereço 0-based
         """
         try:
-            result = self.client.read_holding_registers(address, 1)
-            if result.isError():
-                raise Exception(f"Erro Modbus: {result}")
+            result = self.client.read_holding_registers(address, 1, slave=self.unit_id)
+            check_result(result)
             
-            decoder = BinaryPayloadDecoder.fromRegisters(result.registers, byteorder=Endian.BIG, wordorder=Endian.BIG)
-            return decoder.decode_16bit_int()
+            return self.decode_int(result.registers)
         except Exception as e:
             print(f"Erro ao ler INT de {address}: {e}")
             raise
@@ -90,13 +130,10 @@ class ModbusCLP:
         value: Float
         """
         try:
-            builder = BinaryPayloadBuilder(byteorder=Endian.BIG, wordorder=Endian.BIG)
-            builder.add_32bit_float(value)
-            payload = builder.build()
+            registers = self.encode_real(value)
             
-            result = self.client.write_registers(address, payload, skip_encode=True)
-            if result.isError():
-                raise Exception(f"Erro Modbus: {result}")
+            result = self.client.write_registers(address, registers, slave=self.unit_id)
+            check_result(result)
             return True
         except Exception as e:
             print(f"Erro ao escrever REAL em {address}: {e}")
@@ -108,12 +145,115 @@ class ModbusCLP:
         address: Endereço 0-based inicial
         """
         try:
-            result = self.client.read_holding_registers(address, 2)
-            if result.isError():
-                raise Exception(f"Erro Modbus: {result}")
+            result = self.client.read_holding_registers(address, 2, slave=self.unit_id)
+            check_result(result)
             
-            decoder = BinaryPayloadDecoder.fromRegisters(result.registers, byteorder=Endian.BIG, wordorder=Endian.BIG)
-            return decoder.decode_32bit_float()
+            return self.decode_real(result.registers)
         except Exception as e:
             print(f"Erro ao ler REAL de {address}: {e}")
             raise
+
+    def read_coil_block(self, address, count):
+        """
+        Lê um bloco contíguo de Coils em uma única requisição (FC01).
+        address: Endereço 0-based inicial
+        count: Quantidade de coils (máx. 2000)
+        Retorna: lista de bools com exatamente `count` itens
+        """
+        result = self.client.read_coils(address, count, slave=self.unit_id)
+        check_result(result)
+        # O pymodbus completa os bits até múltiplo de 8
+        return result.bits[:count]
+
+    def read_register_block(self, address, count):
+        """
+        Lê um bloco contíguo de Holding Registers em uma única requisição (FC03).
+        address: Endereço 0-based inicial
+        count: Quantidade de registradores (máx. 125)
+        Retorna: lista de inteiros (words de 16 bits)
+        """
+        result = self.client.read_holding_registers(address, count, slave=self.unit_id)
+        check_result(result)
+        return result.registers
+
+    def write_coil_block(self, address, values):
+        """
+        Escreve um bloco contíguo de Coils em uma única requisição (FC15).
+        address: Endereço 0-based inicial
+        values: lista de bools (máx. 1968)
+        """
+        result = self.client.write_coils(address, [bool(v) for v in values], slave=self.unit_id)
+        check_result(result)
+        return True
+
+    def write_register_block(self, address, registers):
+        """
+        Escreve um bloco contíguo de Holding Registers em uma única requisição (FC16).
+        address: Endereço 0-based inicial
+        registers: lista de words de 16 bits (máx. 123)
+        """
+        result = self.client.write_registers(address, list(registers), slave=self.unit_id)
+        check_result(result)
+        return True
+
+    def write_many(self, writes, verify=False):
+        """
+        Escreve várias tags agrupadas em poucas requisições FC15/FC16.
+        writes: lista de dicts {'type', 'address', 'value'} ('name' e 'word_order' opcionais)
+        verify: relê os blocos escritos e compara
+        Retorna: dict com 'round_trips', 'blocks' e 'mismatches' (ver modbus_planner.WritePlanner)
+        """
+        from modbus_planner import WritePlanner
+        return WritePlanner(self).write(writes, verify=verify)
+
+    def read_array(self, address, count, data_type, word_order=modbus_codec.WORD_BIG, as_numpy=False):
+        """
+        Lê `count` valores consecutivos de um tipo a partir de um Holding Register.
+        Divide em quantas requisições forem necessárias (máx. 125 registradores cada)
+        e decodifica o bloco inteiro de uma vez.
+        address: Endereço 0-based inicial
+        data_type: tipo do modbus_codec (INT16, UINT16, INT32, UINT32, FLOAT32, FLOAT64)
+        Retorna: array.array (ou numpy.ndarray se as_numpy=True)
+        """
+        try:
+            size = modbus_codec.register_count(data_type)
+            per_request = (MAX_REGISTERS_PER_READ // size) * size
+            total = count * size
+            registers = []
+            offset = 0
+            while offset < total:
+                chunk = min(per_request, total - offset)
+                registers.extend(self.read_register_block(address + offset, chunk))
+                offset += chunk
+            return modbus_codec.decode_array(registers, data_type, word_order, as_numpy=as_numpy)
+        except Exception as e:
+            print(f"Erro ao ler {count}x {data_type} de {address}: {e}")
+            raise
+
+    def read_real_array(self, address, count, word_order=modbus_codec.WORD_BIG, as_numpy=False):
+        """Lê `count` REALs (32-bit float) consecutivos a partir de `address`."""
+        return self.read_array(address, count, modbus_codec.FLOAT32, word_order, as_numpy)
+
+    def read_int_array(self, address, count, as_numpy=False):
+        """Lê `count` INTs (16-bit signed) consecutivos a partir de `address`."""
+        return self.read_array(address, count, modbus_codec.INT16, as_numpy=as_numpy)
+
+    @staticmethod
+    def encode_int(value):
+        """Codifica um INT (16-bit signed) em 1 registrador."""
+        return modbus_codec.encode(value, modbus_codec.INT16)
+
+    @staticmethod
+    def encode_real(value):
+        """Codifica um REAL (32-bit float) em 2 registradores."""
+        return modbus_codec.encode(value, modbus_codec.FLOAT32)
+
+    @staticmethod
+    def decode_int(registers):
+        """Decodifica um INT (16-bit signed) a partir de 1 registrador."""
+        return modbus_codec.decode(registers, modbus_codec.INT16)
+
+    @staticmethod
+    def decode_real(registers):
+        """Decodifica um REAL (32-bit float) a partir de 2 registradores."""
+        return modbus_codec.decode(registers, modbus_codec.FLOAT32)
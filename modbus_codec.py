@@ -0,0 +1,157 @@
+"""
+Codificação/decodificação de tipos em Holding Registers
+
+Substitui o BinaryPayloadBuilder/BinaryPayloadDecoder do pymodbus (lentos e
+marcados como obsoletos nas versões novas) por formatos `struct.Struct`
+pré-compilados por tipo e ordem de words.
+
+Tipos: INT16, UINT16, INT32, UINT32, FLOAT32, FLOAT64
+Ordem das words:
+    WORD_BIG     -> word mais significativa primeiro (ABCD, padrão Altus)
+    WORD_SWAPPED -> words invertidas (CDAB, comum em CLPs de outros fabricantes)
+Os bytes dentro de cada word são sempre big endian, como manda o protocolo.
+
+As funções de bloco (decode_array) convertem a lista de registradores em um
+único buffer e o reinterpretam via memoryview, sem criar objetos por valor.
+"""
+import struct
+import sys
+from array import array
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+
+INT16 = 'int16'
+UINT16 = 'uint16'
+INT32 = 'int32'
+UINT32 = 'uint32'
+FLOAT32 = 'float32'
+FLOAT64 = 'float64'
+
+WORD_BIG = 'big'
+WORD_SWAPPED = 'swapped'
+
+# Tipo -> (formato struct, registradores ocupados, typecode de array, dtype numpy)
+DATA_TYPES = {
+    INT16: ('h', 1, 'h', '>i2'),
+    UINT16: ('H', 1, 'H', '>u2'),
+    INT32: ('i', 2, 'i', '>i4'),
+    UINT32: ('I', 2, 'I', '>u4'),
+    FLOAT32: ('f', 2, 'f', '>f4'),
+    FLOAT64: ('d', 4, 'd', '>f8'),
+}
+
+_LITTLE_ENDIAN_HOST = sys.byteorder == 'little'
+
+# Structs pré-compilados: valor <-> bytes big endian, e words <-> bytes
+_VALUE_STRUCTS = {name: struct.Struct('>' + spec[0]) for name, spec in DATA_TYPES.items()}
+_WORD_STRUCTS = {count: struct.Struct(f'>{count}H') for count in (1, 2, 4)}
+
+
+def register_count(data_type):
+    """Quantidade de registradores de 16 bits ocupados pelo tipo"""
+    return DATA_TYPES[data_type][1]
+
+
+def _check(data_type, word_order):
+    if data_type not in DATA_TYPES:
+        raise ValueError(f"Tipo de dado inválido: {data_type}")
+    if word_order not in (WORD_BIG, WORD_SWAPPED):
+        raise ValueError(f"Ordem de words inválida: {word_order}")
+
+
+def encode(value, data_type, word_order=WORD_BIG):
+    """
+    Codifica um valor em registradores.
+
+    Returns:
+        Lista de inteiros 0..65535 pronta para write_registers
+    """
+    _check(data_type, word_order)
+    count = DATA_TYPES[data_type][1]
+    words = _WORD_STRUCTS[count].unpack(_VALUE_STRUCTS[data_type].pack(value))
+    if word_order == WORD_SWAPPED and count > 1:
+        return list(reversed(words))
+    return list(words)
+
+
+def decode(registers, data_type, word_order=WORD_BIG):
+    """Decodifica um valor a partir dos primeiros registradores da lista"""
+    _check(data_type, word_order)
+    count = DATA_TYPES[data_type][1]
+    words = registers[:count]
+    if len(words) < count:
+        raise ValueError(f"{data_type} requer {count} registradores, recebidos {len(words)}")
+    if word_order == WORD_SWAPPED and count > 1:
+        words = words[::-1]
+    return _VALUE_STRUCTS[data_type].unpack(_WORD_STRUCTS[count].pack(*words))[0]
+
+
+def _ordered_words(registers, count, word_order):
+    """Copia os registradores para um array('H') com as words na ordem big endian"""
+    words = registers if isinstance(registers, array) and registers.typecode == 'H' else array('H', registers)
+    if len(words) % count:
+        raise ValueError(f"Quantidade de registradores ({len(words)}) não é múltipla de {count}")
+    if word_order == WORD_SWAPPED and count > 1:
+        words = array('H', words)
+        # Inverte as words dentro de cada valor (atribuição de fatias em C)
+        lanes = [words[i::count] for i in range(count)]
+        for i in range(count):
+            words[i::count] = lanes[count - 1 - i]
+    return words
+
+
+def decode_array(registers, data_type, word_order=WORD_BIG, as_numpy=False):
+    """
+    Decodifica um bloco de registradores em um buffer tipado.
+
+    Args:
+        registers: lista/array de registradores (múltiplo do tamanho do tipo)
+        data_type: um dos tipos deste módulo
+        word_order: WORD_BIG ou WORD_SWAPPED
+        as_numpy: retorna numpy.ndarray (requer numpy) em vez de array.array
+
+    Returns:
+        array.array (ou ndarray) com len(registers) / register_count(data_type) valores
+    """
+    _check(data_type, word_order)
+    _, count, typecode, dtype = DATA_TYPES[data_type]
+    words = _ordered_words(registers, count, word_order)
+
+    if as_numpy and not NUMPY_AVAILABLE:
+        raise ImportError("numpy não instalado - use as_numpy=False")
+
+    # Bytes de cada word em big endian: o buffer passa a ser exatamente a
+    # sequência de valores big endian (sem tocar na lista do chamador)
+    if _LITTLE_ENDIAN_HOST:
+        if words is registers:
+            words = array('H', words)
+        words.byteswap()
+
+    if as_numpy:
+        # Visão sem cópia sobre o buffer, interpretada como dtype big endian
+        return np.frombuffer(memoryview(words), dtype=dtype)
+
+    values = array(typecode)
+    values.frombytes(memoryview(words).cast('B'))
+    if _LITTLE_ENDIAN_HOST:
+        values.byteswap()
+    return values
+
+
+def encode_array(values, data_type, word_order=WORD_BIG):
+    """Codifica uma sequência de valores em uma lista de registradores"""
+    _check(data_type, word_order)
+    _, count, typecode, _ = DATA_TYPES[data_type]
+    buffer = array(typecode, values)
+    if _LITTLE_ENDIAN_HOST:
+        buffer.byteswap()
+    words = array('H')
+    words.frombytes(memoryview(buffer).cast('B'))
+    if _LITTLE_ENDIAN_HOST:
+        words.byteswap()
+    return _ordered_words(words, count, word_order).tolist()
@@ -0,0 +1,407 @@
+"""
+Planejador de leituras e escritas Modbus em bloco
+
+Agrupa uma lista de tags (BOOL/INT/REAL ou qualquer tipo do modbus_codec) em
+poucas requisições read_coils / read_holding_registers, respeitando os limites
+do protocolo, e decodifica cada tag a partir do bloco retornado.
+
+No sentido inverso, agrupa escritas em faixas contíguas enviadas como
+Write Multiple Coils (FC15) e Write Multiple Registers (FC16).
+"""
+import struct
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+import modbus_codec
+from modbus_client import (MAX_REGISTERS_PER_READ, MAX_COILS_PER_WRITE, MAX_REGISTERS_PER_WRITE,
+                           ModbusCommunicationError, ModbusResponseError)
+
+# Limite do protocolo Modbus por requisição FC01
+MAX_COILS_PER_READ = 2000
+
+# Lacuna máxima (endereços não usados) que ainda vale a pena ler junto
+DEFAULT_COIL_GAP = 100
+DEFAULT_REGISTER_GAP = 10
+
+# Tipo de tag -> (tabela Modbus, quantidade de endereços ocupados)
+TAG_TYPES = {
+    'bool': ('coil', 1),
+    'int': ('hr', 1),
+    'real': ('hr', 2),
+}
+TAG_TYPES.update({name: ('hr', modbus_codec.register_count(name)) for name in modbus_codec.DATA_TYPES})
+
+# Apelidos usados pela interface web -> tipo do codec
+_CODEC_ALIASES = {'int': modbus_codec.INT16, 'real': modbus_codec.FLOAT32}
+
+
+class ReadBlock:
+    """Uma requisição de leitura contígua e as tags que ela cobre"""
+
+    def __init__(self, table, start, end, tags):
+        self.table = table
+        self.start = start
+        self.end = end  # Exclusivo
+        self.tags = tags
+
+    @property
+    def count(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"ReadBlock({self.table}, start={self.start}, count={self.count}, tags={len(self.tags)})"
+
+
+def plan_reads(tags, max_coil_gap=DEFAULT_COIL_GAP, max_register_gap=DEFAULT_REGISTER_GAP):
+    """
+    Agrupa tags em blocos de leitura.
+
+    Args:
+        tags: lista de dicts {'name', 'type', 'address'} ('word_order' opcional)
+        max_coil_gap: coils não usadas toleradas entre duas tags do mesmo bloco
+        max_register_gap: registradores não usados tolerados entre duas tags
+
+    Returns:
+        Lista de ReadBlock ordenada por tabela e endereço
+    """
+    limits = {
+        'coil': (MAX_COILS_PER_READ, max_coil_gap),
+        'hr': (MAX_REGISTERS_PER_READ, max_register_gap),
+    }
+
+    by_table = {}
+    for tag in tags:
+        if tag['type'] not in TAG_TYPES:
+            raise ValueError(f"Tipo de tag inválido: {tag['type']}")
+        table, size = TAG_TYPES[tag['type']]
+        by_table.setdefault(table, []).append((tag['address'], tag['address'] + size, tag))
+
+    blocks = []
+    for table in sorted(by_table):
+        max_count, max_gap = limits[table]
+        current = None
+
+        for start, end, tag in sorted(by_table[table], key=lambda item: (item[0], item[1])):
+            if current is not None:
+                gap = start - current.end
+                new_end = max(current.end, end)
+                if gap <= max_gap and new_end - current.start <= max_count:
+                    current.end = new_end
+                    current.tags.append(tag)
+                    continue
+                blocks.append(current)
+            current = ReadBlock(table, start, end, [tag])
+
+        if current is not None:
+            blocks.append(current)
+
+    return blocks
+
+
+class ReadPlanner:
+    """Lê um conjunto de tags do CLP com o mínimo de round trips"""
+
+    def __init__(self, clp, max_coil_gap=DEFAULT_COIL_GAP, max_register_gap=DEFAULT_REGISTER_GAP):
+        """
+        Args:
+            clp: instância conectada de ModbusCLP
+            max_coil_gap: lacuna máxima de coils preenchida entre tags
+            max_register_gap: lacuna máxima de registradores preenchida entre tags
+        """
+        self.clp = clp
+        self.max_coil_gap = max_coil_gap
+        self.max_register_gap = max_register_gap
+        self.last_round_trips = 0
+
+    def plan(self, tags):
+        """Retorna os blocos que seriam lidos para estas tags"""
+        return plan_reads(tags, self.max_coil_gap, self.max_register_gap)
+
+    def read(self, tags):
+        """
+        Lê todas as tags.
+
+        Returns:
+            (values, errors): dicts nome -> valor e nome -> mensagem de erro
+
+        Exceptions Modbus do CLP viram erros por tag; falhas de comunicação
+        são propagadas (não adianta insistir tag a tag num CLP que não responde).
+        """
+        values = {}
+        errors = {}
+        self.last_round_trips = 0
+
+        for block in self.plan(tags):
+            try:
+                data = self._read_block(block.table, block.start, block.count)
+            except ModbusResponseError as e:
+                if len(block.tags) == 1:
+                    errors[block.tags[0]['name']] = str(e)
+                    continue
+                # Lacunas podem conter endereços inválidos no CLP:
+                # tentar as tags individualmente antes de desistir
+                self._read_individually(block, values, errors)
+                continue
+
+            for tag in block.tags:
+                offset = tag['address'] - block.start
+                values[tag['name']] = self._decode(tag, data, offset)
+
+        return values, errors
+
+    def _read_individually(self, block, values, errors):
+        for tag in block.tags:
+            table, size = TAG_TYPES[tag['type']]
+            try:
+                data = self._read_block(table, tag['address'], size)
+                values[tag['name']] = self._decode(tag, data, 0)
+            except ModbusResponseError as e:
+                errors[tag['name']] = str(e)
+
+    def _read_block(self, table, start, count):
+        self.last_round_trips += 1
+        if table == 'coil':
+            return self.clp.read_coil_block(start, count)
+        return self.clp.read_register_block(start, count)
+
+    def _decode(self, tag, data, offset):
+        if tag['type'] == 'bool':
+            return bool(data[offset])
+        data_type = _CODEC_ALIASES.get(tag['type'], tag['type'])
+        size = modbus_codec.register_count(data_type)
+        word_order = tag.get('word_order', modbus_codec.WORD_BIG)
+        return modbus_codec.decode(data[offset:offset + size], data_type, word_order)
+
+
+class WriteBlock:
+    """Uma requisição de escrita contígua (FC15/FC16) e as escritas que ela cobre"""
+
+    def __init__(self, table, start, values, writes):
+        self.table = table
+        self.start = start
+        self.values = values  # bools (coil) ou words (hr)
+        self.writes = writes
+
+    @property
+    def count(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return f"WriteBlock({self.table}, start={self.start}, count={self.count}, writes={len(self.writes)})"
+
+
+def _encode_write(write):
+    """
+    Converte uma escrita {'type', 'value'} nos bits/words a enviar.
+    Levanta ValueError (com a tag) se o valor não couber no tipo, ex.: 40000 em um INT16.
+    """
+    if write['type'] == 'bool':
+        return [bool(write['value'])]
+    data_type = _CODEC_ALIASES.get(write['type'], write['type'])
+    try:
+        if data_type in (modbus_codec.FLOAT32, modbus_codec.FLOAT64):
+            value = float(write['value'])
+        else:
+            value = int(write['value'])
+        return modbus_codec.encode(value, data_type, write.get('word_order', modbus_codec.WORD_BIG))
+    except (struct.error, TypeError, OverflowError, ValueError) as e:
+        tag = f" ({write['name']})" if write.get('name') is not None else ''
+        raise ValueError(f"Valor inválido para {write['type']} no endereço {write['address']}{tag}: "
+                         f"{write['value']!r} ({e})") from e
+
+
+def plan_writes(writes):
+    """
+    Agrupa escritas em blocos contíguos.
+
+    Escritas não podem preencher lacunas (sobrescreveriam endereços não
+    pedidos), então só endereços adjacentes são unidos. Registradores vêm
+    antes das coils: setpoints e modo chegam ao CLP antes dos comandos.
+
+    Args:
+        writes: lista de dicts {'type', 'address', 'value'} ('name', 'word_order' opcionais)
+
+    Returns:
+        Lista de WriteBlock
+    """
+    limits = {'coil': MAX_COILS_PER_WRITE, 'hr': MAX_REGISTERS_PER_WRITE}
+
+    by_table = {}
+    for write in writes:
+        if write['type'] not in TAG_TYPES:
+            raise ValueError(f"Tipo de tag inválido: {write['type']}")
+        table, _ = TAG_TYPES[write['type']]
+        by_table.setdefault(table, []).append((write['address'], _encode_write(write), write))
+
+    blocks = []
+    for table in ('hr', 'coil'):
+        current = None
+        last_end = None
+
+        for start, values, write in sorted(by_table.get(table, []), key=lambda item: item[0]):
+            if last_end is not None and start < last_end:
+                raise ValueError(f"Escritas sobrepostas em {table} {start}")
+            if current is not None and start == last_end and current.count + len(values) <= limits[table]:
+                current.values.extend(values)
+                current.writes.append(write)
+            else:
+                if current is not None:
+                    blocks.append(current)
+                current = WriteBlock(table, start, list(values), [write])
+            last_end = start + len(values)
+
+        if current is not None:
+            blocks.append(current)
+
+    return blocks
+
+
+class WritePlanner:
+    """Escreve um conjunto de tags no CLP com o mínimo de round trips"""
+
+    def __init__(self, clp):
+        """
+        Args:
+            clp: instância conectada de ModbusCLP
+        """
+        self.clp = clp
+
+    def plan(self, writes):
+        """Retorna os blocos que seriam escritos"""
+        return plan_writes(writes)
+
+    def write(self, writes, verify=False):
+        """
+        Escreve todas as tags.
+
+        Args:
+            writes: lista de escritas (ver plan_writes)
+            verify: relê cada bloco após escrever tudo e compara com o enviado
+
+        Returns:
+            {'round_trips', 'blocks', 'verified', 'mismatches': [{'name', 'type', 'address', 'expected', 'actual'}]}
+        """
+        blocks = self.plan(writes)
+        round_trips = 0
+
+        for index, block in enumerate(blocks):
+            try:
+                self.write_block(block)
+                round_trips += 1
+            except Exception as e:
+                # Mantém a classe da falha: comunicação (o pool descarta o socket por ela) ou
+                # rejeição do CLP (resposta de exceção, ex.: endereço ilegal)
+                if isinstance(e, (ModbusCommunicationError, ModbusResponseError)):
+                    error_class = type(e)
+                elif isinstance(e, (ConnectionException, ModbusIOException, OSError)):
+                    error_class = ModbusCommunicationError
+                else:
+                    error_class = Exception
+                raise error_class(f"Falha no bloco {index + 1}/{len(blocks)} {block} "
+                                  f"({index} blocos já escritos): {e}") from e
+
+        mismatches = []
+        if verify:
+            for block in blocks:
+                if block.table == 'coil':
+                    actual = self.clp.read_coil_block(block.start, block.count)
+                else:
+                    actual = self.clp.read_register_block(block.start, block.count)
+                round_trips += 1
+                mismatches.extend(self._compare(block, actual))
+
+        return {
+            'round_trips': round_trips,
+            'blocks': len(blocks),
+            'verified': (not mismatches) if verify else None,
+            'mismatches': mismatches,
+        }
+
+    def write_block(self, block):
+        """Envia um WriteBlock em uma requisição FC15/FC16"""
+        if block.table == 'coil':
+            self.clp.write_coil_block(block.start, block.values)
+        else:
+            self.clp.write_register_block(block.start, block.values)
+
+    def _compare(self, block, actual):
+        mismatches = []
+        for write in block.writes:
+            offset = write['address'] - block.start
+            size = TAG_TYPES[write['type']][1]
+            if list(actual[offset:offset + size]) == list(block.values[offset:offset + size]):
+                continue
+            if write['type'] == 'bool':
+                read_value = bool(actual[offset])
+            else:
+                read_value = self._decode_value(write, actual[offset:offset + size])
+            mismatches.append({
+                'name': write.get('name'),
+                'type': write['type'],
+                'address': write['address'],
+                'expected': write['value'],
+                'actual': read_value,
+            })
+        return mismatches
+
+    @staticmethod
+    def _decode_value(write, registers):
+        data_type = _CODEC_ALIASES.get(write['type'], write['type'])
+        return modbus_codec.decode(registers, data_type, write.get('word_order', modbus_codec.WORD_BIG))
+
+
+def run_batch(clp, operations):
+    """
+    Executa uma lista mista de leituras e escritas em uma única passada planejada.
+
+    Todas as escritas vão primeiro (agrupadas como em WritePlanner, parando no
+    primeiro bloco recusado pelo CLP) e depois todas as leituras (agrupadas
+    como em ReadPlanner), então as leituras já enxergam os valores escritos.
+    Exceptions Modbus viram erros por operação; falhas de comunicação são propagadas.
+
+    Args:
+        clp: instância conectada de ModbusCLP
+        operations: lista de dicts {'op': 'read'|'write', 'type', 'address'} ('value' nas escritas)
+
+    Returns:
+        (results, round_trips): results na mesma ordem de operations, cada um
+        {'success': bool, 'value': ...} ou {'success': False, 'error': ...}
+    """
+    results = [None] * len(operations)
+    reads = []
+    writes = []
+    for index, operation in enumerate(operations):
+        if operation['op'] == 'write':
+            writes.append({**operation, 'name': index})
+        else:
+            reads.append({'name': index, 'type': operation['type'], 'address': operation['address'],
+                          'word_order': operation.get('word_order', modbus_codec.WORD_BIG)})
+
+    write_planner = WritePlanner(clp)
+    round_trips = 0
+    failed_block = None
+    for block in write_planner.plan(writes):
+        if failed_block is None:
+            try:
+                write_planner.write_block(block)
+                round_trips += 1
+            except ModbusResponseError as e:
+                failed_block = str(e)
+                for write in block.writes:
+                    results[write['name']] = {'success': False, 'error': failed_block}
+                continue
+            for write in block.writes:
+                results[write['name']] = {'success': True, 'value': write['value']}
+        else:
+            for write in block.writes:
+                results[write['name']] = {'success': False,
+                                          'error': f"Não executada: escrita anterior falhou ({failed_block})"}
+
+    read_planner = ReadPlanner(clp)
+    values, errors = read_planner.read(reads)
+    round_trips += read_planner.last_round_trips
+    for read in reads:
+        if read['name'] in values:
+            results[read['name']] = {'success': True, 'value': values[read['name']]}
+        else:
+            results[read['name']] = {'success': False, 'error': errors.get(read['name'], 'Leitura não realizada')}
+
+    return results, round_trips
@@ -0,0 +1,286 @@
+"""
+Serviço de varredura concorrente de vários CLPs
+
+Cada CLP da lista tem seu próprio intervalo, timeout e backoff. As varreduras
+rodam em um pool de threads limitado, então um CLP lento ou desligado nunca
+atrasa os saudáveis: enquanto ele espera o timeout, os outros continuam sendo
+lidos no seu ritmo.
+
+As leituras passam pela fila de comandos de cada CLP com prioridade de
+background e prazo de um intervalo: comandos e leituras de operadores vão
+na frente, e uma varredura que não começou a tempo é descartada.
+
+Uso (linha de comando):
+    python plc_poller.py devices.json
+
+Formato do devices.json:
+    [
+      {"name": "linha1", "ip": "192.168.0.200", "interval": 1.0, "timeout": 2,
+       "tags": [{"name": "PC_Temp", "type": "real", "address": 1}]}
+    ]
+"""
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from command_queue import get_command_queue, PRIORITY_BACKGROUND
+from modbus_planner import ReadPlanner
+
+
+class PLCDevice:
+    """Configuração de um CLP a ser varrido"""
+
+    def __init__(self, name, ip, tags, port=502, unit_id=0, interval=1.0, timeout=3,
+                 backoff_initial=1.0, backoff_max=60.0):
+        """
+        Args:
+            name: Nome único do CLP
+            ip, port, unit_id: Endereço Modbus TCP
+            tags: Lista de tags {'name', 'type', 'address'} (ver modbus_planner)
+            interval: Período de varredura em segundos
+            timeout: Timeout Modbus deste CLP em segundos
+            backoff_initial: Espera após a primeira falha consecutiva
+            backoff_max: Espera máxima entre tentativas de um CLP com falha
+        """
+        self.name = name
+        self.ip = ip
+        self.port = port
+        self.unit_id = unit_id
+        self.tags = tags
+        self.interval = interval
+        self.timeout = timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class DeviceState:
+    """Agenda, últimos valores e estatísticas de varredura de um CLP"""
+
+    def __init__(self, device):
+        self.device = device
+        self.next_due = time.monotonic()
+        self.busy = False
+        self.values = {}
+        self.errors = {}
+        self.last_success = None  # time.time()
+        self.scans = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.last_scan = 0.0
+        self.max_scan = 0.0
+        self.total_scan = 0.0
+        self.last_error = None
+
+
+class PLCPoller:
+    """Varre uma lista de CLPs em paralelo, cada um no seu próprio ritmo"""
+
+    def __init__(self, devices, max_workers=8, on_scan=None):
+        """
+        Args:
+            devices: Lista de PLCDevice
+            max_workers: Máximo de varreduras simultâneas (threads)
+            on_scan: Callback opcional on_scan(device, values, errors) após cada varredura
+        """
+        names = [device.name for device in devices]
+        if len(names) != len(set(names)):
+            raise ValueError("Nomes de CLP duplicados na lista de dispositivos")
+
+        self.max_workers = max_workers
+        self.on_scan = on_scan
+        self._states = {device.name: DeviceState(device) for device in devices}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._executor = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Inicia a varredura em background"""
+        if self.running:
+            print("[POLLER] Já está rodando")
+            return
+
+        self.running = True
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='plc-poller')
+        self.thread = threading.Thread(target=self._schedule_loop, daemon=True)
+        self.thread.start()
+        print(f"[POLLER] Varredura iniciada ({len(self._states)} CLPs, {self.max_workers} workers)")
+
+    def stop(self):
+        """Para a varredura e aguarda as leituras em andamento"""
+        self.running = False
+        self._wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+        if self._executor:
+            self._executor.shutdown(wait=True)
+        print("[POLLER] Varredura parada")
+
+    def _schedule_loop(self):
+        """Dispara cada CLP quando vence o seu prazo; nunca espera por um CLP lento"""
+        while self.running:
+            now = time.monotonic()
+            next_wakeup = now + 1.0
+
+            with self._lock:
+                for state in self._states.values():
+                    if state.next_due <= now:
+                        if state.busy:
+                            # Varredura anterior ainda em andamento: tick perdido
+                            state.skipped += 1
+                            state.next_due += state.device.interval
+                            continue
+                        state.busy = True
+                        state.next_due += state.device.interval
+                        self._executor.submit(self._scan, state)
+                    else:
+                        next_wakeup = min(next_wakeup, state.next_due)
+
+            self._wakeup.wait(max(0.0, next_wakeup - time.monotonic()))
+            self._wakeup.clear()
+
+    def _scan(self, state):
+        device = state.device
+        start = time.monotonic()
+
+        try:
+            tags = device.tags
+            queue = get_command_queue(device.ip, device.port, device.unit_id)
+            values, errors = queue.call(lambda clp: ReadPlanner(clp).read(tags), PRIORITY_BACKGROUND,
+                                        deadline=device.interval, timeout=device.timeout)
+            if tags and not values:
+                raise Exception(next(iter(errors.values()), "Nenhuma tag lida"))
+            failed = False
+        except Exception as e:
+            values, errors = {}, {}
+            failed = True
+            error = str(e)
+
+        duration = time.monotonic() - start
+
+        with self._lock:
+            state.scans += 1
+            state.last_scan = duration
+            state.max_scan = max(state.max_scan, duration)
+            state.total_scan += duration
+
+            if failed:
+                state.failures += 1
+                state.consecutive_failures += 1
+                state.last_error = error
+                backoff = min(device.backoff_initial * (2 ** (state.consecutive_failures - 1)), device.backoff_max)
+                state.next_due = time.monotonic() + max(backoff, device.interval)
+            else:
+                state.values = values
+                state.errors = errors
+                state.last_success = time.time()
+                state.consecutive_failures = 0
+                state.last_error = None
+                if duration > device.interval:
+                    state.overruns += 1
+                # Mantém a grade de horários; se atrasou, não dispara rajadas para compensar
+                if state.next_due < time.monotonic():
+                    state.next_due = time.monotonic()
+            state.busy = False
+
+        self._wakeup.set()
+
+        if self.on_scan and not failed:
+            try:
+                self.on_scan(device, values, errors)
+            except Exception as e:
+                print(f"[POLLER] Erro no callback de {device.name}: {e}")
+
+        if failed and state.consecutive_failures == 1:
+            print(f"[POLLER] ⚠️ {device.name} ({device.ip}) falhou: {error}")
+
+    def add_tag(self, name, tag):
+        """Inclui uma tag na varredura de um CLP. Retorna False se ela já estava na lista."""
+        with self._lock:
+            device = self._states[name].device
+            if any(existing['name'] == tag['name'] for existing in device.tags):
+                return False
+            # Nova lista em vez de append: uma varredura em andamento continua com a antiga
+            device.tags = device.tags + [tag]
+        return True
+
+    def remove_tag(self, name, tag_name):
+        """Tira uma tag da varredura de um CLP. Retorna False se ela não estava na lista."""
+        with self._lock:
+            state = self._states[name]
+            tags = [tag for tag in state.device.tags if tag['name'] != tag_name]
+            if len(tags) == len(state.device.tags):
+                return False
+            state.device.tags = tags
+            state.values.pop(tag_name, None)
+            state.errors.pop(tag_name, None)
+        return True
+
+    def get_values(self, name):
+        """Últimos valores lidos de um CLP: (values, errors, timestamp da última leitura)"""
+        with self._lock:
+            state = self._states[name]
+            return dict(state.values), dict(state.errors), state.last_success
+
+    def stats(self):
+        """Estatísticas de varredura por CLP"""
+        result = {}
+        with self._lock:
+            for name, state in self._states.items():
+                successes = state.scans - state.failures
+                result[name] = {
+                    'ip': state.device.ip,
+                    'interval': state.device.interval,
+                    'scans': state.scans,
+                    'failures': state.failures,
+                    'consecutive_failures': state.consecutive_failures,
+                    'overruns': state.overruns,
+                    'skipped_ticks': state.skipped,
+                    'last_scan_ms': round(state.last_scan * 1000, 2),
+                    'avg_scan_ms': round(state.total_scan / state.scans * 1000, 2) if state.scans else 0,
+                    'max_scan_ms': round(state.max_scan * 1000, 2),
+                    'success_rate': round(successes / state.scans, 3) if state.scans else None,
+                    'last_success': state.last_success,
+                    'last_error': state.last_error,
+                }
+        return result
+
+
+def load_devices(path):
+    """Carrega a lista de CLPs de um arquivo JSON"""
+    with open(path, encoding='utf-8') as f:
+        return [PLCDevice.from_dict(item) for item in json.load(f)]
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Uso: python plc_poller.py devices.json")
+        sys.exit(1)
+
+    poller = PLCPoller(load_devices(sys.argv[1]))
+    poller.start()
+
+    try:
+        while True:
+            time.sleep(5)
+            print("-" * 60)
+            for name, stats in poller.stats().items():
+                status = 'OK' if not stats['consecutive_failures'] else f"FALHA: {stats['last_error']}"
+                print(f"{name:<15} scans={stats['scans']:<6} avg={stats['avg_scan_ms']:>7.2f}ms "
+                      f"max={stats['max_scan_ms']:>7.2f}ms overruns={stats['overruns']} {status}")
+    except KeyboardInterrupt:
+        print("\nEncerrando...")
+    finally:
+        poller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Backend compartilhado pelas interfaces web
+
+Antes, web_app.py e web_server.py montavam cada um o seu pool, tabela de
+valores, poller e stream, e web_app.py iniciava a thread de status e o
+coletor de temperatura ao ser importado: abrir as duas interfaces dobrava
+a carga no CLP. Aqui existe uma única instância por processo, criada por
+app_factory.create_app e guardada em app.extensions['plc_services'].
+
+Nada roda em background até start() ser chamado explicitamente.
+"""
+import threading
+import time
+from flask import current_app
+from command_queue import get_command_queue, PRIORITY_COMMAND, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from connection_pool import get_pool, PLCUnavailableError
+from event_stream import EventBroker
+from plc_poller import PLCDevice, PLCPoller
+from response_cache import ResponseCache
+from tag_cache import TagCache
+from temperature_monitor import TemperatureCollector
+
+LIVE_READERS = {
+    'bool': lambda conn, address: conn.read_bool(address),
+    'int': lambda conn, address: conn.read_int(address),
+    'real': lambda conn, address: conn.read_real(address),
+}
+
+# Intervalo da verificação de conexão exibida em /api/status
+STATUS_INTERVAL = 5
+
+# Segundos sem leitura após os quais uma tag avulsa lida pela API (sem stream) sai da varredura
+WATCH_IDLE = 300
+
+
+def tag_name(tag_type, address):
+    return f'{tag_type}:{address}'
+
+
+class PLCServices:
+    """Pool, fila de comandos, tabela de valores, stream e coletor de um CLP"""
+
+    def __init__(self, config):
+        """
+        Args:
+            config: Configuração do app (ver app_factory.DEFAULT_CONFIG)
+        """
+        self.ip = config['PLC_IP']
+        self.port = config['PLC_PORT']
+        self.variables = config['VARIABLES']
+        self.interactive_deadline = config['INTERACTIVE_DEADLINE']
+        # Tags avulsas 'tipo:endereço' na varredura, além das variáveis configuradas:
+        # streams abertos por tag e último acesso pela API de leitura (ver watch_tags)
+        self.max_watched_tags = config['MAX_WATCHED_TAGS']
+        self._watchers = {}
+        self._watch_reads = {}
+        self._watch_lock = threading.Lock()
+        self.pool = get_pool()
+
+        # Tabela de valores atuais: um único poller varre as variáveis configuradas
+        # e as tags já consultadas; as leituras da API respondem daqui (ver read_tag)
+        scan_interval = config['SCAN_INTERVAL']
+        self.event_broker = EventBroker(heartbeat=15)
+        self.tag_cache = TagCache(stale_after=3 * scan_interval,
+                                  on_change=lambda changes: self.event_broker.publish('tags', changes))
+        self.event_broker.snapshot = self.tag_cache.snapshot
+        self.plc_device = PLCDevice('clp', self.ip, port=self.port, interval=scan_interval, tags=[
+            {'name': var['name'], 'type': var_type, 'address': var['address']}
+            for var_type, variables in self.variables.items()
+            for var in variables
+        ])
+        self.tag_poller = PLCPoller([self.plc_device], max_workers=1, on_scan=self.tag_cache.on_scan)
+
+        self.temp_collector = TemperatureCollector(
+            plc_ip=self.ip, plc_port=self.port,
+            hr_address=config['TEMPERATURE_HR'], interval=config['TEMPERATURE_INTERVAL'],
+            on_sample=lambda reading: self.event_broker.publish('temperature', reading),
+            db_path=config['TEMPERATURE_DB'], synchronous=config['SQLITE_SYNCHRONOUS'],
+            buffer_size=config['TEMPERATURE_BUFFER'], catch_up=config['TEMPERATURE_CATCH_UP'],
+            detectors=config['ANOMALY_DETECTORS'])
+        # Respostas serializadas de /history e /stats compartilhadas entre clientes
+        self.history_cache = ResponseCache(max_entries=64)
+        self._ai_analyzer = None
+
+        # Estado de conexão (para display apenas)
+        self.connection_status = {
+            'connected': False,
+            'last_check': None,
+            'error': None
+        }
+        self._stop = threading.Event()
+        self._status_thread = None
+        self._stale_thread = None
+        self._scan_interval = scan_interval
+        self.collect_temperature = config['COLLECT_TEMPERATURE']
+        self.running = False
+
+    @property
+    def ai_analyzer(self):
+        """Criado no primeiro uso: a configuração dos provedores de IA não atrasa a partida"""
+        if self._ai_analyzer is None:
+            from ai_analyzer import TemperatureAIAnalyzer
+            self._ai_analyzer = TemperatureAIAnalyzer()  # Usa GEMINI_API_KEY do ambiente, se disponível
+        return self._ai_analyzer
+
+    # ------------------------------------------------------------ ciclo de vida
+
+    def start(self):
+        """Inicia verificação de status, varredura e coleta de temperatura"""
+        if self.running:
+            return
+        self.running = True
+        self._stop.clear()
+        self._status_thread = threading.Thread(target=self._check_connection_status, daemon=True)
+        self._status_thread.start()
+        self._stale_thread = threading.Thread(target=self._tag_maintenance, daemon=True)
+        self._stale_thread.start()
+        self.tag_poller.start()
+        if self.collect_temperature:
+            self.temp_collector.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self._stop.set()
+        self.temp_collector.stop()  # Também grava as amostras ainda na fila
+        self.tag_poller.stop()
+        if self._status_thread:
+            self._status_thread.join(timeout=STATUS_INTERVAL)
+        if self._stale_thread:
+            self._stale_thread.join(timeout=STATUS_INTERVAL)
+
+    def set_target(self, ip, port):
+        """Aponta tudo para outro CLP; valores do CLP anterior são descartados"""
+        # Fecha conexões ociosas com o CLP anterior
+        self.pool.close(self.ip, self.port)
+        self.ip = ip
+        self.port = port
+        # A próxima varredura e a próxima amostra já usam o novo endereço
+        self.plc_device.ip = ip
+        self.plc_device.port = port
+        self.temp_collector.plc_ip = ip
+        self.temp_collector.plc_port = port
+        self.tag_cache.clear()
+
+    def _check_connection_status(self):
+        """Thread separada apenas para verificar se CLP está acessível"""
+        while not self._stop.is_set():
+            try:
+                # Prioridade mais baixa: nunca atrasa comandos nem leituras do operador
+                self.command_queue().call(lambda conn: True, PRIORITY_BACKGROUND, deadline=5)
+                self.connection_status['connected'] = True
+                self.connection_status['error'] = None
+                self.connection_status['last_check'] = time.time()
+            except Exception as e:
+                self.connection_status['connected'] = False
+                self.connection_status['error'] = str(e)
+
+            self._stop.wait(STATUS_INTERVAL)
+
+    def _tag_maintenance(self):
+        """
+        Publica good -> stale das tags que a varredura parou de atualizar (CLP fora, poller
+        parado) e tira da varredura as tags avulsas sem stream e sem leitura há WATCH_IDLE s.
+        """
+        while not self._stop.wait(self._scan_interval):
+            self.tag_cache.check_stale()
+            self._expire_watches()
+
+    # ------------------------------------------------------------ acesso ao CLP
+
+    def command_queue(self):
+        return get_command_queue(self.ip, self.port)
+
+    def run_on_plc(self, operation, priority=PRIORITY_INTERACTIVE, deadline=None):
+        """Executa operation(clp) na fila de comandos do CLP e retorna o resultado.
+        Escritas usam PRIORITY_COMMAND e passam à frente de leituras e varreduras.
+        Com o circuito do CLP aberto falha na hora, sem entrar na fila. Após falha de
+        comunicação a fila tenta uma vez mais com uma conexão nova.
+        Levanta PLCUnavailableError se não for possível conectar ou o prazo expirar.
+        """
+        try:
+            return self.command_queue().call(operation, priority, deadline)
+        except PLCUnavailableError as e:
+            self.connection_status['connected'] = False
+            self.connection_status['error'] = str(e)
+            raise
+
+    def read_live(self, tag_type, address):
+        """Leitura interativa direta no CLP (sem passar pela tabela de valores)"""
+        return self.run_on_plc(lambda conn: LIVE_READERS[tag_type](conn, address),
+                               PRIORITY_INTERACTIVE, self.interactive_deadline)
+
+    def write(self, tag_type, address, value):
+        """Escreve com prioridade de comando e invalida a tag na tabela de valores"""
+        writers = {
+            'bool': lambda conn: conn.write_bool(address, value),
+            'int': lambda conn: conn.write_int(address, value),
+            'real': lambda conn: conn.write_real(address, value),
+        }
+        self.run_on_plc(writers[tag_type], PRIORITY_COMMAND)
+        self.invalidate(tag_type, address)
+
+    def invalidate(self, tag_type, address):
+        """Descarta a tag 'tipo:endereço' e a variável configurada no mesmo endereço"""
+        self.tag_cache.invalidate(tag_name(tag_type, address))
+        for var in self.variables.get(tag_type, []):
+            if var['address'] == address:
+                self.tag_cache.invalidate(var['name'])
+
+    def read_tag(self, tag_type, address, max_age_ms=None):
+        """Lê uma tag da tabela de valores atuais.
+        Lê ao vivo (e passa a varrer a tag) se ela ainda não está na tabela, não
+        está com qualidade good ou é mais velha que max_age_ms.
+        Retorna a entrada da tabela com 'source' = 'cache' ou 'live'.
+        """
+        name = tag_name(tag_type, address)
+        entry = self.tag_cache.get(name, max_age_ms)
+        if entry is not None:
+            self.watch_tag(name)
+            return {**entry, 'source': 'cache'}
+
+        value = self.read_live(tag_type, address)
+        timestamp = time.time()
+        self.tag_cache.update({name: value}, timestamp=timestamp)
+        self.watch_tag(name)
+        return {'value': value, 'timestamp': timestamp, 'quality': 'good', 'error': None,
+                'age_ms': 0.0, 'source': 'live'}
+
+    @staticmethod
+    def _parse_tag(name):
+        """'tipo:endereço' -> (tipo, endereço), ou None se não estiver nesse formato"""
+        tag_type, _, address = name.partition(':')
+        if tag_type in LIVE_READERS and address.isdigit():
+            return tag_type, int(address)
+        return None
+
+    def _scan_tag(self, name):
+        tag_type, address = self._parse_tag(name)
+        self.tag_poller.add_tag('clp', {'name': name, 'type': tag_type, 'address': address})
+
+    def _unscan_tag(self, name):
+        self.tag_poller.remove_tag('clp', name)
+        self.tag_cache.invalidate(name)
+
+    def watch_tag(self, name):
+        """
+        Mantém na varredura uma tag 'tipo:endereço' lida pela API (ex.: 'real:1'), enquanto
+        ela continuar sendo lida. Acima de MAX_WATCHED_TAGS a leitura segue ao vivo, sem varredura.
+        """
+        if self._parse_tag(name) is None:
+            return
+        with self._watch_lock:
+            if name not in self._watchers and name not in self._watch_reads:
+                if len(self._watchers.keys() | self._watch_reads.keys()) >= self.max_watched_tags:
+                    return
+                self._scan_tag(name)
+            self._watch_reads[name] = time.monotonic()
+
+    def watch_tags(self, tags):
+        """
+        Inclui na varredura as tags pedidas por um cliente do stream; desfazer com
+        unwatch_tags(retorno) quando o cliente desconectar.
+        Aceita nomes de variáveis configuradas (já varridas) e 'tipo:endereço'.
+        Levanta ValueError para nomes desconhecidos ou acima de MAX_WATCHED_TAGS tags avulsas.
+        """
+        configured = {var['name'] for variables in self.variables.values() for var in variables}
+        unknown = [name for name in tags if name not in configured and self._parse_tag(name) is None]
+        if unknown:
+            raise ValueError(f"Tags desconhecidas: {', '.join(unknown)} "
+                             f"(use o nome de uma variável ou 'tipo:endereço', ex.: real:1)")
+        names = sorted({name for name in tags if name not in configured})
+        with self._watch_lock:
+            watched = self._watchers.keys() | self._watch_reads.keys()
+            if len(watched | set(names)) > self.max_watched_tags:
+                raise ValueError(f"Máximo de {self.max_watched_tags} tags avulsas na varredura")
+            for name in names:
+                if name not in watched:
+                    self._scan_tag(name)
+                self._watchers[name] = self._watchers.get(name, 0) + 1
+        return names
+
+    def unwatch_tags(self, names):
+        """Libera as tags de um stream encerrado; sem outro stream nem leitura recente, saem da varredura"""
+        with self._watch_lock:
+            for name in names:
+                count = self._watchers.get(name, 0) - 1
+                if count > 0:
+                    self._watchers[name] = count
+                    continue
+                self._watchers.pop(name, None)
+                if name not in self._watch_reads:
+                    self._unscan_tag(name)
+
+    def _expire_watches(self):
+        limit = time.monotonic() - WATCH_IDLE
+        with self._watch_lock:
+            for name, last_read in list(self._watch_reads.items()):
+                if last_read < limit:
+                    del self._watch_reads[name]
+                    if name not in self._watchers:
+                        self._unscan_tag(name)
+
+    def status(self):
+        return {
+            **self.connection_status,
+            'circuit': self.pool.circuit_state(self.ip, self.port),
+            'queue': self.command_queue().stats(),
+            'storage': self.temp_collector.storage_stats(),
+            'sampling': self.temp_collector.sampling_stats(),
+        }
+
+
+def current_services():
+    """PLCServices do app Flask da requisição atual"""
+    return current_app.extensions['plc_services']
@@ -0,0 +1,142 @@
+"""
+Cache de respostas JSON com ETag para os endpoints de histórico
+
+Vários painéis consultam a mesma janela (/history?limit=200, /stats?hours=24)
+e, entre duas leituras do coletor, a resposta é sempre a mesma. O ETag é
+derivado do id da leitura mais recente e dos parâmetros da consulta:
+  - se o navegador já tem essa versão (If-None-Match), responde 304 sem corpo;
+  - senão, o JSON já serializado sai de um LRU compartilhado entre clientes,
+    e só o primeiro pedido de cada versão consulta o SQLite.
+
+Corpos grandes saem comprimidos (brotli se o pacote estiver instalado, senão
+gzip) conforme Accept-Encoding; cada codificação é uma representação com ETag
+própria e também fica no LRU, então a compressão roda uma vez por versão.
+"""
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from flask import Response, request
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024
+
+
+class ResponseCache:
+    """LRU de corpos serializados (body, content_encoding) indexados pelo ETag"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, etag):
+        with self._lock:
+            body = self._entries.get(etag)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return body
+
+    def put(self, etag, body):
+        with self._lock:
+            self._entries[etag] = body
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+            }
+
+
+def negotiate_encoding():
+    """Content-Encoding aceito pelo cliente da requisição atual ('br', 'gzip' ou None)"""
+    accepted = request.accept_encodings
+    if BROTLI_AVAILABLE and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def conditional_json(cache, etag, build):
+    """
+    Resposta JSON com ETag forte para a requisição Flask atual.
+
+    Args:
+        cache: ResponseCache compartilhado
+        etag: Identificador da versão (sem aspas), ex.: 'history-1532-200'
+        build: Função sem argumentos que retorna o objeto a serializar, ou None
+               para 404 (chamada apenas se a versão não estiver no cache)
+    """
+    def build_body():
+        data = build()
+        return None if data is None else json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+    return conditional_response(cache, etag, build_body, 'application/json')
+
+
+def conditional_response(cache, etag, build, mimetype, vary=None):
+    """
+    Como conditional_json, mas `build` já retorna os bytes do corpo (ou None).
+
+    Args:
+        mimetype: Content-Type da representação
+        vary: Cabeçalhos da requisição que escolheram a representação (ex.: 'Accept')
+    """
+    encoding = negotiate_encoding()
+    if encoding:
+        etag = f'{etag}-{encoding}'
+
+    if etag in request.if_none_match:
+        cache.count_not_modified()
+        response = Response(status=304)
+    else:
+        entry = cache.get(etag)
+        if entry is None:
+            body = build()
+            if body is None:
+                return None
+            # Corpos pequenos não compensam: saem sem Content-Encoding
+            if encoding and len(body) < COMPRESS_MIN_BYTES:
+                entry = (body, None)
+            else:
+                entry = (compress(body, encoding) if encoding else body, encoding)
+            cache.put(etag, entry)
+        body, content_encoding = entry
+        response = Response(body, mimetype=mimetype)
+        if content_encoding:
+            response.headers['Content-Encoding'] = content_encoding
+
+    response.set_etag(etag)
+    # O navegador pode guardar, mas revalida a cada uso (If-None-Match)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = ', '.join(filter(None, (vary, 'Accept-Encoding')))
+    return response
@@ -0,0 +1,280 @@
+"""
+Agregados de temperatura por minuto, hora e dia (rollups)
+
+Cada tabela guarda, por bucket alinhado em epoch-ms (UTC):
+    count, sum, sum_sq, min, max, anomalies
+e é atualizada na mesma transação em que as amostras são gravadas (ver
+SampleWriter.in_transaction), então agregados e amostras nunca divergem.
+
+Uma janela [início, fim) é decomposta em buckets inteiros do maior tamanho
+que couber e bordas brutas (menos de um minuto de cada lado):
+
+    |raw|  minutos  |  horas  |      dias      |  horas  | minutos |raw|
+
+30 dias a 1 Hz somam ~2,6M amostras, mas no máximo ~30 dias + 46 horas +
+118 minutos de buckets e 2 minutos de amostras brutas.
+
+Séries (bucket_series) usam a mesma decomposição, limitada às resoluções
+que dividem o bucket pedido: uma semana em buckets de 15 min lê ~10k linhas
+de temperature_rollup_1m, não 600k amostras.
+"""
+import math
+import re
+
+# (sufixo da tabela, tamanho do bucket em ms), do menor para o maior
+RESOLUTIONS = (
+    ('1m', 60 * 1000),
+    ('1h', 60 * 60 * 1000),
+    ('1d', 24 * 60 * 60 * 1000),
+)
+
+
+# Agregações aceitas por bucket_series/series_rows
+SERIES_AGGREGATES = ('avg', 'min', 'max', 'count', 'sum', 'stdev', 'anomalies')
+
+BUCKET_UNITS = {'s': 1000, 'm': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000}
+
+
+def table(suffix):
+    return f'temperature_rollup_{suffix}'
+
+
+def create_rollup_tables(conn):
+    for suffix, _ in RESOLUTIONS:
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table(suffix)} (
+                bucket INTEGER PRIMARY KEY,
+                count INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                sum_sq REAL NOT NULL,
+                min REAL NOT NULL,
+                max REAL NOT NULL,
+                anomalies INTEGER NOT NULL
+            )
+        ''')
+
+
+def update_rollups(conn, rows):
+    """
+    Soma as amostras aos buckets (chamar dentro da transação que as grava).
+
+    Args:
+        rows: Tuplas (id, ts epoch-ms, temperature, anomaly, rate_of_change)
+    """
+    for suffix, size in RESOLUTIONS:
+        buckets = {}
+        for _, ts, temperature, anomaly, _ in rows:
+            bucket = ts - ts % size
+            agg = buckets.get(bucket)
+            if agg is None:
+                buckets[bucket] = [1, temperature, temperature * temperature, temperature, temperature,
+                                   1 if anomaly else 0]
+            else:
+                agg[0] += 1
+                agg[1] += temperature
+                agg[2] += temperature * temperature
+                agg[3] = min(agg[3], temperature)
+                agg[4] = max(agg[4], temperature)
+                agg[5] += 1 if anomaly else 0
+        conn.executemany(f'''
+            INSERT INTO {table(suffix)} (bucket, count, sum, sum_sq, min, max, anomalies)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(bucket) DO UPDATE SET
+                count = count + excluded.count,
+                sum = sum + excluded.sum,
+                sum_sq = sum_sq + excluded.sum_sq,
+                min = MIN(min, excluded.min),
+                max = MAX(max, excluded.max),
+                anomalies = anomalies + excluded.anomalies
+        ''', [(bucket, *agg) for bucket, agg in buckets.items()])
+
+
+def rebuild_rollups(conn):
+    """Recalcula todos os agregados a partir das amostras (bancos gravados antes dos rollups)"""
+    previous = None
+    for suffix, size in RESOLUTIONS:
+        conn.execute(f'DELETE FROM {table(suffix)}')
+        if previous is None:
+            conn.execute(f'''
+                INSERT INTO {table(suffix)} (bucket, count, sum, sum_sq, min, max, anomalies)
+                SELECT ts - ts % {size}, COUNT(*), SUM(temperature), SUM(temperature * temperature),
+                       MIN(temperature), MAX(temperature), SUM(anomaly)
+                FROM temperature_samples
+                GROUP BY 1
+            ''')
+        else:
+            # Cada nível sai do anterior, não das amostras
+            conn.execute(f'''
+                INSERT INTO {table(suffix)} (bucket, count, sum, sum_sq, min, max, anomalies)
+                SELECT bucket - bucket % {size}, SUM(count), SUM(sum), SUM(sum_sq),
+                       MIN(min), MAX(max), SUM(anomalies)
+                FROM {table(previous)}
+                GROUP BY 1
+            ''')
+        previous = suffix
+    conn.commit()
+
+
+def plan_range(start_ms, end_ms, level=len(RESOLUTIONS) - 1):
+    """
+    Decompõe [start_ms, end_ms) em trechos (sufixo ou None para amostras brutas, início, fim).
+    """
+    if start_ms >= end_ms:
+        return []
+    if level < 0:
+        return [(None, start_ms, end_ms)]
+    suffix, size = RESOLUTIONS[level]
+    first = -(-start_ms // size) * size   # Primeiro bucket inteiro dentro da janela
+    last = end_ms - end_ms % size         # Fim do último bucket inteiro
+    if first >= last:
+        return plan_range(start_ms, end_ms, level - 1)
+    return (plan_range(start_ms, first, level - 1)
+            + [(suffix, first, last)]
+            + plan_range(last, end_ms, level - 1))
+
+
+def range_aggregate(conn, start_ms, end_ms):
+    """
+    (count, sum, sum_sq, min, max, anomalies) das amostras com start_ms <= ts < end_ms.
+
+    Todas as consultas rodam em uma única transação de leitura, para que um
+    commit do gravador no meio não seja contado pela metade.
+    """
+    count, total, total_sq, minimum, maximum, anomalies = 0, 0.0, 0.0, None, None, 0
+    in_transaction = conn.in_transaction
+    if not in_transaction:
+        conn.execute('BEGIN')
+    try:
+        for suffix, lo, hi in plan_range(start_ms, end_ms):
+            if suffix is None:
+                row = conn.execute('''
+                    SELECT COUNT(*), SUM(temperature), SUM(temperature * temperature),
+                           MIN(temperature), MAX(temperature), SUM(anomaly)
+                    FROM temperature_samples
+                    WHERE ts >= ? AND ts < ?
+                ''', (lo, hi)).fetchone()
+            else:
+                row = conn.execute(f'''
+                    SELECT SUM(count), SUM(sum), SUM(sum_sq), MIN(min), MAX(max), SUM(anomalies)
+                    FROM {table(suffix)}
+                    WHERE bucket >= ? AND bucket < ?
+                ''', (lo, hi)).fetchone()
+            if not row[0]:
+                continue
+            count += row[0]
+            total += row[1]
+            total_sq += row[2]
+            minimum = row[3] if minimum is None else min(minimum, row[3])
+            maximum = row[4] if maximum is None else max(maximum, row[4])
+            anomalies += row[5]
+    finally:
+        if not in_transaction:
+            conn.execute('COMMIT')
+    return count, total, total_sq, minimum, maximum, anomalies
+
+
+def summarize(count, total, total_sq, minimum, maximum, anomalies):
+    """Agregado -> min, max, média e desvio padrão amostral (mesmo resultado de statistics.stdev)"""
+    mean = total / count
+    variance = (total_sq - total * mean) / (count - 1) if count > 1 else 0.0
+    return {
+        'count': count,
+        'min': minimum,
+        'max': maximum,
+        'avg': mean,
+        'stdev': math.sqrt(max(variance, 0.0)),
+        'anomalies': anomalies,
+    }
+
+
+def adjust_anomalies(conn, changes):
+    """
+    Corrige a contagem de anomalias dos buckets após recalcular a coluna anomaly
+    (chamar na mesma transação do UPDATE).
+
+    Args:
+        changes: Pares (ts epoch-ms, +1 ou -1)
+    """
+    for suffix, size in RESOLUTIONS:
+        deltas = {}
+        for ts, delta in changes:
+            bucket = ts - ts % size
+            deltas[bucket] = deltas.get(bucket, 0) + delta
+        conn.executemany(f'UPDATE {table(suffix)} SET anomalies = anomalies + ? WHERE bucket = ?',
+                         [(delta, bucket) for bucket, delta in deltas.items() if delta])
+
+
+def parse_bucket(text):
+    """'30s', '1m', '15m', '1h', '1d' ou milissegundos (só dígitos) -> tamanho do bucket em ms"""
+    match = re.fullmatch(r'(\d+)([smhd]?)', text.strip())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Bucket inválido: {text!r} (ex.: 30s, 1m, 15m, 1h, 1d)")
+    return int(match.group(1)) * BUCKET_UNITS.get(match.group(2), 1)
+
+
+def bucket_series(conn, start_ms, end_ms, bucket_ms):
+    """
+    Agregados das amostras com start_ms <= ts < end_ms por bucket de bucket_ms
+    (alinhado em epoch-ms UTC, como os rollups; o primeiro e o último podem
+    estar cortados pela janela).
+
+    Returns:
+        Lista de (bucket, count, sum, sum_sq, min, max, anomalies) em ordem, só buckets com amostras
+    """
+    # Maior resolução que divide o bucket: cada rollup cai inteiro em um bucket da série
+    level = -1
+    for index, (_, size) in enumerate(RESOLUTIONS):
+        if bucket_ms % size == 0:
+            level = index
+
+    buckets = {}
+    in_transaction = conn.in_transaction
+    if not in_transaction:
+        conn.execute('BEGIN')
+    try:
+        for suffix, lo, hi in plan_range(start_ms, end_ms, level):
+            if suffix is None:
+                rows = conn.execute(f'''
+                    SELECT ts - ts % {bucket_ms}, COUNT(*), SUM(temperature), SUM(temperature * temperature),
+                           MIN(temperature), MAX(temperature), SUM(anomaly)
+                    FROM temperature_samples
+                    WHERE ts >= ? AND ts < ?
+                    GROUP BY 1
+                ''', (lo, hi))
+            else:
+                rows = conn.execute(f'''
+                    SELECT bucket - bucket % {bucket_ms}, SUM(count), SUM(sum), SUM(sum_sq),
+                           MIN(min), MAX(max), SUM(anomalies)
+                    FROM {table(suffix)}
+                    WHERE bucket >= ? AND bucket < ?
+                    GROUP BY 1
+                ''', (lo, hi))
+            # Trechos vizinhos (bordas brutas, minutos, horas) podem cair no mesmo bucket
+            for bucket, count, total, total_sq, minimum, maximum, anomalies in rows:
+                agg = buckets.get(bucket)
+                if agg is None:
+                    buckets[bucket] = [count, total, total_sq, minimum, maximum, anomalies]
+                else:
+                    agg[0] += count
+                    agg[1] += total
+                    agg[2] += total_sq
+                    agg[3] = min(agg[3], minimum)
+                    agg[4] = max(agg[4], maximum)
+                    agg[5] += anomalies
+    finally:
+        if not in_transaction:
+            conn.execute('COMMIT')
+    return [(bucket, *buckets[bucket]) for bucket in sorted(buckets)]
+
+
+def series_rows(series, aggregates=SERIES_AGGREGATES):
+    """Saída de bucket_series -> um dicionário por bucket com 't' (início, epoch-ms) e as agregações pedidas"""
+    rows = []
+    for bucket, *aggregate in series:
+        summary = summarize(*aggregate)
+        summary['sum'] = aggregate[1]
+        row = {'t': bucket}
+        for name in aggregates:
+            row[name] = summary[name]
+        rows.append(row)
+    return rows
@@ -0,0 +1,101 @@
+"""
+Buffer circular das amostras de temperatura mais recentes
+
+As últimas N amostras ficam em arrays de tamanho fixo (array('q') para
+id e epoch-ms, array('d') para temperatura e taxa, bytearray para a
+anomalia): sem um objeto Python por amostra, sem crescer nem realocar.
+get_latest/get_since do coletor respondem daqui quando a janela pedida
+cabe no buffer, sem abrir o SQLite.
+
+As amostras entram em ordem de id (e de horário), então buscas por id ou
+por horário são binárias sobre a ordem lógica do buffer.
+"""
+import math
+import threading
+from array import array
+
+# rate_of_change NULL (bancos v1) vira NaN no array e volta como None
+_NULL = float('nan')
+
+
+class SampleRing:
+    """Últimas `capacity` amostras (id, ts, temperature, anomaly, rate_of_change), segura para várias threads"""
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self._ids = array('q', bytes(8 * capacity))
+        self._ts = array('q', bytes(8 * capacity))
+        self._temps = array('d', bytes(8 * capacity))
+        self._rates = array('d', bytes(8 * capacity))
+        self._anomalies = bytearray(capacity)
+        self._start = 0  # Posição física da amostra mais antiga
+        self._size = 0
+        # True enquanto o buffer tem todas as amostras do banco (banco menor que o buffer)
+        self.complete = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, rows):
+        """Acrescenta amostras em ordem cronológica, descartando as mais antigas"""
+        with self._lock:
+            if len(rows) > self.capacity:
+                self.complete = False  # As primeiras do lote nem chegam a entrar
+            for row_id, ts, temperature, anomaly, rate in rows[-self.capacity:]:
+                if self._size < self.capacity:
+                    pos = (self._start + self._size) % self.capacity
+                    self._size += 1
+                else:
+                    pos = self._start
+                    self._start = (self._start + 1) % self.capacity
+                    self.complete = False
+                self._ids[pos] = row_id
+                self._ts[pos] = ts
+                self._temps[pos] = temperature
+                self._rates[pos] = _NULL if rate is None else rate
+                self._anomalies[pos] = 1 if anomaly else 0
+
+    def _row(self, i):
+        pos = (self._start + i) % self.capacity
+        rate = self._rates[pos]
+        return (self._ids[pos], self._ts[pos], self._temps[pos], self._anomalies[pos],
+                None if math.isnan(rate) else rate)
+
+    def _rows(self, first, count):
+        return [self._row(i) for i in range(first, first + count)]
+
+    def _bisect(self, column, value):
+        """Índice lógico da primeira amostra com column > value"""
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if column[(self._start + mid) % self.capacity] > value:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def latest(self, limit):
+        """
+        Últimas `limit` amostras em ordem cronológica.
+        Retorna None se o buffer não tem todas (pedido maior que o que está na memória).
+        """
+        with self._lock:
+            if limit > self._size and not self.complete:
+                return None
+            count = min(limit, self._size)
+            return self._rows(self._size - count, count)
+
+    def since(self, limit, since_id=None, since_ms=None):
+        """
+        Amostras com id > since_id (ou ts > since_ms) em ordem cronológica, no máximo `limit`.
+        Retorna None se o buffer não cobre o cursor (amostras seguintes já descartadas).
+        """
+        with self._lock:
+            column, value = (self._ids, since_id) if since_id is not None else (self._ts, since_ms)
+            # A amostra do cursor (ou uma anterior) ainda está aqui: todas as seguintes também
+            if not self.complete and (not self._size or column[self._start] > value):
+                return None
+            first = self._bisect(column, value)
+            return self._rows(first, min(limit, self._size - first))
@@ -0,0 +1,122 @@
+"""
+Agenda de amostragem sem deriva (prazos em time.monotonic)
+
+O coletor fazia o trabalho e depois time.sleep(interval): o período real
+era intervalo + Modbus + SQLite e a grade de horários escorregava sem
+limite. Aqui os ticks ficam em uma grade fixa início + n * intervalo; o
+tempo gasto no ciclo sai da espera seguinte, não se soma a ela.
+
+Quando um ciclo passa do prazo (overrun) e um ou mais ticks vencem sem
+ser atendidos:
+    catch_up=False - pula os ticks perdidos e volta à grade no próximo (padrão)
+    catch_up=True  - dispara os ticks perdidos em seguida, até max_catch_up;
+                     o resto é pulado
+
+Jitter = atraso entre o prazo do tick e o instante em que ele foi liberado.
+"""
+import threading
+import time
+
+
+class SampleScheduler:
+    """Ticks periódicos em grade monotônica, com contadores de atraso e overrun"""
+
+    def __init__(self, interval, catch_up=False, max_catch_up=10):
+        """
+        Args:
+            interval: Período em segundos (ex.: 0.01 para 100 Hz)
+            catch_up: Disparar os ticks perdidos em vez de pulá-los
+            max_catch_up: Máximo de ticks atrasados disparados em seguida
+        """
+        self.interval = interval
+        self.catch_up = catch_up
+        self.max_catch_up = max_catch_up
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._next_due = None
+        self._tick_started = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.ticks = 0
+            self.overruns = 0
+            self.skipped = 0
+            self.caught_up = 0
+            self.last_jitter = 0.0
+            self.max_jitter = 0.0
+            self.total_jitter = 0.0
+            self.last_cycle = 0.0
+            self.max_cycle = 0.0
+
+    def start(self):
+        """Primeiro tick imediatamente; os seguintes a cada `interval` a partir dele"""
+        self._stop.clear()
+        self._next_due = time.monotonic()
+        self._tick_started = None
+
+    def stop(self):
+        """Libera um wait() em andamento (retorna None)"""
+        self._stop.set()
+
+    def wait(self):
+        """
+        Espera o próximo tick. Retorna o prazo do tick (monotonic) ou None se stop() foi chamado.
+        """
+        now = time.monotonic()
+        if self._tick_started is not None:
+            self._finish_cycle(now)
+
+        delay = self._next_due - now
+        if delay > 0 and self._stop.wait(delay):
+            return None
+        if self._stop.is_set():
+            return None
+
+        due = self._next_due
+        released = time.monotonic()
+        self._tick_started = released
+        self._next_due = due + self.interval
+        with self._lock:
+            self.ticks += 1
+            self.last_jitter = released - due
+            self.max_jitter = max(self.max_jitter, self.last_jitter)
+            self.total_jitter += self.last_jitter
+            if self.last_jitter >= self.interval:
+                self.caught_up += 1  # Liberado depois do prazo do tick seguinte
+        return due
+
+    def _finish_cycle(self, now):
+        """Contabiliza o ciclo que terminou e decide o que fazer com ticks vencidos"""
+        cycle = now - self._tick_started
+        self._tick_started = None
+        with self._lock:
+            self.last_cycle = cycle
+            self.max_cycle = max(self.max_cycle, cycle)
+            if cycle > self.interval:
+                self.overruns += 1
+
+            # Ticks cujo prazo já passou além do próximo (o próximo atrasado é atendido normalmente)
+            missed = int((now - self._next_due) // self.interval)
+            if missed <= 0:
+                return
+            # catch_up: os atrasados ficam na grade e saem em seguida, no máximo max_catch_up
+            skip = max(0, missed - self.max_catch_up) if self.catch_up else missed
+            self.skipped += skip
+            self._next_due += skip * self.interval
+
+    def stats(self):
+        with self._lock:
+            return {
+                'interval_ms': round(self.interval * 1000, 3),
+                'catch_up': self.catch_up,
+                'ticks': self.ticks,
+                'overruns': self.overruns,
+                'skipped_ticks': self.skipped,
+                'caught_up_ticks': self.caught_up,
+                'last_jitter_ms': round(self.last_jitter * 1000, 3),
+                'avg_jitter_ms': round(self.total_jitter / self.ticks * 1000, 3) if self.ticks else 0,
+                'max_jitter_ms': round(self.max_jitter * 1000, 3),
+                'last_cycle_ms': round(self.last_cycle * 1000, 3),
+                'max_cycle_ms': round(self.max_cycle * 1000, 3),
+            }
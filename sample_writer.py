@@ -0,0 +1,196 @@
+"""
+Gravação de amostras no SQLite em segundo plano (write-behind)
+
+Abrir uma conexão, fazer um INSERT e um commit (fsync) por amostra limita a
+coleta a algumas centenas de amostras por segundo no melhor caso. Aqui:
+  - uma única conexão de longa duração em modo WAL, usada só pela thread
+    gravadora (leitores não bloqueiam a escrita e vice-versa);
+  - uma fila limitada em memória entre o coletor e a thread gravadora;
+  - commits em grupo: um commit a cada `batch_size` linhas ou a cada
+    `flush_interval` segundos, o que vier primeiro;
+  - `synchronous` configurável: FULL sincroniza o WAL a cada commit; NORMAL
+    (padrão) só nos checkpoints, e uma queda de energia pode perder os
+    últimos commits, mas nunca corrompe o banco.
+
+close() grava tudo o que ainda está na fila; também é chamado no atexit,
+então um encerramento limpo (Ctrl+C, fim do processo) não perde amostras.
+
+Se o commit falhar por um erro operacional (ex.: "database is locked" com
+migrate_db, bulk_ingest ou backfill_anomalies segurando a escrita), o mesmo
+lote é tentado de novo com backoff exponencial, enquanto as amostras novas
+esperam na fila. Só depois de `max_attempts` tentativas o lote é descartado
+(contado em `dropped` e registrado no logger do módulo).
+"""
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+_CLOSE = object()
+
+log = logging.getLogger(__name__)
+
+
+def open_database(db_path, synchronous='NORMAL'):
+    """Conexão SQLite em modo WAL com o nível de synchronous pedido"""
+    synchronous = synchronous.upper()
+    if synchronous not in SYNCHRONOUS_LEVELS:
+        raise ValueError(f"synchronous deve ser um de {SYNCHRONOUS_LEVELS}")
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA synchronous={synchronous}')
+    return conn
+
+
+class SampleWriter:
+    """Thread gravadora com fila limitada e commits em grupo"""
+
+    def __init__(self, db_path, insert_sql, batch_size=500, flush_interval=1.0, max_queue=10000,
+                 synchronous='NORMAL', put_timeout=1.0, on_commit=None, in_transaction=None,
+                 max_attempts=8, retry_initial=0.1, retry_max=5.0):
+        """
+        Args:
+            db_path: Arquivo do banco
+            insert_sql: INSERT parametrizado executado para cada linha (executemany)
+            batch_size: Linhas por commit no máximo
+            flush_interval: Segundos no máximo entre a chegada de uma linha e o seu commit
+            max_queue: Linhas pendentes antes de put() começar a esperar
+            synchronous: 'OFF', 'NORMAL', 'FULL' ou 'EXTRA' (PRAGMA synchronous)
+            put_timeout: Espera máxima de put() com a fila cheia; depois a linha é descartada
+            on_commit: Callback opcional on_commit(linhas) na thread gravadora após cada commit
+            in_transaction: Callback opcional in_transaction(conn, linhas) executado na mesma
+                            transação do INSERT (ex.: manter agregados em dia)
+            max_attempts: Tentativas de commit de um lote com erro operacional antes de descartá-lo
+            retry_initial: Espera (s) antes da segunda tentativa; dobra a cada falha
+            retry_max: Espera máxima (s) entre tentativas
+        """
+        self.db_path = db_path
+        self.insert_sql = insert_sql
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous.upper()
+        self.put_timeout = put_timeout
+        self.on_commit = on_commit
+        self.in_transaction = in_transaction
+        self.max_attempts = max_attempts
+        self.retry_initial = retry_initial
+        self.retry_max = retry_max
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._conn = open_database(db_path, synchronous)
+        self.closed = False
+
+        self.written = 0
+        self.commits = 0
+        self.dropped = 0
+        self.errors = 0
+        self.retries = 0
+
+        self.thread = threading.Thread(target=self._write_loop, name='sample-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def put(self, row):
+        """Enfileira uma linha; retorna False se ela foi descartada (fila cheia ou writer fechado)"""
+        if self.closed:
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            log.warning("Fila cheia (%d) - amostra descartada", self._queue.maxsize)
+            return False
+
+    def close(self, timeout=30):
+        """Grava o que está na fila, fecha a conexão e encerra a thread"""
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        self._queue.put(_CLOSE)
+        self.thread.join(timeout)
+
+    def _write_loop(self):
+        closing = False
+        while not closing:
+            row = self._queue.get()
+            if row is _CLOSE:
+                break
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            # Junta o que chegar até encher o lote ou vencer o prazo da primeira linha
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    row = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is _CLOSE:
+                    closing = True
+                    break
+                batch.append(row)
+            self._commit(batch)
+
+        # Encerramento: o que sobrou na fila vai em um último commit
+        rest = []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not _CLOSE:
+                rest.append(row)
+        if rest:
+            self._commit(rest)
+        self._conn.close()
+
+    def _commit(self, batch):
+        delay = self.retry_initial
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with self._conn:
+                    self._conn.executemany(self.insert_sql, batch)
+                    if self.in_transaction:
+                        self.in_transaction(self._conn, batch)
+                break
+            except sqlite3.OperationalError as e:
+                # Banco travado por outro processo, disco cheio...: a transação foi desfeita, tenta de novo
+                self.errors += 1
+                if attempt == self.max_attempts:
+                    self._drop(batch, f"{e} (após {attempt} tentativas)")
+                    return
+                self.retries += 1
+                if attempt == 1:
+                    log.warning("Erro ao gravar %d linhas: %s - tentando de novo", len(batch), e)
+                time.sleep(delay)
+                delay = min(delay * 2, self.retry_max)
+            except sqlite3.Error as e:
+                # Erro nos dados (ex.: id repetido): repetir não resolve
+                self.errors += 1
+                self._drop(batch, e)
+                return
+        self.written += len(batch)
+        self.commits += 1
+        if self.on_commit:
+            self.on_commit(batch)
+
+    def _drop(self, batch, error):
+        self.dropped += len(batch)
+        log.error("%d linhas descartadas: %s", len(batch), error)
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize(),
+            'written': self.written,
+            'commits': self.commits,
+            'rows_per_commit': round(self.written / self.commits, 1) if self.commits else 0,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'retries': self.retries,
+            'synchronous': self.synchronous,
+        }
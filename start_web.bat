@@ -41,7 +41,7 @@ echo ================================================
 echo   SERVIDOR WEB INICIADO!
 echo ================================================
 echo.
-echo   Acesse: http://localhost:5000
+echo   Acesse: http://localhost:5000/console
 echo.
 echo   Press Ctrl+C para parar o servidor
 echo ================================================
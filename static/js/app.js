@@ -1,6 +1,10 @@
 // API Base URL
 const API_BASE = '/api';
 
+// Nome da variável -> {type, address}, para aplicar os eventos do stream
+const variablesByName = {};
+let eventSource = null;
+
 // Toast Notification System
 function showToast(message, type = 'success') {
     // Remove existing toasts
@@ -73,6 +77,12 @@ async function loadVariables() {
         renderIntVariables(variables.int);
         renderRealVariables(variables.real);
 
+        Object.entries(variables).forEach(([type, list]) => {
+            list.forEach(variable => {
+                variablesByName[variable.name] = { type, address: variable.address };
+            });
+        });
+
         updateConnectionStatus(true);
     } catch (error) {
         console.error('Erro ao carregar variáveis:', error);
@@ -107,9 +117,6 @@ function renderBoolVariables(variables) {
             </div>
         `;
         container.appendChild(item);
-
-        // Read initial value
-        readBoolVariable(variable.address);
     });
 }
 
@@ -146,9 +153,6 @@ function renderIntVariables(variables) {
             <div class="current-value" id="int-value-${variable.address}">--</div>
         `;
         container.appendChild(item);
-
-        // Read initial value
-        readInt(variable.address);
     });
 }
 
@@ -186,9 +190,6 @@ function renderRealVariables(variables) {
             <div class="current-value" id="real-value-${variable.address}">--</div>
         `;
         container.appendChild(item);
-
-        // Read initial value
-        readReal(variable.address);
     });
 }
 
@@ -371,31 +372,12 @@ async function readAllVariables() {
         if (result.success) {
             const data = result.data;
 
-            // Update Bool variables
-            Object.entries(data.bool).forEach(([name, info]) => {
-                if (!info.error) {
-                    updateBoolDisplay(info.address, info.value);
-                }
-            });
-
-            // Update Int variables
-            Object.entries(data.int).forEach(([name, info]) => {
-                if (!info.error) {
-                    const display = document.getElementById(`int-value-${info.address}`);
-                    if (display) {
-                        display.textContent = info.value;
-                    }
-                }
-            });
-
-            // Update Real variables
-            Object.entries(data.real).forEach(([name, info]) => {
-                if (!info.error) {
-                    const display = document.getElementById(`real-value-${info.address}`);
-                    if (display) {
-                        display.textContent = info.value.toFixed(2);
+            Object.entries(data).forEach(([type, variables]) => {
+                Object.values(variables).forEach(info => {
+                    if (!info.error) {
+                        updateVariableDisplay(type, info.address, info.value);
                     }
-                }
+                });
             });
 
             showToast('✅ Todas as variáveis atualizadas!', 'success');
@@ -407,7 +389,48 @@ async function readAllVariables() {
     }
 }
 
-// Auto-refresh values every 5 seconds
+// Update the display of any variable type
+function updateVariableDisplay(type, address, value) {
+    if (type === 'bool') {
+        updateBoolDisplay(address, value);
+        return;
+    }
+    const display = document.getElementById(`${type}-value-${address}`);
+    if (display) {
+        display.textContent = type === 'real' ? value.toFixed(2) : value;
+    }
+}
+
+// Apply tag entries received from the stream ({name: {value, quality, ...}})
+function applyTagUpdates(tags) {
+    Object.entries(tags).forEach(([name, entry]) => {
+        const variable = variablesByName[name];
+        if (variable && entry.quality === 'good') {
+            updateVariableDisplay(variable.type, variable.address, entry.value);
+        }
+    });
+}
+
+// Server-Sent Events: o servidor empurra as mudanças a cada varredura
+function startEventStream() {
+    // Stream único do servidor: só eventos de tags, só as variáveis desta página
+    const tags = encodeURIComponent(Object.keys(variablesByName).join(','));
+    eventSource = new EventSource(`${API_BASE}/stream?events=tags&tags=${tags}`);
+
+    eventSource.addEventListener('snapshot', (event) => applyTagUpdates(JSON.parse(event.data)));
+    eventSource.addEventListener('tags', (event) => applyTagUpdates(JSON.parse(event.data)));
+    eventSource.onopen = () => updateConnectionStatus(true);
+    // O EventSource reconecta sozinho; o snapshot da reconexão atualiza tudo
+    eventSource.onerror = () => updateConnectionStatus(false);
+}
+
+function stopEventStream() {
+    if (eventSource) {
+        eventSource.close();
+    }
+}
+
+// Fallback sem SSE: auto-refresh values every 5 seconds
 let autoRefreshInterval;
 
 function startAutoRefresh() {
@@ -423,12 +446,18 @@ function stopAutoRefresh() {
 }
 
 // Initialize on page load
-window.addEventListener('DOMContentLoaded', () => {
-    loadVariables();
-    startAutoRefresh();
+window.addEventListener('DOMContentLoaded', async () => {
+    await loadVariables();
+    if (window.EventSource) {
+        startEventStream();
+    } else {
+        readAllVariables();
+        startAutoRefresh();
+    }
 });
 
 // Stop refresh on page unload
 window.addEventListener('beforeunload', () => {
+    stopEventStream();
     stopAutoRefresh();
 });
@@ -1,9 +1,12 @@
 // API Base URL - usa o mesmo host que está acessando (funciona no PC e celular)
 const API_URL = `http://${window.location.hostname}:5000/api/temperature`;
+const STREAM_URL = `http://${window.location.hostname}:5000/api/stream?events=temperature`;
 
 // Global chart instance
 let temperatureChart = null;
 let chartDataLimit = 200;
+let historyCursor = null;  // id da última leitura no gráfico (cursor de /history?since=)
+let eventSource = null;
 
 // ==================== Initialization ====================
 document.addEventListener('DOMContentLoaded', function () {
@@ -112,26 +115,7 @@ async function updateCurrentTemperature() {
             return;
         }
 
-        // Update temperature display
-        document.getElementById('currentTemp').textContent = data.temperature.toFixed(1);
-
-        // Update status
-        const statusElem = document.getElementById('tempStatus');
-        if (data.anomaly) {
-            statusElem.textContent = '⚠️ Variação Anormal Detectada';
-            statusElem.className = 'temp-status anomaly';
-        } else {
-            statusElem.textContent = '✅ Operação Normal';
-            statusElem.className = 'temp-status';
-        }
-
-        // Update timestamp (horário local)
-        const timestamp = new Date(data.timestamp);
-        document.getElementById('lastUpdate').textContent = timestamp.toLocaleTimeString('pt-BR', {
-            hour: '2-digit',
-            minute: '2-digit',
-            second: '2-digit'
-        });
+        showCurrentTemperature(data);
 
     } catch (error) {
         console.error('Error fetching current temperature:', error);
@@ -140,6 +124,29 @@ async function updateCurrentTemperature() {
     }
 }
 
+function showCurrentTemperature(data) {
+    // Update temperature display
+    document.getElementById('currentTemp').textContent = data.temperature.toFixed(1);
+
+    // Update status
+    const statusElem = document.getElementById('tempStatus');
+    if (data.anomaly) {
+        statusElem.textContent = '⚠️ Variação Anormal Detectada';
+        statusElem.className = 'temp-status anomaly';
+    } else {
+        statusElem.textContent = '✅ Operação Normal';
+        statusElem.className = 'temp-status';
+    }
+
+    // Update timestamp (horário local)
+    const timestamp = new Date(data.timestamp);
+    document.getElementById('lastUpdate').textContent = timestamp.toLocaleTimeString('pt-BR', {
+        hour: '2-digit',
+        minute: '2-digit',
+        second: '2-digit'
+    });
+}
+
 async function updateStatistics() {
     try {
         const response = await fetch(`${API_URL}/stats?hours=24`);
@@ -174,31 +181,86 @@ async function updateChartData() {
         const data = result.data;
 
         // Prepare chart data (horário local)
-        const labels = data.map(d => {
-            const date = new Date(d.timestamp);
-            return date.toLocaleTimeString('pt-BR', {
-                hour: '2-digit',
-                minute: '2-digit',
-                second: '2-digit'
-            });
-        });
-
-        const temperatures = data.map(d => ({
-            x: new Date(d.timestamp),
-            y: d.temperature,
-            anomaly: d.anomaly
-        }));
+        const labels = data.map(d => formatChartLabel(d.timestamp));
+        const temperatures = data.map(toChartPoint);
 
         // Update chart
         temperatureChart.data.labels = labels;
         temperatureChart.data.datasets[0].data = temperatures;
         temperatureChart.update('none'); // No animation for real-time updates
+        historyCursor = result.cursor;
+
+    } catch (error) {
+        console.error('Error updating chart:', error);
+    }
+}
+
+function formatChartLabel(timestamp) {
+    return new Date(timestamp).toLocaleTimeString('pt-BR', {
+        hour: '2-digit',
+        minute: '2-digit',
+        second: '2-digit'
+    });
+}
+
+function toChartPoint(d) {
+    return {
+        x: new Date(d.timestamp),
+        y: d.temperature,
+        anomaly: d.anomaly
+    };
+}
+
+// Busca só as leituras depois do cursor e acrescenta ao gráfico
+async function fetchNewChartData() {
+    if (historyCursor === null) {
+        return updateChartData();
+    }
+    try {
+        const response = await fetch(`${API_URL}/history?since=${historyCursor}&limit=${chartDataLimit}`);
+        const result = await response.json();
+
+        if (result.error || !result.data) {
+            console.error('Error fetching history');
+            return;
+        }
 
+        // Mais leituras novas do que cabem no gráfico: recarrega a janela inteira
+        if (result.has_more) {
+            return updateChartData();
+        }
+        appendChartPoints(result.data);
+        historyCursor = result.cursor;
     } catch (error) {
         console.error('Error updating chart:', error);
     }
 }
 
+// Acrescenta amostras (stream ou consulta incremental), mantendo no máximo chartDataLimit pontos
+function appendChartPoints(readings) {
+    const chartData = temperatureChart.data;
+    let appended = false;
+    for (const reading of readings) {
+        // Ignora o que já está no gráfico (evento repetido após recarga)
+        if (historyCursor !== null && reading.id <= historyCursor) {
+            continue;
+        }
+        chartData.labels.push(formatChartLabel(reading.timestamp));
+        chartData.datasets[0].data.push(toChartPoint(reading));
+        historyCursor = reading.id;
+        appended = true;
+    }
+    if (!appended) {
+        return;
+    }
+
+    while (chartData.labels.length > chartDataLimit) {
+        chartData.labels.shift();
+        chartData.datasets[0].data.shift();
+    }
+    temperatureChart.update('none');
+}
+
 // ==================== Chart Controls ====================
 function updateChartRange(limit) {
     chartDataLimit = limit;
@@ -279,14 +341,45 @@ async function generateReport() {
 
 // ==================== Auto Update ====================
 function startAutoUpdate() {
-    // Update every 5 seconds
-    setInterval(() => {
-        updateCurrentTemperature();
-        updateChartData();
-    }, 5000);
+    if (window.EventSource) {
+        startEventStream();
+    } else {
+        // Navegador sem SSE: consulta a cada 5 segundos
+        setInterval(() => {
+            updateCurrentTemperature();
+            fetchNewChartData();
+        }, 5000);
+    }
 
     // Update statistics every minute
     setInterval(() => {
         updateStatistics();
     }, 60000);
 }
+
+// ==================== Event Stream (SSE) ====================
+function startEventStream() {
+    eventSource = new EventSource(STREAM_URL);
+    let firstSnapshot = true;
+
+    eventSource.addEventListener('temperature', (event) => {
+        const reading = JSON.parse(event.data);
+        showCurrentTemperature(reading);
+        appendChartPoints([reading]);
+    });
+
+    // Enviado ao conectar e quando o servidor descarta eventos atrasados:
+    // depois de uma reconexão ou resync, busca o que foi perdido a partir do cursor
+    eventSource.addEventListener('snapshot', () => {
+        if (!firstSnapshot) {
+            updateCurrentTemperature();
+            fetchNewChartData();
+        }
+        firstSnapshot = false;
+    });
+
+    eventSource.onerror = () => {
+        // O EventSource reconecta sozinho; o próximo snapshot recarrega os dados
+        document.getElementById('tempStatus').textContent = 'Reconectando...';
+    };
+}
@@ -0,0 +1,146 @@
+"""
+Tabela de valores atuais das tags (current value table)
+
+Um único poller (plc_poller.PLCPoller) varre o CLP no seu ritmo e grava
+aqui o valor, o horário e a qualidade de cada tag. Os endpoints de leitura
+respondem a partir desta tabela, então a carga no CLP depende da taxa de
+varredura e não de quantas pessoas estão com a página aberta.
+
+Qualidade:
+    good  - lido com sucesso na última varredura
+    bad   - o CLP respondeu com erro para esta tag
+    stale - sem atualização há mais de `stale_after` segundos (varredura falhando)
+
+good e bad são publicados em on_change quando a varredura grava a tag;
+stale acontece justamente quando ela não grava, então check_stale() deve
+ser chamado periodicamente (PLCServices tem uma thread para isso) para
+publicar a passagem good -> stale pelo mesmo on_change.
+"""
+import threading
+import time
+
+GOOD = 'good'
+BAD = 'bad'
+STALE = 'stale'
+
+
+class TagCache:
+    """Valores atuais por nome de tag, seguros para várias threads"""
+
+    def __init__(self, stale_after=5.0, on_change=None):
+        """
+        Args:
+            stale_after: Segundos sem atualização até a tag ser marcada como stale
+            on_change: Callback opcional on_change({nome: entrada}) com as tags que
+                       mudaram de valor ou qualidade em cada atualização
+        """
+        self.stale_after = stale_after
+        self.on_change = on_change
+        self._entries = {}
+        self._stale = set()  # Tags cuja passagem para stale já foi publicada
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def update(self, values, errors=None, timestamp=None):
+        """Grava valores lidos (qualidade good) e erros por tag (qualidade bad)"""
+        timestamp = timestamp or time.time()
+        changes = {}
+        with self._lock:
+            for name, value in values.items():
+                changes[name] = self._store(name, {'value': value, 'timestamp': timestamp,
+                                                   'quality': GOOD, 'error': None})
+            for name, error in (errors or {}).items():
+                previous = self._entries.get(name, {})
+                changes[name] = self._store(name, {'value': previous.get('value'), 'timestamp': timestamp,
+                                                   'quality': BAD, 'error': error})
+            changes = {name: {**entry, 'age_ms': 0.0} for name, entry in changes.items() if entry}
+        self._notify(changes)
+
+    def check_stale(self):
+        """Publica em on_change as tags good que passaram de stale_after sem atualização"""
+        now = time.time()
+        changes = {}
+        with self._lock:
+            for name, entry in self._entries.items():
+                if name in self._stale or entry['quality'] != GOOD or now - entry['timestamp'] <= self.stale_after:
+                    continue
+                self._stale.add(name)
+                changes[name] = self._with_age(entry, now)
+        self._notify(changes)
+        return changes
+
+    def _notify(self, changes):
+        if changes and self.on_change:
+            try:
+                self.on_change(changes)
+            except Exception as e:
+                print(f"[TAG CACHE] Erro no callback on_change: {e}")
+
+    def _store(self, name, entry):
+        """Grava a entrada; retorna-a se mudou valor ou qualidade (inclusive stale -> good), senão None"""
+        previous = self._entries.get(name)
+        self._entries[name] = entry
+        was_stale = name in self._stale
+        self._stale.discard(name)
+        if (previous is None or was_stale or previous['value'] != entry['value']
+                or previous['quality'] != entry['quality']):
+            return entry
+        return None
+
+    def on_scan(self, device, values, errors):
+        """Callback para PLCPoller(on_scan=...)"""
+        self.update(values, errors)
+
+    def invalidate(self, name):
+        """Remove uma tag (ex.: após uma escrita), forçando a próxima leitura ao vivo"""
+        with self._lock:
+            self._entries.pop(name, None)
+            self._stale.discard(name)
+
+    def clear(self):
+        """Esquece todas as tags (ex.: ao trocar de CLP)"""
+        with self._lock:
+            self._entries.clear()
+            self._stale.clear()
+
+    def get(self, name, max_age_ms=None):
+        """
+        Entrada atual da tag: {'value', 'timestamp', 'quality', 'error', 'age_ms'}.
+
+        Retorna None se a tag não está na tabela, não está good ou é mais velha
+        que max_age_ms - nesses casos o chamador deve ler ao vivo.
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            entry = self._with_age(entry, time.time()) if entry else None
+            fresh = (entry is not None and entry['quality'] == GOOD
+                     and (max_age_ms is None or entry['age_ms'] <= max_age_ms))
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry if fresh else None
+
+    def snapshot(self):
+        """Todas as tags com idade e qualidade calculadas agora"""
+        now = time.time()
+        with self._lock:
+            return {name: self._with_age(entry, now) for name, entry in self._entries.items()}
+
+    def _with_age(self, entry, now):
+        age = max(0.0, now - entry['timestamp'])
+        quality = entry['quality']
+        if quality == GOOD and age > self.stale_after:
+            quality = STALE
+        return {**entry, 'quality': quality, 'age_ms': round(age * 1000, 1)}
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'tags': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else None,
+            }
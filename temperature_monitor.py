@@ -1,206 +1,440 @@
 import sqlite3
 import threading
 import time
-from datetime import datetime
-from modbus_client import ModbusCLP
-import statistics
+from anomaly_detection import AnomalyEngine
+from command_queue import get_command_queue, PRIORITY_BACKGROUND
+from history_encoding import epoch_ms, local_timestamp
+from modbus_planner import ReadPlanner
+from rollups import (SERIES_AGGREGATES, bucket_series, create_rollup_tables, range_aggregate, rebuild_rollups,
+                     series_rows, summarize, update_rollups)
+from sample_ring import SampleRing
+from sample_scheduler import SampleScheduler
+from sample_writer import SampleWriter, open_database
+
+# v2: timestamps inteiros em epoch-ms (UTC), id atribuído pelo coletor.
+# Bancos v1 (temperature_readings, TEXT local) são convertidos por migrate_db.py.
+SCHEMA_VERSION = 2
+
+def create_schema(conn):
+    """Cria a tabela v2 e os índices se não existirem"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS temperature_samples (
+            id INTEGER PRIMARY KEY,
+            ts INTEGER NOT NULL,
+            temperature REAL NOT NULL,
+            anomaly INTEGER NOT NULL DEFAULT 0,
+            rate_of_change REAL DEFAULT 0
+        )
+    ''')
+    # Índice de cobertura: estatísticas por período leem só o índice, sem tocar a tabela
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_samples_ts
+        ON temperature_samples(ts, temperature, anomaly)
+    ''')
+    create_rollup_tables(conn)
+    conn.commit()
+
+def legacy_table_exists(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'temperature_readings'"
+    ).fetchone() is not None
 
 class TemperatureCollector:
     """Coleta e armazena dados de temperatura do CLP em tempo real"""
     
-    def __init__(self, plc_ip='192.168.0.200', hr_address=40001, interval=5):
+    def __init__(self, plc_ip='192.168.0.200', hr_address=40001, interval=5, plc_port=502, on_sample=None,
+                 db_path='temperature_data.db', synchronous='NORMAL', flush_interval=1.0, buffer_size=4096,
+                 catch_up=False, detectors=None):
         """
         Args:
             plc_ip: IP do CLP
+            plc_port: Porta Modbus TCP do CLP
             hr_address: Endereço Holding Register da temperatura
-            interval: Intervalo de coleta em segundos
+            interval: Intervalo de coleta em segundos (aceita frações: 0.01 = 100 Hz)
+            on_sample: Callback opcional on_sample(leitura) após salvar cada amostra
+                       (mesmo formato de get_latest)
+            db_path: Arquivo SQLite
+            synchronous: PRAGMA synchronous da conexão gravadora (ver sample_writer)
+            flush_interval: Segundos no máximo até uma amostra ser gravada
+            buffer_size: Amostras mais recentes mantidas em memória (ver sample_ring)
+            catch_up: Após um ciclo atrasado, ler os ticks perdidos em vez de pulá-los
+                      (ver sample_scheduler)
+            detectors: Detectores de anomalia {nome: {parâmetro: valor}} (None = padrão de
+                       anomaly_detection)
         """
         self.plc_ip = plc_ip
+        self.plc_port = plc_port
         self.hr_address = hr_address
         self.interval = interval
+        self.scheduler = SampleScheduler(interval, catch_up=catch_up)
+        self.on_sample = on_sample
         self.running = False
         self.thread = None
-        self.db_path = 'temperature_data.db'
+        self.db_path = db_path
+        self.synchronous = synchronous
+        self.flush_interval = flush_interval
+        self.last_reading = None
+        self._read_error = None
+        self._readers = threading.local()
+        self.recent = SampleRing(buffer_size)
+        self.anomaly_engine = AnomalyEngine(detectors)
+        
+        # Tags lidas a cada ciclo (converter endereço HR para index: 40001 -> 0)
+        self.tags = [
+            {'name': 'temperature', 'type': 'real', 'address': hr_address - 40001},
+        ]
         
-        # Inicializar banco de dados
-        self._init_database()
+        # Banco (schema, rollups, buffer) e gravador só são abertos no primeiro uso:
+        # criar o app não toca o disco (ver ensure_database e open)
+        self._writer = None
+        self._database_ready = False
+        self._database_lock = threading.Lock()
+        self._latest_id = 0
+        self._next_id = 0
+        self._opened_ms = 0
+        self.needs_migration = False
         
         print(f"[TEMP MONITOR] Inicializado - HR {hr_address}, intervalo {interval}s")
     
+    @property
+    def latest_id(self):
+        """Id da leitura mais recente já gravada"""
+        self.ensure_database()
+        return self._latest_id
+    
+    @property
+    def data_version(self):
+        """
+        Versão dos dados para ETags e caches: muda a cada gravação e a cada vez que o banco
+        é aberto, então correções feitas com o coletor parado (backfill_anomalies.py,
+        bulk_ingest.py) invalidam também o cache dos clientes quando ele volta.
+        """
+        self.ensure_database()
+        return f'{self._opened_ms:x}.{self._latest_id}'
+    
+    def ensure_database(self):
+        """
+        Prepara o banco na primeira chamada (schema, WAL, rollups de bancos antigos, buffer
+        em memória e aquecimento dos detectores). Chamado por start()/open() e pelas consultas.
+        """
+        if self._database_ready:
+            return
+        with self._database_lock:
+            if self._database_ready:
+                return
+            self._init_database()
+            # Detectores começam aquecidos com as últimas amostras gravadas
+            self.anomaly_engine.warm(self.recent.latest(min(self.anomaly_engine.warmup, len(self.recent))))
+            self._database_ready = True
+    
+    def open(self):
+        """Prepara o banco e abre o gravador, sem iniciar a coleta (start() chama este método)"""
+        self.ensure_database()
+        if self._writer is None or self._writer.closed:
+            self._writer = self._open_writer()
+    
     def _init_database(self):
-        """Cria tabela se não existir"""
-        conn = sqlite3.connect(self.db_path)
+        """Cria tabela se não existir (e passa o banco para o modo WAL)"""
+        conn = open_database(self.db_path, self.synchronous)
+        create_schema(conn)
         cursor = conn.cursor()
         
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS temperature_readings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                temperature REAL NOT NULL,
-                anomaly BOOLEAN DEFAULT FALSE,
-                rate_of_change REAL DEFAULT 0
-            )
-        ''')
-        
-        # Índice para consultas rápidas por timestamp
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_timestamp 
-            ON temperature_readings(timestamp DESC)
-        ''')
+        # Id da leitura mais recente já gravada (ver data_version).
+        # Os ids das novas leituras são atribuídos aqui, antes da gravação (write-behind)
+        cursor.execute('SELECT MAX(id) FROM temperature_samples')
+        self._latest_id = cursor.fetchone()[0] or 0
+        
+        # Banco v1 ainda não migrado: os ids novos continuam depois dos antigos
+        # Amostras gravadas antes dos rollups: agrega tudo uma vez
+        if self._latest_id and conn.execute('SELECT 1 FROM temperature_rollup_1m LIMIT 1').fetchone() is None:
+            print("[TEMP MONITOR] Calculando agregados por minuto/hora/dia...")
+            rebuild_rollups(conn)
+        
+        self.needs_migration = legacy_table_exists(conn)
+        if self.needs_migration:
+            cursor.execute('SELECT MAX(id) FROM temperature_readings')
+            self._latest_id = max(self._latest_id, cursor.fetchone()[0] or 0)
+        self._next_id = self._latest_id
+        self._opened_ms = int(time.time() * 1000)
+        
+        self._fill_recent(cursor)
         
-        conn.commit()
         conn.close()
         print("[TEMP MONITOR] Banco de dados inicializado")
     
+    def _fill_recent(self, cursor):
+        """Carrega as últimas amostras do banco (v2 e, se ainda houver, v1) no buffer em memória"""
+        capacity = self.recent.capacity
+        cursor.execute('''
+            SELECT id, ts, temperature, anomaly, rate_of_change
+            FROM temperature_samples
+            ORDER BY ts DESC, id DESC
+            LIMIT ?
+        ''', (capacity,))
+        rows = cursor.fetchall()
+        if self.needs_migration:
+            cursor.execute('''
+                SELECT id, timestamp, temperature, anomaly, rate_of_change
+                FROM temperature_readings
+                ORDER BY id DESC
+                LIMIT ?
+            ''', (capacity,))
+            rows += [(row_id, epoch_ms(timestamp), temperature, int(bool(anomaly)), rate)
+                     for row_id, timestamp, temperature, anomaly, rate in cursor.fetchall()]
+        rows.sort(key=lambda row: (row[1], row[0]))
+        self.recent.extend(rows[-capacity:])
+        # Banco menor que o buffer: toda consulta recente pode sair da memória
+        self.recent.complete = len(rows) < capacity
+    
+    def _open_writer(self):
+        return SampleWriter(self.db_path, '''
+            INSERT INTO temperature_samples (id, ts, temperature, anomaly, rate_of_change)
+            VALUES (?, ?, ?, ?, ?)
+        ''', flush_interval=self.flush_interval, synchronous=self.synchronous,
+           on_commit=self._on_commit, in_transaction=update_rollups)
+    
+    def _on_commit(self, rows):
+        # Só agora as leituras aparecem nas consultas: buffer e versão avançam juntos
+        self.recent.extend(rows)
+        self._latest_id = rows[-1][0]
+    
+    def _reader(self):
+        """Conexão de leitura da thread atual (reaproveitada entre consultas)"""
+        conn = getattr(self._readers, 'conn', None)
+        if conn is None:
+            conn = self._readers.conn = sqlite3.connect(self.db_path)
+        return conn
+    
     def start(self):
         """Inicia coleta de dados em background"""
         if self.running:
             print("[TEMP MONITOR] Já está rodando")
             return
         
+        self.open()
+        self.scheduler.interval = self.interval
+        self.scheduler.start()
         self.running = True
         self.thread = threading.Thread(target=self._collect_loop, daemon=True)
         self.thread.start()
         print("[TEMP MONITOR] Coleta iniciada")
+        
+        if self.needs_migration:
+            # Converte o histórico v1 em lotes pequenos enquanto a coleta continua
+            from migrate_db import migrate
+            self.needs_migration = False
+            threading.Thread(target=migrate, args=(self.db_path,), daemon=True).start()
     
     def stop(self):
-        """Para a coleta de dados"""
+        """Para a coleta de dados e grava as amostras pendentes"""
         self.running = False
+        self.scheduler.stop()
         if self.thread:
             self.thread.join(timeout=10)
+        if self._writer is not None:
+            self._writer.close()
         print("[TEMP MONITOR] Coleta parada")
     
     def _collect_loop(self):
-        """Loop principal de coleta"""
-        last_temp = None
+        """Loop principal de coleta: um tick da agenda por amostra"""
+        last_temp = last_acquired = None
+        failing = False
         
-        while self.running:
+        while self.running and self.scheduler.wait() is not None:
             try:
                 # Ler temperatura do CLP
-                temp = self._read_temperature()
+                result = self._read_temperature()
                 
-                if temp is not None:
-                    # Calcular taxa de variação
+                if result is not None:
+                    temp, acquired, ts = result
+                    
+                    # Taxa de variação sobre o tempo real entre as aquisições, não o intervalo nominal
                     rate = 0
-                    if last_temp is not None:
-                        rate = (temp - last_temp) / self.interval  # °C/s
+                    if last_temp is not None and acquired > last_acquired:
+                        rate = (temp - last_temp) / (acquired - last_acquired)  # °C/s
                     
-                    # Detectar anomalia (variação > 2°C em 5s = 0.4°C/s)
-                    is_anomaly = abs(rate) > 0.4 if last_temp is not None else False
+                    # Detectar anomalia (detectores configurados, ver anomaly_detection)
+                    fired = self.anomaly_engine.update(ts, temp)
+                    is_anomaly = bool(fired)
                     
                     # Salvar no banco
-                    self._save_reading(temp, is_anomaly, rate)
+                    reading = self._save_reading(temp, is_anomaly, rate, ts)
+                    if self.on_sample:
+                        self.on_sample(reading)
                     
                     if is_anomaly:
-                        print(f"[TEMP MONITOR] ⚠️ ANOMALIA: {temp:.2f}°C (Δ{rate:.2f}°C/s)")
+                        print(f"[TEMP MONITOR] ⚠️ ANOMALIA ({', '.join(fired)}): {temp:.2f}°C (Δ{rate:.2f}°C/s)")
                     
-                    last_temp = temp
-                else:
-                    print("[TEMP MONITOR] Falha ao ler temperatura")
+                    last_temp, last_acquired = temp, acquired
+                    if failing:
+                        print("[TEMP MONITOR] Leitura de temperatura restabelecida")
+                        failing = False
+                elif not failing:
+                    # Uma mensagem por sequência de falhas: a 100 Hz seriam 100 linhas por segundo
+                    print(f"[TEMP MONITOR] Falha ao ler temperatura: {self._read_error}")
+                    failing = True
                 
             except Exception as e:
                 print(f"[TEMP MONITOR] Erro no loop: {e}")
-            
-            # Aguardar próximo ciclo
-            time.sleep(self.interval)
     
     def _read_temperature(self):
-        """Lê temperatura do CLP via Modbus"""
-        clp = ModbusCLP(ip=self.plc_ip, port=502)
+        """
+        Lê temperatura do CLP via Modbus (fila de comandos do CLP, prioridade de background).
+        Retorna (temperatura, instante monotonic, epoch-ms) da aquisição ou None (motivo em _read_error).
+        O instante é o meio da troca Modbus, medido na thread de I/O: não inclui a espera na fila.
+        """
+        def acquire(clp):
+            started = time.monotonic()
+            values, errors = ReadPlanner(clp).read(self.tags)
+            finished = time.monotonic()
+            wall = time.time() - (finished - started) / 2
+            return values, errors, (started + finished) / 2, int(wall * 1000)
         
         try:
-            if not clp.connect():
-                return None
+            queue = get_command_queue(self.plc_ip, self.plc_port)
+            values, errors, acquired, ts = queue.call(acquire, PRIORITY_BACKGROUND, deadline=self.interval)
             
-            # Converter endereço HR para index (40001 -> 0)
-            index = self.hr_address - 40001
-            temp = clp.read_real(index)
-            
-            clp.close()
-            return temp
+            if 'temperature' not in values:
+                self._read_error = f"Erro Modbus: {errors.get('temperature')}"
+                return None
+            return values['temperature'], acquired, ts
             
         except Exception as e:
-            print(f"[TEMP MONITOR] Erro Modbus: {e}")
-            try:
-                clp.close()
-            except:
-                pass
+            self._read_error = f"Erro Modbus: {e}"
             return None
     
-    def _save_reading(self, temperature, anomaly, rate):
-        """Salva leitura no banco de dados com timestamp local"""
-        from datetime import datetime
+    def _save_reading(self, temperature, anomaly, rate, ts=None):
+        """Enfileira a leitura para gravação (epoch-ms da aquisição; agora se omitido); não espera o commit"""
+        if ts is None:
+            ts = int(time.time() * 1000)
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self._next_id += 1
+        self._writer.put((self._next_id, ts, temperature, int(bool(anomaly)), rate))
         
-        # Usar horário local do sistema
-        timestamp_local = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.last_reading = {
+            'id': self._next_id,
+            'timestamp': local_timestamp(ts),
+            'temperature': temperature,
+            'anomaly': bool(anomaly),
+            'rate_of_change': rate
+        }
+        return self.last_reading
+    
+    def get_latest(self, limit=100, raw=False):
+        """
+        Retorna últimas N leituras
+        raw=True: tuplas (id, ts epoch-ms, temperature, anomaly, rate_of_change), sem montar dicts
+        Sai do buffer em memória quando ele tem as N leituras; senão, do banco.
+        """
+        self.ensure_database()
+        rows = self.recent.latest(limit)
+        if rows is None:
+            cursor = self._reader().cursor()
+            
+            cursor.execute('''
+                SELECT id, ts, temperature, anomaly, rate_of_change
+                FROM temperature_samples
+                ORDER BY ts DESC, id DESC
+                LIMIT ?
+            ''', (limit,))
+            
+            rows = cursor.fetchall()
+            
+            rows.reverse()  # Ordem cronológica
+        return rows if raw else [self._row_to_reading(row) for row in rows]
+    
+    def get_since(self, since_id=None, limit=1000, raw=False, since_ms=None):
+        """
+        Retorna leituras mais novas que o cursor, em ordem cronológica.
+        since_id: id da última leitura já recebida; ou since_ms: instante em epoch-ms
+        Cursor recente: busca binária no buffer em memória. Cursor mais antigo:
+        consulta pelo índice (id ou ts), custo proporcional às leituras novas.
+        raw=True: tuplas como em get_latest
+        """
+        self.ensure_database()
+        if since_id is not None and since_id >= self.latest_id:
+            return []  # Nada novo: nem consulta o banco
         
-        cursor.execute('''
-            INSERT INTO temperature_readings (timestamp, temperature, anomaly, rate_of_change)
-            VALUES (?, ?, ?, ?)
-        ''', (timestamp_local, temperature, anomaly, rate))
+        rows = self.recent.since(limit, since_id=since_id, since_ms=since_ms)
+        if rows is not None:
+            return rows if raw else [self._row_to_reading(row) for row in rows]
         
-        conn.commit()
-        conn.close()
-    
-    def get_latest(self, limit=100):
-        """Retorna últimas N leituras"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._reader().cursor()
         
-        cursor.execute('''
-            SELECT timestamp, temperature, anomaly, rate_of_change
-            FROM temperature_readings
-            ORDER BY timestamp DESC
+        if since_id is not None:
+            where, order, value = 'id > ?', 'id', since_id
+        else:
+            where, order, value = 'ts > ?', 'ts, id', since_ms
+        cursor.execute(f'''
+            SELECT id, ts, temperature, anomaly, rate_of_change
+            FROM temperature_samples
+            WHERE {where}
+            ORDER BY {order}
             LIMIT ?
-        ''', (limit,))
+        ''', (value, limit))
         
         rows = cursor.fetchall()
-        conn.close()
         
-        return [
-            {
-                'timestamp': row[0],
-                'temperature': row[1],
-                'anomaly': bool(row[2]),
-                'rate_of_change': row[3]
-            }
-            for row in reversed(rows)  # Ordem cronológica
-        ]
+        return rows if raw else [self._row_to_reading(row) for row in rows]
+    
+    @staticmethod
+    def _row_to_reading(row):
+        return {
+            'id': row[0],
+            'timestamp': local_timestamp(row[1]),
+            'temperature': row[2],
+            'anomaly': bool(row[3]),
+            'rate_of_change': row[4]
+        }
     
     def get_statistics(self, hours=24):
         """Calcula estatísticas das últimas N horas"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT temperature, anomaly
-            FROM temperature_readings
-            WHERE timestamp >= datetime('now', '-' || ? || ' hours')
-        ''', (hours,))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        if not rows:
+        # Epoch-ms dos dois lados: sem desvio de fuso
+        end_ms = int(time.time() * 1000) + 1
+        stats = self.get_range_statistics(end_ms - int(hours * 3600 * 1000), end_ms)
+        if stats is not None:
+            stats['period_hours'] = hours
+        return stats
+    
+    def get_range_statistics(self, start_ms, end_ms):
+        """
+        Estatísticas das amostras com start_ms <= ts < end_ms.
+        Buckets inteiros saem dos rollups e só as bordas são lidas das amostras:
+        o custo depende do número de buckets, não do número de amostras.
+        """
+        self.ensure_database()
+        aggregate = range_aggregate(self._reader(), start_ms, end_ms)
+        if not aggregate[0]:
             return None
-        
-        temps = [row[0] for row in rows]
-        anomalies = sum(1 for row in rows if row[1])
-        
-        return {
-            'count': len(temps),
-            'min': min(temps),
-            'max': max(temps),
-            'avg': statistics.mean(temps),
-            'stdev': statistics.stdev(temps) if len(temps) > 1 else 0,
-            'anomalies': anomalies,
-            'period_hours': hours
-        }
+        return summarize(*aggregate)
+    
+    def get_series(self, start_ms, end_ms, bucket_ms, aggregates=('avg', 'min', 'max', 'count')):
+        """
+        Série agregada por bucket de bucket_ms entre start_ms (inclusivo) e end_ms (exclusivo).
+        Um item por bucket com amostras: {'t', 'timestamp', <agregações>}. Como em
+        get_range_statistics, os buckets saem dos rollups sempre que o tamanho permite.
+        """
+        unknown = [name for name in aggregates if name not in SERIES_AGGREGATES]
+        if unknown:
+            raise ValueError(f"Agregação inválida: {', '.join(unknown)} (use {', '.join(SERIES_AGGREGATES)})")
+        self.ensure_database()
+        rows = series_rows(bucket_series(self._reader(), start_ms, end_ms, bucket_ms), aggregates)
+        for row in rows:
+            row['timestamp'] = local_timestamp(row['t'])
+        return rows
+    
+    def storage_stats(self):
+        """Fila e commits da gravação em segundo plano (None antes de o gravador ser aberto)"""
+        return self._writer.stats() if self._writer is not None else None
+    
+    def sampling_stats(self):
+        """Ticks, atrasos (jitter) e ciclos estourados da agenda de amostragem"""
+        return self.scheduler.stats()
     
     def get_current(self):
-        """Retorna leitura mais recente"""
-        latest = self.get_latest(limit=1)
-        return latest[0] if latest else None
+        """Retorna leitura mais recente (da memória, mesmo antes de ser gravada)"""
+        if self.last_reading is not None:
+            return self.last_reading
+        self.ensure_database()
+        latest = self.recent.latest(1)
+        return self._row_to_reading(latest[0]) if latest else None
@@ -0,0 +1,177 @@
+"""
+Teste dos detectores de anomalia e do recálculo do histórico
+
+Verifica que cada detector dá o mesmo resultado incremental (update) e em
+lote (detect, em pedaços de tamanhos variados, com e sem o caminho
+vetorizado), que picos, degraus e deriva são detectados, e que o backfill
+regrava a coluna anomaly e mantém as contagens dos rollups, recusando rodar
+com o coletor gravando.
+
+Uso:
+    python test_anomaly_detection.py
+"""
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from anomaly_detection import DETECTORS, AnomalyEngine, Detector
+from backfill_anomalies import backfill
+from rollups import RESOLUTIONS, rebuild_rollups, table
+from temperature_monitor import TemperatureCollector
+
+START_MS = 1735689600000
+
+
+def make_samples(count=12000, seed=22):
+    random.seed(seed)
+    ts, values = [], []
+    noise = 0.0
+    for i in range(count):
+        noise = 0.8 * noise + random.gauss(0, 0.05)
+        value = 25.0 + noise
+        if i >= 6000:
+            value += 0.3                        # Degrau
+        if 9000 <= i < 11000:
+            value += (i - 9000) * 0.0005        # Deriva lenta
+        if i in (2000, 4000):
+            value += 1.5                        # Picos
+        ts.append(START_MS + 5000 * i + random.randrange(-200, 200))
+        values.append(round(value, 2))
+    return ts, values
+
+
+def chunked(detector, detect, ts, values):
+    flags, i = [], 0
+    random.seed(len(values))
+    while i < len(values):
+        size = random.randint(1, 2500)
+        flags += detect(detector, ts[i:i + size], values[i:i + size])
+        i += size
+    return flags
+
+
+def test_incremental_matches_batch():
+    ts, values = make_samples()
+    for name, cls in DETECTORS.items():
+        detector = cls()
+        incremental = [detector.update(t, v) for t, v in zip(ts, values)]
+        batch = chunked(cls(), cls.detect, ts, values)
+        loop = chunked(cls(), Detector.detect, ts, values)
+        assert incremental == batch, (name, sum(a != b for a, b in zip(incremental, batch)))
+        assert incremental == loop, name
+
+
+def test_detects_spikes_step_and_drift():
+    ts, values = make_samples()
+    flags = {name: cls().detect(ts, values) for name, cls in DETECTORS.items()}
+    for name in ('zscore', 'ewma', 'cusum', 'mad'):
+        assert flags[name][2000] and flags[name][4000], name
+    assert any(flags['ewma'][6000:6020]) and any(flags['cusum'][6000:6020])
+    assert any(flags['cusum'][9000:11000])
+
+    combined = AnomalyEngine().detect(ts, values)
+    quiet = [i for i in range(200, 6000) if abs(i - 2000) > 130 and abs(i - 4000) > 130]
+    false_alarms = sum(combined[i] for i in quiet)
+    assert false_alarms < len(quiet) * 0.005, false_alarms
+
+
+def test_engine_config():
+    try:
+        AnomalyEngine({'mad': {}, 'nope': {}})
+        raise AssertionError("Detector desconhecido deveria ser rejeitado")
+    except ValueError:
+        pass
+    ts, values = make_samples(400)
+    warmed = AnomalyEngine({'zscore': {'window': 50}})
+    warmed.warm([(None, t, v) for t, v in zip(ts[:300], values[:300])])
+    cold = AnomalyEngine({'zscore': {'window': 50}})
+    cold.detect(ts[:300], values[:300])
+    assert warmed.detect(ts[300:], values[300:]) == cold.detect(ts[300:], values[300:])
+
+
+def rollup_anomalies(conn):
+    return {suffix: conn.execute(f'SELECT bucket, anomalies FROM {table(suffix)} ORDER BY bucket').fetchall()
+            for suffix, _ in RESOLUTIONS}
+
+
+def test_backfill():
+    ts, values = make_samples()
+    workdir = tempfile.mkdtemp(prefix='test_anomaly_')
+    try:
+        db_path = os.path.join(workdir, 'anomaly.db')
+        TemperatureCollector(db_path=db_path).ensure_database()
+        conn = sqlite3.connect(db_path)
+        conn.executemany('INSERT INTO temperature_samples VALUES (?, ?, ?, ?, 0.0)',
+                         [(i + 1, t, v, i % 97 == 0) for i, (t, v) in enumerate(zip(ts, values))])
+        conn.commit()
+        rebuild_rollups(conn)
+
+        for config in (None, {'zscore': {'threshold': 3.0}, 'mad': {}}):
+            result = backfill(db_path, config, chunk_size=3000)
+            expected = AnomalyEngine(config).detect(ts, values)
+            stored = [bool(row[0]) for row in conn.execute('SELECT anomaly FROM temperature_samples ORDER BY id')]
+            assert stored == expected, config
+            assert result['scanned'] == len(ts)
+            # Contagens corrigidas incrementalmente == recalculadas do zero
+            adjusted = rollup_anomalies(conn)
+            rebuild_rollups(conn)
+            assert adjusted == rollup_anomalies(conn), config
+
+        # Período parcial: detectores de janela aquecidos com as amostras anteriores
+        config = {'zscore': {}, 'mad': {}}
+        conn.execute('UPDATE temperature_samples SET anomaly = 0')
+        conn.commit()
+        backfill(db_path, config, start_ms=ts[5000], end_ms=ts[8000])
+        stored = [bool(row[0]) for row in conn.execute('SELECT anomaly FROM temperature_samples ORDER BY id')]
+        assert stored[5000:8000] == AnomalyEngine(config).detect(ts, values)[5000:8000]
+        assert not any(stored[:5000]) and not any(stored[8000:])
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_backfill_requires_stopped_collector():
+    workdir = tempfile.mkdtemp(prefix='test_anomaly_')
+    try:
+        db_path = os.path.join(workdir, 'anomaly.db')
+        collector = TemperatureCollector(db_path=db_path)
+        version = collector.data_version
+        conn = sqlite3.connect(db_path)
+        conn.execute('INSERT INTO temperature_samples VALUES (1, ?, 25.0, 0, 0.0)', (int(time.time() * 1000),))
+        conn.commit()
+        conn.close()
+        try:
+            backfill(db_path)
+            raise AssertionError("Backfill rodou com amostra recente (coletor gravando)")
+        except RuntimeError as e:
+            assert '--force' in str(e), e
+        assert backfill(db_path, force=True)['scanned'] == 1
+
+        # Coletor reiniciado depois do backfill: versão (ETags) nova mesmo sem leitura nova
+        time.sleep(0.01)
+        assert TemperatureCollector(db_path=db_path).data_version != version
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DOS DETECTORES DE ANOMALIA")
+    print("=" * 60)
+    test_incremental_matches_batch()
+    print("✅ Incremental e em lote (vetorizado ou não) dão o mesmo resultado")
+    test_detects_spikes_step_and_drift()
+    print("✅ Picos, degrau e deriva detectados, poucos alarmes falsos")
+    test_engine_config()
+    print("✅ Configuração validada e aquecimento equivalente ao histórico")
+    test_backfill()
+    print("✅ Backfill regrava anomaly e corrige os rollups")
+    test_backfill_requires_stopped_collector()
+    print("✅ Backfill recusa rodar com o coletor gravando; reinício muda a versão dos dados")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
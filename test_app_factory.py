@@ -0,0 +1,143 @@
+"""
+Teste da fábrica do app (app_factory.create_app)
+
+Confere que create_app só monta o app: nenhuma thread iniciada e nenhum
+banco aberto até a primeira consulta de temperatura; que a configuração
+padrão é completada pelas chaves passadas; que cada app tem o seu próprio
+PLCServices em app.extensions e as rotas usam o do app da requisição; e,
+com o mock_server em uma porta livre, que as rotas de web_app.py e de
+web_server.py compartilham o mesmo backend (escrita pelo /console invalida
+a tabela de valores lida por /api/int/read).
+
+Uso:
+    python test_app_factory.py
+"""
+import asyncio
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import web_server
+from app_factory import DEFAULT_CONFIG, create_app
+from mock_server import run_server
+from plc_services import PLCServices
+
+
+def start_mock_server():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        port = sock.getsockname()[1]
+    threading.Thread(target=lambda: asyncio.run(run_server(port)), daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('localhost', port), timeout=0.1).close()
+            return port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Mock não subiu na porta {port}")
+
+
+def make_app(workdir, name, **config):
+    return create_app({'PLC_IP': 'localhost', 'PLC_PORT': 5999, 'COLLECT_TEMPERATURE': False,
+                       'TEMPERATURE_DB': os.path.join(workdir, f'{name}.db'), **config})
+
+
+def test_create_app_is_lazy():
+    workdir = tempfile.mkdtemp(prefix='test_app_factory_')
+    try:
+        threads = set(threading.enumerate())
+        app = make_app(workdir, 'lazy', SCAN_INTERVAL=0.5)
+        db_path = app.config['TEMPERATURE_DB']
+        services = app.extensions['plc_services']
+
+        # Nada em background e nenhum arquivo criado só por montar o app
+        assert not set(threading.enumerate()) - threads
+        assert not services.running and not os.path.exists(db_path)
+
+        # Padrões completados pela configuração passada
+        assert isinstance(services, PLCServices)
+        assert app.config['SCAN_INTERVAL'] == 0.5 and services.plc_device.interval == 0.5
+        assert app.config['MAX_BATCH_OPERATIONS'] == DEFAULT_CONFIG['MAX_BATCH_OPERATIONS']
+        assert app.config['VARIABLES'] is web_server.VARIABLES
+
+        client = app.test_client()
+        assert client.get('/api/config').get_json() == {'ip': 'localhost', 'port': 5999, 'connected': False}
+        assert client.get('/api/variables').get_json() == web_server.VARIABLES
+        tags = client.get('/api/tags').get_json()
+        assert tags['tags'] == {} and tags['poller']['scans'] == 0 and tags['stream']['clients'] == 0
+        assert not os.path.exists(db_path)
+
+        # Primeira consulta de temperatura abre (e cria) o banco
+        response = client.get('/api/temperature/current')
+        assert response.status_code == 404, response.get_json()
+        assert os.path.exists(db_path) and not services.running
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_services_per_app():
+    workdir = tempfile.mkdtemp(prefix='test_app_factory_')
+    try:
+        app_a = make_app(workdir, 'a')
+        app_b = make_app(workdir, 'b')
+        services_a = app_a.extensions['plc_services']
+        assert services_a is not app_b.extensions['plc_services']
+
+        collector = services_a.temp_collector
+        collector.open()
+        collector._save_reading(42.5, False, 0.0)
+        collector.stop()
+
+        # Cada rota usa o backend do app que recebeu a requisição
+        client_a, client_b = app_a.test_client(), app_b.test_client()
+        assert client_a.get('/api/temperature/current').get_json()['temperature'] == 42.5
+        assert client_b.get('/api/temperature/current').status_code == 404
+
+        response = client_a.post('/api/config', json={'ip': '127.0.0.1', 'port': 5888})
+        assert response.get_json() == {'success': True, 'ip': '127.0.0.1', 'port': 5888}
+        assert services_a.plc_device.port == 5888 and collector.plc_port == 5888
+        assert client_b.get('/api/config').get_json()['port'] == 5999
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_interfaces_share_backend():
+    workdir = tempfile.mkdtemp(prefix='test_app_factory_')
+    try:
+        port = start_mock_server()
+        app = make_app(workdir, 'shared', PLC_PORT=port)
+        client = app.test_client()
+
+        response = client.post('/api/write/int/3', json={'value': 77})
+        assert response.status_code == 200, response.get_json()
+        response = client.post('/api/int/read', json={'address': 3})
+        assert response.get_json()['value'] == 77 and response.get_json()['source'] == 'live'
+        assert client.post('/api/int/read', json={'address': 3}).get_json()['source'] == 'cache'
+
+        # Escrita pela interface /console invalida a tabela usada pela página principal
+        assert client.post('/api/write/int/3', json={'value': 78}).status_code == 200
+        response = client.post('/api/int/read', json={'address': 3})
+        assert response.get_json()['value'] == 78 and response.get_json()['source'] == 'live'
+        assert client.get('/api/read/int/3').get_json() == {'success': True, 'value': 78}
+        assert client.get('/api/config').get_json()['connected']
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DA FÁBRICA DO APP")
+    print("=" * 60)
+    test_create_app_is_lazy()
+    print("✅ create_app não inicia threads nem abre o banco antes da primeira consulta")
+    test_services_per_app()
+    print("✅ Um PLCServices por app em app.extensions; rotas usam o do app da requisição")
+    test_interfaces_share_backend()
+    print("✅ Rotas de web_app e web_server sobre o mesmo backend")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Teste da carga em massa (bulk_ingest.py) e do replay no mock_server.py
+
+Carrega um CSV de logger antigo (';', vírgula decimal, DD/MM/YYYY) e um CSV
+exportado por history_export em um banco temporário e confere linhas, ids,
+taxa calculada, índice recriado e rollups iguais aos recalculados do zero,
+e que a carga recusa rodar com o coletor gravando.
+Depois toca uma série gravada no mock acelerada e lê a temperatura pelo
+Modbus, como o coletor faria, e confere que um erro no replay aparece no log
+do mock.
+
+Uso:
+    python test_bulk_ingest.py
+"""
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from bulk_ingest import ingest, read_series
+from history_export import export
+from mock_server import run_server
+from modbus_client import ModbusCLP
+from rollups import RESOLUTIONS, rebuild_rollups, table
+from temperature_monitor import TemperatureCollector
+
+START = datetime(2019, 3, 1, 8, 0, 0)
+LEGACY_COUNT = 7000
+
+
+def write_legacy_csv(path):
+    """Logger antigo: ';' como separador, vírgula decimal, horário DD/MM/YYYY, uma linha inválida"""
+    start_ms = int(START.timestamp() * 1000)
+    expected = []
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('Data_Hora;Temperatura\n')
+        for i in range(LEGACY_COUNT):
+            ts = start_ms + 10000 * i
+            temperature = round(22 + (i % 300) / 100, 2)
+            text = datetime.fromtimestamp(ts / 1000).strftime('%d/%m/%Y %H:%M:%S')
+            f.write(f'{text};{str(temperature).replace(".", ",")}\n')
+            expected.append((ts, temperature))
+            if i == 100:
+                f.write('erro de leitura;---\n')
+    return expected
+
+
+def rollups(conn):
+    return {suffix: conn.execute(f'SELECT * FROM {table(suffix)} ORDER BY bucket').fetchall()
+            for suffix, _ in RESOLUTIONS}
+
+
+def test_read_series():
+    workdir = tempfile.mkdtemp(prefix='test_ingest_')
+    try:
+        path = os.path.join(workdir, 'logger.csv')
+        expected = write_legacy_csv(path)
+        stats = {}
+        chunks = list(read_series(path, chunk_size=1000, stats=stats))
+        assert len(chunks) == 7 and stats['skipped'] == 1
+        rows = [row for chunk in chunks for row in chunk]
+        assert [(ts, temperature) for ts, temperature, _, _ in rows] == expected
+        assert all(anomaly is None and rate is None for _, _, anomaly, rate in rows)
+
+        # Sem cabeçalho, epoch em segundos, vírgula como separador
+        with open(path, 'w') as f:
+            f.write('1735689600,21.5\n1735689605.5,21.75\n')
+        assert next(read_series(path)) == [(1735689600000, 21.5, None, None), (1735689605500, 21.75, None, None)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_ingest():
+    workdir = tempfile.mkdtemp(prefix='test_ingest_')
+    try:
+        legacy_path = os.path.join(workdir, 'logger.csv')
+        expected = write_legacy_csv(legacy_path)
+
+        # Banco de origem com anomalias e taxas próprias, exportado em CSV
+        source_db = os.path.join(workdir, 'origem.db')
+        TemperatureCollector(db_path=source_db).ensure_database()
+        conn = sqlite3.connect(source_db)
+        base_ms = expected[-1][0] + 60000
+        source_rows = [(i + 1, base_ms + 5000 * i, 30 + (i % 40) / 10, int(i % 53 == 0), i / 100) for i in range(3000)]
+        conn.executemany('INSERT INTO temperature_samples VALUES (?, ?, ?, ?, ?)', source_rows)
+        conn.commit()
+        conn.close()
+        export_path = os.path.join(workdir, 'exportado.csv')
+        with open(export_path, 'wb') as f:
+            for block in export(source_db, 'csv'):
+                f.write(block)
+
+        db_path = os.path.join(workdir, 'carga.db')
+        result = ingest(db_path, [legacy_path, export_path], chunk_size=1000, commit_rows=2500)
+        assert result['rows'] == LEGACY_COUNT + len(source_rows) and result['skipped'] == 1
+
+        conn = sqlite3.connect(db_path)
+        stored = conn.execute('SELECT id, ts, temperature, anomaly, rate_of_change FROM temperature_samples '
+                              'ORDER BY id').fetchall()
+        assert [row[0] for row in stored] == list(range(1, result['rows'] + 1))
+        assert [(ts, temperature) for _, ts, temperature, _, _ in stored[:LEGACY_COUNT]] == expected
+        # Taxa calculada entre linhas seguidas (°C/s) quando o arquivo não a traz
+        assert stored[0][4] == 0.0 and abs(stored[1][4] - 0.001) < 1e-9
+        # Colunas anomaly/rate_of_change do arquivo preservadas
+        assert [row[1:] for row in stored[LEGACY_COUNT:]] == [row[1:] for row in source_rows]
+
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_samples_ts'").fetchone()
+        loaded = rollups(conn)
+        rebuild_rollups(conn)
+        assert loaded == rollups(conn)
+        count, total = conn.execute(f'SELECT SUM(count), SUM(sum) FROM {table("1d")}').fetchone()
+        assert count == result['rows']
+        assert abs(total - sum(row[2] for row in stored)) < 1e-6
+        conn.close()
+
+        # Segunda carga continua os ids
+        assert ingest(db_path, [export_path])['rows'] == len(source_rows)
+        conn = sqlite3.connect(db_path)
+        assert conn.execute('SELECT COUNT(*), MAX(id) FROM temperature_samples').fetchone() == \
+               (result['rows'] + len(source_rows),) * 2
+
+        # Amostra recente = coletor gravando: os ids da carga colidiriam com os dele
+        total = conn.execute('SELECT COUNT(*) FROM temperature_samples').fetchone()[0]
+        conn.execute('INSERT INTO temperature_samples VALUES (?, ?, 25.0, 0, 0.0)',
+                     (total + 1, int(time.time() * 1000)))
+        conn.commit()
+        try:
+            ingest(db_path, [export_path])
+            raise AssertionError("Carga rodou com o coletor gravando")
+        except RuntimeError as e:
+            assert '--force' in str(e), e
+        assert conn.execute('SELECT COUNT(*) FROM temperature_samples').fetchone()[0] == total + 1
+        assert ingest(db_path, [export_path], force=True)['rows'] == len(source_rows)
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def start_replay_server(source, speed):
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        port = sock.getsockname()[1]
+    replay = {'source': source, 'address': 0, 'speed': speed}
+    threading.Thread(target=lambda: asyncio.run(run_server(port, replay)), daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('localhost', port), timeout=0.1).close()
+            return port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Mock não subiu na porta {port}")
+
+
+def test_replay():
+    workdir = tempfile.mkdtemp(prefix='test_ingest_')
+    try:
+        # 40 amostras a cada 10 s tocadas a x200: 50 ms por amostra, ~2 s no total
+        path = os.path.join(workdir, 'serie.csv')
+        values = [round(20 + i * 0.25, 2) for i in range(40)]
+        with open(path, 'w') as f:
+            f.write('ts,temperature\n')
+            f.writelines(f'{1735689600000 + 10000 * i},{value}\n' for i, value in enumerate(values))
+
+        started = time.monotonic()
+        port = start_replay_server(path, speed=200)
+        plc = ModbusCLP('localhost', port)
+        assert plc.connect()
+        try:
+            seen = []
+            while time.monotonic() - started < 5:
+                temperature = round(plc.read_real(0), 2)
+                if not seen or seen[-1] != temperature:
+                    seen.append(temperature)
+                if temperature == values[-1]:
+                    break
+                time.sleep(0.02)
+            elapsed = time.monotonic() - started
+        finally:
+            plc.close()
+        assert seen[-1] == values[-1], seen
+        assert set(seen) <= set(values) | {0.0}
+        assert len(seen) >= 10  # Leituras acompanham a série, não só o último valor
+        assert 1.5 < elapsed < 4, elapsed  # 39 intervalos de 50 ms
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_replay_error_logged():
+    handler = ListHandler()
+    logging.getLogger().addHandler(handler)
+    try:
+        port = start_replay_server('/nao/existe/serie.csv', speed=1)
+        for _ in range(50):
+            if any('Replay interrompido' in record.getMessage() for record in handler.records):
+                break
+            time.sleep(0.05)
+        errors = [record for record in handler.records if 'Replay interrompido' in record.getMessage()]
+        assert errors and errors[0].levelno == logging.ERROR, [r.getMessage() for r in handler.records]
+        assert isinstance(errors[0].exc_info[1], FileNotFoundError)
+        # O servidor continua atendendo sem o replay
+        plc = ModbusCLP('localhost', port)
+        assert plc.connect()
+        plc.close()
+    finally:
+        logging.getLogger().removeHandler(handler)
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DA CARGA EM MASSA E DO REPLAY")
+    print("=" * 60)
+    test_read_series()
+    print("✅ CSV de logger (';', vírgula decimal, DD/MM/YYYY) lido em lotes, linha inválida pulada")
+    test_ingest()
+    print("✅ Carga com ids contínuos, taxa calculada, índice e rollups recriados")
+    test_replay()
+    print("✅ Série tocada no mock acelerada e lida pelo Modbus")
+    test_replay_error_logged()
+    print("✅ Erro no replay registrado no log do mock")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Teste do circuit breaker e do timeout adaptativo do pool de conexões
+
+Sobe na própria máquina um mock que nunca responde (--stall) e um que
+derruba a conexão (--drop), em portas livres, e verifica que depois de
+algumas falhas o pool passa a recusar chamadas na hora em vez de esperar
+o timeout Modbus. Também coloca um proxy com atraso na frente do mock e
+verifica que o timeout adaptativo reaprende quando o CLP fica mais lento.
+Não precisa do CLP nem do mock_server rodando.
+
+Uso:
+    python test_circuit_breaker.py
+"""
+import asyncio
+import socket
+import threading
+import time
+from circuit_breaker import CircuitBreaker, RttTracker
+from connection_pool import ModbusConnectionPool, CircuitOpenError, PLCUnavailableError
+from mock_server import run_faulty_server, run_server
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def start_faulty_server(mode):
+    port = free_port()
+    thread = threading.Thread(target=lambda: asyncio.run(run_faulty_server(mode, port)), daemon=True)
+    thread.start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('localhost', port), timeout=0.1).close()
+            return port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Mock {mode} não subiu na porta {port}")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_half_open_recovery():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow_request()
+
+    clock.now = 5.0
+    assert breaker.allow_request()       # Chamada de teste
+    assert not breaker.allow_request()   # Só uma por vez
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    clock.now = 10.0
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.stats()['times_opened'] == 2
+
+
+def test_rtt_tracker_timeout():
+    tracker = RttTracker(min_samples=10, multiplier=3.0, min_timeout=0.05, max_timeout=2.0)
+    assert tracker.timeout() == 2.0      # Sem amostras: usa o teto
+
+    for _ in range(100):
+        tracker.record(0.010)
+    assert abs(tracker.timeout() - 0.05) < 1e-9   # 10 ms x 3 fica abaixo do piso
+
+    for _ in range(100):
+        tracker.record(0.100)
+    assert abs(tracker.timeout() - 0.3) < 1e-9
+
+    for _ in range(5):
+        tracker.record(10.0)
+    assert tracker.timeout() == 2.0      # Nunca passa do teto
+
+
+def wait_port(port):
+    for _ in range(50):
+        try:
+            socket.create_connection(('localhost', port), timeout=0.1).close()
+            return port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Nada escutando na porta {port}")
+
+
+def start_delay_proxy(target_port, delay):
+    """Proxy TCP que atrasa cada resposta do mock em delay['s'] segundos (link ou CLP lento)"""
+    async def pipe(reader, writer, wait):
+        try:
+            while data := await reader.read(260):
+                if wait:
+                    await asyncio.sleep(delay['s'])
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection('localhost', target_port)
+        await asyncio.gather(pipe(client_reader, server_writer, False), pipe(server_reader, client_writer, True))
+
+    async def serve(port):
+        server = await asyncio.start_server(handle, 'localhost', port)
+        async with server:
+            await server.serve_forever()
+
+    port = free_port()
+    threading.Thread(target=lambda: asyncio.run(serve(port)), daemon=True).start()
+    return wait_port(port)
+
+
+def test_timeout_relearns_when_latency_rises():
+    mock_port = free_port()
+    threading.Thread(target=lambda: asyncio.run(run_server(mock_port)), daemon=True).start()
+    wait_port(mock_port)
+    delay = {'s': 0.0}
+    port = start_delay_proxy(mock_port, delay)
+    pool = ModbusConnectionPool(timeout=3, retries=0, failure_threshold=3, reset_timeout=30)
+
+    def read():
+        with pool.connection('localhost', port) as clp:
+            clp.read_register_block(0, 1)
+
+    for _ in range(30):
+        read()
+    assert pool.circuit_state('localhost', port)['rtt']['timeout_ms'] == 200.0  # Aprendeu o piso
+
+    # CLP passa a responder em 350 ms: no máximo uma chamada estoura o timeout aprendido
+    delay['s'] = 0.35
+    failures = 0
+    for _ in range(25):
+        try:
+            read()
+        except Exception:
+            failures += 1
+    state = pool.circuit_state('localhost', port)
+    assert failures <= 1, failures
+    assert state['state'] == 'closed' and state['times_opened'] == 0, state
+    assert state['rtt']['timeout_ms'] >= 1000, state  # Reaprendeu: 350 ms x 3
+    pool.close_all()
+
+
+def test_half_open_trial_uses_max_timeout():
+    mock_port = free_port()
+    threading.Thread(target=lambda: asyncio.run(run_server(mock_port)), daemon=True).start()
+    wait_port(mock_port)
+    delay = {'s': 0.0}
+    port = start_delay_proxy(mock_port, delay)
+    pool = ModbusConnectionPool(timeout=3, retries=0, failure_threshold=1, reset_timeout=0.2)
+    for _ in range(30):
+        with pool.connection('localhost', port) as clp:
+            clp.read_register_block(0, 1)
+
+    # Circuito aberto por outro motivo; enquanto isso o CLP ficou lento e o histórico segue curto
+    device = pool._device('localhost', port, 0)
+    device.breaker.record_failure()
+    assert device.breaker.state == 'open'
+    for _ in range(30):
+        device.rtt.record(0.005)
+    delay['s'] = 0.35
+    time.sleep(0.25)
+    with pool.connection('localhost', port) as clp:   # Chamada de teste com 3 s, não 200 ms
+        clp.read_register_block(0, 1)
+    assert device.breaker.state == 'closed'
+    pool.close_all()
+
+
+def _assert_opens_and_fails_fast(mode):
+    port = start_faulty_server(mode)
+    pool = ModbusConnectionPool(timeout=0.3, retries=0, failure_threshold=3, reset_timeout=30, backoff_initial=0)
+
+    for _ in range(3):
+        try:
+            with pool.connection('localhost', port) as clp:
+                clp.read_register_block(0, 1)
+        except CircuitOpenError:
+            raise AssertionError("Circuito abriu antes do limite de falhas")
+        except Exception:
+            pass
+
+    assert pool.circuit_state('localhost', port)['state'] == 'open'
+
+    start = time.perf_counter()
+    try:
+        with pool.connection('localhost', port):
+            raise AssertionError("Conexão deveria ter sido recusada")
+    except CircuitOpenError as e:
+        assert e.retry_after > 0
+    elapsed = time.perf_counter() - start
+    assert elapsed < 0.05, f"Falha rápida demorou {elapsed * 1000:.1f} ms"
+
+    assert isinstance(CircuitOpenError("x"), PLCUnavailableError)
+    assert not pool.check('localhost', port)
+    pool.close_all()
+    return elapsed
+
+
+def test_stalled_plc_opens_circuit():
+    _assert_opens_and_fails_fast('stall')
+
+
+def test_dropping_plc_opens_circuit():
+    _assert_opens_and_fails_fast('drop')
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DO CIRCUIT BREAKER")
+    print("=" * 60)
+
+    test_breaker_half_open_recovery()
+    print("✅ closed -> open -> half_open -> closed")
+
+    test_rtt_tracker_timeout()
+    print("✅ Timeout adaptativo respeita piso e teto")
+
+    test_timeout_relearns_when_latency_rises()
+    print("✅ CLP mais lento: timeout reaprendido sem abrir o circuito")
+
+    test_half_open_trial_uses_max_timeout()
+    print("✅ Chamada de teste do half-open usa o timeout máximo")
+
+    for mode in ('stall', 'drop'):
+        elapsed = _assert_opens_and_fails_fast(mode)
+        print(f"✅ CLP '{mode}': circuito aberto, chamada recusada em {elapsed * 1000:.2f} ms")
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
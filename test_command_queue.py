@@ -0,0 +1,100 @@
+"""
+Teste da fila de comandos por CLP (prioridades e prazos)
+
+Sobe o mock_server em uma porta livre e verifica que, com a thread de I/O
+ocupada, um comando passa na frente de leituras e varreduras já
+enfileiradas e que operações com prazo vencido são descartadas.
+
+Uso:
+    python test_command_queue.py
+"""
+import asyncio
+import socket
+import threading
+import time
+from command_queue import (DeviceCommandQueue, DeadlineExceededError,
+                           PRIORITY_COMMAND, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND)
+from connection_pool import ModbusConnectionPool
+from mock_server import run_server
+
+
+def start_mock_server():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        port = sock.getsockname()[1]
+    threading.Thread(target=lambda: asyncio.run(run_server(port)), daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('localhost', port), timeout=0.1).close()
+            return port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Mock não subiu na porta {port}")
+
+
+PORT = None
+
+
+def make_queue():
+    global PORT
+    if PORT is None:
+        PORT = start_mock_server()
+    return DeviceCommandQueue('localhost', PORT, pool=ModbusConnectionPool())
+
+
+def test_priority_order():
+    queue = make_queue()
+    order = []
+    busy = queue.submit(lambda clp: time.sleep(0.2), PRIORITY_BACKGROUND)
+    time.sleep(0.05)  # Garante que a thread de I/O já está ocupada
+
+    futures = [queue.submit(lambda clp, i=i: order.append(f'scan{i}') or clp.read_int(0), PRIORITY_BACKGROUND)
+               for i in range(5)]
+    futures.append(queue.submit(lambda clp: order.append('read') or clp.read_real(1), PRIORITY_INTERACTIVE))
+    futures.append(queue.submit(lambda clp: order.append('stop') or clp.write_bool(1, True), PRIORITY_COMMAND))
+
+    busy.result()
+    for future in futures:
+        future.result()
+    assert order[:2] == ['stop', 'read'], order
+    assert order[2:] == [f'scan{i}' for i in range(5)], order
+
+    stats = queue.stats()['priorities']
+    assert stats['command']['executed'] == 1
+    assert stats['background']['executed'] == 6
+    queue.close()
+
+
+def test_deadline_drops_stale_reads():
+    queue = make_queue()
+    queue.submit(lambda clp: time.sleep(0.2), PRIORITY_BACKGROUND)
+    time.sleep(0.05)
+
+    stale = queue.submit(lambda clp: clp.read_int(0), PRIORITY_INTERACTIVE, deadline=0.05)
+    fresh = queue.submit(lambda clp: clp.read_int(0), PRIORITY_INTERACTIVE, deadline=5)
+
+    try:
+        stale.result()
+        raise AssertionError("Leitura com prazo vencido não deveria ter rodado")
+    except DeadlineExceededError:
+        pass
+    fresh.result()
+
+    stats = queue.stats()['priorities']['interactive']
+    assert stats['expired'] == 1 and stats['executed'] == 1, stats
+    queue.close()
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DA FILA DE COMANDOS")
+    print("=" * 60)
+    test_priority_order()
+    print("✅ Comando executado antes de leituras e varreduras pendentes")
+    test_deadline_drops_stale_reads()
+    print("✅ Leitura com prazo vencido descartada")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
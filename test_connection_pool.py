@@ -0,0 +1,185 @@
+"""
+Teste do pool de conexões Modbus (connection_pool.py)
+
+Sobe o mock_server em uma porta livre e verifica que o pool empresta e
+devolve conexões (reaproveitando o socket), troca uma conexão quebrada,
+ociosa demais ou que falhou no meio de uma operação por uma nova, e que com
+todos os slots ocupados o pedido espera até acquire_timeout e então falha
+com PLCUnavailableError. Também confere o backoff quando o CLP recusa a
+conexão. Não precisa do CLP nem do mock_server rodando.
+
+Uso:
+    python test_connection_pool.py
+"""
+import asyncio
+import socket
+import threading
+import time
+from connection_pool import ModbusConnectionPool, PLCUnavailableError
+from modbus_client import ModbusCommunicationError
+from mock_server import run_server
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server():
+    port = free_port()
+    threading.Thread(target=lambda: asyncio.run(run_server(port)), daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('localhost', port), timeout=0.1).close()
+            return port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Mock não subiu na porta {port}")
+
+
+def device_stats(pool, port):
+    return pool.stats()[f'localhost:{port}/0']
+
+
+def test_checkout_and_return():
+    port = start_mock_server()
+    pool = ModbusConnectionPool(max_connections=2)
+    with pool.connection('localhost', port) as clp:
+        assert clp.write_int(7, 321)
+        assert device_stats(pool, port)['in_use'] == 1
+        first = clp
+    assert device_stats(pool, port)['idle'] == 1 and device_stats(pool, port)['in_use'] == 0
+
+    # Devolvida ao pool: o mesmo socket é reaproveitado
+    with pool.connection('localhost', port) as clp:
+        assert clp is first and clp.read_int(7) == 321
+
+    # Duas ao mesmo tempo: a segunda é um socket novo; as duas voltam ociosas
+    with pool.connection('localhost', port) as a, pool.connection('localhost', port) as b:
+        assert a is not b and {a, b} >= {first}
+        assert device_stats(pool, port)['in_use'] == 2
+    assert device_stats(pool, port)['idle'] == 2
+    assert pool.is_connected('localhost', port)
+    pool.close_all()
+    assert device_stats(pool, port)['idle'] == 0 and not pool.is_connected('localhost', port)
+
+
+def test_broken_connection_replaced():
+    port = start_mock_server()
+    pool = ModbusConnectionPool(probe_after=0)
+
+    # Socket fechado enquanto estava ocioso: a verificação antes do uso o descarta
+    with pool.connection('localhost', port) as clp:
+        broken = clp
+    broken.client.close()
+    with pool.connection('localhost', port) as clp:
+        assert clp is not broken and clp.write_int(8, 55) and clp.read_int(8) == 55
+        healthy = clp
+
+    # Falha de comunicação no meio da operação: o socket não volta ao pool
+    try:
+        with pool.connection('localhost', port) as clp:
+            assert clp is healthy
+            raise ModbusCommunicationError("timeout simulado")
+    except ModbusCommunicationError:
+        pass
+    assert device_stats(pool, port)['idle'] == 0
+    with pool.connection('localhost', port) as clp:
+        assert clp is not healthy and clp.read_int(8) == 55
+
+    # Erro de aplicação (o CLP respondeu): o socket continua bom e volta
+    try:
+        with pool.connection('localhost', port) as clp:
+            kept = clp
+            raise ValueError("erro do chamador")
+    except ValueError:
+        pass
+    with pool.connection('localhost', port) as clp:
+        assert clp is kept
+
+    # Ocioso além de idle_timeout: fechado e trocado
+    pool.idle_timeout = 0.05
+    time.sleep(0.1)
+    with pool.connection('localhost', port) as clp:
+        assert clp is not kept and clp.read_int(8) == 55
+    pool.close_all()
+
+
+def test_exhaustion_and_timeout():
+    port = start_mock_server()
+    pool = ModbusConnectionPool(max_connections=1, acquire_timeout=0.3)
+    holding = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.connection('localhost', port):
+            holding.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    assert holding.wait(5)
+    try:
+        started = time.monotonic()
+        try:
+            with pool.connection('localhost', port):
+                raise AssertionError("Conexão emprestada com o pool esgotado")
+        except PLCUnavailableError as e:
+            assert 'Limite de 1' in str(e), e
+        elapsed = time.monotonic() - started
+        assert 0.25 < elapsed < 1.0, elapsed
+
+        # Slot liberado dentro do acquire_timeout: o pedido espera e consegue
+        threading.Timer(0.1, release.set).start()
+        started = time.monotonic()
+        with pool.connection('localhost', port) as clp:
+            assert clp.read_int(0) is not None
+        assert 0.05 < time.monotonic() - started < 0.3
+    finally:
+        release.set()
+        thread.join()
+    pool.close_all()
+
+
+def test_refused_connection_backoff():
+    port = free_port()  # Ninguém escutando
+    pool = ModbusConnectionPool(backoff_initial=0.3, failure_threshold=100)
+    try:
+        with pool.connection('localhost', port):
+            raise AssertionError("Conectou em uma porta fechada")
+    except PLCUnavailableError as e:
+        assert 'Falha ao conectar' in str(e), e
+    # Dentro do backoff: recusa sem tentar de novo
+    try:
+        with pool.connection('localhost', port):
+            raise AssertionError("Conectou em uma porta fechada")
+    except PLCUnavailableError as e:
+        assert 'nova tentativa em' in str(e), e
+    assert device_stats(pool, port)['failures'] == 1
+    time.sleep(0.35)
+    try:
+        with pool.connection('localhost', port):
+            pass
+    except PLCUnavailableError:
+        pass
+    assert device_stats(pool, port)['failures'] == 2  # Tentou de novo depois do backoff
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DO POOL DE CONEXÕES")
+    print("=" * 60)
+    test_checkout_and_return()
+    print("✅ Conexões emprestadas e devolvidas, socket reaproveitado")
+    test_broken_connection_replaced()
+    print("✅ Conexão quebrada, com falha ou ociosa demais trocada por uma nova")
+    test_exhaustion_and_timeout()
+    print("✅ Pool esgotado espera acquire_timeout e falha com PLCUnavailableError")
+    test_refused_connection_backoff()
+    print("✅ CLP recusando conexão: backoff antes da próxima tentativa")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Teste da distribuição de eventos SSE (event_stream.py)
+
+Confere o formato no fio (event/data/linha em branco), o filtro por tipo de
+evento e por tag de cada assinatura, subscribe/unsubscribe (também ao
+fechar o stream), o heartbeat sem eventos e o cliente lento: com a fila
+cheia os eventos atrasados são descartados e ele recebe um snapshot novo
+seguido só dos eventos mais recentes. Repete o essencial com LoopFanout,
+publicando de outra thread para assinaturas dentro de um event loop.
+
+Uso:
+    python test_event_stream.py
+"""
+import asyncio
+import json
+import threading
+from event_stream import AsyncSubscription, EventBroker, LoopFanout, Subscription, format_sse
+
+TAGS = {'real:1': {'value': 75.5, 'quality': 'good'}, 'int:0': {'value': 3, 'quality': 'good'}}
+
+
+def parse_sse(chunk):
+    """'event: x\\ndata: {...}\\n\\n' -> (x, dados)"""
+    assert chunk.endswith('\n\n'), repr(chunk)
+    lines = chunk[:-2].split('\n')
+    assert len(lines) == 2 and lines[0].startswith('event: ') and lines[1].startswith('data: '), repr(chunk)
+    return lines[0][len('event: '):], json.loads(lines[1][len('data: '):])
+
+
+def pending(subscription):
+    items = []
+    while not subscription.queue.empty():
+        items.append(subscription.queue.get_nowait())
+    return items
+
+
+def test_format_sse():
+    assert format_sse('tags', {'real:1': {'value': 75.5}}) == 'event: tags\ndata: {"real:1":{"value":75.5}}\n\n'
+    # Texto com quebra de linha não quebra o enquadramento: o JSON escapa o \n
+    chunk = format_sse('temperature', {'note': 'linha 1\nlinha 2', 'unit': '°C'})
+    assert parse_sse(chunk) == ('temperature', {'note': 'linha 1\nlinha 2', 'unit': '°C'})
+
+
+def test_subscribe_and_filters():
+    broker = EventBroker(snapshot=lambda: dict(TAGS))
+    everything = broker.subscribe()
+    one_tag = broker.subscribe(events=['tags'], tags=['real:1'])
+    temperature = broker.subscribe(events=['temperature'])
+    assert broker.stats()['clients'] == 3
+
+    broker.publish('tags', dict(TAGS))
+    broker.publish('tags', {'int:0': TAGS['int:0']})
+    broker.publish('temperature', {'temperature': 21.0})
+    assert pending(everything) == [('tags', TAGS), ('tags', {'int:0': TAGS['int:0']}),
+                                   ('temperature', {'temperature': 21.0})]
+    # Só a tag pedida; um evento sem ela não chega
+    assert pending(one_tag) == [('tags', {'real:1': TAGS['real:1']})]
+    assert pending(temperature) == [('temperature', {'temperature': 21.0})]
+
+    broker.unsubscribe(everything)
+    broker.unsubscribe(everything)  # Duas vezes não é erro
+    broker.publish('temperature', {'temperature': 22.0})
+    assert pending(everything) == [] and len(pending(temperature)) == 1
+    stats = broker.stats()
+    assert stats['clients'] == 2 and stats['published'] == 4 and stats['resyncs'] == 0, stats
+
+
+def test_stream_framing_and_heartbeat():
+    broker = EventBroker(heartbeat=0.05, snapshot=lambda: dict(TAGS))
+    subscription = broker.subscribe(tags=['int:0'])
+    stream = broker.stream(subscription)
+
+    assert next(stream) == 'retry: 3000\n\n'
+    assert parse_sse(next(stream)) == ('snapshot', {'int:0': TAGS['int:0']})
+    broker.publish('tags', {'int:0': {'value': 4, 'quality': 'good'}})
+    assert parse_sse(next(stream)) == ('tags', {'int:0': {'value': 4, 'quality': 'good'}})
+    event, data = parse_sse(next(stream))  # Nada publicado: heartbeat
+    assert event == 'heartbeat' and data['time'] > 0
+
+    # Cliente desconectou (gerador fechado): a assinatura sai do broker
+    stream.close()
+    assert broker.stats()['clients'] == 0
+
+
+def test_slow_consumer_resync():
+    broker = EventBroker(heartbeat=0.05, snapshot=lambda: dict(TAGS))
+    subscription = broker.attach(Subscription(events=['temperature', 'tags'], max_queue=4))
+    for i in range(6):
+        broker.publish('temperature', {'temperature': float(i)})
+
+    # A 5ª não coube: as 4 atrasadas foram descartadas e no lugar vai um resync; a 6ª entra depois
+    assert subscription.resyncs == 1 and broker.stats()['resyncs'] == 1
+    stream = broker.stream(subscription)
+    assert next(stream) == 'retry: 3000\n\n'
+    assert parse_sse(next(stream))[0] == 'snapshot'
+    assert parse_sse(next(stream)) == ('snapshot', TAGS)  # Estado completo de novo
+    assert parse_sse(next(stream)) == ('temperature', {'temperature': 5.0})
+    assert parse_sse(next(stream))[0] == 'heartbeat'
+    stream.close()
+
+
+def test_loop_fanout():
+    broker = EventBroker(heartbeat=0.05, snapshot=lambda: dict(TAGS))
+
+    async def scenario():
+        fanout = LoopFanout(broker, asyncio.get_running_loop())
+        first = fanout.subscribe(events=['tags'], tags=['real:1'])
+        second = fanout.subscribe(events=['tags'], tags=['real:1'])
+        temperature = fanout.subscribe(events=['temperature'])
+        # O broker enxerga um único assinante, que conta os clientes do loop
+        assert broker.stats()['clients'] == 3
+
+        # Publicado de outra thread, como fazem o poller e o coletor
+        thread = threading.Thread(target=lambda: (broker.publish('tags', dict(TAGS)),
+                                                  broker.publish('temperature', {'temperature': 20.0})))
+        thread.start()
+        thread.join()
+        await asyncio.sleep(0.05)
+
+        (event, chunk), = pending(first)
+        assert event == 'tags' and parse_sse(chunk) == ('tags', {'real:1': TAGS['real:1']})
+        # Mesmo filtro: o texto SSE é serializado uma vez e compartilhado
+        (_, shared), = pending(second)
+        assert shared is chunk
+        (_, chunk), = pending(temperature)
+        assert parse_sse(chunk) == ('temperature', {'temperature': 20.0})
+
+        stream = fanout.stream(first)
+        assert await anext(stream) == 'retry: 3000\n\n'
+        assert parse_sse(await anext(stream)) == ('snapshot', {'real:1': TAGS['real:1']})
+        broker.publish('tags', {'real:1': {'value': 80.0, 'quality': 'good'}})
+        assert parse_sse(await anext(stream)) == ('tags', {'real:1': {'value': 80.0, 'quality': 'good'}})
+        assert parse_sse(await anext(stream))[0] == 'heartbeat'
+        await stream.aclose()
+        assert first not in fanout.subscriptions and fanout.clients == 2
+
+        # Cliente lento dentro do loop: mesmo descarte com resync
+        slow = AsyncSubscription(events=['temperature'], max_queue=3)
+        fanout.subscriptions.add(slow)
+        for i in range(5):
+            broker.publish('temperature', {'temperature': float(i)})
+        await asyncio.sleep(0.05)
+        assert slow.resyncs == 1 and broker.stats()['resyncs'] == 1
+        stream = fanout.stream(slow)
+        assert await anext(stream) == 'retry: 3000\n\n'
+        assert parse_sse(await anext(stream)) == ('snapshot', {})
+        assert parse_sse(await anext(stream)) == ('snapshot', {})  # Resync (filtro sem tags)
+        assert parse_sse(await anext(stream)) == ('temperature', {'temperature': 4.0})
+        await stream.aclose()
+        fanout.unsubscribe(second)
+        fanout.unsubscribe(temperature)
+        assert fanout.clients == 0
+
+    asyncio.run(scenario())
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DA DISTRIBUIÇÃO DE EVENTOS (SSE)")
+    print("=" * 60)
+    test_format_sse()
+    print("✅ Formato event/data/linha em branco, JSON compacto")
+    test_subscribe_and_filters()
+    print("✅ subscribe/unsubscribe e filtro por evento e por tag")
+    test_stream_framing_and_heartbeat()
+    print("✅ Stream: retry, snapshot, eventos, heartbeat; fechar cancela a assinatura")
+    test_slow_consumer_resync()
+    print("✅ Cliente lento: atrasados descartados, snapshot novo e só os eventos recentes")
+    test_loop_fanout()
+    print("✅ LoopFanout: publicação de outra thread, serialização compartilhada, resync")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
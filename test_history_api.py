@@ -0,0 +1,293 @@
+"""
+Teste de /api/temperature/history pelo cliente de teste do Flask
+
+Grava amostras pelo coletor em um banco temporário e confere o cache com
+ETag (response_cache.py): If-None-Match igual responde 304 sem corpo, uma
+leitura nova muda o ETag, e Accept-Encoding escolhe gzip/brotli (cada
+codificação com ETag própria, corpos pequenos sem compressão). Confere
+também o cursor incremental (?since=): corte estrito, has_more e ids
+sempre crescentes mesmo com amostras no mesmo instante, tanto do buffer em
+memória quanto do banco. Por fim, as codificações de history_encoding.py:
+o binário (cabeçalho '<4sIq?7x' + colunas) volta igual por decode_binary, e
+colunar, binário e linhas trazem as mesmas leituras pelo endpoint.
+
+Uso:
+    python test_history_api.py
+"""
+import gzip
+import json
+import math
+import os
+import shutil
+import struct
+import tempfile
+from datetime import datetime
+from app_factory import create_app
+from history_encoding import (BINARY_HEADER, BINARY_MAGIC, FORMAT_BINARY, FORMAT_COLUMNS, FORMAT_ROWS, MIMETYPES,
+                              decode_binary, encode_history, local_timestamp)
+from response_cache import BROTLI_AVAILABLE, COMPRESS_MIN_BYTES
+
+# 2025-01-01 00:00:00 UTC
+START_MS = 1735689600000
+
+
+def make_app(workdir, **config):
+    return create_app({'COLLECT_TEMPERATURE': False, 'TEMPERATURE_DB': os.path.join(workdir, 'history.db'),
+                       **config})
+
+
+def add_samples(app, samples):
+    """Grava (ts, temperatura) pelo gravador do coletor e espera o commit"""
+    collector = app.extensions['plc_services'].temp_collector
+    collector.open()
+    for ts, temperature in samples:
+        collector._save_reading(temperature, False, 0.0, ts=ts)
+    collector.stop()
+    return collector.latest_id
+
+
+def series(count, start_ms=START_MS, step_ms=5000):
+    return [(start_ms + step_ms * i, round(20 + (i % 50) / 10, 2)) for i in range(count)]
+
+
+def test_etag_not_modified():
+    workdir = tempfile.mkdtemp(prefix='test_history_')
+    try:
+        app = make_app(workdir)
+        cache = app.extensions['plc_services'].history_cache
+        client = app.test_client()
+        add_samples(app, series(50))
+
+        response = client.get('/api/temperature/history?limit=20')
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert response.headers['Cache-Control'] == 'no-cache'
+        assert response.headers['Vary'] == 'Accept, Accept-Encoding'
+        assert response.get_json()['count'] == 20
+
+        # Mesma versão: 304 sem corpo e sem consultar de novo
+        response = client.get('/api/temperature/history?limit=20', headers={'If-None-Match': etag})
+        assert response.status_code == 304 and response.data == b''
+        assert response.headers['ETag'] == etag
+        assert cache.stats()['not_modified'] == 1
+
+        # Outro cliente sem a versão: corpo sai do LRU
+        hits = cache.stats()['hits']
+        assert client.get('/api/temperature/history?limit=20').headers['ETag'] == etag
+        assert cache.stats()['hits'] == hits + 1
+
+        # Outros parâmetros, outra representação
+        assert client.get('/api/temperature/history?limit=10').headers['ETag'] != etag
+
+        # Leitura nova: ETag novo e o ETag antigo não dá mais 304
+        latest_id = add_samples(app, [(START_MS + 50 * 5000, 30.0)])
+        response = client.get('/api/temperature/history?limit=20', headers={'If-None-Match': etag})
+        assert response.status_code == 200 and response.headers['ETag'] != etag
+        assert response.get_json()['data'][-1]['id'] == latest_id
+        assert response.get_json()['data'][-1]['temperature'] == 30.0
+        app.extensions['plc_services'].stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_accept_encoding():
+    workdir = tempfile.mkdtemp(prefix='test_history_')
+    try:
+        app = make_app(workdir)
+        client = app.test_client()
+        add_samples(app, series(300))
+
+        plain = client.get('/api/temperature/history?limit=200', headers={'Accept-Encoding': 'identity'})
+        assert 'Content-Encoding' not in plain.headers and len(plain.data) > COMPRESS_MIN_BYTES
+
+        response = client.get('/api/temperature/history?limit=200', headers={'Accept-Encoding': 'gzip, deflate'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data) == plain.data
+        assert response.headers['ETag'] != plain.headers['ETag']
+        assert response.headers['ETag'].strip('"').endswith('-gzip')
+        # ETag de outra codificação não vale para esta
+        assert client.get('/api/temperature/history?limit=200', headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': plain.headers['ETag']}).status_code == 200
+        assert client.get('/api/temperature/history?limit=200', headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']}).status_code == 304
+
+        response = client.get('/api/temperature/history?limit=200', headers={'Accept-Encoding': 'br, gzip'})
+        assert response.headers['Content-Encoding'] == ('br' if BROTLI_AVAILABLE else 'gzip')
+        response = client.get('/api/temperature/history?limit=200', headers={'Accept-Encoding': 'br'})
+        assert response.headers.get('Content-Encoding') == ('br' if BROTLI_AVAILABLE else None)
+
+        # Corpo pequeno: não compensa comprimir
+        response = client.get('/api/temperature/history?limit=2', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+        assert json.loads(response.data)['count'] == 2
+        app.extensions['plc_services'].stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def fetch_since(client, since, limit):
+    response = client.get('/api/temperature/history', query_string={'since': since, 'limit': limit})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def local_text(ms):
+    return datetime.fromtimestamp(ms / 1000).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+def test_since_cursor():
+    workdir = tempfile.mkdtemp(prefix='test_history_')
+    try:
+        # Buffer de 16 amostras: cursores antigos saem do banco, recentes da memória
+        app = make_app(workdir, TEMPERATURE_BUFFER=16)
+        client = app.test_client()
+        # Três amostras por instante: o cursor por id não pode pular nem repetir nenhuma
+        samples = [(START_MS + 1000 * (i // 3), 20 + i / 100) for i in range(60)]
+        latest_id = add_samples(app, samples)
+        assert latest_id == 60
+
+        for start, limit in ((0, 7), (50, 4), (10, 100)):
+            ids, cursor = [], start
+            while True:
+                body = fetch_since(client, cursor, limit)
+                assert body['count'] == len(body['data']) <= limit
+                ids += [item['id'] for item in body['data']]
+                assert body['has_more'] == (ids[-1] < latest_id if ids else False)
+                assert body['cursor'] == (ids[-1] if ids else cursor)
+                cursor = body['cursor']
+                if not body['has_more']:
+                    break
+            assert ids == list(range(start + 1, latest_id + 1)), (start, limit, ids)
+
+        # Nada novo: lista vazia, cursor igual ao enviado
+        body = fetch_since(client, latest_id, 10)
+        assert body == {'count': 0, 'cursor': latest_id, 'has_more': False, 'data': []}
+
+        # Cursor por horário: só as amostras estritamente depois do instante
+        cut_ms = START_MS + 1000 * 5  # Instante das amostras 16, 17 e 18
+        body = fetch_since(client, local_text(cut_ms), 100)
+        assert [item['id'] for item in body['data']] == list(range(19, 61))
+        assert body['cursor'] == 60 and not body['has_more']
+        body = fetch_since(client, local_text(cut_ms), 5)
+        assert [item['id'] for item in body['data']] == list(range(19, 24)) and body['has_more']
+        body = fetch_since(client, local_text(START_MS + 1000 * 18), 100)  # Dentro do buffer
+        assert [item['id'] for item in body['data']] == [58, 59, 60]
+
+        for since in ('ontem', '2025-13-01 00:00:00', '-5'):
+            assert client.get('/api/temperature/history', query_string={'since': since}).status_code == 400
+        app.extensions['plc_services'].stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def float32(value):
+    return struct.unpack('<f', struct.pack('<f', value))[0]
+
+
+def assert_binary_rows(decoded, rows):
+    """decode_binary devolve float32 e NaN para rate nulo; o resto é exato"""
+    assert len(decoded) == len(rows)
+    for (row_id, ts, temperature, anomaly, rate), expected in zip(decoded, rows):
+        assert (row_id, ts, anomaly) == (expected[0], expected[1], bool(expected[3]))
+        assert temperature == float32(expected[2])
+        assert math.isnan(rate) if expected[4] is None else rate == float32(expected[4])
+
+
+def test_encodings_round_trip():
+    rows = [(1, START_MS, 21.5, 0, 0.0), (2, START_MS + 5000, -3.25, 1, None),
+            (2 ** 40, START_MS + 2 ** 33, 1234.567, True, -0.001), (2 ** 40 + 1, START_MS + 2 ** 33 + 1, 0.1, False, 1e-6)]
+
+    body = encode_history(rows, FORMAT_BINARY, cursor=rows[-1][0], has_more=True)
+    assert BINARY_HEADER.size == 24
+    assert len(body) == BINARY_HEADER.size + len(rows) * (8 + 8 + 4 + 4 + 1)
+    assert BINARY_HEADER.unpack_from(body) == (BINARY_MAGIC, len(rows), 2 ** 40 + 1, True)
+    assert body[17:24] == bytes(7)  # Preenchimento zerado
+    decoded, cursor, has_more = decode_binary(body)
+    assert (cursor, has_more) == (2 ** 40 + 1, True)
+    assert_binary_rows(decoded, rows)
+
+    # Sem has_more (consulta das últimas N) e sem linhas
+    assert decode_binary(encode_history(rows[:1], FORMAT_BINARY, cursor=1))[1:] == (1, False)
+    assert decode_binary(encode_history([], FORMAT_BINARY, cursor=99, has_more=False)) == ([], 99, False)
+    try:
+        decode_binary(b'XXXX' + body[4:])
+        raise AssertionError("Magic inválido aceito")
+    except ValueError:
+        pass
+
+    columns = json.loads(encode_history(rows, FORMAT_COLUMNS, cursor=7, has_more=False))
+    assert (columns['count'], columns['cursor'], columns['has_more']) == (4, 7, False)
+    assert columns['columns'] == {
+        'id': [row[0] for row in rows],
+        't': [row[1] for row in rows],
+        'temperature': [row[2] for row in rows],
+        'anomaly': [1 if row[3] else 0 for row in rows],
+        'rate_of_change': [row[4] for row in rows],
+    }
+    assert json.loads(encode_history([], FORMAT_COLUMNS, cursor=0))['columns']['id'] == []
+
+    data = json.loads(encode_history(rows, FORMAT_ROWS, cursor=7))
+    assert 'has_more' not in data
+    assert data['data'][1] == {'id': 2, 'timestamp': local_timestamp(START_MS + 5000), 'temperature': -3.25,
+                               'anomaly': True, 'rate_of_change': None}
+
+
+def test_formats_endpoint():
+    workdir = tempfile.mkdtemp(prefix='test_history_')
+    try:
+        app = make_app(workdir)
+        client = app.test_client()
+        add_samples(app, series(120))
+
+        for query in ({'limit': 50}, {'since': 30, 'limit': 40}, {'since': 100, 'limit': 40}):
+            responses = {fmt: client.get('/api/temperature/history', query_string=query,
+                                         headers={'Accept': mimetype})
+                         for fmt, mimetype in MIMETYPES.items()}
+            for fmt, response in responses.items():
+                assert response.status_code == 200 and response.mimetype == MIMETYPES[fmt], (query, fmt)
+                assert 'Accept' in response.headers['Vary']
+            assert len({response.headers['ETag'] for response in responses.values()}) == 3
+
+            rows_body = responses[FORMAT_ROWS].get_json()
+            expected = [(item['id'], item['timestamp'], item['temperature'], item['anomaly'],
+                         item['rate_of_change']) for item in rows_body['data']]
+
+            columns_body = responses[FORMAT_COLUMNS].get_json()
+            columns = columns_body['columns']
+            assert [(row_id, local_timestamp(ts), temperature, bool(anomaly), rate) for row_id, ts, temperature,
+                    anomaly, rate in zip(columns['id'], columns['t'], columns['temperature'], columns['anomaly'],
+                                         columns['rate_of_change'])] == expected, query
+            assert {key: columns_body[key] for key in rows_body if key != 'data'} == \
+                   {key: value for key, value in rows_body.items() if key != 'data'}
+
+            decoded, cursor, has_more = decode_binary(responses[FORMAT_BINARY].data)
+            assert cursor == rows_body['cursor'] and has_more == rows_body.get('has_more', False)
+            assert_binary_rows(decoded, [(row_id, ts, temperature, anomaly, rate) for (row_id, _, temperature,
+                                         anomaly, rate), ts in zip(expected, columns['t'])])
+
+        # Sem Accept ou com */*: JSON em linhas, como os clientes antigos esperam
+        assert client.get('/api/temperature/history', headers={'Accept': '*/*'}).mimetype == 'application/json'
+        app.extensions['plc_services'].stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DE /api/temperature/history")
+    print("=" * 60)
+    test_etag_not_modified()
+    print("✅ If-None-Match igual responde 304; leitura nova muda o ETag")
+    test_accept_encoding()
+    print("✅ Accept-Encoding escolhe a compressão, com ETag por codificação")
+    test_since_cursor()
+    print("✅ Cursor incremental: corte estrito, has_more e ids crescentes sem pular nem repetir")
+    test_encodings_round_trip()
+    print("✅ Binário (cabeçalho e colunas) e colunar voltam iguais às linhas")
+    test_formats_endpoint()
+    print("✅ Linhas, colunar e binário trazem as mesmas leituras pelo endpoint")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Teste da exportação em massa do histórico (history_export.py e /api/temperature/export)
+
+Grava amostras em um banco temporário e confere que CSV, NDJSON (com e sem
+gzip) e Parquet (se o pyarrow estiver instalado) trazem exatamente as
+linhas do período pedido, chegando em vários blocos, também pelo servidor
+assíncrono (--async), em chunked transfer-encoding, com 304 e HEAD sem corpo.
+
+Uso:
+    python test_history_export.py
+"""
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from app_factory import create_app
+from async_server import AsyncWSGIServer
+from history_export import PARQUET_AVAILABLE, export
+from temperature_monitor import TemperatureCollector
+
+START_MS = 1735689600000
+COUNT = 25000
+
+
+def make_db(workdir):
+    db_path = os.path.join(workdir, 'export.db')
+    TemperatureCollector(db_path=db_path).ensure_database()
+    rows = [(i + 1, START_MS + 1000 * i, 20 + (i % 500) / 100, int(i % 101 == 0), None if i % 7 == 0 else i / 1000)
+            for i in range(COUNT)]
+    conn = sqlite3.connect(db_path)
+    conn.executemany('INSERT INTO temperature_samples VALUES (?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+    return db_path, rows
+
+
+def check_rows(parsed, expected):
+    assert len(parsed) == len(expected), (len(parsed), len(expected))
+    for (row_id, ts, temperature, anomaly, rate), row in zip(expected, parsed):
+        assert (row['id'], row['ts'], row['temperature'], row['anomaly'], row['rate_of_change']) == \
+               (row_id, ts, temperature, bool(anomaly), rate), (row, row_id)
+
+
+def parse_csv(data):
+    return [{'id': int(r['id']), 'ts': int(r['ts']), 'temperature': float(r['temperature']),
+             'anomaly': r['anomaly'] == '1',
+             'rate_of_change': float(r['rate_of_change']) if r['rate_of_change'] else None}
+            for r in csv.DictReader(io.StringIO(data.decode('utf-8')))]
+
+
+def parse_ndjson(data):
+    return [json.loads(line) for line in data.decode('utf-8').splitlines()]
+
+
+def test_export_formats():
+    workdir = tempfile.mkdtemp(prefix='test_export_')
+    try:
+        db_path, rows = make_db(workdir)
+        start, end = START_MS + 1000 * 1234, START_MS + 1000 * 23456
+        expected = [row for row in rows if start <= row[1] < end]
+
+        blocks = list(export(db_path, 'csv', start, end, fetch_size=4000))
+        assert len(blocks) > 5  # Um bloco por lote, não um corpo único
+        check_rows(parse_csv(b''.join(blocks)), expected)
+        check_rows(parse_csv(gzip.decompress(b''.join(export(db_path, 'csv', start, end, 'gzip')))), expected)
+        check_rows(parse_ndjson(b''.join(export(db_path, 'ndjson', start, end))), expected)
+        check_rows(parse_ndjson(gzip.decompress(b''.join(export(db_path, 'ndjson', compress='gzip')))), rows)
+
+        if PARQUET_AVAILABLE:
+            import pyarrow.parquet as pq
+            table = pq.read_table(io.BytesIO(b''.join(export(db_path, 'parquet', start, end, fetch_size=4000))))
+            parsed = table.to_pylist()
+            for row in parsed:
+                row['ts'] = int(row['ts'].timestamp() * 1000)
+            check_rows(parsed, expected)
+            assert pq.ParquetFile(io.BytesIO(b''.join(export(db_path, 'parquet', fetch_size=4000)))) \
+                .metadata.num_row_groups == 7
+
+        for args in (('xml',), ('csv', None, None, 'zip')):
+            try:
+                export(db_path, *args)
+                raise AssertionError(f"Parâmetros inválidos aceitos: {args}")
+            except ValueError:
+                pass
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_export_endpoint():
+    workdir = tempfile.mkdtemp(prefix='test_export_')
+    try:
+        db_path, rows = make_db(workdir)
+        app = create_app({'COLLECT_TEMPERATURE': False, 'TEMPERATURE_DB': db_path})
+        client = app.test_client()
+
+        response = client.get(f'/api/temperature/export?format=ndjson&since={START_MS + 5000}&until={START_MS + 9000}')
+        assert response.status_code == 200 and response.is_streamed
+        assert response.mimetype == 'application/x-ndjson'
+        check_rows(parse_ndjson(response.data), rows[5:9])
+
+        response = client.get('/api/temperature/export?compress=gzip')
+        assert response.mimetype == 'application/gzip'
+        assert 'temperatura.csv.gz' in response.headers['Content-Disposition']
+        check_rows(parse_csv(gzip.decompress(response.data)), rows)
+
+        assert client.get('/api/temperature/export?format=xml').status_code == 400
+        assert client.get('/api/temperature/export?since=ontem').status_code == 400
+        app.extensions['plc_services'].stop()
+
+        # Criar o app não abre o banco; a primeira exportação cria o schema
+        fresh_path = os.path.join(workdir, 'novo.db')
+        app = create_app({'COLLECT_TEMPERATURE': False, 'TEMPERATURE_DB': fresh_path})
+        assert not os.path.exists(fresh_path)
+        response = app.test_client().get('/api/temperature/export')
+        assert response.status_code == 200 and parse_csv(response.data) == []
+        app.extensions['plc_services'].stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def start_async_server(app):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    server = AsyncWSGIServer(app, host='127.0.0.1', port=port, max_workers=2)
+    threading.Thread(target=lambda: asyncio.run(server.serve()), daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Servidor assíncrono não subiu na porta {port}")
+
+
+def read_response(f, head=False):
+    """Lê status, cabeçalhos e corpo (Content-Length, chunked ou até fechar); corpo chunked em pedaços"""
+    status = int(f.readline().split()[1])
+    headers = {}
+    for line in iter(f.readline, b'\r\n'):
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if head or status in (204, 304):
+        return status, headers, []
+    if 'content-length' in headers:
+        return status, headers, [f.read(int(headers['content-length']))]
+    if headers.get('transfer-encoding') != 'chunked':
+        return status, headers, [f.read()]
+    chunks = []
+    while True:
+        size = int(f.readline(), 16)
+        chunk = f.read(size + 2)[:size]
+        if not size:
+            return status, headers, chunks
+        chunks.append(chunk)
+
+
+def test_export_async_server():
+    workdir = tempfile.mkdtemp(prefix='test_export_')
+    try:
+        db_path, rows = make_db(workdir)
+        app = create_app({'COLLECT_TEMPERATURE': False, 'TEMPERATURE_DB': db_path})
+        port = start_async_server(app)
+
+        with socket.create_connection(('127.0.0.1', port), timeout=10) as sock:
+            f = sock.makefile('rb')
+            # Exportação e uma rota comum na mesma conexão (keep-alive depois do chunked)
+            sock.sendall(b'GET /api/temperature/export HTTP/1.1\r\nHost: localhost\r\n\r\n'
+                         b'GET /api/temperature/export?format=xml HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            status, headers, chunks = read_response(f)
+            assert status == 200 and headers['transfer-encoding'] == 'chunked' and 'content-length' not in headers
+            assert len(chunks) > 1, len(chunks)  # Repassado bloco a bloco, não juntado
+            check_rows(parse_csv(b''.join(chunks)), rows)
+            status, headers, chunks = read_response(f)
+            assert status == 400 and int(headers['content-length']) == len(chunks[0])
+
+            # 304 e HEAD saem sem corpo nem moldura chunked: a resposta seguinte na mesma
+            # conexão tem que começar logo depois do cabeçalho
+            sock.sendall(b'GET /api/temperature/history?limit=5 HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            status, headers, chunks = read_response(f)
+            assert status == 200 and headers['etag'], headers
+            etag = headers['etag'].encode('latin-1')
+            sock.sendall(b'GET /api/temperature/history?limit=5 HTTP/1.1\r\nHost: localhost\r\n'
+                         b'If-None-Match: ' + etag + b'\r\n\r\n'
+                         b'HEAD /api/temperature/export HTTP/1.1\r\nHost: localhost\r\n\r\n'
+                         b'GET /api/temperature/history?limit=5 HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            status, headers, _ = read_response(f)
+            assert status == 304 and 'transfer-encoding' not in headers, headers
+            status, headers, _ = read_response(f, head=True)
+            assert status == 200 and 'transfer-encoding' not in headers, headers
+            status, headers, chunks = read_response(f)
+            assert status == 200 and len(json.loads(b''.join(chunks))['data']) == 5
+
+        # HTTP/1.0 não entende chunked: corpo termina com o fechamento da conexão
+        with socket.create_connection(('127.0.0.1', port), timeout=10) as sock:
+            sock.sendall(b'GET /api/temperature/export?format=ndjson HTTP/1.0\r\n\r\n')
+            status, headers, chunks = read_response(sock.makefile('rb'))
+            assert status == 200 and headers['connection'] == 'close' and 'transfer-encoding' not in headers
+            check_rows(parse_ndjson(chunks[0]), rows)
+        app.extensions['plc_services'].stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DA EXPORTAÇÃO DO HISTÓRICO")
+    print("=" * 60)
+    test_export_formats()
+    print(f"✅ CSV, NDJSON{', Parquet' if PARQUET_AVAILABLE else ''} e gzip com as linhas do período, em blocos")
+    test_export_endpoint()
+    print("✅ /api/temperature/export em streaming, erros de parâmetro com 400")
+    test_export_async_server()
+    print("✅ Exportação pelo servidor assíncrono em chunked, sem juntar o corpo")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
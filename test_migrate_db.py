@@ -0,0 +1,147 @@
+"""
+Teste da migração v1 -> v2 do banco de temperatura (migrate_db.py)
+
+Monta um banco no esquema original (temperature_readings, timestamp TEXT no
+horário local) e verifica que migrate() converte todas as linhas mantendo
+ids, valores e o horário em epoch-ms, preenche os agregados, remove a
+tabela v1 e marca user_version = 2; que rodar de novo não altera nada; e
+que uma migração interrompida no meio recomeça de onde parou sem duplicar
+linhas.
+
+Uso:
+    python test_migrate_db.py
+"""
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from migrate_db import migrate, migrate_chunk
+from rollups import RESOLUTIONS, table
+from sample_writer import open_database
+from temperature_monitor import SCHEMA_VERSION, TemperatureCollector, create_schema, legacy_table_exists
+
+ROWS = 1234
+START = datetime(2024, 3, 30, 23, 58, 0)
+
+
+def create_v1_database(db_path, count=ROWS):
+    """Banco como o temperature_monitor original criava; retorna as linhas inseridas"""
+    random.seed(18)
+    rows = []
+    for i in range(count):
+        moment = START + timedelta(seconds=7 * i)
+        # Leituras antigas têm resolução de 1 s; algumas vieram com milissegundos
+        text = moment.strftime('%Y-%m-%d %H:%M:%S') + ('.250' if i % 10 == 0 else '')
+        rows.append((i + 1, text, round(random.uniform(20, 90), 2), i % 17 == 0, round(random.uniform(-1, 1), 3)))
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS temperature_readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            temperature REAL NOT NULL,
+            anomaly BOOLEAN DEFAULT FALSE,
+            rate_of_change REAL DEFAULT 0
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON temperature_readings(timestamp DESC)')
+    conn.executemany('INSERT INTO temperature_readings (id, timestamp, temperature, anomaly, rate_of_change) '
+                     'VALUES (?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+    return rows
+
+
+def expected_samples(rows):
+    """Linhas v1 -> (id, ts epoch-ms, temperature, anomaly, rate) calculadas sem o history_encoding"""
+    samples = []
+    for row_id, text, temperature, anomaly, rate in rows:
+        moment = datetime.strptime(text, '%Y-%m-%d %H:%M:%S.%f' if '.' in text else '%Y-%m-%d %H:%M:%S')
+        samples.append((row_id, round(moment.timestamp() * 1000), temperature, int(anomaly), rate))
+    return samples
+
+
+def read_state(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        samples = conn.execute('SELECT id, ts, temperature, anomaly, rate_of_change FROM temperature_samples '
+                               'ORDER BY id').fetchall()
+        rollups = {suffix: conn.execute(f'SELECT * FROM {table(suffix)} ORDER BY bucket').fetchall()
+                   for suffix, _ in RESOLUTIONS}
+        return samples, rollups, conn.execute('PRAGMA user_version').fetchone()[0], legacy_table_exists(conn)
+    finally:
+        conn.close()
+
+
+def check_migrated(db_path, rows):
+    samples, rollups, user_version, legacy = read_state(db_path)
+    assert not legacy and user_version == SCHEMA_VERSION
+    assert len(samples) == len(rows)
+    assert samples == expected_samples(rows)
+    # Cada linha entra exatamente uma vez em cada resolução de agregado
+    for suffix, size in RESOLUTIONS:
+        assert sum(bucket[1] for bucket in rollups[suffix]) == len(rows), suffix
+        assert all(bucket[0] % size == 0 for bucket in rollups[suffix]), suffix
+    assert sum(bucket[6] for bucket in rollups['1d']) == sum(1 for row in rows if row[3])
+    return samples, rollups
+
+
+def test_migrate_and_rerun():
+    workdir = tempfile.mkdtemp(prefix='test_migrate_')
+    try:
+        db_path = os.path.join(workdir, 'temperature.db')
+        rows = create_v1_database(db_path)
+        assert migrate(db_path, chunk_size=100, pause=0) == ROWS
+        state = check_migrated(db_path, rows)
+
+        # Segunda execução: nada a migrar, banco idêntico
+        assert migrate(db_path, chunk_size=100, pause=0) == 0
+        assert check_migrated(db_path, rows) == state
+
+        # O coletor abre o banco migrado e continua a numeração depois dos ids antigos
+        collector = TemperatureCollector(db_path=db_path)
+        assert collector.latest_id == ROWS and not collector.needs_migration
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_interrupted_migration_resumes():
+    workdir = tempfile.mkdtemp(prefix='test_migrate_')
+    try:
+        db_path = os.path.join(workdir, 'temperature.db')
+        rows = create_v1_database(db_path)
+
+        # Dois lotes e a migração "cai": parte das linhas já está na v2, o resto ainda na v1
+        conn = open_database(db_path)
+        conn.isolation_level = None
+        create_schema(conn)
+        assert migrate_chunk(conn, 300) == 300 and migrate_chunk(conn, 300) == 300
+        assert conn.execute('SELECT COUNT(*) FROM temperature_readings').fetchone()[0] == ROWS - 600
+        conn.close()
+
+        # Coletor aberto no meio da migração enxerga as duas tabelas
+        collector = TemperatureCollector(db_path=db_path, buffer_size=ROWS * 2)
+        assert collector.latest_id == ROWS and collector.needs_migration
+        assert collector.recent.complete and len(collector.recent) == ROWS
+
+        assert migrate(db_path, chunk_size=250, pause=0) == ROWS - 600
+        check_migrated(db_path, rows)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DA MIGRAÇÃO v1 -> v2")
+    print("=" * 60)
+    test_migrate_and_rerun()
+    print(f"✅ {ROWS} leituras migradas: ids, valores, ts em epoch-ms e agregados; rodar de novo não muda nada")
+    test_interrupted_migration_resumes()
+    print("✅ Migração interrompida recomeça de onde parou, sem duplicar linhas")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Teste da codificação de tipos em Holding Registers (modbus_codec.py)
+
+Confere vetores conhecidos de cada tipo nas duas ordens de words (ABCD e
+CDAB), ida e volta encode/decode com valores de borda, e que os blocos
+(encode_array/decode_array, com e sem numpy) dão o mesmo resultado que
+valor a valor, sem alterar a lista do chamador.
+
+Uso:
+    python test_modbus_codec.py
+"""
+import math
+import struct
+from array import array
+import modbus_codec
+from modbus_codec import (FLOAT32, FLOAT64, INT16, INT32, UINT16, UINT32, WORD_BIG, WORD_SWAPPED, DATA_TYPES,
+                          decode, decode_array, encode, encode_array)
+
+EDGE_VALUES = {
+    INT16: [0, 1, -1, 32767, -32768, 1234],
+    UINT16: [0, 1, 65535, 0xABCD],
+    INT32: [0, -1, 2 ** 31 - 1, -2 ** 31, 0x12345678, -123456],
+    UINT32: [0, 2 ** 32 - 1, 0x12345678, 4000000000],
+    FLOAT32: [0.0, 1.0, -273.15, 75.5, 3.4e38, -1e-30, float('inf'), float('-inf')],
+    FLOAT64: [0.0, math.pi, -1e300, 5e-324, 123456789.123456789, float('inf')],
+}
+
+
+def as_stored(value, data_type):
+    """Valor como o tipo consegue guardar (float32 perde precisão)"""
+    if data_type == FLOAT32:
+        return struct.unpack('>f', struct.pack('>f', value))[0]
+    return value
+
+
+def test_known_vectors():
+    vectors = [
+        (INT16, -2, [0xFFFE], [0xFFFE]),
+        (UINT16, 0xABCD, [0xABCD], [0xABCD]),
+        (INT32, 0x12345678, [0x1234, 0x5678], [0x5678, 0x1234]),
+        (INT32, -2, [0xFFFF, 0xFFFE], [0xFFFE, 0xFFFF]),
+        (UINT32, 0xDEADBEEF, [0xDEAD, 0xBEEF], [0xBEEF, 0xDEAD]),
+        (FLOAT32, 1.0, [0x3F80, 0x0000], [0x0000, 0x3F80]),
+        (FLOAT32, -2.5, [0xC020, 0x0000], [0x0000, 0xC020]),
+        (FLOAT64, 1.0, [0x3FF0, 0, 0, 0], [0, 0, 0, 0x3FF0]),
+        (FLOAT64, -2.0, [0xC000, 0, 0, 0], [0, 0, 0, 0xC000]),
+    ]
+    for data_type, value, big, swapped in vectors:
+        assert encode(value, data_type) == big, (data_type, value)
+        assert encode(value, data_type, WORD_SWAPPED) == swapped, (data_type, value)
+        assert decode(big, data_type) == value and decode(swapped, data_type, WORD_SWAPPED) == value
+        # Registradores a mais são ignorados
+        assert decode(big + [0x1111], data_type) == value
+
+
+def test_scalar_round_trip():
+    for data_type, values in EDGE_VALUES.items():
+        assert modbus_codec.register_count(data_type) == DATA_TYPES[data_type][1]
+        for word_order in (WORD_BIG, WORD_SWAPPED):
+            for value in values:
+                registers = encode(value, data_type, word_order)
+                assert len(registers) == DATA_TYPES[data_type][1]
+                assert all(0 <= word <= 0xFFFF for word in registers)
+                assert decode(registers, data_type, word_order) == as_stored(value, data_type), \
+                    (data_type, word_order, value)
+            # Tipos de mais de uma word: as duas ordens diferem só pela ordem das words
+            if DATA_TYPES[data_type][1] > 1:
+                value = values[-2]
+                assert encode(value, data_type, WORD_SWAPPED) == encode(value, data_type)[::-1]
+    nan = decode(encode(float('nan'), FLOAT32, WORD_SWAPPED), FLOAT32, WORD_SWAPPED)
+    assert math.isnan(nan)
+
+    for args in ((1, 'int64'), (1, INT16, 'little')):
+        try:
+            encode(*args)
+            raise AssertionError(f"Aceitou {args}")
+        except ValueError:
+            pass
+    try:
+        decode([0x3F80], FLOAT32)
+        raise AssertionError("Decodificou float32 com um registrador")
+    except ValueError:
+        pass
+
+
+def test_array_round_trip():
+    for data_type, values in EDGE_VALUES.items():
+        for word_order in (WORD_BIG, WORD_SWAPPED):
+            registers = encode_array(values, data_type, word_order)
+            # Bloco = valores codificados um a um, lado a lado
+            assert registers == [word for value in values for word in encode(value, data_type, word_order)]
+            original = list(registers)
+            decoded = decode_array(registers, data_type, word_order)
+            assert list(decoded) == [as_stored(value, data_type) for value in values], (data_type, word_order)
+            assert registers == original  # Lista do chamador intacta
+            # array('H') também é aceito e continua intacto
+            words = array('H', registers)
+            assert list(decode_array(words, data_type, word_order)) == list(decoded)
+            assert words.tolist() == original
+            if modbus_codec.NUMPY_AVAILABLE:
+                assert decode_array(registers, data_type, word_order, as_numpy=True).tolist() == list(decoded)
+        assert list(decode_array([], data_type)) == [] and encode_array([], data_type) == []
+
+    try:
+        decode_array([1, 2, 3], FLOAT32)
+        raise AssertionError("Decodificou 3 registradores como float32")
+    except ValueError:
+        pass
+    if not modbus_codec.NUMPY_AVAILABLE:
+        try:
+            decode_array([0, 0], FLOAT32, as_numpy=True)
+            raise AssertionError("as_numpy sem numpy")
+        except ImportError:
+            pass
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DO CODEC DE REGISTRADORES")
+    print("=" * 60)
+    test_known_vectors()
+    print("✅ Vetores conhecidos em ABCD e CDAB")
+    test_scalar_round_trip()
+    print("✅ encode/decode ida e volta para todos os tipos e ordens de words")
+    test_array_round_trip()
+    print(f"✅ Blocos iguais a valor a valor{' (também com numpy)' if modbus_codec.NUMPY_AVAILABLE else ''}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Teste do planejador de escritas e de /api/batch com valores fora da faixa
+
+Um INT de 16 bits não aceita 40000: plan_writes deve recusar com ValueError
+(citando a tag) antes de acessar o CLP, e /api/batch e /api/batch/write
+devem responder 400, não 500 (também com address que não é inteiro). Sobe
+o mock_server em uma porta livre para conferir que uma escrita válida
+continua passando, e que /api/batch devolve um resultado por operação, na
+ordem pedida, com as leituras enxergando as escritas do mesmo lote.
+
+Uso:
+    python test_modbus_planner.py
+"""
+import asyncio
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from app_factory import create_app
+from mock_server import run_server
+from modbus_planner import plan_writes
+
+
+def start_mock_server():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        port = sock.getsockname()[1]
+    threading.Thread(target=lambda: asyncio.run(run_server(port)), daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('localhost', port), timeout=0.1).close()
+            return port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Mock não subiu na porta {port}")
+
+
+def test_plan_rejects_out_of_range():
+    for write in ({'type': 'int', 'address': 3, 'value': 40000},
+                  {'type': 'int', 'address': 3, 'value': -40000},
+                  {'type': 'uint32', 'address': 3, 'value': -1},
+                  {'type': 'real', 'address': 3, 'value': None},
+                  {'type': 'real', 'address': 3, 'value': 1e300}):
+        try:
+            plan_writes([{'type': 'bool', 'address': 0, 'value': True}, {**write, 'name': 'PC_Setpoint'}])
+            raise AssertionError(f"Escrita inválida aceita: {write}")
+        except ValueError as e:
+            assert 'endereço 3' in str(e) and 'PC_Setpoint' in str(e), e
+    assert len(plan_writes([{'type': 'int', 'address': 3, 'value': 32767}])) == 1
+
+
+def test_batch_endpoints_return_400():
+    workdir = tempfile.mkdtemp(prefix='test_planner_')
+    try:
+        port = start_mock_server()
+        app = create_app({'PLC_IP': 'localhost', 'PLC_PORT': port, 'COLLECT_TEMPERATURE': False,
+                          'TEMPERATURE_DB': os.path.join(workdir, 'temperature.db')})
+        client = app.test_client()
+
+        response = client.post('/api/batch', json={'operations': [
+            {'op': 'write', 'type': 'int', 'address': 3, 'value': 40000}]})
+        assert response.status_code == 400, response.get_json()
+        assert 'endereço 3' in response.get_json()['error']
+
+        response = client.post('/api/batch/write', json={'writes': [
+            {'type': 'int', 'address': 3, 'value': 123}, {'type': 'int', 'address': 4, 'value': -70000}]})
+        assert response.status_code == 400, response.get_json()
+        assert 'endereço 4' in response.get_json()['error']
+
+        # address precisa ser inteiro >= 0 (antes um texto ou float estourava com 500 na ordenação)
+        for address in ('3', 1.5, -1, None):
+            response = client.post('/api/batch/write', json={'writes': [
+                {'type': 'int', 'address': 4, 'value': 1}, {'type': 'int', 'address': address, 'value': 2}]})
+            assert response.status_code == 400, (address, response.get_json())
+            assert 'Escrita 1: address' in response.get_json()['error']
+
+        response = client.post('/api/batch', json={'operations': [
+            {'op': 'write', 'type': 'int', 'address': 3, 'value': 1234},
+            {'op': 'read', 'type': 'int', 'address': 3}]})
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()['results'][1]['value'] == 1234
+        app.extensions['plc_services'].stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def post_batch(client, operations):
+    return client.post('/api/batch', json={'operations': operations})
+
+
+def test_batch_operations():
+    workdir = tempfile.mkdtemp(prefix='test_planner_')
+    try:
+        port = start_mock_server()
+        app = create_app({'PLC_IP': 'localhost', 'PLC_PORT': port, 'COLLECT_TEMPERATURE': False,
+                          'TEMPERATURE_DB': os.path.join(workdir, 'temperature.db'), 'MAX_BATCH_OPERATIONS': 12})
+        client = app.test_client()
+
+        # Operações malformadas: 400 antes de acessar o CLP (a escrita válida do lote não acontece)
+        valid = {'op': 'write', 'type': 'int', 'address': 60, 'value': 77}
+        for operation, message in (({'op': 'delete', 'type': 'int', 'address': 1}, 'op deve ser'),
+                                   ({'op': 'read', 'type': 'string', 'address': 1}, 'tipo inválido'),
+                                   ({'op': 'read', 'type': 'int'}, 'address inválido'),
+                                   ({'op': 'read', 'type': 'int', 'address': '1'}, 'address inválido'),
+                                   ({'op': 'read', 'type': 'int', 'address': 1.5}, 'address inválido'),
+                                   ({'op': 'read', 'type': 'int', 'address': -1}, 'address inválido'),
+                                   ({'op': 'write', 'type': 'int', 'address': 1}, 'escrita sem value'),
+                                   ({'op': 'write', 'type': 'uint16', 'address': 1, 'value': -1}, 'endereço 1'),
+                                   ({'op': 'write', 'type': 'int', 'address': 1, 'value': 'abc'}, 'endereço 1')):
+            response = post_batch(client, [valid, operation])
+            assert response.status_code == 400, (operation, response.get_json())
+            error = response.get_json()['error']
+            assert message in error and (message.startswith('endereço') or error.startswith('Operação 1')), error
+        assert post_batch(client, []).status_code == 400
+        response = post_batch(client, [{'op': 'read', 'type': 'int', 'address': i} for i in range(13)])
+        assert response.status_code == 400 and 'Máximo de 12' in response.get_json()['error']
+        response = post_batch(client, [{'op': 'read', 'type': 'int', 'address': 60}])
+        assert response.get_json()['results'][0]['value'] == 0
+
+        # Leituras e escritas misturadas: escritas primeiro, resultados na ordem pedida
+        operations = [
+            {'op': 'read', 'type': 'int', 'address': 10},
+            {'op': 'write', 'type': 'real', 'address': 20, 'value': 75.5},
+            {'op': 'read', 'type': 'bool', 'address': 5},
+            {'op': 'write', 'type': 'int', 'address': 10, 'value': -1234},
+            {'op': 'write', 'type': 'bool', 'address': 5, 'value': True},
+            {'op': 'read', 'type': 'real', 'address': 20},
+            {'op': 'write', 'type': 'uint32', 'address': 30, 'value': 4000000000},
+            {'op': 'read', 'type': 'uint32', 'address': 30},
+            {'op': 'write', 'type': 'float64', 'address': 40, 'value': 3.141592653589793},
+            {'op': 'read', 'type': 'float64', 'address': 40},
+            {'op': 'read', 'type': 'int', 'address': 50},
+        ]
+        response = post_batch(client, operations)
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        assert body['success'] and len(body['results']) == len(operations)
+        for operation, result in zip(operations, body['results']):
+            assert (result['op'], result['type'], result['address']) == \
+                   (operation['op'], operation['type'], operation['address'])
+            assert result['success'], result
+        values = [result.get('value') for result in body['results']]
+        assert values[0] == -1234 and values[2] is True and values[5] == 75.5
+        assert values[7] == 4000000000 and values[9] == 3.141592653589793 and values[10] == 0
+        assert body['round_trips'] < len(operations)  # Agrupadas pelo planejador
+
+        # Os valores ficaram no CLP: outro lote só de leitura os enxerga
+        response = post_batch(client, [{'op': 'read', 'type': operation['type'], 'address': operation['address']}
+                                       for operation in operations if operation['op'] == 'write'])
+        assert [result['value'] for result in response.get_json()['results']] == \
+               [75.5, -1234, True, 4000000000, 3.141592653589793]
+        app.extensions['plc_services'].stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DO PLANEJADOR DE ESCRITAS")
+    print("=" * 60)
+    test_plan_rejects_out_of_range()
+    print("✅ Valores fora da faixa recusados com ValueError citando a tag")
+    test_batch_endpoints_return_400()
+    print("✅ /api/batch e /api/batch/write respondem 400 (valor ou address inválido); escrita válida passa")
+    test_batch_operations()
+    print("✅ /api/batch: 400 para operações malformadas, resultados na ordem pedida, escrita e leitura no mock")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
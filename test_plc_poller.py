@@ -0,0 +1,164 @@
+"""
+Teste da varredura de vários CLPs (plc_poller.py)
+
+Sobe dois mock_server e um CLP travado (run_faulty_server 'stall') em portas
+livres e verifica que cada CLP é lido no seu ritmo com os valores gravados
+nele, que o CLP travado acumula falhas com backoff sem atrasar os saudáveis,
+que um endereço inexistente vira erro da tag sem derrubar as demais, e que
+add_tag/remove_tag mudam a varredura em andamento. Não precisa do CLP nem
+do mock_server rodando.
+
+Uso:
+    python test_plc_poller.py
+"""
+import asyncio
+import socket
+import threading
+import time
+from mock_server import run_faulty_server, run_server
+from modbus_client import ModbusCLP
+from plc_poller import PLCDevice, PLCPoller
+
+TAGS = [
+    {'name': 'Start', 'type': 'bool', 'address': 0},
+    {'name': 'Estado', 'type': 'int', 'address': 0},
+    {'name': 'Temp', 'type': 'real', 'address': 1},
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(server=run_server, *args):
+    port = free_port()
+    threading.Thread(target=lambda: asyncio.run(server(*args, port=port)), daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('localhost', port), timeout=0.1).close()
+            return port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Mock não subiu na porta {port}")
+
+
+def write_values(port, start, estado, temp):
+    clp = ModbusCLP('localhost', port)
+    assert clp.connect()
+    try:
+        assert clp.write_bool(0, start) and clp.write_int(0, estado) and clp.write_real(1, temp)
+    finally:
+        clp.close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_duplicate_names_rejected():
+    devices = [PLCDevice('a', 'localhost', TAGS), PLCDevice('a', 'localhost', TAGS, port=5021)]
+    try:
+        PLCPoller(devices)
+        raise AssertionError("Aceitou dois CLPs com o mesmo nome")
+    except ValueError:
+        pass
+
+
+def test_scans_each_plc():
+    port_a = start_mock_server()
+    port_b = start_mock_server()
+    port_stall = start_mock_server(run_faulty_server, 'stall')
+    write_values(port_a, True, 11, 21.5)
+    write_values(port_b, False, 22, -3.25)
+
+    scanned = []
+    devices = [
+        PLCDevice('a', 'localhost', list(TAGS), port=port_a, interval=0.1),
+        PLCDevice('b', 'localhost', list(TAGS), port=port_b, interval=0.2),
+        PLCDevice('travado', 'localhost', list(TAGS), port=port_stall, interval=0.1, timeout=0.5,
+                  backoff_initial=0.5),
+    ]
+    poller = PLCPoller(devices, max_workers=4, on_scan=lambda device, values, errors: scanned.append(device.name))
+    poller.start()
+    try:
+        assert wait_for(lambda: poller.get_values('a')[2] and poller.get_values('b')[2])
+        values, errors, _ = poller.get_values('a')
+        assert values == {'Start': True, 'Estado': 11, 'Temp': 21.5} and not errors, (values, errors)
+        values, errors, _ = poller.get_values('b')
+        assert values == {'Start': False, 'Estado': 22, 'Temp': -3.25} and not errors, (values, errors)
+
+        # Valor novo no CLP aparece na próxima varredura
+        write_values(port_a, False, 12, 30.0)
+        assert wait_for(lambda: poller.get_values('a')[0]['Estado'] == 12)
+
+        time.sleep(1.5)
+    finally:
+        poller.stop()
+    stats = poller.stats()
+
+    # Cada CLP no seu ritmo; o travado (timeout de 0,5 s) não atrasou os outros
+    assert stats['a']['scans'] >= 12 and stats['a']['failures'] == 0, stats['a']
+    assert 6 <= stats['b']['scans'] <= stats['a']['scans'], stats['b']
+    assert stats['a']['success_rate'] == 1.0 and stats['a']['consecutive_failures'] == 0
+
+    # O travado só falha, e o backoff espaça as tentativas (bem menos que uma a cada 0,1 s)
+    stalled = stats['travado']
+    assert stalled['failures'] == stalled['scans'] and 1 <= stalled['scans'] <= 6, stalled
+    assert stalled['last_error'] and stalled['last_success'] is None, stalled
+    assert poller.get_values('travado') == ({}, {}, None)
+
+    # on_scan só é chamado para varreduras bem-sucedidas
+    assert 'travado' not in scanned and scanned.count('a') == stats['a']['scans']
+
+
+def test_tag_errors_and_tag_changes():
+    port = start_mock_server()
+    write_values(port, True, 7, 1.5)
+    device = PLCDevice('clp', 'localhost', [TAGS[1], {'name': 'Fora', 'type': 'int', 'address': 500}],
+                       port=port, interval=0.05)
+    poller = PLCPoller([device], max_workers=1)
+    poller.start()
+    try:
+        # Endereço inexistente no CLP: erro só dessa tag, a varredura continua boa
+        assert wait_for(lambda: poller.get_values('clp')[2])
+        values, errors, _ = poller.get_values('clp')
+        assert values == {'Estado': 7} and set(errors) == {'Fora'}, (values, errors)
+        assert poller.stats()['clp']['failures'] == 0
+
+        assert poller.add_tag('clp', TAGS[2])
+        assert not poller.add_tag('clp', TAGS[2])  # Já estava na lista
+        assert wait_for(lambda: poller.get_values('clp')[0].get('Temp') == 1.5)
+
+        assert poller.remove_tag('clp', 'Fora') and not poller.remove_tag('clp', 'Fora')
+        values, errors, _ = poller.get_values('clp')
+        assert 'Fora' not in errors and values['Estado'] == 7
+        scans = poller.stats()['clp']['scans']
+        assert wait_for(lambda: poller.stats()['clp']['scans'] > scans + 1)
+        values, errors, _ = poller.get_values('clp')
+        assert values == {'Estado': 7, 'Temp': 1.5} and not errors, (values, errors)
+    finally:
+        poller.stop()
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DA VARREDURA DE VÁRIOS CLPs")
+    print("=" * 60)
+    test_duplicate_names_rejected()
+    print("✅ Nomes de CLP duplicados recusados")
+    test_scans_each_plc()
+    print("✅ Cada CLP no seu ritmo; o travado falha com backoff sem atrasar os outros")
+    test_tag_errors_and_tag_changes()
+    print("✅ Endereço inexistente vira erro da tag; add_tag/remove_tag mudam a varredura")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Teste dos agregados por minuto/hora/dia (rollups.py)
+
+Grava amostras irregulares de ~3 dias pelo SampleWriter do coletor e
+verifica que as estatísticas por período (buckets inteiros + bordas brutas)
+batem com o cálculo direto sobre as amostras, que as séries por bucket
+(rollups.bucket_series e /api/series, lida das amostras ou do rollup que
+divide o bucket) também batem, e que rebuild_rollups
+chega aos mesmos agregados que a atualização incremental.
+
+Uso:
+    python test_rollups.py
+"""
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+from app_factory import create_app
+from rollups import RESOLUTIONS, SERIES_AGGREGATES, parse_bucket, plan_range, rebuild_rollups, table
+from temperature_monitor import TemperatureCollector
+
+# 2025-01-01 00:00:00 UTC
+START_MS = 1735689600000
+SPAN_MS = 3 * 24 * 3600 * 1000
+
+
+def make_collector(workdir):
+    collector = TemperatureCollector(db_path=os.path.join(workdir, 'rollups.db'), flush_interval=0.05)
+    collector.open()  # Banco e gravador, sem coletar do CLP
+    random.seed(19)
+    ts = START_MS + random.randrange(60000)
+    temperature = 25.0
+    rows = []
+    while ts < START_MS + SPAN_MS:
+        temperature += random.gauss(0, 0.5)
+        collector._next_id += 1
+        row = (collector._next_id, ts, round(temperature, 2), int(random.random() < 0.02), 0.0)
+        assert collector._writer.put(row)
+        rows.append(row)
+        ts += random.randrange(1, 40000)
+    collector.stop()  # Espera o último commit
+    return collector, rows
+
+
+def raw_statistics(rows, start_ms, end_ms):
+    temps = [row[2] for row in rows if start_ms <= row[1] < end_ms]
+    anomalies = sum(row[3] for row in rows if start_ms <= row[1] < end_ms)
+    if not temps:
+        return None
+    return {
+        'count': len(temps),
+        'min': min(temps),
+        'max': max(temps),
+        'avg': statistics.mean(temps),
+        'stdev': statistics.stdev(temps) if len(temps) > 1 else 0,
+        'anomalies': anomalies,
+    }
+
+
+def test_plan_range_covers_window():
+    for start_ms, end_ms in ((START_MS + 1234, START_MS + SPAN_MS - 987),
+                             (START_MS, START_MS + SPAN_MS),
+                             (START_MS + 59999, START_MS + 60001)):
+        pieces = plan_range(start_ms, end_ms)
+        assert pieces[0][1] == start_ms and pieces[-1][2] == end_ms, pieces
+        for (_, _, hi), (_, lo, _) in zip(pieces, pieces[1:]):
+            assert hi == lo, pieces
+        sizes = dict(RESOLUTIONS)
+        for suffix, lo, hi in pieces:
+            if suffix is not None:
+                assert lo % sizes[suffix] == 0 and hi % sizes[suffix] == 0, (suffix, lo, hi)
+            else:
+                assert hi - lo < 2 * 60000, (lo, hi)
+
+
+def test_range_statistics_match_raw():
+    workdir = tempfile.mkdtemp(prefix='test_rollups_')
+    try:
+        collector, rows = make_collector(workdir)
+        random.seed(20)
+        windows = [(START_MS, START_MS + SPAN_MS), (START_MS + 1, START_MS + 2),
+                   (START_MS + 3600000 - 1, START_MS + 2 * 86400000 + 1)]
+        windows += [sorted(random.randrange(START_MS - 60000, START_MS + SPAN_MS + 60000) for _ in range(2))
+                    for _ in range(50)]
+        for start_ms, end_ms in windows:
+            expected = raw_statistics(rows, start_ms, end_ms)
+            actual = collector.get_range_statistics(start_ms, end_ms)
+            if expected is None:
+                assert actual is None, (start_ms, end_ms, actual)
+                continue
+            for key in ('count', 'min', 'max', 'anomalies'):
+                assert actual[key] == expected[key], (key, start_ms, end_ms, actual, expected)
+            for key in ('avg', 'stdev'):
+                assert abs(actual[key] - expected[key]) < 1e-6, (key, start_ms, end_ms, actual, expected)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def check_series(series, rows, start_ms, end_ms, bucket_ms):
+    expected = {}
+    for row in rows:
+        if start_ms <= row[1] < end_ms:
+            expected.setdefault(row[1] - row[1] % bucket_ms, []).append(row)
+    assert [item['t'] for item in series] == sorted(expected), (start_ms, end_ms, bucket_ms)
+    for item in series:
+        stats = raw_statistics(expected[item['t']], start_ms, end_ms)
+        for key in ('count', 'min', 'max', 'anomalies'):
+            assert item[key] == stats[key], (key, item, stats)
+        for key in ('avg', 'stdev'):
+            assert abs(item[key] - stats[key]) < 1e-6, (key, item, stats)
+        assert abs(item['sum'] - sum(row[2] for row in expected[item['t']])) < 1e-6
+
+
+def test_series_match_raw():
+    assert [parse_bucket(text) for text in ('30s', '1m', '15m', '2h', '1d', '250')] == \
+           [30000, 60000, 900000, 7200000, 86400000, 250]
+    for text in ('0m', '1w', '', 'm'):
+        try:
+            parse_bucket(text)
+            raise AssertionError(f"Bucket inválido aceito: {text!r}")
+        except ValueError:
+            pass
+
+    workdir = tempfile.mkdtemp(prefix='test_rollups_')
+    try:
+        collector, rows = make_collector(workdir)
+        random.seed(25)
+        # Buckets múltiplos dos rollups (lidos deles) e não múltiplos (lidos das amostras)
+        for bucket_ms in (60000, 15 * 60000, 3600000, 6 * 3600000, 86400000, 45000, 90000):
+            for start_ms, end_ms in [(START_MS, START_MS + SPAN_MS)] + \
+                    [sorted(random.randrange(START_MS - 60000, START_MS + SPAN_MS + 60000) for _ in range(2))
+                     for _ in range(10)]:
+                series = collector.get_series(start_ms, end_ms, bucket_ms, SERIES_AGGREGATES)
+                check_series(series, rows, start_ms, end_ms, bucket_ms)
+        try:
+            collector.get_series(START_MS, START_MS + SPAN_MS, 60000, ('avg', 'median'))
+            raise AssertionError("Agregação desconhecida deveria ser rejeitada")
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_series_endpoint():
+    workdir = tempfile.mkdtemp(prefix='test_rollups_')
+    try:
+        collector, rows = make_collector(workdir)
+        app = create_app({'COLLECT_TEMPERATURE': False, 'TEMPERATURE_DB': collector.db_path,
+                          'SERIES_MAX_BUCKETS': 500})
+        client = app.test_client()
+        start_ms, end_ms = START_MS + 1234, START_MS + 2 * 86400000 + 5678
+
+        response = client.get(f'/api/series?from={start_ms}&to={end_ms}&bucket=15m&agg=avg,min,max,count')
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['bucket_ms'] == 900000 and body['agg'] == ['avg', 'min', 'max', 'count']
+        assert len(body['data']) <= 2 * 96 + 1
+        assert set(body['data'][0]) == {'t', 'timestamp', 'avg', 'min', 'max', 'count'}
+        assert sum(item['count'] for item in body['data']) == sum(start_ms <= row[1] < end_ms for row in rows)
+        etag = response.headers['ETag']
+        assert client.get(response.request.full_path, headers={'If-None-Match': etag}).status_code == 304
+
+        for query in ('bucket=1w', 'agg=avg,median', f'from={end_ms}&to={start_ms}', 'from=ontem',
+                      f'from={START_MS}&to={START_MS + SPAN_MS}&bucket=1m'):  # 4320 buckets > 500
+            assert client.get(f'/api/series?{query}').status_code == 400, query
+        app.extensions['plc_services'].stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def series_endpoint(client, start_ms, end_ms, bucket):
+    response = client.get(f'/api/series?from={start_ms}&to={end_ms}&bucket={bucket}&agg={",".join(SERIES_AGGREGATES)}')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+
+def test_series_endpoint_resolutions():
+    workdir = tempfile.mkdtemp(prefix='test_rollups_')
+    try:
+        collector, rows = make_collector(workdir)
+        config = {'COLLECT_TEMPERATURE': False, 'TEMPERATURE_DB': collector.db_path, 'SERIES_MAX_BUCKETS': 200}
+        app = create_app(config)
+        client = app.test_client()
+
+        # avg/min/max/... por bucket iguais às amostras brutas, lidos das amostras (30s, 45s) ou dos rollups
+        day_ms = 86400000
+        for bucket, bucket_ms, start_ms, end_ms in (('30s', 30000, START_MS + 777, START_MS + 3600000),
+                                                    ('45s', 45000, START_MS + 1000, START_MS + 7200000),
+                                                    ('1m', 60000, START_MS + 30000, START_MS + 3 * 3600000),
+                                                    ('1h', 3600000, START_MS + 1234, START_MS + 2 * day_ms + 99),
+                                                    ('1d', day_ms, START_MS, START_MS + SPAN_MS)):
+            data = series_endpoint(client, start_ms, end_ms, bucket)
+            assert data, bucket
+            check_series(data, rows, start_ms, end_ms, bucket_ms)
+
+        # Limite de pontos: 200 buckets passam, 201 não (e from/to inválidos dão 400)
+        assert client.get(f'/api/series?from={START_MS}&to={START_MS + 200 * 60000}&bucket=1m').status_code == 200
+        response = client.get(f'/api/series?from={START_MS}&to={START_MS + 200 * 60000 + 1}&bucket=1m')
+        assert response.status_code == 400 and '201 buckets' in response.get_json()['error']
+        for query in (f'from={START_MS}&to={START_MS}', f'from={START_MS + 1}&to={START_MS}', 'to=amanhã',
+                      'from=2025-02-30 00:00:00', 'bucket=0s', 'bucket=-1m', 'agg='):
+            assert client.get(f'/api/series?{query}').status_code == 400, query
+        app.extensions['plc_services'].stop()
+
+        # Qual fonte cada bucket usa: marca o rollup diário e o horário com valores impossíveis
+        conn = sqlite3.connect(collector.db_path)
+        conn.execute(f'UPDATE {table("1d")} SET max = 999')
+        conn.execute(f'UPDATE {table("1h")} SET min = -999')
+        conn.commit()
+        conn.close()
+        app = create_app(config)  # Cache de respostas novo
+        client = app.test_client()
+        full = (START_MS, START_MS + SPAN_MS)
+        assert {item['max'] for item in series_endpoint(client, *full, '1d')} == {999}
+        assert -999 not in {item['min'] for item in series_endpoint(client, *full, '1d')}  # min também do 1d
+        assert {item['min'] for item in series_endpoint(client, *full, '6h')} == {-999}
+        assert 999 not in {item['max'] for item in series_endpoint(client, *full, '6h')}
+        raw = series_endpoint(client, START_MS, START_MS + 3600000, '45s')
+        assert all(-999 < item['min'] and item['max'] < 999 for item in raw)
+        app.extensions['plc_services'].stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_rebuild_matches_incremental():
+    workdir = tempfile.mkdtemp(prefix='test_rollups_')
+    try:
+        collector, _ = make_collector(workdir)
+        conn = sqlite3.connect(collector.db_path)
+        query = 'SELECT bucket, count, sum, sum_sq, min, max, anomalies FROM {} ORDER BY bucket'
+        incremental = {suffix: conn.execute(query.format(table(suffix))).fetchall() for suffix, _ in RESOLUTIONS}
+        rebuild_rollups(conn)
+        for suffix, _ in RESOLUTIONS:
+            rebuilt = conn.execute(query.format(table(suffix))).fetchall()
+            assert len(rebuilt) == len(incremental[suffix]), suffix
+            for a, b in zip(rebuilt, incremental[suffix]):
+                assert a[0:2] == b[0:2] and a[4:] == b[4:], (suffix, a, b)
+                assert abs(a[2] - b[2]) < 1e-6 and abs(a[3] - b[3]) < 1e-3, (suffix, a, b)
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DOS AGREGADOS (ROLLUPS)")
+    print("=" * 60)
+    test_plan_range_covers_window()
+    print("✅ Janela decomposta em buckets alinhados e bordas brutas")
+    test_range_statistics_match_raw()
+    print("✅ Estatísticas por período iguais ao cálculo sobre as amostras")
+    test_series_match_raw()
+    print("✅ Séries por bucket (dos rollups ou das amostras) iguais ao cálculo direto")
+    test_series_endpoint()
+    print("✅ /api/series limitada pelo número de buckets, erros de parâmetro com 400")
+    test_series_endpoint_resolutions()
+    print("✅ /api/series: agregados por bucket, rollup certo para cada bucket, limite de pontos e 400")
+    test_rebuild_matches_incremental()
+    print("✅ Reconstrução igual à atualização incremental")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Teste do buffer em memória das amostras recentes (sample_ring.py)
+
+Grava amostras pelo coletor com um buffer pequeno e verifica que
+get_latest/get_since respondem igual ao banco, da memória quando a janela
+cabe no buffer, e que um coletor novo sobre o mesmo banco pré-carrega as
+últimas amostras.
+
+Uso:
+    python test_sample_ring.py
+"""
+import os
+import shutil
+import tempfile
+from sample_ring import SampleRing
+from temperature_monitor import TemperatureCollector
+
+CAPACITY = 64
+
+
+def db_latest(collector, limit):
+    rows = collector._reader().execute('''
+        SELECT id, ts, temperature, anomaly, rate_of_change
+        FROM temperature_samples
+        ORDER BY ts DESC, id DESC
+        LIMIT ?
+    ''', (limit,)).fetchall()
+    rows.reverse()
+    return rows
+
+
+def write_samples(collector, count):
+    for i in range(count):
+        collector._save_reading(20.0 + i / 10, i % 7 == 0, 0.1 * i)
+    collector._writer.close()  # Espera o commit (buffer atualizado em _on_commit)
+    collector._writer = collector._open_writer()
+
+
+def test_ring_wraps():
+    ring = SampleRing(4)
+    assert ring.latest(1) is None and ring.since(10, since_id=0) is None
+    ring.extend([(i, 1000 * i, float(i), i % 2, None if i == 3 else 0.5) for i in range(1, 7)])
+    assert ring.latest(10) is None  # Pedido maior que o buffer: vai ao banco
+    assert [row[0] for row in ring.latest(4)] == [3, 4, 5, 6]
+    assert ring.latest(4)[0] == (3, 3000, 3.0, 1, None)
+    assert [row[0] for row in ring.since(10, since_id=4)] == [5, 6]
+    assert [row[0] for row in ring.since(1, since_ms=3000)] == [4]
+    assert ring.since(10, since_id=1) is None  # Amostra 2 já foi descartada
+
+    # Buffer completo (banco vazio) recebendo um lote maior que ele: deixa de ser completo
+    ring = SampleRing(4)
+    ring.complete = True
+    ring.extend([(i, 1000 * i, float(i), 0, 0.0) for i in range(1, 7)])
+    assert not ring.complete
+    assert ring.since(10, since_id=0) is None and ring.latest(5) is None
+
+
+def test_collector_matches_database():
+    workdir = tempfile.mkdtemp(prefix='test_ring_')
+    try:
+        db_path = os.path.join(workdir, 'ring.db')
+        collector = TemperatureCollector(db_path=db_path, flush_interval=0.05, buffer_size=CAPACITY)
+        assert not os.path.exists(db_path)  # Nada é aberto na construção
+        collector.open()
+        assert collector.recent.complete
+
+        write_samples(collector, 40)
+        # Banco menor que o buffer: qualquer limite sai da memória
+        assert collector.get_latest(1000, raw=True) == db_latest(collector, 1000)
+
+        write_samples(collector, 100)
+        assert not collector.recent.complete and len(collector.recent) == CAPACITY
+        for limit in (1, 10, CAPACITY, CAPACITY + 1, 500):
+            assert collector.get_latest(limit, raw=True) == db_latest(collector, limit), limit
+        assert collector.get_latest(5) == [collector._row_to_reading(row) for row in db_latest(collector, 5)]
+
+        rows = db_latest(collector, 1000)
+        for since_id in (0, 50, rows[-CAPACITY][0], rows[-2][0]):
+            expected = [row for row in rows if row[0] > since_id][:20]
+            assert collector.get_since(since_id, limit=20, raw=True) == expected, since_id
+        since_ms = rows[-10][1]
+        assert collector.get_since(since_ms=since_ms, limit=20, raw=True) == [r for r in rows if r[1] > since_ms]
+        collector.stop()
+
+        # Coletor novo sobre o mesmo banco: buffer pré-carregado
+        reopened = TemperatureCollector(db_path=db_path, buffer_size=CAPACITY)
+        reopened.ensure_database()
+        assert reopened.recent.latest(CAPACITY) == rows[-CAPACITY:]
+        assert reopened.get_current() == reopened._row_to_reading(rows[-1])
+        reopened.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DO BUFFER DE AMOSTRAS RECENTES")
+    print("=" * 60)
+    test_ring_wraps()
+    print("✅ Buffer circular descarta as mais antigas e busca por id/horário")
+    test_collector_matches_database()
+    print("✅ get_latest/get_since iguais ao banco; buffer pré-carregado ao iniciar")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
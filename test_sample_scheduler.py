@@ -0,0 +1,129 @@
+"""
+Teste da agenda de amostragem (sample_scheduler.py) e do coletor a 50-100 Hz
+
+Verifica que os ticks ficam na grade início + n * intervalo mesmo com
+trabalho dentro do ciclo (sem deriva), que um ciclo estourado pula ou
+recupera os ticks perdidos conforme catch_up, e que a taxa de variação do
+coletor usa o tempo real entre as aquisições.
+
+Uso:
+    python test_sample_scheduler.py
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from sample_scheduler import SampleScheduler
+from temperature_monitor import TemperatureCollector
+
+
+def run_ticks(scheduler, count, work=lambda n: None):
+    scheduler.start()
+    dues = []
+    while len(dues) < count:
+        dues.append(scheduler.wait())
+        work(len(dues))
+    return dues
+
+
+def test_no_drift():
+    interval = 0.01  # 100 Hz
+    scheduler = SampleScheduler(interval)
+    start = time.monotonic()
+    dues = run_ticks(scheduler, 100, lambda n: time.sleep(0.004))  # Trabalho de 4 ms por ciclo
+    elapsed = time.monotonic() - start
+
+    for due in dues:
+        steps = (due - dues[0]) / interval
+        assert abs(steps - round(steps)) < 1e-6, due  # Sempre na grade início + n * intervalo
+    # Com sleep(interval) depois do trabalho seriam ~1,4 s
+    assert elapsed < 100 * interval + 0.1, elapsed
+    stats = scheduler.stats()
+    # Tolerância para um ou outro atraso do sistema operacional
+    assert stats['ticks'] == 100 and stats['skipped_ticks'] <= 2 and stats['overruns'] <= 2, stats
+
+
+def test_overrun_skips_missed_ticks():
+    interval = 0.02
+    scheduler = SampleScheduler(interval)
+    dues = run_ticks(scheduler, 10, lambda n: time.sleep(0.105) if n == 3 else None)
+
+    stats = scheduler.stats()
+    assert stats['overruns'] == 1 and stats['skipped_ticks'] == 4 and stats['caught_up_ticks'] == 0, stats
+    steps = [round((b - a) / interval) for a, b in zip(dues, dues[1:])]
+    assert steps == [1, 1, 5, 1, 1, 1, 1, 1, 1], steps  # Continua na grade original
+
+
+def test_overrun_catches_up():
+    interval = 0.02
+    scheduler = SampleScheduler(interval, catch_up=True, max_catch_up=2)
+    dues = run_ticks(scheduler, 10, lambda n: time.sleep(0.105) if n == 3 else None)
+
+    stats = scheduler.stats()
+    assert stats['overruns'] == 1 and stats['skipped_ticks'] == 2 and stats['caught_up_ticks'] == 2, stats
+    steps = [round((b - a) / interval) for a, b in zip(dues, dues[1:])]
+    assert steps == [1, 1, 3, 1, 1, 1, 1, 1, 1], steps
+
+
+def test_stop_releases_wait():
+    scheduler = SampleScheduler(10)
+    scheduler.start()
+    scheduler.wait()
+    threading.Timer(0.05, scheduler.stop).start()
+    start = time.monotonic()
+    assert scheduler.wait() is None
+    assert time.monotonic() - start < 1
+
+
+class RampCollector(TemperatureCollector):
+    """Temperatura subindo 0,2 °C/s no tempo real, com um ciclo lento de vez em quando"""
+
+    def _read_temperature(self):
+        self.reads = getattr(self, 'reads', 0) + 1
+        if self.reads % 10 == 0:
+            time.sleep(0.05)
+        acquired = time.monotonic()
+        return 0.2 * (acquired - self.t0), acquired, int(time.time() * 1000)
+
+
+def test_collector_rate_uses_real_time():
+    workdir = tempfile.mkdtemp(prefix='test_scheduler_')
+    try:
+        collector = RampCollector(db_path=os.path.join(workdir, 'sched.db'), interval=0.02,
+                                  flush_interval=0.05)
+        collector.t0 = time.monotonic()
+        collector.start()
+        time.sleep(1)
+        collector.stop()
+
+        rows = collector.get_latest(1000, raw=True)
+        assert 30 <= len(rows) <= 52, len(rows)
+        # Taxa nominal (Δ / 0,02 s) daria ~0,7 °C/s depois de um ciclo lento: anomalia falsa
+        assert all(abs(row[4] - 0.2) < 1e-6 for row in rows[1:]), [row[4] for row in rows]
+        assert not any(row[3] for row in rows)
+        stats = collector.sampling_stats()
+        assert stats['overruns'] >= 3 and stats['skipped_ticks'] >= 3, stats
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DA AGENDA DE AMOSTRAGEM")
+    print("=" * 60)
+    test_no_drift()
+    print("✅ 100 Hz sem deriva com trabalho dentro do ciclo")
+    test_overrun_skips_missed_ticks()
+    print("✅ Ciclo estourado pula os ticks perdidos e mantém a grade")
+    test_overrun_catches_up()
+    print("✅ catch_up recupera até max_catch_up ticks perdidos")
+    test_stop_releases_wait()
+    print("✅ stop() libera a espera")
+    test_collector_rate_uses_real_time()
+    print("✅ Taxa de variação calculada sobre o tempo real entre aquisições")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
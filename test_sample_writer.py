@@ -0,0 +1,115 @@
+"""
+Teste da gravadora em lote (sample_writer.py) com o banco travado
+
+Outra conexão segura a escrita (BEGIN IMMEDIATE), como migrate_db ou
+bulk_ingest fariam: a gravadora deve tentar de novo com backoff e não perder
+nenhuma linha quando a trava é solta, e só descartar o lote depois de
+max_attempts tentativas. Confere também que close() tira o gancho do atexit
+(a gravadora fechada pode ser coletada).
+
+Uso:
+    python test_sample_writer.py
+"""
+import gc
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import weakref
+from sample_writer import SampleWriter, open_database
+
+INSERT_SQL = 'INSERT INTO samples (ts, value) VALUES (?, ?)'
+
+
+def make_writer(db_path, **kwargs):
+    conn = open_database(db_path)
+    conn.execute('CREATE TABLE IF NOT EXISTS samples (ts INTEGER, value REAL)')
+    conn.commit()
+    conn.close()
+    writer = SampleWriter(db_path, INSERT_SQL, flush_interval=0.05, retry_initial=0.05, retry_max=0.2, **kwargs)
+    # Sem a espera padrão de 5 s do sqlite3: "database is locked" sai na hora
+    writer._conn.execute('PRAGMA busy_timeout = 20')
+    return writer
+
+
+def lock_database(db_path):
+    holder = sqlite3.connect(db_path, isolation_level=None)
+    holder.execute('BEGIN IMMEDIATE')
+    return holder
+
+
+def count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM samples').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_retries_until_unlocked():
+    workdir = tempfile.mkdtemp(prefix='test_writer_')
+    try:
+        db_path = os.path.join(workdir, 'samples.db')
+        writer = make_writer(db_path, max_attempts=20)
+        holder = lock_database(db_path)
+        for i in range(100):
+            assert writer.put((i, i / 10))
+        time.sleep(0.5)
+        holder.execute('COMMIT')
+        holder.close()
+        writer.close()
+        stats = writer.stats()
+        assert count_rows(db_path) == 100, stats
+        assert stats['written'] == 100 and stats['dropped'] == 0 and stats['retries'] > 0, stats
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_drops_after_max_attempts():
+    workdir = tempfile.mkdtemp(prefix='test_writer_')
+    try:
+        db_path = os.path.join(workdir, 'samples.db')
+        writer = make_writer(db_path, max_attempts=3)
+        holder = lock_database(db_path)
+        for i in range(10):
+            writer.put((i, i / 10))
+        writer.close()
+        holder.execute('ROLLBACK')
+        holder.close()
+        stats = writer.stats()
+        assert count_rows(db_path) == 0
+        assert stats['dropped'] == 10 and stats['errors'] == 3 and stats['retries'] == 2, stats
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_close_unregisters_atexit():
+    workdir = tempfile.mkdtemp(prefix='test_writer_')
+    try:
+        # O atexit guarda uma referência forte: sem unregister a gravadora nunca seria coletada
+        writer = make_writer(os.path.join(workdir, 'samples.db'))
+        ref = weakref.ref(writer)
+        writer.close()
+        del writer
+        gc.collect()
+        assert ref() is None
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DA GRAVADORA EM LOTE")
+    print("=" * 60)
+    test_retries_until_unlocked()
+    print("✅ Banco travado: lote tentado de novo com backoff, nenhuma linha perdida")
+    test_drops_after_max_attempts()
+    print("✅ Lote descartado só depois de max_attempts tentativas")
+    test_close_unregisters_atexit()
+    print("✅ close() remove o gancho do atexit")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Teste da tabela de valores atuais (tag_cache.py) e das leituras da API
+
+Confere a qualidade das entradas (good, bad e stale após stale_after), que
+on_change só recebe o que mudou e publica good -> stale uma única vez, e
+invalidate. Depois sobe o mock_server em uma porta livre: a primeira
+leitura pela API vai ao CLP e as seguintes saem da tabela, max_age_ms força
+a leitura ao vivo, uma escrita pela API (simples ou em lote) invalida a tag
+e a variável configurada no mesmo endereço, e com a varredura rodando uma
+tag lida pela API passa a ser atualizada sozinha.
+
+Uso:
+    python test_tag_cache.py
+"""
+import asyncio
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from app_factory import create_app, start_services
+from mock_server import run_server
+from modbus_client import ModbusCLP
+from tag_cache import BAD, GOOD, STALE, TagCache
+
+
+def start_mock_server():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        port = sock.getsockname()[1]
+    threading.Thread(target=lambda: asyncio.run(run_server(port)), daemon=True).start()
+    for _ in range(50):
+        try:
+            socket.create_connection(('localhost', port), timeout=0.1).close()
+            return port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Mock não subiu na porta {port}")
+
+
+def write_on_plc(port, address, value):
+    """Escreve direto no mock, sem passar pela API (a tabela não fica sabendo)"""
+    clp = ModbusCLP('localhost', port)
+    assert clp.connect()
+    try:
+        assert clp.write_int(address, value)
+    finally:
+        clp.close()
+
+
+def read_int(client, address, **body):
+    response = client.post('/api/int/read', json={'address': address, **body})
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()
+    return data['value'], data['source']
+
+
+def test_quality_and_changes():
+    published = []
+    cache = TagCache(stale_after=0.1, on_change=published.append)
+
+    cache.update({'a': 1, 'b': 2.5})
+    assert [set(changes) for changes in published] == [{'a', 'b'}]
+    assert published[0]['a']['quality'] == GOOD and published[0]['a']['age_ms'] == 0.0
+    cache.update({'a': 1, 'b': 2.5})  # Nada mudou: nada publicado
+    cache.update({'a': 1, 'b': 3.0})
+    assert len(published) == 2 and set(published[1]) == {'b'}
+
+    # Erro de leitura: bad, mantendo o último valor; get manda ler ao vivo
+    cache.update({}, {'a': 'IllegalAddress'})
+    assert published[2]['a']['quality'] == BAD and published[2]['a']['value'] == 1
+    assert cache.get('a') is None and cache.snapshot()['a']['error'] == 'IllegalAddress'
+    entry = cache.get('b')
+    assert entry['value'] == 3.0 and entry['quality'] == GOOD
+    time.sleep(0.02)
+    assert cache.get('b', max_age_ms=1) is None and cache.get('b', max_age_ms=1000)['value'] == 3.0
+
+    # Sem atualização por mais de stale_after: stale, publicado uma única vez
+    time.sleep(0.1)
+    assert cache.get('b') is None and cache.snapshot()['b']['quality'] == STALE
+    assert set(cache.check_stale()) == {'b'} and published[-1]['b']['quality'] == STALE
+    assert cache.check_stale() == {}
+    count = len(published)
+    cache.update({'b': 3.0})  # Mesmo valor, mas stale -> good é publicado
+    assert len(published) == count + 1 and published[-1]['b']['quality'] == GOOD
+
+    cache.invalidate('b')
+    assert cache.get('b') is None and 'b' not in cache.snapshot()
+    cache.update({'b': 3.0})
+    assert len(published) == count + 2  # Sem entrada anterior: valor novo
+    cache.clear()
+    assert cache.snapshot() == {} and cache.stats()['tags'] == 0
+    stats = cache.stats()
+    assert stats['hits'] == 2 and stats['misses'] == 4, stats
+
+
+def test_reads_and_write_invalidation():
+    workdir = tempfile.mkdtemp(prefix='test_tag_cache_')
+    try:
+        port = start_mock_server()
+        app = create_app({'PLC_IP': 'localhost', 'PLC_PORT': port, 'COLLECT_TEMPERATURE': False,
+                          'TEMPERATURE_DB': os.path.join(workdir, 'temperature.db')})
+        client = app.test_client()
+        tag_cache = app.extensions['plc_services'].tag_cache
+        write_on_plc(port, 5, 100)
+
+        assert read_int(client, 5) == (100, 'live')
+        assert read_int(client, 5) == (100, 'cache')
+
+        # Mudou no CLP por fora: a tabela ainda responde; max_age_ms força a leitura ao vivo
+        write_on_plc(port, 5, 101)
+        assert read_int(client, 5) == (100, 'cache')
+        time.sleep(0.02)
+        assert read_int(client, 5, max_age_ms=1) == (101, 'live')
+        assert read_int(client, 5) == (101, 'cache')
+
+        # Escrita pela API invalida a tag: a próxima leitura vai ao CLP
+        response = client.post('/api/int/write', json={'address': 5, 'value': 202})
+        assert response.status_code == 200, response.get_json()
+        assert tag_cache.get('int:5') is None
+        assert read_int(client, 5) == (202, 'live')
+
+        # Em lote também; a variável configurada no mesmo endereço (PC_Estado = int 0) sai junto
+        assert read_int(client, 0)[1] == 'live'
+        tag_cache.update({'PC_Estado': 0})
+        response = client.post('/api/batch/write', json={'writes': [
+            {'type': 'int', 'address': 5, 'value': 303}, {'type': 'int', 'address': 0, 'value': 9}]})
+        assert response.status_code == 200, response.get_json()
+        assert tag_cache.get('int:5') is None and tag_cache.get('int:0') is None
+        assert tag_cache.get('PC_Estado') is None
+        assert read_int(client, 5) == (303, 'live') and read_int(client, 0) == (9, 'live')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_scan_refreshes_read_tags():
+    workdir = tempfile.mkdtemp(prefix='test_tag_cache_')
+    try:
+        port = start_mock_server()
+        app = create_app({'PLC_IP': 'localhost', 'PLC_PORT': port, 'COLLECT_TEMPERATURE': False,
+                          'SCAN_INTERVAL': 0.1, 'TEMPERATURE_DB': os.path.join(workdir, 'temperature.db')})
+        client = app.test_client()
+        write_on_plc(port, 7, 1)
+        services = start_services(app)
+        try:
+            # Lida pela API: entra na varredura e passa a acompanhar o CLP sem leitura ao vivo
+            assert read_int(client, 7) == (1, 'live')
+            write_on_plc(port, 7, 2)
+            deadline = time.monotonic() + 5
+            while services.tag_cache.snapshot()['int:7']['value'] != 2:
+                assert time.monotonic() < deadline, "Varredura não atualizou a tag"
+                time.sleep(0.02)
+            assert read_int(client, 7) == (2, 'cache')
+            # Variáveis configuradas também estão na tabela
+            assert services.tag_cache.get('PC_Estado') is not None
+        finally:
+            services.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    print("=" * 60)
+    print("  TESTE DA TABELA DE VALORES ATUAIS")
+    print("=" * 60)
+    test_quality_and_changes()
+    print("✅ Qualidade good/bad/stale, on_change só com mudanças, invalidate")
+    test_reads_and_write_invalidation()
+    print("✅ Leitura ao vivo e depois da tabela; escrita invalida a tag e a variável")
+    test_scan_refreshes_read_tags()
+    print("✅ Tag lida pela API entra na varredura e se atualiza sozinha")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,40 @@
 import time
 import sys
-from modbus_client import ModbusCLP
+from connection_pool import get_pool, PLCUnavailableError
+
+CLP_IP = '192.168.0.200'
+CLP_PORT = 502
 
 def main():
     print("=== INICIANDO SERVIÇO DE WATCHDOG ===")
-    print("CLP Alvo: 192.168.0.200 | Tag: Watchdog (HR 40004 -> Index 3)")
+    print(f"CLP Alvo: {CLP_IP} | Tag: Watchdog (HR 40004 -> Index 3)")
     print("Intervalo: 500ms | Pressione Ctrl+C para sair.")
     print("-" * 50)
 
-    clp = ModbusCLP(ip='192.168.0.200', port=502)
-    
-    last_connection_attempt = 0
-    connection_retry_interval = 2.0  # Segundos
+    # O pool mantém o socket aberto entre os ciclos e aplica backoff
+    # exponencial nas tentativas de reconexão
+    pool = get_pool()
+    connected = False
 
     while True:
         try:
-            # Verifica conexão
-            if not clp.client.connected:
-                now = time.time()
-                if now - last_connection_attempt > connection_retry_interval:
-                    print("Tentando conectar ao CLP...")
-                    last_connection_attempt = now
-                    if clp.connect():
-                        print(">> CONECTADO! Retomando Watchdog.")
-                    else:
-                        print(f"Falha na conexão. Nova tentativa em {connection_retry_interval}s...")
-                
-                # Se não conectado, aguarda um pouco para não travar CPU
-                if not clp.client.connected:
-                    time.sleep(0.1)
-                    continue
+            with pool.connection(CLP_IP, CLP_PORT) as clp:
+                if not connected:
+                    print(">> CONECTADO! Retomando Watchdog.")
+                    connected = True
 
-            # Lógica do Watchdog
-            # 1. Ler valor atual
-            # Address 3 (HR 40004)
-            current_val = clp.read_int(3)
-            
-            # 2. Incrementar
-            new_val = current_val + 1
-            if new_val > 30000: # Reseta antes do limite do INT (32767)
-                new_val = 0
-            
-            # 3. Escrever novo valor
-            clp.write_int(3, new_val)
+                # Lógica do Watchdog
+                # 1. Ler valor atual
+                # Address 3 (HR 40004)
+                current_val = clp.read_int(3)
+                
+                # 2. Incrementar
+                new_val = current_val + 1
+                if new_val > 30000: # Reseta antes do limite do INT (32767)
+                    new_val = 0
+                
+                # 3. Escrever novo valor
+                clp.write_int(3, new_val)
             
             # Opcional: Feedback visual (pode remover para serviço)
             # print(f"Watchdog Heartbeat: {new_val}", end='\r')
@@ -53,16 +45,19 @@ def main():
         except KeyboardInterrupt:
             print("\n\nParando serviço de Watchdog...")
             break
+        except PLCUnavailableError as e:
+            if connected:
+                print(f"\nConexão perdida: {e}")
+            connected = False
+            # Se não conectado, aguarda um pouco para não travar CPU
+            time.sleep(0.1)
         except Exception as e:
             print(f"\nErro no loop: {e}")
             print("Tentando reconectar em breve...")
-            try:
-                clp.close()
-            except:
-                pass
+            connected = False
             time.sleep(2)  # Delay antes de tentar reconectar
 
-    clp.close()
+    pool.close_all()
     print("Serviço encerrado.")
     sys.exit(0)
 
@@ -1,121 +1,110 @@
-from flask import Flask, jsonify, request, send_from_directory
-from flask_cors import CORS
-from modbus_client import ModbusCLP
-from temperature_monitor import TemperatureCollector
-from ai_analyzer import TemperatureAIAnalyzer
-import threading
-import time
+"""
+Rotas da interface de controle (/) e do monitoramento de temperatura (/monitoring)
 
-app = Flask(__name__, static_folder='static')
-CORS(app)
+O app é montado por app_factory.create_app; o backend (fila de comandos,
+tabela de valores, stream e coletor) vem de plc_services.
 
-# Instância global do cliente Modbus
-clp = ModbusCLP(ip='192.168.0.200', port=502)
-operation_lock = threading.Lock()
+Uso:
+    python web_app.py [--async]
+"""
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from app_factory import create_app, start_services
+from command_queue import PRIORITY_COMMAND, PRIORITY_INTERACTIVE
+from connection_pool import PLCUnavailableError
+from history_encoding import MIMETYPES as HISTORY_MIMETYPES, encode_history, epoch_ms, negotiate_format
+from history_export import MIMETYPES as EXPORT_MIMETYPES, export, export_filename, parse_time
+from modbus_planner import TAG_TYPES, plan_writes, run_batch
+from plc_services import LIVE_READERS, current_services, tag_name
+from response_cache import conditional_json, conditional_response
+from rollups import SERIES_AGGREGATES, parse_bucket
+import sys
+import time
 
-# Estado de conexão (para display apenas)
-connection_status = {
-    'connected': False,
-    'last_check': None,
-    'error': None
-}
+bp = Blueprint('control', __name__)
 
-def ensure_connection():
-    """Garante que há uma conexão ativa antes de cada operação"""
-    try:
-        # Se já estiver conectado, retornar True
-        if clp.client.is_socket_open():
-            return True
-            
-        # Tentar conectar
-        if clp.connect():
-            connection_status['connected'] = True
-            connection_status['error'] = None
-            connection_status['last_check'] = time.time()
-            print("✅ [MODBUS] Conexão restabelecida.")
-            return True
-        else:
-            connection_status['connected'] = False
-            connection_status['error'] = "Falha ao conectar"
-            print("❌ [MODBUS] Falha ao conectar.")
-            return False
-    except Exception as e:
-        connection_status['connected'] = False
-        connection_status['error'] = str(e)
-        return False
+# Versão de /stats também muda a cada bucket (leituras antigas saem da janela)
+STATS_ETAG_BUCKET = 60
 
-def check_connection_status():
-    """Thread separada apenas para verificar se CLP está acessível"""
-    while True:
-        try:
-            with operation_lock:
-                if clp.client.is_socket_open():
-                     connection_status['connected'] = True
-                     connection_status['error'] = None
-                else:
-                    # Tentar reconectar silenciosamente
-                    if clp.connect():
-                        connection_status['connected'] = True
-                        connection_status['error'] = None
-                    else:
-                        connection_status['connected'] = False
-                        connection_status['error'] = "Desconectado"
-            
-            connection_status['last_check'] = time.time()
-        except Exception as e:
-            connection_status['connected'] = False
-            connection_status['error'] = str(e)
-        
-        time.sleep(5)  # Verifica a cada 5 segundos
-
-# Iniciar thread de verificação de status
-status_thread = threading.Thread(target=check_connection_status, daemon=True)
-status_thread.start()
+def parse_max_age(data):
+    max_age_ms = data.get('max_age_ms')
+    return None if max_age_ms is None else float(max_age_ms)
 
 # ==================== ROTAS DA API ====================
 
-@app.route('/')
+@bp.route('/')
 def index():
     """Servir página principal"""
-    return send_from_directory('static', 'index.html')
+    return current_app.send_static_file('index.html')
 
-@app.route('/api/status', methods=['GET'])
+@bp.route('/api/status', methods=['GET'])
 def get_status():
-    """Retorna status da conexão"""
-    return jsonify(connection_status)
+    """Retorna status da conexão, do circuit breaker e da fila de comandos do CLP"""
+    return jsonify(current_services().status())
 
-@app.route('/api/bool/read', methods=['POST'])
+@bp.route('/api/tags', methods=['GET'])
+def get_tags():
+    """Retorna a tabela de valores atuais e as estatísticas do cache e da varredura"""
+    plc = current_services()
+    return jsonify({
+        'tags': plc.tag_cache.snapshot(),
+        'cache': plc.tag_cache.stats(),
+        'poller': plc.tag_poller.stats().get('clp'),
+        'stream': plc.event_broker.stats(),
+    })
+
+@bp.route('/api/stream', methods=['GET'])
+def stream_events():
+    """Stream SSE com mudanças de tags e novas amostras de temperatura
+    Query: ?events=tags,temperature&tags=real:1,PC_Temp  (ambos opcionais)
+    Tags por 'tipo:endereço' entram na varredura; por nome, as variáveis do /console.
+    """
+    plc = current_services()
+    events = [e for e in request.args.get('events', '').split(',') if e]
+    tags = [t for t in request.args.get('tags', '').split(',') if t]
+    try:
+        watched = plc.watch_tags(tags)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    subscription = plc.event_broker.subscribe(events or None, tags or None)
+    
+    def stream():
+        try:
+            yield from plc.event_broker.stream(subscription)
+        finally:
+            # Cliente desconectou: tags que só ele pedia saem da varredura
+            plc.unwatch_tags(watched)
+    
+    return Response(stream_with_context(stream()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/bool/read', methods=['POST'])
 def read_bool():
     """Lê valor booleano
-    Body: {"address": 0}
+    Body: {"address": 0, "max_age_ms": 500}  (max_age_ms opcional)
     """
     try:
         data = request.get_json()
         address = data.get('address', 0)
         
-        with operation_lock:
-            # Conectar para esta operação
-            if not ensure_connection():
-                return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
-            
-            try:
-                value = clp.read_bool(address)
-                return jsonify({
-                    'success': True,
-                    'address': address,
-                    'value': value
-                })
-            except Exception as e:
-                # Se falhar, tentar reconectar uma vez
-                clp.close()
-                if ensure_connection():
-                    value = clp.read_bool(address)
-                    return jsonify({'success': True, 'address': address, 'value': value})
-                raise e
+        entry = current_services().read_tag('bool', address, parse_max_age(data))
+        
+        return jsonify({
+            'success': True,
+            'address': address,
+            'value': entry['value'],
+            'timestamp': entry['timestamp'],
+            'quality': entry['quality'],
+            'age_ms': entry['age_ms'],
+            'source': entry['source']
+        })
+    except PLCUnavailableError:
+        return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/bool/write', methods=['POST'])
+@bp.route('/api/bool/write', methods=['POST'])
 def write_bool():
     """Escreve valor booleano
     Body: {"address": 0, "value": true}
@@ -125,58 +114,45 @@ def write_bool():
         address = data.get('address', 0)
         value = data.get('value', False)
         
-        with operation_lock:
-            # Conectar para esta operação
-            if not ensure_connection():
-                return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
-            
-            try:
-                clp.write_bool(address, value)
-                return jsonify({
-                    'success': True,
-                    'address': address,
-                    'value': value,
-                    'message': f'BOOL {address} definido para {value}'
-                })
-            except Exception as e:
-                clp.close()
-                if ensure_connection():
-                    clp.write_bool(address, value)
-                    return jsonify({'success': True, 'address': address, 'value': value, 'message': f'BOOL {address} definido para {value}'})
-                raise e
+        current_services().write('bool', address, value)
+        
+        return jsonify({
+            'success': True,
+            'address': address,
+            'value': value,
+            'message': f'BOOL {address} definido para {value}'
+        })
+    except PLCUnavailableError:
+        return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/int/read', methods=['POST'])
+@bp.route('/api/int/read', methods=['POST'])
 def read_int():
     """Lê valor inteiro
-    Body: {"address": 0}
+    Body: {"address": 0, "max_age_ms": 500}  (max_age_ms opcional)
     """
     try:
         data = request.get_json()
         address = data.get('address', 0)
         
-        with operation_lock:
-            if not ensure_connection():
-                return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
-            
-            try:
-                value = clp.read_int(address)
-                return jsonify({
-                    'success': True,
-                    'address': address,
-                    'value': value
-                })
-            except Exception as e:
-                clp.close()
-                if ensure_connection():
-                    value = clp.read_int(address)
-                    return jsonify({'success': True, 'address': address, 'value': value})
-                raise e
+        entry = current_services().read_tag('int', address, parse_max_age(data))
+        
+        return jsonify({
+            'success': True,
+            'address': address,
+            'value': entry['value'],
+            'timestamp': entry['timestamp'],
+            'quality': entry['quality'],
+            'age_ms': entry['age_ms'],
+            'source': entry['source']
+        })
+    except PLCUnavailableError:
+        return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/int/write', methods=['POST'])
+@bp.route('/api/int/write', methods=['POST'])
 def write_int():
     """Escreve valor inteiro
     Body: {"address": 0, "value": 1234}
@@ -186,57 +162,45 @@ def write_int():
         address = data.get('address', 0)
         value = int(data.get('value', 0))
         
-        with operation_lock:
-            if not ensure_connection():
-                return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
-            
-            try:
-                clp.write_int(address, value)
-                return jsonify({
-                    'success': True,
-                    'address': address,
-                    'value': value,
-                    'message': f'INT {address} definido para {value}'
-                })
-            except Exception as e:
-                clp.close()
-                if ensure_connection():
-                     clp.write_int(address, value)
-                     return jsonify({'success': True, 'address': address, 'value': value, 'message': f'INT {address} definido para {value}'})
-                raise e
+        current_services().write('int', address, value)
+        
+        return jsonify({
+            'success': True,
+            'address': address,
+            'value': value,
+            'message': f'INT {address} definido para {value}'
+        })
+    except PLCUnavailableError:
+        return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/real/read', methods=['POST'])
+@bp.route('/api/real/read', methods=['POST'])
 def read_real():
     """Lê valor real (float)
-    Body: {"address": 1}
+    Body: {"address": 1, "max_age_ms": 500}  (max_age_ms opcional)
     """
     try:
         data = request.get_json()
         address = data.get('address', 1)
         
-        with operation_lock:
-            if not ensure_connection():
-                return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
-            
-            try:
-                value = clp.read_real(address)
-                return jsonify({
-                    'success': True,
-                    'address': address,
-                    'value': round(value, 2)
-                })
-            except Exception as e:
-                clp.close()
-                if ensure_connection():
-                    value = clp.read_real(address)
-                    return jsonify({'success': True, 'address': address, 'value': round(value, 2)})
-                raise e
+        entry = current_services().read_tag('real', address, parse_max_age(data))
+        
+        return jsonify({
+            'success': True,
+            'address': address,
+            'value': round(entry['value'], 2),
+            'timestamp': entry['timestamp'],
+            'quality': entry['quality'],
+            'age_ms': entry['age_ms'],
+            'source': entry['source']
+        })
+    except PLCUnavailableError:
+        return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/real/write', methods=['POST'])
+@bp.route('/api/real/write', methods=['POST'])
 def write_real():
     """Escreve valor real (float)
     Body: {"address": 1, "value": 75.5}
@@ -246,43 +210,135 @@ def write_real():
         address = data.get('address', 1)
         value = float(data.get('value', 0.0))
         
-        with operation_lock:
-            if not ensure_connection():
-                return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
-            
-            try:
-                clp.write_real(address, value)
-                return jsonify({
-                    'success': True,
-                    'address': address,
-                    'value': value,
-                    'message': f'REAL {address} definido para {value}'
-                })
-            except Exception as e:
-                clp.close()
-                if ensure_connection():
-                    clp.write_real(address, value)
-                    return jsonify({'success': True, 'address': address, 'value': value, 'message': f'REAL {address} definido para {value}'})
-                raise e
+        current_services().write('real', address, value)
+        
+        return jsonify({
+            'success': True,
+            'address': address,
+            'value': value,
+            'message': f'REAL {address} definido para {value}'
+        })
+    except PLCUnavailableError:
+        return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# ==================== TEMPERATURE MONITORING ====================
+@bp.route('/api/batch/write', methods=['POST'])
+def write_batch():
+    """Escreve várias variáveis agrupadas em requisições FC15/FC16
+    Body: {"writes": [{"type": "real", "address": 1, "value": 75.5},
+                      {"type": "bool", "address": 0, "value": true}],
+           "verify": true}
+    """
+    try:
+        data = request.get_json() or {}
+        writes = data.get('writes', [])
+        verify = bool(data.get('verify', False))
+        
+        if not writes:
+            return jsonify({'error': 'Nenhuma escrita informada'}), 400
+        for index, write in enumerate(writes):
+            if 'type' not in write or 'address' not in write or 'value' not in write:
+                return jsonify({'error': 'Cada escrita precisa de type, address e value'}), 400
+            if not isinstance(write['address'], int) or write['address'] < 0:
+                return jsonify({'error': f'Escrita {index}: address inválido'}), 400
+        plan_writes(writes)  # Valida tipos e sobreposições antes de acessar o CLP
+        
+        plc = current_services()
+        result = plc.run_on_plc(lambda conn: conn.write_many(writes, verify=verify), PRIORITY_COMMAND)
+        for write in writes:
+            plc.invalidate(write['type'], write['address'])
+        
+        if result['mismatches']:
+            return jsonify({
+                'success': False,
+                'error': 'Verificação falhou: valores lidos diferem dos escritos',
+                **result
+            }), 409
+        
+        return jsonify({
+            'success': True,
+            'count': len(writes),
+            'message': f'{len(writes)} variáveis escritas em {result["blocks"]} requisições',
+            **result
+        })
+    except PLCUnavailableError:
+        return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-# Inicializar coletor e analisador
-temp_collector = TemperatureCollector(plc_ip='192.168.0.200', hr_address=40001, interval=5)
-ai_analyzer = TemperatureAIAnalyzer()  # Usa GEMINI_API_KEY do ambiente, se disponível
+@bp.route('/api/batch', methods=['POST'])
+def batch():
+    """Executa leituras e escritas mistas em uma única passada Modbus planejada
+    Body: {"operations": [{"op": "write", "type": "real", "address": 1, "value": 75.5},
+                          {"op": "read", "type": "bool", "address": 0},
+                          {"op": "read", "type": "int", "address": 0}]}
+    As escritas são feitas antes das leituras. Resultados na mesma ordem das operações.
+    """
+    try:
+        data = request.get_json() or {}
+        operations = data.get('operations', [])
+        max_operations = current_app.config['MAX_BATCH_OPERATIONS']
+        
+        if not operations:
+            return jsonify({'error': 'Nenhuma operação informada'}), 400
+        if len(operations) > max_operations:
+            return jsonify({'error': f'Máximo de {max_operations} operações por requisição'}), 400
+        for index, operation in enumerate(operations):
+            if operation.get('op') not in ('read', 'write'):
+                return jsonify({'error': f'Operação {index}: op deve ser read ou write'}), 400
+            if operation.get('type') not in TAG_TYPES:
+                return jsonify({'error': f'Operação {index}: tipo inválido {operation.get("type")}'}), 400
+            if not isinstance(operation.get('address'), int) or operation['address'] < 0:
+                return jsonify({'error': f'Operação {index}: address inválido'}), 400
+            if operation['op'] == 'write' and 'value' not in operation:
+                return jsonify({'error': f'Operação {index}: escrita sem value'}), 400
+        # Valida valores e sobreposições antes de acessar o CLP
+        plan_writes([operation for operation in operations if operation['op'] == 'write'])
+        
+        plc = current_services()
+        has_writes = any(operation['op'] == 'write' for operation in operations)
+        results, round_trips = plc.run_on_plc(lambda conn: run_batch(conn, operations),
+                                              PRIORITY_COMMAND if has_writes else PRIORITY_INTERACTIVE,
+                                              None if has_writes else plc.interactive_deadline)
+        
+        timestamp = time.time()
+        for operation, result in zip(operations, results):
+            if operation['op'] == 'write':
+                plc.invalidate(operation['type'], operation['address'])
+            elif result['success'] and operation['type'] in LIVE_READERS:
+                name = tag_name(operation['type'], operation['address'])
+                plc.tag_cache.update({name: result['value']}, timestamp=timestamp)
+        
+        return jsonify({
+            'success': all(result['success'] for result in results),
+            'results': [
+                {'op': operation['op'], 'type': operation['type'], 'address': operation['address'], **result}
+                for operation, result in zip(operations, results)
+            ],
+            'round_trips': round_trips
+        })
+    except PLCUnavailableError:
+        return jsonify({'error': 'Falha ao conectar ao CLP'}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ==================== TEMPERATURE MONITORING ====================
 
-@app.route('/monitoring')
+@bp.route('/monitoring')
 def monitoring_page():
     """Página de monitoramento de temperatura"""
-    return send_from_directory('static', 'monitoring.html')
+    return current_app.send_static_file('monitoring.html')
 
-@app.route('/api/temperature/current', methods=['GET'])
+@bp.route('/api/temperature/current', methods=['GET'])
 def get_current_temperature():
     """Retorna temperatura atual"""
     try:
-        current = temp_collector.get_current()
+        current = current_services().temp_collector.get_current()
         if not current:
             return jsonify({'error': 'Nenhuma leitura disponível'}), 404
         
@@ -290,36 +346,149 @@ def get_current_temperature():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/temperature/history', methods=['GET'])
+@bp.route('/api/temperature/history', methods=['GET'])
 def get_temperature_history():
-    """Retorna histórico de temperatura"""
+    """Retorna histórico de temperatura
+    Query: ?limit=200 (últimas N) ou ?since=<cursor>&limit=1000 (só as leituras novas).
+    Accept escolhe JSON em linhas (padrão), colunar ou binário (ver history_encoding.py).
+    'cursor' na resposta é o valor a enviar em `since` na próxima consulta;
+    'has_more' indica que havia mais de `limit` leituras novas.
+    """
     try:
         limit = int(request.args.get('limit', 100))
         limit = min(limit, 1000)  # Máximo 1000 pontos
+        since = request.args.get('since')
+        plc = current_services()
+        temp_collector = plc.temp_collector
+        latest_id = temp_collector.latest_id
+        version = temp_collector.data_version
+        fmt = negotiate_format(request.accept_mimetypes)
         
-        history = temp_collector.get_latest(limit=limit)
-        return jsonify({
-            'data': history,
-            'count': len(history)
-        })
+        if since is None:
+            def build():
+                rows = temp_collector.get_latest(limit=limit, raw=True)
+                cursor = rows[-1][0] if rows else latest_id
+                return encode_history(rows, fmt, cursor)
+            
+            return conditional_response(plc.history_cache, f'history-{version}-{limit}-{fmt}', build,
+                                        HISTORY_MIMETYPES[fmt], vary='Accept')
+        
+        # Incremental: só as leituras depois do cursor (id ou horário local)
+        since_id = since_ms = None
+        if since.isdigit():
+            since_id = int(since)
+        else:
+            try:
+                since_ms = epoch_ms(since)
+            except ValueError:
+                return jsonify({'error': "since deve ser um id ou 'YYYY-MM-DD HH:MM:SS[.fff]'"}), 400
+        
+        def build_since():
+            rows = temp_collector.get_since(since_id, limit=limit + 1, raw=True, since_ms=since_ms)
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            cursor = rows[-1][0] if rows else (since_id if since_id is not None else latest_id)
+            return encode_history(rows, fmt, cursor, has_more)
+        
+        cursor_key = since_id if since_id is not None else f't{since_ms}'
+        etag = f"history-{version}-{limit}-since-{cursor_key}-{fmt}"
+        return conditional_response(plc.history_cache, etag, build_since, HISTORY_MIMETYPES[fmt], vary='Accept')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/temperature/stats', methods=['GET'])
+@bp.route('/api/temperature/stats', methods=['GET'])
 def get_temperature_stats():
     """Retorna estatísticas de temperatura"""
     try:
         hours = int(request.args.get('hours', 24))
-        stats = temp_collector.get_statistics(hours=hours)
+        plc = current_services()
+        temp_collector = plc.temp_collector
         
-        if not stats:
+        # Leituras antigas saem da janela com o tempo: a versão também muda a cada bucket
+        bucket = int(time.time() // STATS_ETAG_BUCKET)
+        etag = f'stats-{temp_collector.data_version}-{hours}-{bucket}'
+        response = conditional_json(plc.history_cache, etag, lambda: temp_collector.get_statistics(hours=hours))
+        if response is None:
             return jsonify({'error': 'Sem dados para o período'}), 404
         
-        return jsonify(stats)
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/temperature/export', methods=['GET'])
+def export_temperature():
+    """
+    Exporta as leituras de um período em streaming (sem limite de linhas)
+    Query: ?format=csv|ndjson|parquet&since=...&until=...&compress=gzip
+    since/until: epoch-ms ou horário local 'YYYY-MM-DD HH:MM:SS' (until exclusivo); omitidos = tudo
+    """
+    fmt = request.args.get('format', 'csv')
+    compress = request.args.get('compress') or None
+    try:
+        start_ms = parse_time(request.args.get('since'))
+        end_ms = parse_time(request.args.get('until'))
+        temp_collector = current_services().temp_collector
+        temp_collector.ensure_database()  # Banco novo: cria o schema antes de consultar
+        blocks = export(temp_collector.db_path, fmt, start_ms, end_ms, compress)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Arquivo .gz para download (não Content-Encoding): o navegador salva comprimido
+    mimetype = 'application/gzip' if compress and fmt != 'parquet' else EXPORT_MIMETYPES[fmt]
+    return Response(stream_with_context(blocks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{export_filename(fmt, compress)}"',
+                             'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/series', methods=['GET'])
+def get_series():
+    """
+    Série de temperatura agregada por bucket no servidor (uma linha por bucket com amostras)
+    Query: ?from=...&to=...&bucket=1m&agg=avg,min,max,count
+    from/to: epoch-ms ou horário local 'YYYY-MM-DD HH:MM:SS' (to exclusivo; padrão: últimas 24 h)
+    bucket: 30s, 1m, 15m, 1h, 1d... (alinhado em UTC); agg: avg, min, max, count, sum, stdev, anomalies
+    O tamanho da resposta depende só do número de buckets (máximo SERIES_MAX_BUCKETS).
+    """
+    try:
+        end_ms = parse_time(request.args.get('to'))
+        if end_ms is None:
+            end_ms = int(time.time() * 1000) + 1
+        start_ms = parse_time(request.args.get('from'))
+        if start_ms is None:
+            start_ms = end_ms - 24 * 3600 * 1000
+        bucket_ms = parse_bucket(request.args.get('bucket', '1m'))
+        aggregates = [name.strip() for name in request.args.get('agg', 'avg,min,max,count').split(',') if name.strip()]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if start_ms >= end_ms:
+        return jsonify({'error': 'from deve ser anterior a to'}), 400
+    unknown = [name for name in aggregates if name not in SERIES_AGGREGATES]
+    if unknown or not aggregates:
+        return jsonify({'error': f"agg inválido: {','.join(unknown)} (use {','.join(SERIES_AGGREGATES)})"}), 400
+    max_buckets = current_app.config['SERIES_MAX_BUCKETS']
+    buckets = (end_ms - 1) // bucket_ms - start_ms // bucket_ms + 1
+    if buckets > max_buckets:
+        return jsonify({'error': f'{buckets} buckets no período (máximo {max_buckets}): aumente o bucket'}), 400
+    
+    plc = current_services()
+    temp_collector = plc.temp_collector
+    
+    def build():
+        return {
+            'from': start_ms,
+            'to': end_ms,
+            'bucket_ms': bucket_ms,
+            'agg': aggregates,
+            'data': temp_collector.get_series(start_ms, end_ms, bucket_ms, aggregates),
+        }
+    
+    etag = f"series-{temp_collector.data_version}-{start_ms}-{end_ms}-{bucket_ms}-{','.join(aggregates)}"
+    try:
+        return conditional_json(plc.history_cache, etag, build)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/temperature/analyze', methods=['POST'])
+@bp.route('/api/temperature/analyze', methods=['POST'])
 def analyze_temperature():
     """Analisa padrões de temperatura com IA"""
     try:
@@ -327,6 +496,8 @@ def analyze_temperature():
         data = request.get_json() or {}
         limit = data.get('limit', 200)
         hours = data.get('hours', 24)
+        plc = current_services()
+        temp_collector, ai_analyzer = plc.temp_collector, plc.ai_analyzer
         
         # Buscar dados
         readings = temp_collector.get_latest(limit=limit)
@@ -342,11 +513,13 @@ def analyze_temperature():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/temperature/report', methods=['GET'])
+@bp.route('/api/temperature/report', methods=['GET'])
 def generate_temperature_report():
     """Gera relatório completo de temperatura"""
     try:
         hours = int(request.args.get('hours', 24))
+        plc = current_services()
+        temp_collector, ai_analyzer = plc.temp_collector, plc.ai_analyzer
         
         # Buscar dados
         readings = temp_collector.get_latest(limit=500)
@@ -365,17 +538,26 @@ def generate_temperature_report():
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    app = create_app()
+    plc = app.extensions['plc_services']
     print("=" * 60)
     print("  SERVIDOR WEB MODBUS - INTERFACE DE CONTROLE CLP")
     print("=" * 60)
     print(f"URL: http://localhost:5000")
     print(f"Monitoring: http://localhost:5000/monitoring")
-    print(f"CLP: {clp.ip}:{clp.port}")
+    print(f"Console: http://localhost:5000/console")
+    print(f"CLP: {plc.ip}:{plc.port}")
     print("-" * 60)
     print("Aguardando conexão com o CLP...")
     
-    # Iniciar coletor de temperatura
-    print("[STARTUP] Iniciando coletor de temperatura...")
-    temp_collector.start()
+    # Varredura, verificação de status e coletor de temperatura
+    print("[STARTUP] Iniciando serviços em background...")
+    start_services(app)
     
-    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
+    if '--async' in sys.argv:
+        # Um event loop para todas as conexões (milhares de streams SSE abertos)
+        from async_server import run_async
+        run_async(app, plc.event_broker, port=5000, on_subscribe=lambda events, tags: plc.watch_tags(tags),
+                  on_unsubscribe=plc.unwatch_tags)
+    else:
+        app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
@@ -1,11 +1,22 @@
-from flask import Flask, render_template, request, jsonify
-from flask_cors import CORS
-from modbus_client import ModbusCLP
-import threading
-import time
+"""
+Rotas da interface de variáveis com template (/console)
 
-app = Flask(__name__)
-CORS(app)
+O app é montado por app_factory.create_app junto com as rotas de web_app.py;
+as duas interfaces compartilham o mesmo backend (plc_services). As mudanças
+das variáveis chegam pelo /api/stream único, filtrado pelos nomes abaixo.
+
+Uso:
+    python web_server.py [--async]
+"""
+from flask import Blueprint, render_template, request, jsonify
+from app_factory import create_app, start_services
+from command_queue import PRIORITY_INTERACTIVE
+from modbus_planner import ReadPlanner
+from plc_services import current_services
+import os
+import sys
+
+bp = Blueprint('console', __name__)
 
 # ============================================
 # CONFIGURAÇÃO DO CLP - AJUSTE AQUI!
@@ -22,20 +33,6 @@ CORS(app)
 CLP_IP = '192.168.0.200'  # ✅ Conectado ao CLP REAL
 CLP_PORT = 502  # ✅ Porta Modbus padrão
 
-# Instância global do cliente Modbus
-clp = None
-clp_lock = threading.Lock()
-
-def get_clp_connection():
-    """Retorna ou cria uma conexão com o CLP."""
-    global clp
-    with clp_lock:
-        if clp is None:
-            clp = ModbusCLP(ip=CLP_IP, port=CLP_PORT)
-            if not clp.connect():
-                raise Exception("Não foi possível conectar ao CLP")
-        return clp
-
 # Definição das variáveis disponíveis (conforme mapeamento do CLP)
 # NOTA: Modbus usa endereços 0-based, então Coil 1 = address 0
 VARIABLES = {
@@ -52,64 +49,52 @@ VARIABLES = {
     ]
 }
 
-@app.route('/')
+@bp.route('/console')
 def index():
     """Página principal."""
     return render_template('index.html')
 
-@app.route('/api/config', methods=['GET'])
+@bp.route('/api/config', methods=['GET'])
 def get_config():
     """Retorna a configuração atual do CLP."""
+    plc = current_services()
     return jsonify({
-        'ip': CLP_IP,
-        'port': CLP_PORT,
-        'connected': clp is not None
+        'ip': plc.ip,
+        'port': plc.port,
+        'connected': plc.pool.is_connected(plc.ip, plc.port)
     })
 
-@app.route('/api/config', methods=['POST'])
+@bp.route('/api/config', methods=['POST'])
 def set_config():
-    """Atualiza a configuração do CLP."""
-    global CLP_IP, CLP_PORT, clp
+    """Atualiza a configuração do CLP (vale para as duas interfaces)."""
+    plc = current_services()
     data = request.json
     
-    with clp_lock:
-        # Fecha conexão anterior
-        if clp:
-            clp.close()
-            clp = None
-        
-        # Atualiza configuração
-        CLP_IP = data.get('ip', CLP_IP)
-        CLP_PORT = int(data.get('port', CLP_PORT))
+    # Varredura, comandos e coletor passam para o novo endereço
+    plc.set_target(data.get('ip', plc.ip), int(data.get('port', plc.port)))
         
-    return jsonify({'success': True, 'ip': CLP_IP, 'port': CLP_PORT})
+    return jsonify({'success': True, 'ip': plc.ip, 'port': plc.port})
 
-@app.route('/api/variables', methods=['GET'])
+@bp.route('/api/variables', methods=['GET'])
 def get_variables():
     """Retorna todas as variáveis disponíveis."""
-    return jsonify(VARIABLES)
+    return jsonify(current_services().variables)
 
-@app.route('/api/read/<var_type>/<int:address>', methods=['GET'])
+@bp.route('/api/read/<var_type>/<int:address>', methods=['GET'])
 def read_variable(var_type, address):
     """Lê uma variável do CLP."""
     try:
-        clp_conn = get_clp_connection()
-        
-        if var_type == 'bool':
-            value = clp_conn.read_bool(address)
-        elif var_type == 'int':
-            value = clp_conn.read_int(address)
-        elif var_type == 'real':
-            value = clp_conn.read_real(address)
-        else:
+        if var_type not in ('bool', 'int', 'real'):
             return jsonify({'success': False, 'error': 'Tipo inválido'}), 400
         
+        value = current_services().read_live(var_type, address)
+        
         return jsonify({'success': True, 'value': value})
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/write/<var_type>/<int:address>', methods=['POST'])
+@bp.route('/api/write/<var_type>/<int:address>', methods=['POST'])
 def write_variable(var_type, address):
     """Escreve uma variável no CLP."""
     try:
@@ -119,51 +104,43 @@ def write_variable(var_type, address):
         if value is None:
             return jsonify({'success': False, 'error': 'Valor não fornecido'}), 400
         
-        clp_conn = get_clp_connection()
-        
-        if var_type == 'bool':
-            clp_conn.write_bool(address, bool(value))
-        elif var_type == 'int':
-            clp_conn.write_int(address, int(value))
-        elif var_type == 'real':
-            clp_conn.write_real(address, float(value))
-        else:
+        if var_type not in ('bool', 'int', 'real'):
             return jsonify({'success': False, 'error': 'Tipo inválido'}), 400
         
+        converters = {'bool': bool, 'int': int, 'real': float}
+        current_services().write(var_type, address, converters[var_type](value))
+        
         return jsonify({'success': True})
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/read_all', methods=['GET'])
+@bp.route('/api/read_all', methods=['GET'])
 def read_all_variables():
-    """Lê todas as variáveis do CLP."""
+    """Lê todas as variáveis do CLP em blocos (poucas requisições Modbus)."""
     try:
-        clp_conn = get_clp_connection()
+        plc = current_services()
         results = {'bool': {}, 'int': {}, 'real': {}}
         
-        for var_type, variables in VARIABLES.items():
+        tags = [
+            {'name': var['name'], 'type': var_type, 'address': var['address']}
+            for var_type, variables in plc.variables.items()
+            for var in variables
+        ]
+        values, errors = plc.run_on_plc(lambda clp_conn: ReadPlanner(clp_conn).read(tags),
+                                        PRIORITY_INTERACTIVE, plc.interactive_deadline)
+        
+        for var_type, variables in plc.variables.items():
             for var in variables:
-                try:
-                    address = var['address']
-                    if var_type == 'bool':
-                        value = clp_conn.read_bool(address)
-                    elif var_type == 'int':
-                        value = clp_conn.read_int(address)
-                    elif var_type == 'real':
-                        value = clp_conn.read_real(address)
-                    
-                    results[var_type][var['name']] = {
-                        'value': value,
-                        'address': address,
-                        'description': var['description']
-                    }
-                except Exception as e:
-                    results[var_type][var['name']] = {
-                        'error': str(e),
-                        'address': address,
-                        'description': var['description']
-                    }
+                entry = {
+                    'address': var['address'],
+                    'description': var['description']
+                }
+                if var['name'] in values:
+                    entry['value'] = values[var['name']]
+                else:
+                    entry['error'] = errors.get(var['name'], 'Leitura não realizada')
+                results[var_type][var['name']] = entry
         
         return jsonify({'success': True, 'data': results})
     
@@ -171,12 +148,24 @@ def read_all_variables():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 if __name__ == '__main__':
+    app = create_app({'PLC_IP': CLP_IP, 'PLC_PORT': CLP_PORT})
+    plc = app.extensions['plc_services']
     print("=" * 60)
     print("  🚀 WEB SERVER MODBUS CLP")
     print("=" * 60)
     print(f"  📡 CLP: {CLP_IP}:{CLP_PORT}")
-    print(f"  🌐 Servidor Web: http://localhost:5000")
+    print(f"  🌐 Servidor Web: http://localhost:5000/console")
     print("=" * 60)
-    print("\n  Abra o navegador em: http://localhost:5000\n")
+    print("\n  Abra o navegador em: http://localhost:5000/console\n")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    if '--async' in sys.argv:
+        # Um event loop para todas as conexões (milhares de streams SSE abertos)
+        from async_server import run_async
+        start_services(app)
+        run_async(app, plc.event_broker, port=5000, on_subscribe=lambda events, tags: plc.watch_tags(tags),
+                  on_unsubscribe=plc.unwatch_tags)
+    else:
+        # Com debug=True o reloader executa este bloco também no processo monitor
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            start_services(app)
+        app.run(debug=True, host='0.0.0.0', port=5000)